@@ -8,14 +8,19 @@ from datetime import datetime, timedelta
 import pandas as pd
 
 from config import BEIJING_TZ
-from database import get_connection, get_stock_pool
+from database import get_connection, get_stock_pool, execute_with_retry
 from utils import send_wecom_notification
 from engine.ai_service import generate_ai_prediction
-from engine.validator import validate_previous_prediction
+from engine.validator import validate_previous_prediction, verify_pending_range
 from trading_calendar import is_trading_day, get_market_from_symbol
 from helpers import check_stock_analysis_mode
 from logger import logger
 
+RULE_ENGINE_MODEL_ID = "rule-engine"
+# 规则引擎批量回填: 每条多行 INSERT 的行数 (13 个参数/行) 与每个事务的行数
+RULE_INSERT_CHUNK_ROWS = 400
+RULE_TXN_ROWS = 20000
+
 
 def run_ai_analysis_backfill(
     symbol: str = None,
@@ -103,10 +108,17 @@ def run_ai_analysis_backfill(
         
         # 执行补充
         total_success = 0
+        if model_filter == RULE_ENGINE_MODEL_ID:
+            pairs = {(s, d) for d, stocks in dates_with_stocks.items() for s in stocks}
+            written = _rule_engine_bulk_backfill(sorted({s for s, _ in pairs}), sorted(dates_with_stocks), force=force, pairs=pairs)
+            conn.close()
+            logger.info(f"\n✅ 智能补充完成! 共处理 {sum(written.values())} 条分析")
+            return
+        done_keys = _load_done_keys(min(dates_with_stocks), max(dates_with_stocks), force)
         for date_str in sorted(dates_with_stocks.keys()):
             stocks_to_fill = dates_with_stocks[date_str]
             logger.info(f"\n🧠 开始补充 {date_str}...")
-            success = _analyze_stocks_for_date(conn, stocks_to_fill, date_str, model_filter=model_filter, force=force)
+            success = _analyze_stocks_for_date(conn, stocks_to_fill, date_str, model_filter=model_filter, force=force, done_keys=done_keys)
             total_success += success
         
         conn.close()
@@ -172,23 +184,34 @@ def run_ai_analysis_backfill(
     start_time = time.time()
     total_success = 0
     total_skipped = 0
-    
-    for date_str in target_dates:
+    if model_filter == RULE_ENGINE_MODEL_ID:
+        # 规则引擎走批量快速路径: 一次读价格、向量化计算、批量写入
         market = get_market_from_symbol(targets[0]) if targets else "CN"
+        trading_dates = [d for d in target_dates if is_trading_day(d, market=market)]
+        total_skipped = len(target_dates) - len(trading_dates)
+        if trading_dates:
+            written = _rule_engine_bulk_backfill(targets, trading_dates, force=force)
+            total_success = sum(written.values())
+            _notify_completed(tracker, written)
+    else:
+        done_keys = _load_done_keys(target_dates[0], target_dates[-1], force)
+    
+        for date_str in target_dates:
+            market = get_market_from_symbol(targets[0]) if targets else "CN"
         
-        # 交易日检查
-        if not is_trading_day(date_str, market=market):
-            weekday = datetime.strptime(date_str, "%Y-%m-%d").strftime("%A")
-            logger.warning(f"⚠️ {date_str} ({weekday}) 非交易日，跳过")
-            total_skipped += 1
-            continue
+            # 交易日检查
+            if not is_trading_day(date_str, market=market):
+                weekday = datetime.strptime(date_str, "%Y-%m-%d").strftime("%A")
+                logger.warning(f"⚠️ {date_str} ({weekday}) 非交易日，跳过")
+                total_skipped += 1
+                continue
         
-        logger.info(f"\n{'='*50}")
-        logger.info(f"🗓️ 分析日期: {date_str}")
-        logger.info(f"{'='*50}")
+            logger.info(f"\n{'='*50}")
+            logger.info(f"🗓️ 分析日期: {date_str}")
+            logger.info(f"{'='*50}")
         
-        success = _analyze_stocks_for_date(conn, targets, date_str, model_filter=model_filter, force=force, tracker=tracker)
-        total_success += success
+            success = _analyze_stocks_for_date(conn, targets, date_str, model_filter=model_filter, force=force, tracker=tracker, done_keys=done_keys)
+            total_success += success
     
     conn.close()
     duration = time.time() - start_time
@@ -207,16 +230,143 @@ def run_ai_analysis_backfill(
     send_wecom_notification(report)
 
 
-def _analyze_stocks_for_date(conn, stocks: list, date_str: str, model_filter: str = None, force: bool = False, tracker=None) -> int:
+def _notify_completed(tracker, written: dict):
+    """批量回填完成后，按股票通知 watchlist 已全部就绪的用户"""
+    from backend.analysis.user_tracker import notify_user_prediction_updated
+    for stock in written:
+        for uid in tracker.mark_stock_complete(stock):
+            notify_user_prediction_updated(uid, market=get_market_from_symbol(stock))
+
+
+def _rule_engine_bulk_backfill(targets: list, dates: list, force: bool = False, pairs: set = None) -> dict:
+    """
+    规则引擎批量回填 (不经过 PredictionRunner)
+    一次读入价格 -> 周/月线 as-of 对齐 -> TrendStrategy 向量化 -> 分块多行 INSERT 写入 ai_predictions_v2
+    is_primary 与 PredictionRunner 一致: 规则引擎优先级高于已有主决策 (或原本就是主决策) 时成为主决策
+    返回 {symbol: 写入条数}
+    """
+    from quant.backtest import load_prices, align_periods
+    from quant.strategies.trend import TrendStrategy
+    from engine.models.rule_based import RuleAdapter
+    from engine.done_keys import DoneKeySet
+    from trading_calendar import get_next_trading_day_str
+
+    started = time.time()
+    start_date, end_date = min(dates), max(dates)
+    frame = align_periods(*load_prices(targets, start_date, end_date))
+    frame = frame[frame["date"].isin(set(dates))]
+    if pairs is not None:
+        frame = frame[[key in pairs for key in zip(frame["symbol"], frame["date"])]]
+    # 指标完整性检查 (同逐只回填)
+    frame = frame[frame["ma5"].notna() & frame["rsi"].notna()]
+    if not force:
+        done = DoneKeySet.load_predictions(start_date, end_date)
+        frame = frame[[(s, d, RULE_ENGINE_MODEL_ID) not in done for s, d in zip(frame["symbol"], frame["date"])]]
+    if frame.empty:
+        logger.info("✅ 规则引擎: 没有需要回填的数据")
+        return {}
+
+    signals = TrendStrategy().analyze_frame(frame)
+    priority, primaries = execute_with_retry(_load_primaries, 3, start_date, end_date)
+
+    next_days, reasonings = {}, {}
+    rows, demote = [], []
+    for symbol, date, ma20, action, confidence, reason in zip(
+            frame["symbol"], frame["date"], frame["ma20"], signals["action"], signals["confidence"], signals["reason"]):
+        market = get_market_from_symbol(symbol)
+        if (market, date) not in next_days:
+            next_days[(market, date)] = get_next_trading_day_str(date, market=market)
+        if (action, reason) not in reasonings:
+            reasonings[(action, reason)] = RuleAdapter._build_reasoning(action, f"{action}: {reason}", reason)
+
+        existing_model, existing_priority = primaries.get((symbol, date), (None, -1))
+        is_primary = int(priority > existing_priority or existing_model == RULE_ENGINE_MODEL_ID)
+        if is_primary and existing_model not in (None, RULE_ENGINE_MODEL_ID):
+            demote.append((symbol, date))
+
+        # 支撑 / 压力位与 RuleAdapter 一致: MA20 缺失时记为 0
+        ma20 = 0.0 if pd.isna(ma20) else float(ma20)
+        rows.append((
+            symbol, date, RULE_ENGINE_MODEL_ID, next_days[(market, date)], action, float(confidence),
+            ma20, ma20 * 1.1, reasonings[(action, reason)], 0, 0, 0, is_primary
+        ))
+
+    demote_set = set(demote)
+    for i in range(0, len(rows), RULE_TXN_ROWS):
+        batch = rows[i:i + RULE_TXN_ROWS]
+        batch_demote = [(r[0], r[1]) for r in batch if (r[0], r[1]) in demote_set]
+        execute_with_retry(_write_rule_predictions, 3, batch, batch_demote)
+
+    # 逐只回填每条都会验证上一条预测; 批量路径写完后对写入区间做一次向量化验证 (target_date 未同步的保持 Pending)
+    validated, _ = execute_with_retry(verify_pending_range, 3, start_date, end_date, RULE_ENGINE_MODEL_ID)
+
+    written = frame["symbol"].value_counts().to_dict()
+    logger.info(f"⚡ 规则引擎批量回填: {len(rows)} 条 ({len(written)} 只股票, {len(set(frame['date']))} 天), "
+                f"主决策 {sum(r[-1] for r in rows)} 条, 已验证 {validated} 条, 耗时 {time.time() - started:.1f}s")
+    return written
+
+
+def _load_primaries(conn, start_date: str, end_date: str):
+    """规则引擎的优先级，以及区间内已有主决策 {(symbol, date): (model_id, priority)}"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT priority FROM prediction_models WHERE model_id = ?", (RULE_ENGINE_MODEL_ID,))
+    row = cursor.fetchone()
+    priority = row[0] if row and row[0] is not None else 0
+    cursor.execute("""
+        SELECT p.symbol, p.date, p.model_id, m.priority
+        FROM ai_predictions_v2 p
+        JOIN prediction_models m ON p.model_id = m.model_id
+        WHERE p.is_primary = 1 AND p.date BETWEEN ? AND ?
+    """, (start_date, end_date))
+    return priority, {(r[0], r[1]): (r[2], r[3]) for r in cursor.fetchall()}
+
+
+def _write_rule_predictions(conn, rows: list, demote: list):
+    cursor = conn.cursor()
+    # 规则引擎成为主决策的 (symbol, date)，先取消其他模型的主决策标记
+    for i in range(0, len(demote), RULE_INSERT_CHUNK_ROWS):
+        chunk = demote[i:i + RULE_INSERT_CHUNK_ROWS]
+        cursor.execute(f"""
+            UPDATE ai_predictions_v2 SET is_primary = 0
+            WHERE model_id != ? AND (symbol, date) IN (VALUES {", ".join(["(?, ?)"] * len(chunk))})
+        """, (RULE_ENGINE_MODEL_ID, *[v for key in chunk for v in key]))
+
+    row_placeholder = "(" + ", ".join(["?"] * 13) + ", datetime('now', '+8 hours'), datetime('now', '+8 hours'))"
+    for i in range(0, len(rows), RULE_INSERT_CHUNK_ROWS):
+        chunk = rows[i:i + RULE_INSERT_CHUNK_ROWS]
+        cursor.execute(f"""
+            INSERT OR REPLACE INTO ai_predictions_v2
+            (symbol, date, model_id, target_date, signal, confidence,
+             support_price, pressure_price, ai_reasoning,
+             token_usage_input, token_usage_output, execution_time_ms,
+             is_primary, created_at, updated_at)
+            VALUES {", ".join([row_placeholder] * len(chunk))}
+        """, tuple(v for r in chunk for v in r))
+
+
+def _load_done_keys(start_date: str, end_date: str, force: bool):
+    """一次读入回填日期范围内已有的预测键 (force 时不需要；加载失败时回退逐条检查)"""
+    if force:
+        return None
+    from engine.done_keys import DoneKeySet
+    try:
+        return DoneKeySet.load_predictions(start_date, end_date)
+    except Exception as e:
+        logger.warning(f"⚠️ 预加载已有预测失败，改为逐条检查: {e}")
+        return None
+
+
+def _analyze_stocks_for_date(conn, stocks: list, date_str: str, model_filter: str = None, force: bool = False, tracker=None, done_keys=None) -> int:
     """为指定日期分析一组股票，返回成功数量"""
     success_count = 0
     
     # Use PredictionRunner for multi-model support
     from engine.runner import PredictionRunner
+    from backend.engine.llm_client import run_with_http_clients
     import asyncio
     import os
     
-    runner = PredictionRunner(model_filter=model_filter, force=force)
+    runner = PredictionRunner(model_filter=model_filter, force=force, done_keys=done_keys)
     
     # Windows event loop policy
     if os.name == 'nt':
@@ -224,17 +374,23 @@ def _analyze_stocks_for_date(conn, stocks: list, date_str: str, model_filter: st
             asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
         except: pass
     
+    # 一次性批量预取该日期所有股票的完整上下文 (含各模型历史)，与逐只查询结果一致
+    from engine.prompts import fetch_analysis_contexts
+    try:
+        contexts = fetch_analysis_contexts(stocks, date_str, model_history=True)
+    except Exception as e:
+        logger.error(f"   ❌ {date_str} 分析上下文加载失败: {e}")
+        return success_count
+    
     for stock in stocks:
         try:
             # 获取该日期的行情数据
-            query = "SELECT * FROM daily_prices WHERE symbol = ? AND date = ?"
-            df = pd.read_sql_query(query, conn, params=(stock, date_str))
-            
-            if df.empty:
+            ctx = contexts.get(stock) or {"error": True}
+            if "error" in ctx:
                 logger.warning(f"   ⚠️ {stock}: {date_str} 无数据，跳过")
                 continue
             
-            row = df.iloc[0]
+            row = pd.Series(ctx["latest_data"])
             
             # 指标完整性检查
             if pd.isna(row.get('ma5')) or pd.isna(row.get('rsi')):
@@ -243,8 +399,8 @@ def _analyze_stocks_for_date(conn, stocks: list, date_str: str, model_filter: st
             
             logger.info(f"   >>> 分析 {stock} ({date_str})")
             
-            # Run prediction - Pass data=None to force PredictionRunner to fetch FULL context (Strict Parity)
-            result = asyncio.run(runner.run_analysis(stock, date_str, data=None, force=force))
+            # Run prediction - 预取的上下文与 fetch_full_analysis_context 同源 (Strict Parity)
+            result = run_with_http_clients(runner.run_analysis(stock, date_str, data=ctx, force=force))
             if result:
                 success_count += 1
                 
@@ -1,17 +1,19 @@
 """
 AI 分析主入口模块
 """
+import asyncio
 import time
 import os
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
-import pandas as pd
-
-from config import BEIJING_TZ
-from database import get_connection, get_stock_pool
+from config import AI_ANALYSIS_CONFIG
+from database import get_stock_pool, get_latest_prices
+from price_cache import get_price_cache
 from utils import send_wecom_notification
-from notifications import send_push_notification, send_personalized_daily_report
+from notifications import send_push_notification, send_personalized_daily_report, flush_push_notifications
 from engine.ai_service import generate_ai_prediction
+from engine.prompts import fetch_analysis_contexts
+from engine.done_keys import DoneKeySet
 from helpers import check_stock_analysis_mode, check_trading_day_skip
 from logger import logger
 
@@ -19,6 +21,15 @@ from logger import logger
 from trading_calendar import get_market_from_symbol, is_market_closed
 
 
+def _latest_trade_date(stock: str):
+    """该股票最新一根日线的日期 (无数据返回 None)"""
+    row = get_price_cache().get_row(stock, "daily")
+    if row:
+        return row["date"]
+    found = get_latest_prices([stock], "daily", columns=["date"]).get(stock)
+    return found["date"] if found else None
+
+
 def run_ai_analysis(symbol: str = None, market_filter: str = None, force: bool = False, model_filter: str = None):
     """独立运行 AI 预测任务
     
@@ -50,9 +61,6 @@ def run_ai_analysis(symbol: str = None, market_filter: str = None, force: bool =
     
     logger.info(f"🧠 开始执行 AI 分析任务，共 {len(targets)} 只股票...")
     start_time = time.time()
-    success_count = 0
-    ai_count = 0
-    rule_count = 0
     
     # [NEW] Initialize User Completion Tracker
     from backend.analysis.user_tracker import UserCompletionTracker, notify_user_prediction_updated
@@ -71,115 +79,125 @@ def run_ai_analysis(symbol: str = None, market_filter: str = None, force: bool =
             involved_users.update(users)
         notif_manager.load_signal_states(list(involved_users), targets)
     
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # 获取当前北京时间用于判断休市
-    now_date = datetime.now(BEIJING_TZ)
+    # 单个事件循环处理整个股票池: 股票级并发由 symbol_concurrency 控制，
+    # 模型调用再按上游服务限流 (共享的 AdaptiveRateLimiter: 速率 + max_concurrency 并发上限)
+    symbol_concurrency = max(1, AI_ANALYSIS_CONFIG.get("symbol_concurrency", 8))
+    runner = None
+    try:
+        from backend.engine.runner import PredictionRunner
+        runner = PredictionRunner(model_filter=model_filter, force=force)
+    except Exception as e:
+        logger.error(f"❌ AI Engine init failed: {e}")
 
-    for stock in targets:
-        try:
-            # 1. 检查该股票所属市场是否休市 (Cost Saving)
-            # logic moved to scheduler level or implied by data availability
-            # if not symbol:
-            #     market = get_market_from_symbol(stock)
-            #     if is_market_closed(now_date, market):
-            #         logger.debug(f"💤 {stock}: {market} 市场休市，跳过")
-            #         continue
-
-            # 获取该股票最新的日线数据 (含指标)
-            query = f"SELECT * FROM daily_prices WHERE symbol = ? ORDER BY date DESC LIMIT 1"
-            df = pd.read_sql_query(query, conn, params=(stock,))
-            
-            if df.empty:
-                logger.warning(f"⚠️ {stock}: 无行情数据，跳过")
-                continue
-                
-            today_data = df.iloc[0]
-            today_str = today_data['date']
-            
-            # --- Idempotency Check (幂等性检查) ---
-            # 改良逻辑：如果是单模型运行，只检查该模型。如果是 all 运行，交给 PredictionRunner 内部处理。
-            if not force:
-                if model_filter and model_filter != 'all':
-                    cursor.execute(
-                        "SELECT 1 FROM ai_predictions_v2 WHERE symbol = ? AND date = ? AND model_id = ? LIMIT 1",
-                        (stock, today_str, model_filter)
+    stats = {"success": 0, "ai": 0}
+
+    def _on_stock_done(stock: str, primary_result=None, market: str = None):
+        """股票完成后的登记 (只在事件循环线程中调用，tracker / notif_manager 无需加锁)
+        返回需要推送的 (user_id, market, tier) 列表，由调用方投递到推送队列"""
+        stats["success"] += 1
+        if primary_result is not None:
+            stats["ai"] += 1
+            # [NEW] Check for Signal Flips for each subscriber
+            if notif_manager and isinstance(primary_result, dict):
+                for uid in tracker.stock_subscribers.get(stock, set()):
+                    notif_manager.check_signal_flip(
+                        uid, stock,
+                        primary_result.get('signal'),
+                        primary_result.get('confidence')
                     )
-                    if cursor.fetchone():
+        # [NEW] Mark stock complete and notify ready users
+        return [(uid, market, tracker.user_tiers.get(uid, "free")) for uid in tracker.mark_stock_complete(stock)]
+
+    def _notify(ready):
+        # 推送只是入队 (PushDispatcher 后台发送)，不阻塞分析循环
+        for uid, market, tier in ready:
+            notify_user_prediction_updated(uid, market=market, tier=tier)
+
+    async def _analyze_stock(stock: str, sem: asyncio.Semaphore, contexts: dict):
+        async with sem:
+            try:
+                # 获取该股票最新交易日 (预取的上下文优先，其次本地行情缓存)
+                ctx = contexts.pop(stock, None)
+                if ctx is not None:
+                    today_str = ctx.get("date")
+                else:
+                    today_str = await asyncio.to_thread(_latest_trade_date, stock)
+                if not today_str:
+                    logger.warning(f"⚠️ {stock}: 无行情数据，跳过")
+                    return
+
+                # --- Idempotency Check (幂等性检查) ---
+                # 改良逻辑：如果是单模型运行，只检查该模型。如果是 all 运行，交给 PredictionRunner 内部处理。
+                if not force and model_filter and model_filter != 'all':
+                    if await runner.has_prediction(stock, today_str, model_filter):
                         logger.info(f"⏩ {stock}: {today_str} ({model_filter}) 预测已存在，跳过")
-                        success_count += 1
-                        
                         # [NEW] Still mark as complete for tracker (data already exists)
-                        ready_users = tracker.mark_stock_complete(stock)
-                        for uid in ready_users:
-                            notify_user_prediction_updated(uid, tier=tracker.user_tiers.get(uid, "free"))
-                        
-                        continue
-                # 如果是 all，这里不再做整体跳过，让子引擎去判断具体哪个模型没跑
-            # --------------------------------------
-
-            logger.info(f">>> 分析 {stock} ({today_str})")
-            
-            # 确定分析模式 (AI vs Rule) - Now handled by Race Mode internally, but we can keep log
-            # analysis_mode = check_stock_analysis_mode(stock) # Deprecated but harmless
-            
-            # 生成预测 (New Multi-Model Engine)
-            # Use local import to avoid circular dependency issues if any
-            try:
-                from backend.engine.runner import PredictionRunner
-                import asyncio
-                
-                runner = PredictionRunner(model_filter=model_filter, force=force)
-                
-                # Run async in sync context
-                if os.name == 'nt':
-                    try:
-                        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-                    except: pass
-                     
-                primary_result = asyncio.run(runner.run_analysis(stock, today_str))
-                
+                        _notify(_on_stock_done(stock))
+                        return
+                # --------------------------------------
+
+                logger.info(f">>> 分析 {stock} ({today_str})")
+                try:
+                    primary_result = await runner.run_analysis(stock, today_str, data=ctx)
+                except Exception as e:
+                    logger.error(f"❌ {stock} AI Engine Failed: {e}")
+                    return
+
                 if primary_result:
-                    # [NEW] Check for Signal Flips for each subscriber
-                    if notif_manager and isinstance(primary_result, dict):
-                        subscribers = tracker.stock_subscribers.get(stock, set())
-                        for uid in subscribers:
-                            notif_manager.check_signal_flip(
-                                uid, stock, 
-                                primary_result.get('signal'), 
-                                primary_result.get('confidence')
-                            )
-
-                    success_count += 1
-                    ai_count += 1 
-                    
-                    # [NEW] Mark stock complete and notify ready users
-                    ready_users = tracker.mark_stock_complete(stock)
-                    # Notify immediately
-                    for uid in ready_users:
-                        notify_user_prediction_updated(uid, market=market_filter or "CN", tier=tracker.user_tiers.get(uid, "free"))
+                    _notify(_on_stock_done(stock, primary_result, market=market_filter or "CN"))
                 else:
                     logger.warning(f"⚠️ {stock}: Analysis failed or returned no results.")
-                
             except Exception as e:
-                logger.error(f"❌ {stock} AI Engine Failed: {e}")
-                continue
-            
+                logger.error(f"❌ {stock} 分析失败: {e}")
+
+    async def _analyze_all():
+        # 模型调用 (run_in_executor) 与数据库读写 (to_thread) 共用默认线程池，按并发度放大
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=symbol_concurrency * 4, thread_name_prefix="ai-analysis")
+        )
+        sem = asyncio.Semaphore(symbol_concurrency)
+        # 一次性批量预取整个股票池的分析上下文 (固定条数的窗口函数查询)，失败时逐只回退
+        contexts = {}
+        try:
+            contexts = await asyncio.to_thread(fetch_analysis_contexts, targets, None, True)
+            logger.info(f"📦 已预取 {len(contexts)} 只股票的分析上下文")
         except Exception as e:
-            logger.error(f"❌ {stock} 分析失败: {e}")
+            logger.warning(f"⚠️ 批量预取分析上下文失败，改为逐只查询: {e}")
+        # 本次涉及日期范围内已有的预测键一次读入，幂等性检查只做内存查找
+        dates = [c["date"] for c in contexts.values() if "date" in c]
+        if dates and not force:
+            try:
+                runner.done_keys = await asyncio.to_thread(DoneKeySet.load_predictions, min(dates), max(dates))
+            except Exception as e:
+                logger.warning(f"⚠️ 预加载已有预测失败，改为逐条检查: {e}")
+        await asyncio.gather(*(_analyze_stock(stock, sem, contexts) for stock in targets))
+
+    if runner is not None:
+        if os.name == 'nt':
+            try:
+                asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+            except: pass
+        logger.info(f"⚡ 并发分析: {symbol_concurrency} 只股票同时进行")
+        from backend.engine.llm_client import run_with_http_clients
+        run_with_http_clients(_analyze_all())
+
+    success_count, ai_count = stats["success"], stats["ai"]
 
     # [NEW] Finalize Smart Notifications (Flush updates and send aggregated)
     if notif_manager:
         notif_manager.flush()
         logger.info("📢 [Runner] Smart notification flush completed")
+
+    # 等待队列中的推送发送完毕 (失败的已进入 push_queue 重试)
+    flush_push_notifications(timeout=60)
             
     duration = time.time() - start_time
-    logger.info(f"✅ AI 分析完成! 成功: {success_count}/{len(targets)} (AI: {ai_count}, Rule: {rule_count}), 耗时: {duration:.1f}s")
+    logger.info(f"✅ AI 分析完成! 成功: {success_count}/{len(targets)} (AI: {ai_count}), 耗时: {duration:.1f}s")
+    from backend.engine.llm_client import get_llm_cache
+    logger.info(f"🗃️ {get_llm_cache().summary()}")
     
     # [NEW] Cleanup tracker to free memory
     tracker.clear()
-    del tracker
     
     # 发送企微通知
     market_label = f" ({market_filter})" if market_filter else ""
@@ -192,6 +210,3 @@ def run_ai_analysis(symbol: str = None, market_filter: str = None, force: bool =
     # [REMOVED] Old broadcast notification
     # Individual users are now notified as their watchlists complete
     # See user_tracker.py::notify_user_prediction_updated()
-
-    # 最后关闭连接
-    conn.close()
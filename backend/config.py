@@ -1,5 +1,7 @@
 import os
+import json
 from pathlib import Path
+from urllib.parse import urlparse
 from datetime import timedelta, timezone
 try:
     from backend.logger import logger
@@ -55,7 +57,42 @@ else:
 # 控制 ThreadPoolExecutor 的并发线程数，避免 Turso/libSQL 压力过大
 SYNC_CONFIG = {
     "realtime_workers": int(os.getenv("SYNC_REALTIME_WORKERS", "2")),
-    "daily_workers": int(os.getenv("SYNC_DAILY_WORKERS", "2")),
+    # 全量同步流水线: 抓取线程数 / 每个上游主机每秒请求数 / 指标计算线程数 / 阶段间队列容量
+    "fetch_workers": int(os.getenv("SYNC_FETCH_WORKERS", os.getenv("SYNC_DAILY_WORKERS", "4"))),
+    "fetch_rate_per_host": float(os.getenv("SYNC_FETCH_RATE_PER_HOST", "2.0")),
+    "cpu_workers": int(os.getenv("SYNC_CPU_WORKERS", "2")),
+    "queue_size": int(os.getenv("SYNC_QUEUE_SIZE", "32")),
+    # 行情批量写入: 累积多少行后合并为一个事务 flush
+    "write_batch_rows": int(os.getenv("SYNC_WRITE_BATCH_ROWS", "5000")),
+    # 增量指标: 保存指标状态，只计算并写入新增/变化的 K 线 (false 则每次全量重算回溯窗口)
+    "incremental_indicators": os.getenv("SYNC_INCREMENTAL_INDICATORS", "true").lower() == "true",
+}
+
+# 3.1 数据库连接池配置
+# mode=pooled: 每个线程复用少量长连接 (减少 Turso TLS 握手)
+# mode=stateless: 回退到旧策略，每次调用都新建连接
+DB_POOL_CONFIG = {
+    "mode": os.getenv("DB_POOL_MODE", "pooled").lower(),
+    "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "2")),           # 每线程最多保留的空闲连接数
+    "max_idle_seconds": float(os.getenv("DB_POOL_MAX_IDLE", "30")),  # 空闲超过该时长的连接视为过期 (Hrana 流会被服务端回收)
+    "max_lifetime_seconds": float(os.getenv("DB_POOL_MAX_LIFETIME", "600")),
+}
+
+# 3.2 指标计算内核: pandas_ta (逐只股票调用 pandas_ta_classic) / numpy (纯 NumPy，支持多股票批量)
+INDICATOR_CONFIG = {
+    "kernel": os.getenv("INDICATOR_KERNEL", "pandas_ta").lower(),
+}
+
+# 3.3 本地列式行情缓存 (Arrow IPC，按 周期×市场 分区，内存映射读取；Turso 仍是唯一数据源)
+PRICE_CACHE_CONFIG = {
+    "enabled": os.getenv("PRICE_CACHE_ENABLED", "true").lower() == "true",
+    "dir": os.getenv("PRICE_CACHE_DIR", str(BASE_DIR / "data" / "price_cache")),
+    # 每只股票保留的最近 K 线数 (日线 300 覆盖 250 日周期分析)
+    "keep_bars": {
+        "daily": int(os.getenv("PRICE_CACHE_DAILY_BARS", "300")),
+        "weekly": int(os.getenv("PRICE_CACHE_WEEKLY_BARS", "260")),
+        "monthly": int(os.getenv("PRICE_CACHE_MONTHLY_BARS", "240")),
+    },
 }
 
 # 4. API 配置
@@ -118,6 +155,100 @@ if LLM_PROVIDER in DEFAULTS:
     if provider_cfg.get("base_url"):
         LLM_CONFIG["base_url"] = provider_cfg["base_url"]
 
+# LLM 异步 HTTP 传输 (httpx): 每个事件循环 × base_url 共享一个 keep-alive 连接池，https 下优先 HTTP/2
+LLM_HTTP_CONFIG = {
+    "http2": os.getenv("LLM_HTTP2", "true").lower() == "true",
+    "max_connections": int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100")),
+    "max_keepalive": int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20")),
+    "keepalive_expiry": float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "30")),
+    "connect_timeout": float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "10")),
+}
+
+# LLM 限流 (并发上限 + 令牌桶 + AIMD)，按上游主机共享，是 LLM 调用唯一的并发控制:
+# max_concurrency 为每个主机同时在途的请求数 (AI_PROVIDER_LIMITS 按主机覆盖)
+# rate 默认不限 (只遵守 429 的 Retry-After)；配置后为初始速率 (req/s)，成功后线性回升到 max_rate，429 时减半
+# overrides 按主机覆盖，如 LLM_RATE_LIMITS='{"api.deepseek.com": {"rate": 10, "burst": 20, "max_concurrency": 16}}'
+LLM_RATE_LIMIT_CONFIG = {
+    "default": {
+        "rate": float(os.getenv("LLM_RATE_DEFAULT")) if os.getenv("LLM_RATE_DEFAULT") else None,
+        "burst": float(os.getenv("LLM_RATE_BURST")) if os.getenv("LLM_RATE_BURST") else None,
+        "max_concurrency": int(os.getenv("AI_PROVIDER_CONCURRENCY", "4")),
+        "min_rate": float(os.getenv("LLM_RATE_MIN", "0.2")),
+        "max_rate": float(os.getenv("LLM_RATE_MAX")) if os.getenv("LLM_RATE_MAX") else None,
+        "increase_step": float(os.getenv("LLM_RATE_INCREASE_STEP", "0.05")),
+        "decrease_factor": float(os.getenv("LLM_RATE_DECREASE_FACTOR", "0.5")),
+    },
+    "overrides": {
+        # 混元: HUNYUAN_QPS_LIMIT 作为初始速率与突发额度，之后按 429 反馈自适应
+        urlparse(DEFAULTS["hunyuan"]["base_url"]).netloc: {
+            "rate": DEFAULTS["hunyuan"]["qps_limit"],
+            "burst": DEFAULTS["hunyuan"]["qps_limit"],
+        },
+        **{host: {"max_concurrency": int(limit)}
+           for host, limit in json.loads(os.getenv("AI_PROVIDER_LIMITS", "{}")).items()},
+    },
+}
+for _host, _params in json.loads(os.getenv("LLM_RATE_LIMITS", "{}")).items():
+    LLM_RATE_LIMIT_CONFIG["overrides"].setdefault(_host, {}).update(_params)
+
+# LLM 响应缓存: 相同的 (provider, model, temperature, max_tokens, messages) 复用上次的成功响应
+# backend=sqlite 为本地文件 (独立于业务库)，memory 为进程内 LRU；LLM_CACHE_ENABLED=false 整体绕过
+LLM_CACHE_CONFIG = {
+    "enabled": os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true",
+    "backend": os.getenv("LLM_CACHE_BACKEND", "sqlite").lower(),
+    "path": os.getenv("LLM_CACHE_PATH", str(BASE_DIR / "data" / "llm_cache.db")),
+    "ttl_seconds": float(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600))),
+    "max_entries": int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000")),
+}
+
+# ContextService 事实缓存 (市场情绪 / 价格高度 / 量能): 进程内 LRU
+# 当天的事实仍可能随同步变化，TTL 较短；历史日期的事实不再变化，TTL 较长
+CONTEXT_CACHE_CONFIG = {
+    "max_entries": int(os.getenv("CONTEXT_CACHE_MAX_ENTRIES", "4096")),
+    "ttl_seconds": float(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "300")),
+    "history_ttl_seconds": float(os.getenv("CONTEXT_CACHE_HISTORY_TTL_SECONDS", str(6 * 3600))),
+}
+
+# AI 分析并发 (run_ai_analysis 整个任务共用一个事件循环)
+# symbol_concurrency: 同时分析的股票数; 每个上游服务的并发请求上限见 LLM_RATE_LIMIT_CONFIG
+AI_ANALYSIS_CONFIG = {
+    "symbol_concurrency": int(os.getenv("AI_SYMBOL_CONCURRENCY", "8")),
+}
+
+# Phase 1 简报生成并发: 同时处理的股票数 (各档位的 LLM 调用再由 provider 限流器约束)
+# write_batch_rows: stock_briefs 每累积多少条在一个事务内写入
+BRIEF_GENERATION_CONFIG = {
+    "symbol_concurrency": int(os.getenv("BRIEF_SYMBOL_CONCURRENCY", "16")),
+    "write_batch_rows": int(os.getenv("BRIEF_WRITE_BATCH_ROWS", "50")),
+}
+
+# 个股新闻本地存储 (news_articles): 抓取水位在 ttl_seconds 内直接读库，不请求 EastMoney
+NEWS_CONFIG = {
+    "ttl_seconds": float(os.getenv("NEWS_CACHE_TTL_SECONDS", "1800")),
+    "page_size": int(os.getenv("NEWS_PAGE_SIZE", "50")),
+    "retention_days": int(os.getenv("NEWS_RETENTION_DAYS", "30")),
+}
+
+# Web Push 异步投递 (PushDispatcher): 后台事件循环 + keep-alive 连接池并发发送 /api/internal/notify
+# linger_ms: 攒批等待时间，同一模板的多个 target_user_id 合并为一个 target_user_ids 请求 (bulk_endpoint)
+# 失败的消息写入 push_queue，按 retry_base_seconds 指数退避重试，最多 max_attempts 次
+PUSH_DISPATCH_CONFIG = {
+    "concurrency": int(os.getenv("PUSH_CONCURRENCY", "8")),
+    "timeout": float(os.getenv("PUSH_TIMEOUT", "10")),
+    "linger_ms": float(os.getenv("PUSH_LINGER_MS", "50")),
+    "bulk_endpoint": os.getenv("PUSH_BULK_ENDPOINT", "true").lower() == "true",
+    "batch_max_targets": int(os.getenv("PUSH_BATCH_MAX_TARGETS", "100")),
+    "max_attempts": int(os.getenv("PUSH_MAX_ATTEMPTS", "5")),
+    "retry_base_seconds": float(os.getenv("PUSH_RETRY_BASE_SECONDS", "60")),
+    "retry_interval_seconds": float(os.getenv("PUSH_RETRY_INTERVAL_SECONDS", "30")),
+}
+
+# 模型注册表缓存 (ModelFactory): 进程内复用已初始化的模型适配器
+# check_interval: 每隔多少秒重新读取 prediction_models 比对配置，变更的模型才重建 (0 为每次都检查)
+MODEL_REGISTRY_CONFIG = {
+    "check_interval": float(os.getenv("MODEL_REGISTRY_CHECK_INTERVAL", "60")),
+}
+
 
 # -----------------------------------------------------------------------------
 # Chain Engine Strategies (LLM Multi-turn Workflows)
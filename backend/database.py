@@ -2,17 +2,22 @@
 StockWise Database Module (Raw Interface - No ORM)
 
 回归纯粹的 DB-API 2.0 接口，放弃 SQLAlchemy。
-在 Serverless (Turso) 环境下，无状态的短连接比连接池更稳定。
+- get_connection(): 无状态短连接 (调用方负责 close)
+- pooled_connection(): 每线程有界连接池，带健康检查，复用 Turso 连接以减少 TLS 握手
+  (DB_POOL_MODE=stateless 时回退为短连接)
 """
 import sqlite3
 import libsql
 import os
+import atexit
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
 try:
-    from backend.config import DB_PATH, TURSO_DB_URL, TURSO_AUTH_TOKEN
+    from backend.config import DB_PATH, TURSO_DB_URL, TURSO_AUTH_TOKEN, DB_POOL_CONFIG
 except ImportError:
-    from config import DB_PATH, TURSO_DB_URL, TURSO_AUTH_TOKEN
+    from config import DB_PATH, TURSO_DB_URL, TURSO_AUTH_TOKEN, DB_POOL_CONFIG
 try:
     from backend.logger import logger
 except ImportError:
@@ -44,15 +49,16 @@ def execute_with_retry(func, max_retries=5, *args, **kwargs):
     """
     Executes a function with database connection retry logic.
     The function `func` must accept `conn` as its first argument.
+    Connections are borrowed from the per-thread pool (unless DB_POOL_MODE=stateless);
+    a connection that fails with a transient error is dropped instead of being returned.
     """
     last_exception = None
     for attempt in range(max_retries):
-        conn = None
         try:
-            conn = get_connection()
-            result = func(conn, *args, **kwargs)
-            conn.commit()
-            return result
+            with pooled_connection() as conn:
+                result = func(conn, *args, **kwargs)
+                conn.commit()
+                return result
         except Exception as e:
             last_exception = e
             if is_transient_error(e):
@@ -66,12 +72,6 @@ def execute_with_retry(func, max_retries=5, *args, **kwargs):
             else:
                 # If it's a logic error, raise immediately
                 raise e
-        finally:
-            if conn:
-                try:
-                    conn.close()
-                except:
-                    pass
     
     logger.error(f"❌ Failed after {max_retries} attempts. Last error: {last_exception}")
     raise last_exception
@@ -82,6 +82,7 @@ def get_connection(max_retries: int = 3):
     创建原始数据库连接。
     Strategy: Always New Connection (NullPool equivalent).
     Includes retry logic for transient connection errors.
+    调用方负责 close()；需要复用连接时请使用 pooled_connection()。
     """
     last_exception = None
     for attempt in range(max_retries):
@@ -105,6 +106,240 @@ def get_connection(max_retries: int = 3):
     raise last_exception
 
 
+# -----------------------------------------------------------------------------
+# Connection Pool (per-thread, bounded)
+# -----------------------------------------------------------------------------
+# sqlite3 连接不能跨线程使用，libsql 连接也不是线程安全的，因此每个线程维护自己的空闲连接栈。
+# 健康检查策略:
+#   1. 空闲超过 max_idle_seconds 或存活超过 max_lifetime_seconds 的连接直接丢弃
+#      (Turso 会回收空闲的 Hrana 流，复用它们会触发 "stream not found")
+#   2. 空闲超过 PING_AFTER_SECONDS 的连接在借出时执行 SELECT 1 探活
+#   3. 使用过程中抛出瞬态错误的连接不再归还
+
+class _PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """每线程有界连接池。stateless 模式下退化为每次新建连接。"""
+
+    PING_AFTER_SECONDS = 5.0
+
+    def __init__(self, max_size: int = 2, max_idle_seconds: float = 30.0,
+                 max_lifetime_seconds: float = 600.0, stateless: bool = False):
+        self.max_size = max(0, max_size)
+        self.max_idle_seconds = max_idle_seconds
+        self.max_lifetime_seconds = max_lifetime_seconds
+        self.stateless = stateless or self.max_size == 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all = set()  # 所有线程的空闲连接 (用于进程退出时统一关闭)
+        self.stats = {"created": 0, "reused": 0, "discarded": 0}
+
+    def _idle(self) -> list:
+        idle = getattr(self._local, "idle", None)
+        if idle is None:
+            idle = self._local.idle = []
+        return idle
+
+    def _is_healthy(self, entry: _PooledConnection) -> bool:
+        now = time.monotonic()
+        if now - entry.last_used > self.max_idle_seconds:
+            return False
+        if now - entry.created_at > self.max_lifetime_seconds:
+            return False
+        # 刚归还的连接无需探活，省掉一次网络往返
+        if now - entry.last_used < self.PING_AFTER_SECONDS:
+            return True
+        try:
+            entry.conn.execute("SELECT 1").fetchone()
+            return True
+        except Exception as e:
+            logger.debug(f"🩺 Pooled connection failed health check: {e}")
+            return False
+
+    def _discard(self, conn):
+        with self._lock:
+            self.stats["discarded"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _entries(self) -> dict:
+        entries = getattr(self._local, "entries", None)
+        if entries is None:
+            entries = self._local.entries = {}
+        return entries
+
+    def acquire(self):
+        """借出一个连接 (优先复用本线程的健康空闲连接)"""
+        if self.stateless:
+            with self._lock:
+                self.stats["created"] += 1
+            return get_connection()
+
+        idle = self._idle()
+        while idle:
+            entry = idle.pop()
+            with self._lock:
+                self._all.discard(entry)
+            if self._is_healthy(entry):
+                with self._lock:
+                    self.stats["reused"] += 1
+                self._entries()[id(entry.conn)] = entry
+                return entry.conn
+            self._discard(entry.conn)
+
+        conn = get_connection()
+        with self._lock:
+            self.stats["created"] += 1
+        self._entries()[id(conn)] = _PooledConnection(conn)
+        return conn
+
+    def release(self, conn, broken: bool = False):
+        """归还连接。broken=True 或池已满时直接关闭。"""
+        entry = self._entries().pop(id(conn), None)
+        if self.stateless or entry is None or broken:
+            if broken:
+                self._discard(conn)
+            else:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            return
+
+        # 丢弃未提交的事务，避免污染下一个借用者
+        try:
+            conn.rollback()
+        except Exception as e:
+            if is_transient_error(e):
+                self._discard(conn)
+                return
+
+        idle = self._idle()
+        if len(idle) >= self.max_size:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            return
+
+        entry.last_used = time.monotonic()
+        idle.append(entry)
+        with self._lock:
+            self._all.add(entry)
+
+    def close_all(self):
+        """关闭所有线程的空闲连接 (进程退出前调用)"""
+        with self._lock:
+            entries = list(self._all)
+            self._all.clear()
+        for entry in entries:
+            try:
+                entry.conn.close()
+            except Exception:
+                pass
+        self._local = threading.local()
+
+
+_pool = ConnectionPool(
+    max_size=DB_POOL_CONFIG.get("max_size", 2),
+    max_idle_seconds=DB_POOL_CONFIG.get("max_idle_seconds", 30.0),
+    max_lifetime_seconds=DB_POOL_CONFIG.get("max_lifetime_seconds", 600.0),
+    stateless=DB_POOL_CONFIG.get("mode", "pooled") == "stateless",
+)
+
+
+def get_pool() -> ConnectionPool:
+    return _pool
+
+
+@contextmanager
+def pooled_connection():
+    """
+    从连接池借用连接 (Context Manager)。
+    调用方自行 commit；退出时未提交的修改会被回滚，连接归还到当前线程的池中。
+    遇到瞬态错误 (如 stream not found) 的连接会被直接丢弃；
+    非 Exception 的退出 (KeyboardInterrupt / CancelledError / GeneratorExit) 同样丢弃，不确定连接状态。
+
+        with pooled_connection() as conn:
+            conn.execute(...)
+            conn.commit()
+    """
+    conn = _pool.acquire()
+    broken = True
+    try:
+        yield conn
+        broken = False
+    except Exception as e:
+        broken = is_transient_error(e)
+        raise
+    finally:
+        _pool.release(conn, broken=broken)
+
+
+atexit.register(_pool.close_all)
+
+
+# 行情表 (daily/weekly/monthly_prices) 与 latest_prices 共用的列
+PRICE_COLUMNS = [
+    "symbol", "date", "open", "high", "low", "close", "volume", "change_percent",
+    "ma5", "ma10", "ma20", "ma60", "macd", "macd_signal", "macd_hist",
+    "boll_upper", "boll_mid", "boll_lower", "rsi", "kdj_k", "kdj_d", "kdj_j", "ai_summary",
+]
+PRICE_PERIODS = ("daily", "weekly", "monthly")
+# 刷新 latest_prices 时每条语句覆盖的股票数
+LATEST_CHUNK_SYMBOLS = 500
+
+
+def refresh_latest_prices(cursor, period: str, symbols=None):
+    """
+    把 {period}_prices 中每只股票最新的一根 K 线写入 latest_prices (symbols 为 None 时全表重建)
+    MAX(date) 按 (symbol, date) 主键分组，每只股票一次索引查找
+    """
+    sql = f"""
+        INSERT OR REPLACE INTO latest_prices (period, {", ".join(PRICE_COLUMNS)}, updated_at)
+        SELECT ?, {", ".join(f"p.{c}" for c in PRICE_COLUMNS)}, datetime('now', '+8 hours')
+        FROM {period}_prices p
+        JOIN (SELECT symbol, MAX(date) AS date FROM {period}_prices {{where}} GROUP BY symbol) m
+          ON p.symbol = m.symbol AND p.date = m.date
+    """
+    if symbols is None:
+        cursor.execute(sql.format(where=""), (period,))
+        return
+    symbols = list(symbols)
+    for i in range(0, len(symbols), LATEST_CHUNK_SYMBOLS):
+        chunk = symbols[i:i + LATEST_CHUNK_SYMBOLS]
+        cursor.execute(sql.format(where=f"WHERE symbol IN ({', '.join(['?'] * len(chunk))})"), (period, *chunk))
+
+
+def get_latest_prices(symbols, period: str = "daily", columns=None):
+    """读取一批股票某周期的最新 K 线 {symbol: row}，整个股票池也只是一次主键扫描"""
+    symbols = list(symbols)
+    selected = ["symbol"] + [c for c in (columns or PRICE_COLUMNS) if c != "symbol"]
+
+    def _logic(conn):
+        cursor = conn.cursor()
+        rows = {}
+        for i in range(0, len(symbols), LATEST_CHUNK_SYMBOLS):
+            chunk = symbols[i:i + LATEST_CHUNK_SYMBOLS]
+            cursor.execute(f"""
+                SELECT {", ".join(selected)} FROM latest_prices
+                WHERE period = ? AND symbol IN ({", ".join(["?"] * len(chunk))})
+            """, (period, *chunk))
+            rows.update({r[0]: dict(zip(selected, r)) for r in cursor.fetchall()})
+        return rows
+
+    return execute_with_retry(_logic, 3) if symbols else {}
+
 
 def get_table_columns(cursor, table_name):
     try:
@@ -131,7 +366,55 @@ def init_db():
                     PRIMARY KEY (symbol, date)
                 )
             """)
+        # 市场宽度按日期汇总全市场 (engine/market_breadth.py)，主键以 symbol 开头无法按 date 查找
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_daily_prices_date ON daily_prices(date)")
         
+        # 1.1 Incremental indicator state (quant/incremental.py)
+        # indicator_state 与 MACD 列修正同时上线: 表尚不存在说明已有行情都由旧内核写入
+        # (macd_signal / macd_hist 互换)，一次性交换回来; 增量路径不会重算这些历史行
+        if not get_table_columns(cursor, 'indicator_state'):
+            for table in ["daily_prices", "weekly_prices", "monthly_prices"]:
+                cursor.execute(f"UPDATE {table} SET macd_signal = macd_hist, macd_hist = macd_signal")
+            logger.info("✅ Migrated: 已修正历史行情的 macd_signal / macd_hist")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS indicator_state (
+                symbol TEXT NOT NULL, period TEXT NOT NULL,
+                as_of TEXT NOT NULL, state TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT (datetime('now', '+8 hours')),
+                PRIMARY KEY (symbol, period)
+            )
+        """)
+
+        # 1.2 Market breadth, materialized at sync time (engine/market_breadth.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS market_breadth (
+                date TEXT NOT NULL, market TEXT NOT NULL,
+                sample_size INTEGER, advancers INTEGER, decliners INTEGER, median_change REAL,
+                anchors TEXT,  -- JSON: {symbol: change_percent}
+                updated_at TIMESTAMP DEFAULT (datetime('now', '+8 hours')),
+                PRIMARY KEY (date, market)
+            )
+        """)
+
+        # 1.3 Latest bar per (symbol, period), upserted by sync/writer.py in the price transaction
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS latest_prices (
+                symbol TEXT NOT NULL, period TEXT NOT NULL, date TEXT NOT NULL,
+                open REAL, high REAL, low REAL, close REAL, volume REAL, change_percent REAL,
+                ma5 REAL, ma10 REAL, ma20 REAL, ma60 REAL,
+                macd REAL, macd_signal REAL, macd_hist REAL,
+                boll_upper REAL, boll_mid REAL, boll_lower REAL,
+                rsi REAL, kdj_k REAL, kdj_d REAL, kdj_j REAL, ai_summary TEXT,
+                updated_at TIMESTAMP DEFAULT (datetime('now', '+8 hours')),
+                PRIMARY KEY (symbol, period)
+            )
+        """)
+        cursor.execute("SELECT 1 FROM latest_prices LIMIT 1")
+        if cursor.fetchone() is None:
+            for period in PRICE_PERIODS:
+                refresh_latest_prices(cursor, period)
+            logger.info("✅ latest_prices 已从行情表初始化")
+
         # 2. Meta & Pool
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS stock_meta (
@@ -202,6 +485,29 @@ def init_db():
             )
         """)
 
+        # 5.1 News store (engine/services/news_service.py): articles deduplicated per symbol + fetch watermark
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS news_articles (
+                symbol TEXT NOT NULL,
+                article_id TEXT NOT NULL,
+                title TEXT NOT NULL,
+                content TEXT,
+                published_at TEXT,
+                media TEXT,
+                url TEXT,
+                fetched_at TIMESTAMP,
+                PRIMARY KEY (symbol, article_id)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_news_articles_symbol_published ON news_articles(symbol, published_at)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS news_fetch_state (
+                symbol TEXT PRIMARY KEY,
+                last_fetched_at TIMESTAMP,
+                last_seen_at TEXT
+            )
+        """)
+
         # 6. Multi-Model V2
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS prediction_models (
@@ -315,6 +621,21 @@ def init_db():
             )
         """)
         
+        # push_queue: Durable retry queue for push messages that failed to deliver (see push_dispatcher.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS push_queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                attempts INTEGER DEFAULT 0,
+                status TEXT DEFAULT 'pending',
+                next_attempt_at REAL,
+                last_error TEXT,
+                created_at TIMESTAMP DEFAULT (datetime('now', '+8 hours')),
+                updated_at TIMESTAMP
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_push_queue_due ON push_queue(status, next_attempt_at)")
+
         # 10. Add notification_settings column to users table (if exists)
         # This column stores user preferences for notification types as JSON
         try:
@@ -384,20 +705,14 @@ def init_db():
         conn.close()
 
 def get_stock_pool():
-    conn = get_connection()
-    try:
+    with pooled_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT symbol FROM global_stock_pool WHERE watchers_count > 0 ORDER BY watchers_count DESC")
         return [row[0] for row in cursor.fetchall()]
-    finally:
-        conn.close()
 
 def get_stock_profile(symbol: str):
-    conn = get_connection()
-    try:
+    with pooled_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT industry, main_business, description FROM stock_meta WHERE symbol = ?", (symbol,))
         row = cursor.fetchone()
         return row
-    finally:
-        conn.close()
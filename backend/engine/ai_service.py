@@ -2,6 +2,7 @@ import json
 import pandas as pd
 from datetime import datetime, timedelta
 from database import get_connection
+from price_cache import get_price_cache
 from trading_calendar import get_next_trading_day_str
 from config import LLM_CONFIG
 from .llm_client import get_llm_client
@@ -98,31 +99,33 @@ def _process_and_store_prediction(symbol, date, ai_result, model="rule-based"):
     return ai_result
 
 
+def _fetch_latest_row(cursor, table: str, symbol: str):
+    cursor.execute(f"SELECT * FROM {table} WHERE symbol = ? ORDER BY date DESC LIMIT 1", (symbol,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return dict(zip([d[0] for d in cursor.description], row))
+
+
 def _generate_rule_based_prediction(symbol: str, today_data: pd.Series):
     """基于 QuantEngine 的预测逻辑（回退方案）"""
     today_str = today_data.get('date')
     
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # 获取月度/周度参考数据
-    cursor.execute("SELECT * FROM monthly_prices WHERE symbol = ? ORDER BY date DESC LIMIT 1", (symbol,))
-    m_row = cursor.fetchone()
-    if m_row:
-        m_cols = [d[0] for d in cursor.description]
-        monthly_series = pd.Series(dict(zip(m_cols, m_row)))
-    else:
-        monthly_series = None
+    # 获取月度/周度参考数据 (本地行情缓存优先)
+    cache = get_price_cache()
+    m_row = cache.get_row(symbol, "monthly")
+    w_row = cache.get_row(symbol, "weekly")
+    if m_row is None or w_row is None:
+        conn = get_connection()
+        cursor = conn.cursor()
+        if m_row is None:
+            m_row = _fetch_latest_row(cursor, "monthly_prices", symbol)
+        if w_row is None:
+            w_row = _fetch_latest_row(cursor, "weekly_prices", symbol)
+        conn.close()
 
-    cursor.execute("SELECT * FROM weekly_prices WHERE symbol = ? ORDER BY date DESC LIMIT 1", (symbol,))
-    w_row = cursor.fetchone()
-    if w_row:
-         w_cols = [d[0] for d in cursor.description]
-         weekly_series = pd.Series(dict(zip(w_cols, w_row)))
-    else:
-         weekly_series = None
-    
-    conn.close()
+    monthly_series = pd.Series(m_row) if m_row else None
+    weekly_series = pd.Series(w_row) if w_row else None
 
     # Call Quant Engine
     from backend.quant.engine import QuantEngine
@@ -34,23 +34,29 @@ import re
 
 
 try:
-    from backend.database import get_connection
+    from backend.config import BRIEF_GENERATION_CONFIG
+    from backend.database import get_connection, execute_with_retry
     from backend.logger import logger
     from backend.engine.models.brief_strategies import StrategyFactory
     from backend.engine.context_service import ContextService
+    from backend.engine.done_keys import DoneKeySet
     from backend.engine.task_logger import get_task_logger
     from backend.engine.brief_prompts import BRIEF_PRO_INSTRUCTION, BRIEF_FREE_INSTRUCTION
     from backend.engine.services.news_service import fetch_news_for_stock
-    from backend.engine.services.brief_assembler import assemble_user_brief, notify_user_brief_ready
+    from backend.engine.services.brief_assembler import assemble_user_brief, assemble_all_user_briefs, notify_user_briefs
+    from backend.engine.llm_client import run_with_http_clients
 except ImportError:
-    from database import get_connection
+    from config import BRIEF_GENERATION_CONFIG
+    from database import get_connection, execute_with_retry
     from logger import logger
     from engine.models.brief_strategies import StrategyFactory
     from engine.context_service import ContextService
+    from engine.done_keys import DoneKeySet
     from task_logger import get_task_logger
     from engine.brief_prompts import BRIEF_PRO_INSTRUCTION, BRIEF_FREE_INSTRUCTION
     from engine.services.news_service import fetch_news_for_stock
-    from engine.services.brief_assembler import assemble_user_brief, notify_user_brief_ready
+    from engine.services.brief_assembler import assemble_user_brief, assemble_all_user_briefs, notify_user_briefs
+    from engine.llm_client import run_with_http_clients
 
 # --- Tracing Helper ---
 class DetailedTraceRecorder:
@@ -264,18 +270,92 @@ async def analyze_stock_context(
                              content, 
                              meta=result["usage"])
         
-        recorder.save()
+        await asyncio.to_thread(recorder.save)
         return content
         
     except Exception as e:
         duration = int((time.time() - start_ts) * 1000)
         logger.error(f"❌ Brief Generation Failed: {e}")
         recorder.fail("synthesis", str(e))
-        recorder.save()
+        await asyncio.to_thread(recorder.save)
         return "Brief generation failed."
 
 
 # --- Phase 1: Stock-Level Batch Analysis ---
+def _write_briefs(conn, rows: List[tuple]):
+    conn.cursor().executemany("""
+        INSERT OR REPLACE INTO stock_briefs 
+        (symbol, date, tier, stock_name, analysis_markdown, raw_news, signal, confidence)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+
+
+def _brief_exists(conn, symbol: str, date_str: str, tier: str) -> bool:
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM stock_briefs WHERE symbol = ? AND date = ? AND tier = ? LIMIT 1",
+                   (symbol, date_str, tier))
+    return cursor.fetchone() is not None
+
+
+class _BriefWriter:
+    """
+    累积生成好的 stock_briefs 行，达到 write_batch_rows 时在一个事务内批量写入
+    写入成功后才登记幂等键 (与 PredictionRunner 一致)
+    批量写入失败时保留这些行: 中途失败留给下一次 flush，最后一次 flush 改为逐条写入
+    """
+
+    def __init__(self, done_keys: Optional[DoneKeySet]):
+        self.done_keys = done_keys
+        self.batch_rows = BRIEF_GENERATION_CONFIG["write_batch_rows"]
+        self.saved = 0
+        self._rows: List[tuple] = []
+        # 自动 flush 的行数阈值 (失败后推迟到再积累 write_batch_rows 行，避免每只股票都重试)
+        self._flush_at = self.batch_rows
+
+    def add(self, row: tuple):
+        self._rows.append(row)
+
+    def should_flush(self) -> bool:
+        return len(self._rows) >= self._flush_at
+
+    @staticmethod
+    def _write_each(rows: List[tuple]) -> List[tuple]:
+        """逐条写入，返回写入成功的行 (一条坏数据不再拖累整批)"""
+        saved = []
+        for row in rows:
+            try:
+                execute_with_retry(_write_briefs, 3, [row])
+                saved.append(row)
+            except Exception as e:
+                logger.error(f"❌ [Phase 1] Failed to save brief {row[0]}/{row[2]}: {e}")
+        return saved
+
+    async def flush(self, final: bool = False):
+        rows, self._rows = self._rows, []
+        if not rows:
+            return
+
+        try:
+            await asyncio.to_thread(execute_with_retry, _write_briefs, 3, rows)
+        except Exception as e:
+            if not final:
+                logger.warning(f"⚠️ [Phase 1] Failed to save {len(rows)} briefs, will retry: {e}")
+                self._rows = rows + self._rows
+                self._flush_at = len(self._rows) + self.batch_rows
+                return
+            logger.error(f"❌ [Phase 1] Failed to save {len(rows)} briefs, retrying one by one: {e}")
+            rows = await asyncio.to_thread(self._write_each, rows)
+            if not rows:
+                return
+
+        self._flush_at = self.batch_rows
+        self.saved += len(rows)
+        if self.done_keys is not None:
+            for row in rows:
+                self.done_keys.add(row[:3])
+        logger.info(f"💾 [Phase 1] Saved {len(rows)} briefs")
+
+
 async def generate_stock_briefs_batch(date_str: str, specific_symbols: List[str] = None, force: bool = False, target_tier: str = None):
     """
     Phase 1: Analyze unique stocks and cache results in `stock_briefs`.
@@ -343,89 +423,111 @@ async def generate_stock_briefs_batch(date_str: str, specific_symbols: List[str]
         predictions = await ctx_service.get_batch_predictions_and_reflection(symbols_list, date_str)
         price_data = await ctx_service.get_batch_technical_facts(symbols_list)
 
-        # 3. Process each stock (generate briefs for each tier)
-        from engine.models.brief_strategies import SUPPORTED_TIERS, TIER_PROVIDER_MAP
-        
-        processed_count = 0
+        # 3. Process stocks concurrently (generate briefs for each tier)
+        from engine.models.brief_strategies import SUPPORTED_TIERS
         
-        for symbol, stock_name, is_pro_watched in unique_stocks:
-            # Fetch news once (shared across tiers)
-            logger.info(f"⚡ Processing {symbol} ({processed_count + 1}/{len(unique_stocks)})...")
-            
-            # Step A: Enrichment - Get comprehensive facts (including altitude, volume, etc.)
-            facts = await ctx_service.get_comprehensive_context(symbol, date_str, stock_name)
-            
-            # Step B: News Fetching
-            news_task = fetch_news_for_stock(symbol, stock_name, date_str)
-            news = await news_task
-            
-            # Step C: Prepare data for synthesis
-            pred = predictions.get(symbol, {})
-            prices = price_data.get(symbol, {})
-            
-            tech_data = {
-                'signal': pred.get('signal', 'Side'),
-                'confidence': pred.get('confidence', 0),
-                'ai_reasoning': pred.get('reasoning', ''),
-                'support_price': pred.get('support'),
-                'pressure_price': pred.get('pressure'),
-                'close': prices.get('close'),
-                'change_percent': prices.get('change'),
-                'reflection': pred.get('reflection', {}),
-            }
-
-            # Determine which tiers to generate for this stock
-            tiers_to_run = [target_tier] if target_tier else SUPPORTED_TIERS
-            
-            for tier in tiers_to_run:
+        # 当天已生成的 (symbol, date, tier) 一次读入，幂等性检查只做内存查找 (加载失败时回退逐条检查)
+        done_keys = None
+        if not force:
+            try:
+                done_keys = DoneKeySet.load_briefs(date_str)
+            except Exception as e:
+                logger.warning(f"⚠️ [Phase 1] 预加载已生成简报失败，改为逐条检查: {e}")
+        writer = _BriefWriter(done_keys)
+        sem = asyncio.Semaphore(BRIEF_GENERATION_CONFIG["symbol_concurrency"])
+        processed = {"count": 0}
+
+        async def _is_done(symbol: str, tier: str) -> bool:
+            if done_keys is not None:
+                return (symbol, date_str, tier) in done_keys
+            return await asyncio.to_thread(execute_with_retry, _brief_exists, 3, symbol, date_str, tier)
+
+        async def _tiers_for(symbol: str, is_pro_watched: bool) -> List[str]:
+            tiers = []
+            for tier in ([target_tier] if target_tier else SUPPORTED_TIERS):
                 # [Filter] Non-PRO stocks don't get PRO briefs in Full Mode
                 if not target_tier and tier == "pro" and not is_pro_watched:
                     continue
-                
                 # [Optimization] Skip based on User Tier demand
                 if tier == "free" and os.getenv("BRIEF_SKIP_FREE", "false").lower() == "true":
                     logger.debug(f"⏭️ [System] Skipping FREE tier analysis as requested.")
                     continue
-
                 # Check if exists (idempotency)
-                if not force:
-                    cursor.execute("SELECT 1 FROM stock_briefs WHERE symbol = ? AND date = ? AND tier = ?", 
-                                  (symbol, date_str, tier))
-                    if cursor.fetchone():
-                        logger.debug(f"⏭️ [Skip] {symbol}/{tier} already analyzed for {date_str}.")
-                        continue
-                
-                provider = TIER_PROVIDER_MAP[tier]
-                logger.info(f"   📝 Generating {tier.upper()} brief using {provider}...")
-                
-                analysis = None
-                max_retries = 3
-                for attempt in range(max_retries):
-                    try:
-                        # Call synthesis with rich facts
-                        analysis = await analyze_stock_context(symbol, stock_name, news, tech_data, date_str, tier, facts=facts)
+                if not force and await _is_done(symbol, tier):
+                    logger.debug(f"⏭️ [Skip] {symbol}/{tier} already analyzed for {date_str}.")
+                    continue
+                tiers.append(tier)
+            return tiers
+
+        async def _synthesize(symbol, stock_name, news, tech_data, facts, tier):
+            provider = StrategyFactory.get_provider_for_tier(tier)
+            logger.info(f"   📝 Generating {tier.upper()} brief for {symbol} using {provider}...")
+            for attempt in range(3):
+                try:
+                    # Call synthesis with rich facts (LLMClient 的自适应限流器按 provider 控制并发与速率)
+                    analysis = await analyze_stock_context(symbol, stock_name, news, tech_data, date_str, tier, facts=facts)
+                    if analysis:
+                        return analysis
+                except Exception as e:
+                    if "429" in str(e) or "rate limit" in str(e).lower():
+                        # LLMClient 的自适应限流器已按 429 / Retry-After 降速，下一次调用会在限流器内等待
+                        logger.warning(f"⚠️  Rate limit (429) hit. Retrying via adaptive limiter...")
+                    else:
+                        logger.error(f"❌ [Attempt {attempt+1}] Error: {e}")
+                        await asyncio.sleep(2)
+            return None
+
+        async def _process_stock(symbol: str, stock_name: str, is_pro_watched: bool):
+            tiers = await _tiers_for(symbol, is_pro_watched)
+            if not tiers:
+                return
+            async with sem:
+                try:
+                    logger.info(f"⚡ Processing {symbol} (tiers: {', '.join(tiers)})...")
+                    # Step A + B: Enrichment (altitude, volume, ...) 与新闻抓取并行，新闻在各档位间共享
+                    facts, news = await asyncio.gather(
+                        ctx_service.get_comprehensive_context(symbol, date_str, stock_name),
+                        fetch_news_for_stock(symbol, stock_name, date_str),
+                    )
+
+                    # Step C: Prepare data for synthesis
+                    pred = predictions.get(symbol, {})
+                    prices = price_data.get(symbol, {})
+                    tech_data = {
+                        'signal': pred.get('signal', 'Side'),
+                        'confidence': pred.get('confidence', 0),
+                        'ai_reasoning': pred.get('reasoning', ''),
+                        'support_price': pred.get('support'),
+                        'pressure_price': pred.get('pressure'),
+                        'close': prices.get('close'),
+                        'change_percent': prices.get('change'),
+                        'reflection': pred.get('reflection', {}),
+                    }
+
+                    # Step D: free / pro 档位并发生成
+                    analyses = await asyncio.gather(*(
+                        _synthesize(symbol, stock_name, news, tech_data, facts, tier) for tier in tiers
+                    ))
+                    for tier, analysis in zip(tiers, analyses):
                         if analysis:
-                            break
-                    except Exception as e:
-                        if "429" in str(e) or "rate limit" in str(e).lower():
-                            wait_time = (attempt + 1) * 5
-                            logger.warning(f"⚠️  Rate limit (429) hit. Waiting {wait_time}s...")
-                            await asyncio.sleep(wait_time)
-                        else:
-                            logger.error(f"❌ [Attempt {attempt+1}] Error: {e}")
-                            await asyncio.sleep(2)
-                
-                if analysis:
-                    cursor.execute("""
-                        INSERT OR REPLACE INTO stock_briefs 
-                        (symbol, date, tier, stock_name, analysis_markdown, raw_news, signal, confidence)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (symbol, date_str, tier, stock_name, analysis, news, tech_data['signal'], tech_data['confidence']))
-                    conn.commit()
-            
-            processed_count += 1
+                            writer.add((symbol, date_str, tier, stock_name, analysis, news,
+                                        tech_data['signal'], tech_data['confidence']))
+                    if writer.should_flush():
+                        await writer.flush()
+                    processed["count"] += 1
+                except Exception as e:
+                    logger.error(f"❌ [Phase 1] {symbol} failed: {e}")
+
+        logger.info(f"⚡ [Phase 1] {BRIEF_GENERATION_CONFIG['symbol_concurrency']} stocks in parallel")
+        try:
+            await asyncio.gather(*(_process_stock(*stock) for stock in unique_stocks))
+        finally:
+            await writer.flush(final=True)
         
-        logger.info(f"✅ [Phase 1] Completed. Analyzed {processed_count} stocks.")
+        logger.info(f"✅ [Phase 1] Completed. Analyzed {processed['count']} stocks, saved {writer.saved} briefs.")
+        stats = ctx_service.cache.stats
+        logger.info(f"📦 [ContextCache] 命中率 {ctx_service.cache.hit_rate:.0%} "
+                    f"(hits={stats['hits']}, misses={stats['misses']}, coalesced={stats['coalesced']}, evictions={stats['evictions']})")
 
     except Exception as e:
         logger.error(f"❌ [Phase 1] Error: {e}")
@@ -452,37 +554,14 @@ async def run_daily_pipeline(date_str: str = None, force: bool = False, target_t
         # 1. Phase 1: Analyze Stocks
         await generate_stock_briefs_batch(date_str, force=force, target_tier=target_tier)
     
-        # 2. Phase 2: Assemble for relevant users
-        conn = get_connection()
-        try:
-            cursor = conn.cursor()
-            # If target_tier is set, only process users of that tier
-            if target_tier:
-                cursor.execute("SELECT DISTINCT u.user_id FROM users u JOIN user_watchlist w ON u.user_id = w.user_id WHERE u.subscription_tier = ?", (target_tier,))
-            else:
-                cursor.execute("SELECT DISTINCT user_id FROM user_watchlist")
-            
-            users = [r[0] for r in cursor.fetchall()]
-            
-            logger.info(f"👥 [Phase 2] Assembling briefs for {len(users)} users...")
-            for user_id in users:
-                try:
-                    await assemble_user_brief(user_id, date_str)
-                    logger.info(f"   - Prepared brief for {user_id}")
-                    
-                    # [NEW] Notify user immediately after their brief is ready
-                    await notify_user_brief_ready(user_id, date_str)
-                    
-                except Exception as e:
-                    logger.error(f"❌ [Phase 2] Failed to process user {user_id}: {e}")
-                    # Continue with next user
-                    continue
-                
-        finally:
-            conn.close()
+        # 2. Phase 2: Assemble for relevant users (bulk: a handful of queries + batched writes)
+        phase2 = await assemble_all_user_briefs(date_str, target_tier=target_tier)
+
+        # Notify users whose brief is ready (subscribed and not yet notified today)
+        await notify_user_briefs(date_str, phase2["pending"])
         
         # 3. Notification Phase Decoupled
-        # Individual notifications are now sent immediately in Phase 2 loop.
+        # Notifications are sent right after the bulk Phase 2 assembly above.
         # The old batch notification function (send_personalized_daily_report) is deprecated.
         
         logger.info("🎉 Daily Pipeline Completed! Check 'daily_briefs' table.")
@@ -524,7 +603,7 @@ if __name__ == "__main__":
             conn.close()
         
         if symbols:
-            asyncio.run(generate_stock_briefs_batch(target_date, specific_symbols=symbols, force=args.force, target_tier=args.tier))
+            run_with_http_clients(generate_stock_briefs_batch(target_date, specific_symbols=symbols, force=args.force, target_tier=args.tier))
             asyncio.run(assemble_user_brief(args.user, target_date))
             print("\n✅ Verification Complete. Check 'daily_briefs' table.")
         else:
@@ -536,6 +615,6 @@ if __name__ == "__main__":
         target_symbols = [s.strip() for s in args.symbols.split(",")] if args.symbols else None
         if target_symbols:
             print(f"Running targeted analysis for symbols: {target_symbols}")
-            asyncio.run(generate_stock_briefs_batch(target_date, specific_symbols=target_symbols, force=args.force, target_tier=args.tier))
+            run_with_http_clients(generate_stock_briefs_batch(target_date, specific_symbols=target_symbols, force=args.force, target_tier=args.tier))
         else:
-            asyncio.run(run_daily_pipeline(target_date, force=args.force, target_tier=args.tier))
+            run_with_http_clients(run_daily_pipeline(target_date, force=args.force, target_tier=args.tier))
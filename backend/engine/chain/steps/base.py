@@ -31,6 +31,7 @@ class BaseStep(ABC):
         Execute the step with retries and Cot enforcement.
         """
         for attempt in range(max_retries + 1):
+            messages, response = None, None
             try:
                 # 1. Build Base Prompt
                 core_prompt = await self.build_prompt(context)
@@ -47,7 +48,8 @@ class BaseStep(ABC):
                 context.artifacts[f"{self.step_name}_prompt"] = final_prompt
                 
                 # 4. Call LLM
-                params = {"temperature": self.config.get("temperature", 0.5)}
+                # 重试时不读响应缓存，避免重放同一个失败的响应
+                params = {"temperature": self.config.get("temperature", 0.5), "use_cache": attempt == 0}
                 response, meta = await client.chat_async(messages, **params)
                 
                 if response is None:
@@ -66,6 +68,9 @@ class BaseStep(ABC):
             
             except Exception as e:
                 logger.warning(f"⚠️ Step '{self.step_name}' failed (Attempt {attempt+1}/{max_retries+1}): {e}")
+                if response is not None:
+                    # 回复无法解析: 从响应缓存中删除，避免后续运行重放
+                    client.evict_cached(messages, temperature=params["temperature"])
                 if attempt == max_retries:
                     raise StepExecutionError(self.step_name, str(e))
                 await asyncio.sleep(2 ** attempt)
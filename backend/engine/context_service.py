@@ -3,25 +3,111 @@ World-Class Context Service (Knowledge Fact Layer)
 Provides high-quality, synthesized data facts for AI consumers.
 Standardizes how AI 'sees' the market and individual stocks.
 """
-import numpy as np
+import asyncio
+import time
 import pandas as pd
-from typing import Dict, Any, Optional, List
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Callable, Hashable
 from datetime import datetime, timedelta
 import threading
 
 try:
+    from backend.config import BEIJING_TZ, CONTEXT_CACHE_CONFIG
     from backend.logger import logger
-    from backend.database import get_connection
+    from backend.database import pooled_connection, execute_with_retry, get_latest_prices
+    from backend.price_cache import get_price_cache
+    from backend.trading_calendar import get_market_from_symbol
+    from backend.engine.market_breadth import load_market_breadth, format_market_mood
 except ImportError:
+    from config import BEIJING_TZ, CONTEXT_CACHE_CONFIG
     from logger import logger
-    from database import get_connection
+    from database import pooled_connection, execute_with_retry, get_latest_prices
+    from price_cache import get_price_cache
+    from trading_calendar import get_market_from_symbol
+    from engine.market_breadth import load_market_breadth, format_market_mood
+
+class FactCache:
+    """
+    异步安全的事实缓存
+      - LRU: 超过 max_entries 时淘汰最久未用的条目
+      - TTL 按日期区分: 当天的事实用 ttl_seconds，历史日期的事实不再变化，用 history_ttl_seconds
+      - single-flight: 同一 key 的并发请求只执行一次加载，其余请求等待同一个结果
+      - 命中率统计: hits / misses / coalesced / evictions
+    加载函数是阻塞的数据库调用，放到线程中执行，不阻塞事件循环
+    """
+
+    def __init__(self, max_entries: int = None, ttl_seconds: float = None, history_ttl_seconds: float = None):
+        self.max_entries = max_entries or CONTEXT_CACHE_CONFIG["max_entries"]
+        self.ttl = ttl_seconds if ttl_seconds is not None else CONTEXT_CACHE_CONFIG["ttl_seconds"]
+        self.history_ttl = history_ttl_seconds if history_ttl_seconds is not None else CONTEXT_CACHE_CONFIG["history_ttl_seconds"]
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+    def ttl_for(self, date_str: str) -> float:
+        today = datetime.now(BEIJING_TZ).strftime("%Y-%m-%d")
+        return self.history_ttl if date_str and date_str < today else self.ttl
+
+    def _lookup(self, key: Hashable):
+        """返回 (是否命中, 值)"""
+        item = self._items.get(key)
+        if item is None:
+            return False, None
+        value, expires_at = item
+        if time.monotonic() >= expires_at:
+            del self._items[key]
+            return False, None
+        self._items.move_to_end(key)
+        return True, value
+
+    def _store(self, key: Hashable, value, ttl: float):
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    async def _load(self, key: Hashable, date_str: str, loader: Callable, args: tuple):
+        try:
+            value = await asyncio.to_thread(loader, *args)
+            self._store(key, value, self.ttl_for(date_str))
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def get_or_load(self, key: Hashable, date_str: str, loader: Callable, *args):
+        """命中直接返回；未命中时加载 (并发的相同请求共享同一次加载)。加载失败不缓存"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            hit, value = self._lookup(key)
+            if hit:
+                self.stats["hits"] += 1
+                return value
+            task = self._inflight.get(key)
+            if task is not None and task.get_loop() is loop:
+                self.stats["coalesced"] += 1
+            else:
+                self.stats["misses"] += 1
+                task = self._inflight[key] = loop.create_task(self._load(key, date_str, loader, args))
+        # shield: 某个等待方被取消不会中断其他等待方共享的加载
+        return await asyncio.shield(task)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return (self.stats["hits"] + self.stats["coalesced"]) / total if total else 0.0
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
 
 class ContextService:
     _instance = None
     _lock = threading.Lock()
-    
-    # Simple In-Memory Cache for global market data (invalidated by date)
-    _global_cache = {}
 
     def __new__(cls):
         with cls._lock:
@@ -33,20 +119,22 @@ class ContextService:
         # Prevent re-initialization if using singleton
         if hasattr(self, '_initialized'): return
         self._initialized = True
+        self.cache = FactCache()
 
     async def get_comprehensive_context(self, symbol: str, date_str: str, stock_name: str = None) -> Dict[str, Any]:
         """
         API: Get a rich, structured context for a specific stock on a specific date.
         Combines macro, meso, and micro facts.
         """
-        # 1. Macro: Market Mood
-        market_mood = self._get_cached_market_mood(date_str)
-        
-        # 2. Meso: Price Altitude (Positioning in cycles)
-        altitude = self._calculate_altitude(symbol, date_str)
-        
-        # 3. Micro: Volume and Momentum
-        volume_status = self._analyze_volume(symbol, date_str)
+        # 1. Macro: Market Mood / 2. Meso: Price Altitude (Positioning in cycles) / 3. Micro: Volume and Momentum
+        # 同一 symbol/date 的重复请求 (free 与 pro 两个档位) 命中缓存
+        market = get_market_from_symbol(symbol)
+        market_mood, altitude, volume_status = await asyncio.gather(
+            self._fact(("market_mood", date_str, market), date_str, "市场情绪数据暂时不可用。",
+                       self._calculate_market_mood, date_str, market),
+            self._fact(("altitude", symbol, date_str), date_str, {}, self._calculate_altitude, symbol, date_str),
+            self._fact(("volume", symbol, date_str), date_str, "量能未知", self._analyze_volume, symbol, date_str),
+        )
         
         # 4. Fundamental/Meta
         meta = {
@@ -63,125 +151,81 @@ class ContextService:
             "timestamp": datetime.now().isoformat()
         }
 
-    def _get_cached_market_mood(self, date_str: str) -> str:
-        """Fetch market mood with date-based caching."""
-        cache_key = f"market_mood_{date_str}"
-        if cache_key in self._global_cache:
-            return self._global_cache[cache_key]
-        
-        mood = self._calculate_market_mood(date_str)
-        self._global_cache[cache_key] = mood
-        return mood
+    async def _fact(self, key: tuple, date_str: str, fallback, loader: Callable, *args):
+        """经缓存读取一项事实，加载失败时返回 fallback (失败结果不进缓存，下次重新加载)"""
+        try:
+            return await self.cache.get_or_load(key, date_str, loader, *args)
+        except Exception as e:
+            logger.warning(f"⚠️ {key[0]} failed for {key[1:]}: {e}")
+            return fallback
 
-    def _calculate_market_mood(self, date_str: str) -> str:
+    def _calculate_market_mood(self, date_str: str, market: str = "CN") -> str:
         """
-        Analyze market sentiment:
-        1. Query Index Proxies (02800, sh000001, 510300).
-        2. Calculate Market Breadth (Advancers vs Decliners).
+        Analyze market sentiment from the materialized market_breadth row:
+        index proxies (02800, sh000001, 510300) + breadth (advancers vs decliners, median change).
+        Dates not yet materialized are computed on demand (stored only once the sync has covered them).
         """
-        MARKET_ANCHORS = ["02800", "sh000001", "510300"]
-        symbol_map = {"02800": "恒生指数(ETF)", "sh000001": "上证指数", "510300": "沪深300"}
-        
-        conn = get_connection()
-        try:
-            cursor = conn.cursor()
-            
-            # Index performance
-            anchor_placeholders = ','.join([f"'{a}'" for a in MARKET_ANCHORS])
-            cursor.execute(f"""
-                SELECT symbol, change_percent 
-                FROM daily_prices 
-                WHERE date = ? AND symbol IN ({anchor_placeholders})
-            """, (date_str,))
-            anchors = cursor.fetchall()
-            
-            proxy_parts = []
-            for sym, chg in anchors:
-                name = symbol_map.get(sym, sym)
-                proxy_parts.append(f"{name} {'涨' if chg > 0 else '跌'} {abs(chg):.2f}%")
-            proxy_msg = "，".join(proxy_parts)
-            
-            # Market Breadth
-            cursor.execute("SELECT change_percent FROM daily_prices WHERE date = ?", (date_str,))
-            rows = cursor.fetchall()
-            
-            if not rows or len(rows) < 5: 
-                return proxy_msg if proxy_msg else "市场数据正在同步中。"
-                
-            changes = [r[0] for r in rows if r[0] is not None]
-            up = sum(1 for c in changes if c > 0)
-            down = len(changes) - up
-            median_chg = np.median(changes)
-            
-            sample_size = len(changes)
-            scope = "全市场" if sample_size > 1000 else "核心观察池"
-            breadth = f"({scope}涨{up}/跌{down}，中位数{median_chg:+.2f}%)"
-            
-            return f"{proxy_msg}，{breadth}" if proxy_msg else f"{scope}情绪{breadth}"
-            
-        except Exception as e:
-            logger.warning(f"⚠️ Market mood error: {e}")
-            return "市场情绪数据暂时不可用。"
-        finally:
-            conn.close()
+        rows = execute_with_retry(
+            lambda conn: load_market_breadth(conn.cursor(), [(date_str, market)], compute_missing=True), 3
+        )
+        return format_market_mood(rows.get((date_str, market)))
 
     def _calculate_altitude(self, symbol: str, date_str: str) -> Dict[str, str]:
         """
         Cycle Analysis: Where is the current price relative to historical range?
         Returns qualitative descriptions.
         """
-        conn = get_connection()
-        try:
-            # Fetch last 250 trading days
-            query = f"""
-                SELECT close FROM daily_prices 
-                WHERE symbol = '{symbol}' AND date <= '{date_str}'
-                ORDER BY date DESC LIMIT 250
-            """
-            df = pd.read_sql(query, conn)
-            
-            if df.empty or len(df) < 10:
-                return {"info": "历史数据不足以进行周期分析"}
-            
-            curr_price = df.iloc[0]['close']
+        # Fetch last 250 trading days (local price cache first)
+        cached = get_price_cache().get_history(symbol, "daily", end_date=date_str, limit=250, columns=["close"])
+        if cached is not None:
+            df = pd.DataFrame(cached, columns=["close"])
+        else:
+            with pooled_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT close FROM daily_prices WHERE symbol = ? AND date <= ? ORDER BY date DESC LIMIT 250",
+                    (symbol, date_str)
+                )
+                df = pd.DataFrame(cursor.fetchall(), columns=["close"])
+
+        if df.empty or len(df) < 10:
+            return {"info": "历史数据不足以进行周期分析"}
+        
+        curr_price = df.iloc[0]['close']
+        
+        def analyze_range(days: int) -> str:
+            subset = df.head(days)
+            if len(subset) < days * 0.7: return "数据不足"
+            hi, lo = subset['close'].max(), subset['close'].min()
+            if hi == lo: return "横盘"
+            pct = (curr_price - lo) / (hi - lo) * 100
             
-            def analyze_range(days: int) -> str:
-                subset = df.head(days)
-                if len(subset) < days * 0.7: return "数据不足"
-                hi, lo = subset['close'].max(), subset['close'].min()
-                if hi == lo: return "横盘"
-                pct = (curr_price - lo) / (hi - lo) * 100
-                
-                zone = "历史高位" if pct > 85 else ("风险位" if pct > 70 else ("中位" if pct > 40 else ("机会位" if pct > 15 else "底部强支撑")))
-                return f"{zone} ({pct:.0f}%)"
-
-            return {
-                "short_term_20d": analyze_range(20),
-                "medium_term_60d": analyze_range(60),
-                "long_term_250d": analyze_range(250)
-            }
-        except Exception as e:
-            logger.error(f"⚠️ Altitude failed for {symbol}: {e}")
-            return {}
-        finally:
-            conn.close()
+            zone = "历史高位" if pct > 85 else ("风险位" if pct > 70 else ("中位" if pct > 40 else ("机会位" if pct > 15 else "底部强支撑")))
+            return f"{zone} ({pct:.0f}%)"
+
+        return {
+            "short_term_20d": analyze_range(20),
+            "medium_term_60d": analyze_range(60),
+            "long_term_250d": analyze_range(250)
+        }
 
     def _analyze_volume(self, symbol: str, date_str: str) -> str:
         """Volume behavior analysis."""
-        conn = get_connection()
-        try:
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT volume FROM daily_prices WHERE symbol=? AND date<=? ORDER BY date DESC LIMIT 6", (symbol, date_str))
-            vols = [r[0] for r in cursor.fetchall() if r[0]]
-            if len(vols) < 2: return "量能平稳"
-            
-            ratio = vols[0] / (sum(vols[1:]) / len(vols[1:]))
-            if ratio > 2.2: return f"异常放量 (量比 {ratio:.1f}x)"
-            if ratio > 1.5: return f"温和放量 (量比 {ratio:.1f}x)"
-            if ratio < 0.5: return f"极度缩量 (量比 {ratio:.1f}x)"
-            return "量能平稳"
-        except: return "量能未知"
-        finally: conn.close()
+        cached = get_price_cache().get_history(symbol, "daily", end_date=date_str, limit=6, columns=["volume"])
+        if cached is not None:
+            vols = [r["volume"] for r in cached if r["volume"]]
+        else:
+            with pooled_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"SELECT volume FROM daily_prices WHERE symbol=? AND date<=? ORDER BY date DESC LIMIT 6", (symbol, date_str))
+                vols = [r[0] for r in cursor.fetchall() if r[0]]
+        if len(vols) < 2: return "量能平稳"
+        
+        ratio = vols[0] / (sum(vols[1:]) / len(vols[1:]))
+        if ratio > 2.2: return f"异常放量 (量比 {ratio:.1f}x)"
+        if ratio > 1.5: return f"温和放量 (量比 {ratio:.1f}x)"
+        if ratio < 0.5: return f"极度缩量 (量比 {ratio:.1f}x)"
+        return "量能平稳"
 
     async def get_batch_predictions_and_reflection(self, symbols: List[str], date_str: str) -> Dict[str, Dict]:
         """
@@ -190,11 +234,10 @@ class ContextService:
         """
         if not symbols: return {}
         
-        conn = get_connection()
-        try:
+        with pooled_connection() as conn:
             cursor = conn.cursor()
             placeholders = ','.join(['?' for _ in symbols])
-            
+        
             sql = f"""
                 SELECT 
                     p.symbol, p.signal, p.confidence, p.ai_reasoning, p.support_price, p.pressure_price, 
@@ -206,7 +249,7 @@ class ContextService:
                 WHERE p.symbol IN ({placeholders}) AND p.date = ? AND p.is_primary = 1
             """
             cursor.execute(sql, (*symbols, date_str))
-            
+        
             results = {}
             for row in cursor.fetchall():
                 results[row[0]] = {
@@ -217,25 +260,11 @@ class ContextService:
                     }
                 }
             return results
-        finally:
-            conn.close()
 
     async def get_batch_technical_facts(self, symbols: List[str]) -> Dict[str, Dict]:
-        """Fetch latest technical facts for multiple symbols."""
+        """Fetch latest technical facts for multiple symbols (one lookup on the latest_prices snapshot)."""
         if not symbols: return {}
         
-        conn = get_connection()
-        try:
-            cursor = conn.cursor()
-            placeholders = ','.join(['?' for _ in symbols])
-            
-            sql = f"""
-                SELECT symbol, close, change_percent, rsi, macd
-                FROM daily_prices
-                WHERE symbol IN ({placeholders})
-                AND date = (SELECT MAX(date) FROM daily_prices WHERE symbol = daily_prices.symbol)
-            """
-            cursor.execute(sql, symbols)
-            return {row[0]: {'close': row[1], 'change': row[2], 'rsi': row[3], 'macd': row[4]} for row in cursor.fetchall()}
-        finally:
-            conn.close()
+        rows = get_latest_prices(symbols, "daily", columns=["close", "change_percent", "rsi", "macd"])
+        return {symbol: {'close': r['close'], 'change': r['change_percent'], 'rsi': r['rsi'], 'macd': r['macd']}
+                for symbol, r in rows.items()}
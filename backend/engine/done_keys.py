@@ -0,0 +1,52 @@
+"""
+运行级 "已完成" 键集合 (幂等性检查)
+
+一次任务开始时用一条查询把日期范围内已存在的结果键全部读入内存:
+  - ai_predictions_v2: (symbol, date, model_id)
+  - stock_briefs:      (symbol, date, tier)
+之后每次 "是否已存在" 的判断都是集合查找，写入结果后再 add() 进集合
+"""
+import threading
+from typing import Iterable, Tuple
+
+try:
+    from backend.database import execute_with_retry
+except ImportError:
+    from database import execute_with_retry
+
+
+class DoneKeySet:
+    """线程安全的结果键集合"""
+
+    def __init__(self, keys: Iterable[Tuple] = ()):
+        self._keys = set(keys)
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: Tuple) -> bool:
+        return key in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: Tuple):
+        with self._lock:
+            self._keys.add(key)
+
+    @classmethod
+    def _load(cls, table: str, key_column: str, start_date: str, end_date: str = None) -> "DoneKeySet":
+        def _query(conn):
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT symbol, date, {key_column} FROM {table} WHERE date BETWEEN ? AND ?",
+                           (start_date, end_date or start_date))
+            return [tuple(row) for row in cursor.fetchall()]
+        return cls(execute_with_retry(_query, 3))
+
+    @classmethod
+    def load_predictions(cls, start_date: str, end_date: str = None) -> "DoneKeySet":
+        """[start_date, end_date] 内已有的 (symbol, date, model_id)"""
+        return cls._load("ai_predictions_v2", "model_id", start_date, end_date)
+
+    @classmethod
+    def load_briefs(cls, start_date: str, end_date: str = None) -> "DoneKeySet":
+        """[start_date, end_date] 内已有的 (symbol, date, tier)"""
+        return cls._load("stock_briefs", "tier", start_date, end_date)
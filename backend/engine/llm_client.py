@@ -4,14 +4,26 @@ LLM 客户端模块
 """
 
 import json
+import hashlib
+import sqlite3
 import requests
+import threading
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+from importlib.util import find_spec
 from typing import Optional, Dict, Any, Tuple
 import time
 try:
-    from backend.config import LLM_CONFIG
+    import httpx
 except ImportError:
-    from config import LLM_CONFIG
+    httpx = None
+try:
+    from backend.config import LLM_CONFIG, LLM_HTTP_CONFIG, LLM_CACHE_CONFIG
+except ImportError:
+    from config import LLM_CONFIG, LLM_HTTP_CONFIG, LLM_CACHE_CONFIG
 from .llm_tracker import get_tracker, estimate_tokens
+from .rate_limiter import get_rate_limiter, limiter_key
 from .schema_normalizer import normalize_ai_response
 try:
     from backend.logger import logger
@@ -20,29 +32,307 @@ except ImportError:
 
 import asyncio
 
-class AsyncRateLimiter:
-    """简单的异步速率限制器 (Token Bucket 思想)"""
-    def __init__(self, rate: float):
-        self._interval = 1.0 / rate if rate > 0 else 0
-        self._last_check = 0.0
-        self._lock = asyncio.Lock()
-
-    async def acquire(self):
-        if self._interval <= 0: return
-        async with self._lock:
-            now = time.time()
-            elapsed = now - self._last_check
-            wait_time = self._interval - elapsed
-            if wait_time > 0:
-                await asyncio.sleep(wait_time)
-            self._last_check = time.time() + (wait_time if wait_time > 0 else 0)
+# 每个事件循环 × base_url 一个 httpx.AsyncClient (keep-alive 连接池，循环结束后随之回收)
+_async_http_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_async_http_lock = threading.Lock()
+
+
+def get_async_http_client(base_url: str) -> "httpx.AsyncClient":
+    """获取当前事件循环中 base_url 对应的共享异步 HTTP 客户端 (https 且安装了 h2 时启用 HTTP/2)"""
+    loop = asyncio.get_running_loop()
+    with _async_http_lock:
+        per_loop = _async_http_clients.setdefault(loop, {})
+        client = per_loop.get(base_url)
+        if client is None or client.is_closed:
+            http2 = (LLM_HTTP_CONFIG.get("http2", True) and base_url.startswith("https://")
+                     and find_spec("h2") is not None)
+            client = httpx.AsyncClient(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=LLM_HTTP_CONFIG.get("max_connections", 100),
+                    max_keepalive_connections=LLM_HTTP_CONFIG.get("max_keepalive", 20),
+                    keepalive_expiry=LLM_HTTP_CONFIG.get("keepalive_expiry", 30.0),
+                ),
+            )
+            per_loop[base_url] = client
+    return client
+
+
+async def close_async_http_clients():
+    """关闭当前事件循环中的所有共享 HTTP 客户端 (在 asyncio.run 的主协程结束前调用)"""
+    with _async_http_lock:
+        clients = list(_async_http_clients.pop(asyncio.get_running_loop(), {}).values())
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception:
+            pass
+
+
+def run_with_http_clients(coro):
+    """asyncio.run(coro)，并在主协程结束时关闭本循环的共享 HTTP 客户端 (否则每次 asyncio.run 泄漏一个连接池)"""
+    async def _main():
+        try:
+            return await coro
+        finally:
+            await close_async_http_clients()
+
+    return asyncio.run(_main())
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After 头: 秒数或 HTTP 日期"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def _new_meta() -> Dict[str, Any]:
+    return {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0, "latency_ms": 0, "error": None}
+
+
+# ---------- 响应缓存 (按提示词内容寻址) ----------
+
+def llm_cache_key(provider: str, model: str, temperature: float, max_tokens: int, messages: list) -> str:
+    """(provider, model, temperature, max_tokens, messages) 的 SHA-256"""
+    raw = json.dumps(
+        {"provider": provider, "model": model, "temperature": temperature, "max_tokens": max_tokens, "messages": messages},
+        ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryCacheBackend:
+    """进程内 LRU (TTL + 条目上限)，用于测试或不希望落盘的场景"""
+
+    def __init__(self, ttl_seconds: float = 0, max_entries: int = 1000):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Tuple[str, dict]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            content, meta, created_at = item
+            if self.ttl and time.time() - created_at > self.ttl:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return content, meta
+
+    def set(self, key: str, content: str, meta: dict) -> int:
+        """写入并返回被淘汰的条目数"""
+        with self._lock:
+            self._items[key] = (content, meta, time.time())
+            self._items.move_to_end(key)
+            evicted = 0
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def delete(self, key: str):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class SQLiteCacheBackend:
+    """
+    本地 SQLite 文件 (独立于业务库)，TTL 过期 + 按最近访问时间的 LRU 容量上限
+    命中只读不写: 访问时间先记在内存里，下一次 set 时随写入事务一起落盘 (异步路径上命中不等磁盘写入)
+    """
+
+    # 每写入多少条清理一次过期/超额条目
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: str, ttl_seconds: float = 0, max_entries: int = 20000):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._touched: Dict[str, float] = {}
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_response_cache (
+                cache_key TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                meta_json TEXT,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_response_cache(accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[str, dict]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, meta_json, created_at FROM llm_response_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if not row:
+                return None
+            if self.ttl and now - row[2] > self.ttl:
+                # 过期条目由 _prune 删除
+                return None
+            self._touched[key] = now
+        return row[0], json.loads(row[1] or "{}")
+
+    def set(self, key: str, content: str, meta: dict) -> int:
+        now = time.time()
+        with self._lock:
+            self._flush_touched()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_response_cache (cache_key, content, meta_json, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, content, json.dumps(meta, ensure_ascii=False), now, now)
+            )
+            self._writes += 1
+            evicted = self._prune(now) if self._writes % self.PRUNE_EVERY == 0 else 0
+            self._conn.commit()
+            return evicted
+
+    def _flush_touched(self):
+        """把命中时记下的访问时间批量写回 (调用方持有锁并负责提交)"""
+        if self._touched:
+            touched, self._touched = self._touched, {}
+            self._conn.executemany("UPDATE llm_response_cache SET accessed_at = ? WHERE cache_key = ?",
+                                   [(t, k) for k, t in touched.items()])
+
+    def _prune(self, now: float) -> int:
+        evicted = 0
+        if self.ttl:
+            evicted += self._conn.execute("DELETE FROM llm_response_cache WHERE created_at < ?", (now - self.ttl,)).rowcount
+        evicted += self._conn.execute("""
+            DELETE FROM llm_response_cache WHERE cache_key IN (
+                SELECT cache_key FROM llm_response_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,)).rowcount
+        return evicted
+
+    def delete(self, key: str):
+        with self._lock:
+            self._touched.pop(key, None)
+            self._conn.execute("DELETE FROM llm_response_cache WHERE cache_key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute("DELETE FROM llm_response_cache")
+            self._conn.commit()
+
+
+class LLMResponseCache:
+    """
+    LLM 响应缓存: 相同的 (provider, model, temperature, max_tokens, messages) 直接返回上次的成功响应
+    命中时 meta 的 token 计数为 0 (未产生费用)，原始用量记录在 cached_tokens
+    后端可替换: 实现 get(key) -> (content, meta) | None、set(key, content, meta) -> 淘汰数 与 delete(key) 即可
+    缓存只知道请求是否成功；内容无法解析的回复由调用方 evict 掉，不会被后续运行重放
+    """
+
+    def __init__(self, backend=None, enabled: bool = None):
+        self.enabled = LLM_CACHE_CONFIG.get("enabled", True) if enabled is None else enabled
+        self.backend = backend
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "errors": 0, "saved_tokens": 0}
+        self._stats_lock = threading.Lock()
+
+    def _bump(self, name: str, value: int = 1):
+        with self._stats_lock:
+            self.stats[name] += value
+
+    def _get_backend(self):
+        if self.backend is None:
+            if LLM_CACHE_CONFIG.get("backend", "sqlite") == "memory":
+                self.backend = MemoryCacheBackend(LLM_CACHE_CONFIG.get("ttl_seconds", 0), LLM_CACHE_CONFIG.get("max_entries", 20000))
+            else:
+                self.backend = SQLiteCacheBackend(
+                    LLM_CACHE_CONFIG["path"], LLM_CACHE_CONFIG.get("ttl_seconds", 0), LLM_CACHE_CONFIG.get("max_entries", 20000)
+                )
+        return self.backend
+
+    def lookup(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        if not self.enabled:
+            return None
+        try:
+            hit = self._get_backend().get(key)
+        except Exception as e:
+            self._bump("errors")
+            logger.warning(f"⚠️ LLM 缓存读取失败: {e}")
+            return None
+        if hit is None:
+            self._bump("misses")
+            return None
+        content, stored_meta = hit
+        self._bump("hits")
+        self._bump("saved_tokens", stored_meta.get("total_tokens", 0) or 0)
+        meta = _new_meta()
+        meta["cached"] = True
+        meta["cached_tokens"] = stored_meta.get("total_tokens", 0)
+        return content, meta
+
+    def store(self, key: str, content: str, meta: Dict[str, Any]):
+        if not self.enabled or not content:
+            return
+        try:
+            evicted = self._get_backend().set(key, content, {k: meta.get(k) for k in ("input_tokens", "output_tokens", "total_tokens")})
+        except Exception as e:
+            self._bump("errors")
+            logger.warning(f"⚠️ LLM 缓存写入失败: {e}")
+            return
+        self._bump("writes")
+        if evicted:
+            self._bump("evictions", evicted)
+
+    def evict(self, key: str):
+        if not self.enabled or not key:
+            return
+        try:
+            self._get_backend().delete(key)
+        except Exception as e:
+            self._bump("errors")
+            logger.warning(f"⚠️ LLM 缓存删除失败: {e}")
+
+    def summary(self) -> str:
+        s = self.stats
+        total = s["hits"] + s["misses"]
+        rate = s["hits"] / total * 100 if total else 0.0
+        return f"LLM 缓存: 命中 {s['hits']}/{total} ({rate:.0f}%), 节省 {s['saved_tokens']} tokens"
+
+
+_llm_cache: Optional[LLMResponseCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """获取全局 LLM 响应缓存"""
+    global _llm_cache
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                _llm_cache = LLMResponseCache()
+    return _llm_cache
+
 
 class LLMClient:
     """本地 LLM 代理客户端"""
     
-    # 全局共享的限流器 (Provider -> AsyncRateLimiter)
-    _rate_limiters = {}
-    
     def __init__(
         self,
         provider: str = None,
@@ -57,11 +347,6 @@ class LLMClient:
         self.provider = provider or LLM_CONFIG.get("provider", "openai")
         self.timeout = timeout
         
-        # 自动注册 Hunyuan 限流器
-        if self.provider == "hunyuan" and "hunyuan" not in self._rate_limiters:
-            qps = LLM_CONFIG.get("hunyuan", {}).get("qps_limit", 2.0)
-            self._rate_limiters["hunyuan"] = AsyncRateLimiter(qps)
-        
         # 根据提供商加载默认配置
         if self.provider == "deepseek":
             ds_config = LLM_CONFIG.get("deepseek", {})
@@ -90,6 +375,9 @@ class LLMClient:
             self.model = model or LLM_CONFIG.get("model", "gpt-3.5-turbo")
 
         self.timeout = timeout
+
+        # 按上游主机共享的自适应限流器 (令牌桶 + AIMD)
+        self.rate_limiter = get_rate_limiter(limiter_key(self.base_url, self.provider))
         
         # Gemini Native Client 缓存 (用于云端 Gemini)
         self._gemini_client = None
@@ -126,47 +414,105 @@ class LLMClient:
         except:
             return False
     
+    def _cache_key(self, messages: list, model: str, temperature: float, max_tokens: int) -> Optional[str]:
+        if not get_llm_cache().enabled:
+            return None
+        # Gemini 路径始终使用 self.model
+        used_model = self.model if self.provider in ("gemini", "gemini_local") else (model or self.model)
+        return llm_cache_key(self.provider, used_model, temperature, max_tokens, messages)
+
+    def evict_cached(self, messages: list, model: str = None, temperature: float = 0.7, max_tokens: int = 4096):
+        """从响应缓存删除这次请求的回复 (参数与 chat 相同)，调用方解析失败时使用"""
+        key = self._cache_key(messages, model, temperature, max_tokens)
+        if key:
+            get_llm_cache().evict(key)
+
     def chat(
         self,
         messages: list,
         model: str = None,
         temperature: float = 0.7,
-        max_tokens: int = 4096
+        max_tokens: int = 4096,
+        use_cache: bool = True
     ) -> Tuple[Optional[str], Dict[str, Any]]:
-        """发送聊天请求"""
-        if self.provider == "gemini" and self._gemini_client:
-            return self._chat_gemini(messages, temperature, max_tokens)
-        elif self.provider == "gemini_local" and self._gemini_local_client:
-            return self._chat_gemini_local(messages, temperature, max_tokens)
-        
-        return self._chat_openai_compatible(messages, model, temperature, max_tokens)
+        """发送聊天请求
+        use_cache=False 时跳过缓存读取 (仍会写入)，用于解析失败后的重试
+        回复无法解析时调用方应 evict_cached()，否则下次运行会命中这条坏回复"""
+        key = self._cache_key(messages, model, temperature, max_tokens)
+        if key and use_cache:
+            hit = get_llm_cache().lookup(key)
+            if hit:
+                return hit
+
+        with self.rate_limiter.slot_sync():
+            if self.provider == "gemini" and self._gemini_client:
+                content, meta = self._chat_gemini(messages, temperature, max_tokens)
+            elif self.provider == "gemini_local" and self._gemini_local_client:
+                content, meta = self._chat_gemini_local(messages, temperature, max_tokens)
+            else:
+                content, meta = self._chat_openai_compatible(messages, model, temperature, max_tokens)
+        self._record_rate(content, meta)
+
+        if key and content:
+            get_llm_cache().store(key, content, meta)
+        return content, meta
 
     async def chat_async(
         self,
         messages: list,
         model: str = None,
         temperature: float = 0.7,
-        max_tokens: int = 4096
+        max_tokens: int = 4096,
+        timeout: float = None,
+        use_cache: bool = True
     ) -> Tuple[Optional[str], Dict[str, Any]]:
-        """Async wrapper for chat (using executor)"""
-        # Rate Limiting Check
-        if self.provider in self._rate_limiters:
-            await self._rate_limiters[self.provider].acquire()
-
-        import asyncio
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(
-            None, 
-            lambda: self.chat(messages, model, temperature, max_tokens)
+        """
+        异步聊天请求 (不占用线程)
+        - OpenAI 兼容接口: 共享的 httpx 连接池 (按 base_url 复用 keep-alive / HTTP/2 连接)
+        - Gemini / Gemini Local: SDK 原生异步接口 (client.aio)
+        timeout: 本次请求的超时秒数 (默认使用 self.timeout)；未安装 httpx 时回退到线程池执行 chat()
+        use_cache: 同 chat()，命中响应缓存时不发请求、不占限流配额
+        """
+        key = self._cache_key(messages, model, temperature, max_tokens)
+        if key and use_cache:
+            hit = get_llm_cache().lookup(key)
+            if hit:
+                return hit
+
+        is_gemini = (self.provider == "gemini" and self._gemini_client) or \
+                    (self.provider == "gemini_local" and self._gemini_local_client)
+        if httpx is None and not is_gemini:
+            loop = asyncio.get_running_loop()
+            # 缓存已在上面处理；同步 chat() 自己会经过限流器
+            return await loop.run_in_executor(
+                None, 
+                lambda: self.chat(messages, model, temperature, max_tokens, use_cache=False)
+            )
+
+        timeout = timeout or self.timeout
+        async with self.rate_limiter.slot():
+            if self.provider == "gemini" and self._gemini_client:
+                content, meta = await self._chat_gemini_async(self._gemini_client, "GEMINI", messages, temperature, max_tokens, timeout)
+            elif self.provider == "gemini_local" and self._gemini_local_client:
+                content, meta = await self._chat_gemini_async(self._gemini_local_client, "GEMINI_LOCAL", messages, temperature, max_tokens, timeout)
+            else:
+                content, meta = await self._chat_openai_compatible_async(messages, model, temperature, max_tokens, timeout)
+        self._record_rate(content, meta)
+
+        if key and content:
+            get_llm_cache().store(key, content, meta)
+        return content, meta
+
+    def _record_rate(self, content: Optional[str], meta: Dict[str, Any]):
+        """把调用结果反馈给限流器 (成功线性加速，429 乘性减速)"""
+        self.rate_limiter.record(
+            ok=content is not None,
+            status_code=meta.get("status_code"),
+            retry_after=meta.get("retry_after"),
+            error=meta.get("error"),
         )
 
-    def _chat_openai_compatible(
-        self,
-        messages: list,
-        model: str = None,
-        temperature: float = 0.7,
-        max_tokens: int = 4096
-    ) -> Tuple[Optional[str], Dict[str, Any]]:
+    def _openai_request(self, messages: list, model: str, temperature: float, max_tokens: int) -> Tuple[dict, dict]:
         payload = {
             "model": model or self.model,
             "messages": messages,
@@ -186,114 +532,138 @@ class LLMClient:
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
-        
-        meta = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0, "latency_ms": 0, "error": None}
-        
-        try:
-            start_time = time.time()
-            response = requests.post(f"{self.base_url}/chat/completions", headers=headers, json=payload, timeout=self.timeout)
-            elapsed = time.time() - start_time
-            meta["latency_ms"] = int(elapsed * 1000)
-            
-            if response.status_code == 200:
-                data = response.json()
-                usage = data.get('usage', {})
-                if usage:
-                    meta["input_tokens"] = usage.get('prompt_tokens', 0)
-                    meta["output_tokens"] = usage.get('completion_tokens', 0)
-                    meta["total_tokens"] = usage.get('total_tokens', 0)
+        return payload, headers
+
+    def _openai_result(self, response, elapsed: float, messages: list, meta: dict) -> Tuple[Optional[str], Dict[str, Any]]:
+        """解析 OpenAI 兼容响应 (requests.Response 与 httpx.Response 接口一致)"""
+        meta["latency_ms"] = int(elapsed * 1000)
+        meta["status_code"] = response.status_code
+        if response.status_code == 429:
+            meta["retry_after"] = parse_retry_after(response.headers.get("Retry-After"))
+        if response.status_code == 200:
+            data = response.json()
+            usage = data.get('usage', {})
+            if usage:
+                meta["input_tokens"] = usage.get('prompt_tokens', 0)
+                meta["output_tokens"] = usage.get('completion_tokens', 0)
+                meta["total_tokens"] = usage.get('total_tokens', 0)
                 
-                if data.get('choices'):
-                    content = data['choices'][0].get('message', {}).get('content')
-                    if not meta["input_tokens"]:
-                        input_text = " ".join([m.get('content', '') for m in messages])
-                        meta["input_tokens"] = estimate_tokens(input_text)
-                    if not meta["output_tokens"] and content:
-                        meta["output_tokens"] = estimate_tokens(content)
-                    if not meta["total_tokens"]:
-                        meta["total_tokens"] = meta["input_tokens"] + meta["output_tokens"]
+            if data.get('choices'):
+                content = data['choices'][0].get('message', {}).get('content')
+                if not meta["input_tokens"]:
+                    input_text = " ".join([m.get('content', '') for m in messages])
+                    meta["input_tokens"] = estimate_tokens(input_text)
+                if not meta["output_tokens"] and content:
+                    meta["output_tokens"] = estimate_tokens(content)
+                if not meta["total_tokens"]:
+                    meta["total_tokens"] = meta["input_tokens"] + meta["output_tokens"]
                     
-                    print(f"   🤖 {self.provider.upper()} 响应成功 ({elapsed:.1f}s, {meta['total_tokens']} tokens)")
-                    return content, meta
-                else:
-                    meta["error"] = f"响应格式异常: {data}"
-                    return None, meta
+                print(f"   🤖 {self.provider.upper()} 响应成功 ({elapsed:.1f}s, {meta['total_tokens']} tokens)")
+                return content, meta
             else:
-                meta["error"] = f"HTTP {response.status_code}: {response.text[:200]}"
-                print(f"   ❌ {self.provider.upper()} 请求失败: HTTP {response.status_code}")
+                meta["error"] = f"响应格式异常: {data}"
                 return None, meta
+        else:
+            meta["error"] = f"HTTP {response.status_code}: {response.text[:200]}"
+            print(f"   ❌ {self.provider.upper()} 请求失败: HTTP {response.status_code}")
+            return None, meta
+
+    def _chat_openai_compatible(
+        self,
+        messages: list,
+        model: str = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4096
+    ) -> Tuple[Optional[str], Dict[str, Any]]:
+        payload, headers = self._openai_request(messages, model, temperature, max_tokens)
+        meta = _new_meta()
+        try:
+            start_time = time.time()
+            response = requests.post(f"{self.base_url}/chat/completions", headers=headers, json=payload, timeout=self.timeout)
+            return self._openai_result(response, time.time() - start_time, messages, meta)
         except Exception as e:
             meta["error"] = str(e)
             print(f"   ❌ {self.provider.upper()} 请求异常: {e}")
             return None, meta
 
-    def _chat_gemini(
-        self, 
-        messages: list, 
-        temperature: float = 0.7, 
-        max_tokens: int = 4096
+    async def _chat_openai_compatible_async(
+        self,
+        messages: list,
+        model: str = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        timeout: float = None
     ) -> Tuple[Optional[str], Dict[str, Any]]:
-        meta = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0, "latency_ms": 0, "error": None}
+        payload, headers = self._openai_request(messages, model, temperature, max_tokens)
+        meta = _new_meta()
         try:
-            # 提取 system 及 history
-            system_msg = ""
-            history = []
-            
-            # 格式转换：Role 必须是 'user' 或 'model'
-            # System message 通过 config 传递
-            for m in messages:
-                if m["role"] == "system":
-                    system_msg = m["content"]
-                elif m["role"] == "user":
-                    history.append({"role": "user", "parts": [{"text": m["content"]}]})
-                elif m["role"] == "assistant":
-                    history.append({"role": "model", "parts": [{"text": m["content"]}]})
-            
-            client = self._gemini_client
+            client = get_async_http_client(self.base_url)
+            request_timeout = httpx.Timeout(timeout or self.timeout, connect=LLM_HTTP_CONFIG.get("connect_timeout", 10.0))
             start_time = time.time()
-            
-            # 使用 V2 SDK 调用
-            # 注意: V2 SDK 的 Chat 接口略有不同，这里使用 models.generate_content 配合 history 实现单次调用
-            # 或者使用 chats.create
-            
-            # 简单起见，我们使用 generate_content (Stateless)
-            # 需要把 history 构造为 contents
-            # 最后一个作为 prompt? No, generate_content 接受完整列表
-            
-            contents = history # V2 contents format: list of Content or dict
-            
-            from google import genai
-            from google.genai import types
-            
+            response = await client.post(f"{self.base_url}/chat/completions", headers=headers, json=payload, timeout=request_timeout)
+            return self._openai_result(response, time.time() - start_time, messages, meta)
+        except Exception as e:
+            meta["error"] = str(e) or type(e).__name__
+            print(f"   ❌ {self.provider.upper()} 请求异常: {meta['error']}")
+            return None, meta
+
+    def _gemini_request(self, messages: list, temperature: float, max_tokens: int, local: bool):
+        """构造 Gemini V2 SDK 的 contents 与 config
+        local=True: 本地代理不支持 system_instruction，手动合并到第一条 User Message"""
+        from google.genai import types
+
+        # 格式转换：Role 必须是 'user' 或 'model'
+        system_msg = ""
+        contents = []
+        for m in messages:
+            if m["role"] == "system":
+                system_msg = m["content"]
+            elif m["role"] == "user":
+                contents.append({"role": "user", "parts": [{"text": m["content"]}]})
+            elif m["role"] == "assistant":
+                contents.append({"role": "model", "parts": [{"text": m["content"]}]})
+
+        if local:
+            if system_msg and contents:
+                first_part = contents[0]["parts"][0]["text"]
+                contents[0]["parts"][0]["text"] = f"[系统指令] {system_msg}\n\n[用户消息] {first_part}"
+            config = types.GenerateContentConfig(
+                temperature=temperature,
+                max_output_tokens=max_tokens
+            )
+        else:
+            # System message 通过 config 传递
             config = types.GenerateContentConfig(
                 temperature=temperature,
                 max_output_tokens=max_tokens,
                 system_instruction=system_msg if system_msg else None
             )
-            
-            response = client.models.generate_content(
-                model=self.model,
-                contents=contents,
-                config=config
-            )
-            
-            elapsed = time.time() - start_time
-            meta["latency_ms"] = int(elapsed * 1000)
-            
-            content = response.text
-            
-            # 提取 Token 使用情况
-            if response.usage_metadata:
-                meta["input_tokens"] = response.usage_metadata.prompt_token_count
-                meta["output_tokens"] = response.usage_metadata.candidates_token_count
-                meta["total_tokens"] = response.usage_metadata.total_token_count
-            
-            print(f"   🤖 GEMINI 响应成功 ({elapsed:.1f}s, {meta['total_tokens']} tokens)")
-            return content, meta
-        except Exception as e:
-            meta["error"] = str(e)
-            print(f"   ❌ GEMINI 请求异常: {e}")
-            return None, meta
+        return contents, config
+
+    def _gemini_result(self, response, elapsed: float, messages: list, meta: dict, label: str) -> Tuple[Optional[str], Dict[str, Any]]:
+        meta["latency_ms"] = int(elapsed * 1000)
+        content = response.text
+
+        # 提取 Token 使用情况 (本地代理可能不返回 usage，按字符估算)
+        if response.usage_metadata:
+            meta["input_tokens"] = response.usage_metadata.prompt_token_count
+            meta["output_tokens"] = response.usage_metadata.candidates_token_count
+            meta["total_tokens"] = response.usage_metadata.total_token_count
+        elif label == "GEMINI_LOCAL":
+            meta["input_tokens"] = estimate_tokens(str(messages))
+            meta["output_tokens"] = estimate_tokens(content)
+            meta["total_tokens"] = meta["input_tokens"] + meta["output_tokens"]
+
+        print(f"   🤖 {label} 响应成功 ({elapsed:.1f}s, {meta['total_tokens']} tokens)")
+        return content, meta
+
+    def _chat_gemini(
+        self, 
+        messages: list, 
+        temperature: float = 0.7, 
+        max_tokens: int = 4096
+    ) -> Tuple[Optional[str], Dict[str, Any]]:
+        return self._chat_gemini_sync(self._gemini_client, "GEMINI", messages, temperature, max_tokens)
     
     def _chat_gemini_local(
         self, 
@@ -304,64 +674,42 @@ class LLMClient:
         """
         通过本地代理调用 Gemini V2 SDK
         """
-        meta = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0, "latency_ms": 0, "error": None}
+        return self._chat_gemini_sync(self._gemini_local_client, "GEMINI_LOCAL", messages, temperature, max_tokens)
+
+    def _chat_gemini_sync(self, client, label: str, messages: list, temperature: float, max_tokens: int):
+        meta = _new_meta()
         try:
-            # 构造内容
-            # 注意：如果本地代理还不支持 system_instruction, 需要手动合并
-            system_msg = ""
-            contents = []
-            
-            for m in messages:
-                role = "user"
-                if m["role"] == "assistant": role = "model"
-                elif m["role"] == "system": 
-                    system_msg = m["content"]
-                    continue # merge later
-                
-                contents.append({"role": role, "parts": [{"text": m["content"]}]})
-            
-            # 手动合并 System Prompt 到第一个 User Message
-            if system_msg and contents:
-                 first_part = contents[0]["parts"][0]["text"]
-                 contents[0]["parts"][0]["text"] = f"[系统指令] {system_msg}\n\n[用户消息] {first_part}"
-            
-            client = self._gemini_local_client
+            contents, config = self._gemini_request(messages, temperature, max_tokens, local=label == "GEMINI_LOCAL")
             start_time = time.time()
-            
-            from google import genai
-            from google.genai import types
-            
-            config = types.GenerateContentConfig(
-                temperature=temperature,
-                max_output_tokens=max_tokens
-            )
-            
+            # 使用 generate_content (Stateless)，contents 为完整的对话列表
             response = client.models.generate_content(
                 model=self.model,
                 contents=contents,
                 config=config
             )
-            
-            elapsed = time.time() - start_time
-            meta["latency_ms"] = int(elapsed * 1000)
-            
-            content = response.text
-             
-            # Token Usage
-            if response.usage_metadata:
-                meta["input_tokens"] = response.usage_metadata.prompt_token_count
-                meta["output_tokens"] = response.usage_metadata.candidates_token_count
-                meta["total_tokens"] = response.usage_metadata.total_token_count
-            else:
-                meta["input_tokens"] = estimate_tokens(str(messages))
-                meta["output_tokens"] = estimate_tokens(content)
-                meta["total_tokens"] = meta["input_tokens"] + meta["output_tokens"]
-                
-            print(f"   🤖 GEMINI_LOCAL 响应成功 ({elapsed:.1f}s, {meta['total_tokens']} tokens)")
-            return content, meta
+            return self._gemini_result(response, time.time() - start_time, messages, meta, label)
         except Exception as e:
             meta["error"] = str(e)
-            print(f"   ❌ GEMINI_LOCAL 请求异常: {e}")
+            meta["status_code"] = getattr(e, "code", None)
+            print(f"   ❌ {label} 请求异常: {e}")
+            return None, meta
+
+    async def _chat_gemini_async(self, client, label: str, messages: list, temperature: float,
+                                 max_tokens: int, timeout: float):
+        """Gemini SDK 原生异步接口 (client.aio)，不占用线程"""
+        meta = _new_meta()
+        try:
+            contents, config = self._gemini_request(messages, temperature, max_tokens, local=label == "GEMINI_LOCAL")
+            start_time = time.time()
+            response = await asyncio.wait_for(
+                client.aio.models.generate_content(model=self.model, contents=contents, config=config),
+                timeout
+            )
+            return self._gemini_result(response, time.time() - start_time, messages, meta, label)
+        except Exception as e:
+            meta["error"] = str(e) or type(e).__name__
+            meta["status_code"] = getattr(e, "code", None)
+            print(f"   ❌ {label} 请求异常: {meta['error']}")
             return None, meta
     
     def generate_stock_prediction(
@@ -402,7 +750,7 @@ class LLMClient:
                 print(f"   🔄 重试 {attempt}/{retries}...")
                 tracker.increment_retry()
                 
-            content, meta = self.chat(messages, temperature=0.5)
+            content, meta = self.chat(messages, temperature=0.5, use_cache=attempt == 0)
             last_meta = meta
             
             if content:
@@ -416,6 +764,7 @@ class LLMClient:
                     break
                 else:
                     print(f"   ⚠️ JSON 解析失败，原始内容:\n{content[:500]}...")
+                    self.evict_cached(messages, temperature=0.5)
         
         # 记录追踪结果
         tracker.set_tokens(
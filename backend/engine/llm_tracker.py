@@ -6,6 +6,7 @@ LLM 调用追踪模块
 import uuid
 import time
 import json
+from contextvars import ContextVar
 from datetime import datetime
 from typing import Optional, Dict, Any
 from dataclasses import dataclass, field, asdict
@@ -47,17 +48,32 @@ class LLMTrace:
 
 
 class LLMTracker:
-    """LLM 调用追踪器"""
+    """LLM 调用追踪器
+
+    当前追踪保存在 ContextVar 中: 每个 asyncio 任务 / 线程各自持有一条追踪，
+    多只股票、多个模型并发调用时不会互相覆盖
+    """
     
     def __init__(self):
-        self._current_trace: Optional[LLMTrace] = None
-        self._start_time: float = 0
+        self._context: ContextVar = ContextVar(f"llm_trace_{id(self)}", default=(None, 0.0))
+
+    @property
+    def _current_trace(self) -> Optional[LLMTrace]:
+        return self._context.get()[0]
+
+    @_current_trace.setter
+    def _current_trace(self, trace: Optional[LLMTrace]):
+        self._context.set((trace, self._start_time))
+
+    @property
+    def _start_time(self) -> float:
+        return self._context.get()[1]
         
     def start_trace(self, symbol: str = None, model: str = "") -> LLMTrace:
         """开始一次新的追踪"""
-        self._current_trace = LLMTrace(symbol=symbol, model=model)
-        self._start_time = time.time()
-        return self._current_trace
+        trace = LLMTrace(symbol=symbol, model=model)
+        self._context.set((trace, time.time()))
+        return trace
     
     def set_prompts(self, system_prompt: str, user_prompt: str):
         """记录提示词"""
@@ -0,0 +1,143 @@
+"""
+市场宽度物化表 (market_breadth)
+同步结束时按 (date, market) 增量汇总 daily_prices: 涨/跌家数、涨跌幅中位数、锚点指数涨跌幅
+ContextService 与分析提示词只读一行，不再每次扫描当日全市场行情再在 Python 里求中位数
+"""
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+try:
+    from backend.config import BEIJING_TZ
+    from backend.database import execute_with_retry
+    from backend.logger import logger
+except ImportError:
+    from config import BEIJING_TZ
+    from database import execute_with_retry
+    from logger import logger
+
+# 市场锚点 (指数代理)，同步时自动注入股票池
+MARKET_ANCHORS = ["02800", "sh000001", "510300"]
+ANCHOR_NAMES = {"02800": "恒生指数(ETF)", "sh000001": "上证指数", "510300": "沪深300"}
+
+MARKETS = ("CN", "HK")
+# 样本数低于该值时只展示锚点涨跌
+MIN_SAMPLE = 5
+# 首次构建时回溯的天数 (更早的日期由 ContextService 读取时按需补算)
+BACKFILL_DAYS = 400
+
+# 与 trading_calendar.get_market_from_symbol 一致: 5 位代码为港股
+_MARKET_SQL = "CASE WHEN length(symbol) = 5 THEN 'HK' ELSE 'CN' END"
+
+
+def _compute(cursor, where: str, params: tuple) -> List[tuple]:
+    """按 (date, market) 汇总 daily_prices 中满足条件的行，返回 market_breadth 入库行"""
+    cursor.execute(f"SELECT symbol, date, change_percent, {_MARKET_SQL} FROM daily_prices WHERE {where}", params)
+    df = pd.DataFrame(cursor.fetchall(), columns=["symbol", "date", "change", "market"])
+    if df.empty:
+        return []
+
+    is_anchor = df["symbol"].isin(MARKET_ANCHORS)
+    anchors: Dict[Tuple[str, str], Dict[str, float]] = {}
+    for symbol, date, change, market in df[is_anchor & df["change"].notna()].itertuples(index=False):
+        anchors.setdefault((date, market), {})[symbol] = float(change)
+
+    stocks = df[~is_anchor & df["change"].notna()]
+    stats = stocks.groupby(["date", "market"])["change"].agg(
+        sample_size="size",
+        advancers=lambda c: int((c > 0).sum()),
+        decliners=lambda c: int((c < 0).sum()),
+        median_change="median",
+    )
+
+    rows = []
+    for key in sorted(set(stats.index) | set(anchors)):
+        s = stats.loc[key] if key in stats.index else None
+        rows.append((
+            key[0], key[1],
+            int(s["sample_size"]) if s is not None else 0,
+            int(s["advancers"]) if s is not None else 0,
+            int(s["decliners"]) if s is not None else 0,
+            round(float(s["median_change"]), 4) if s is not None else None,
+            json.dumps(anchors.get(key, {})),
+        ))
+    return rows
+
+
+def _upsert(cursor, rows: List[tuple]):
+    if rows:
+        cursor.executemany("""
+            INSERT OR REPLACE INTO market_breadth
+            (date, market, sample_size, advancers, decliners, median_change, anchors, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now', '+8 hours'))
+        """, rows)
+
+
+def update_market_breadth(markets: Iterable[str] = MARKETS) -> int:
+    """
+    同步最后阶段: 增量重算各市场最近已汇总日期 (含) 之后的所有交易日
+    最近一天总是重算，覆盖同一天多次同步、补齐股票后的变化
+    """
+    def _update(conn):
+        cursor = conn.cursor()
+        total = 0
+        for market in markets:
+            cursor.execute("SELECT MAX(date) FROM market_breadth WHERE market = ?", (market,))
+            since = cursor.fetchone()[0] or (datetime.now(BEIJING_TZ) - timedelta(days=BACKFILL_DAYS)).strftime("%Y-%m-%d")
+            rows = _compute(cursor, f"date >= ? AND {_MARKET_SQL} = ?", (since, market))
+            _upsert(cursor, rows)
+            total += len(rows)
+        return total
+
+    total = execute_with_retry(_update, 3)
+    logger.info(f"📊 市场宽度已更新: {total} 个 (日期, 市场)")
+    return total
+
+
+def load_market_breadth(cursor, keys: Iterable[Tuple[str, str]], compute_missing: bool = False) -> Dict[Tuple[str, str], dict]:
+    """
+    读取多个 (date, market) 的市场宽度，返回 {(date, market): row}
+    compute_missing: 表中没有的日期当场从 daily_prices 补算 (调用方负责提交)
+        只写入同步已覆盖的日期 (不晚于该市场最近汇总日期); 更新的日期可能尚未同步完，只计算不写入，
+        否则 update_market_breadth 会以它为起点，跳过首次回溯并留下不完整的当日汇总
+    """
+    keys = sorted(set(keys))
+    if not keys:
+        return {}
+    cursor.execute(f"""
+        SELECT date, market, sample_size, advancers, decliners, median_change, anchors
+        FROM market_breadth WHERE (date, market) IN (VALUES {", ".join(["(?, ?)"] * len(keys))})
+    """, tuple(v for k in keys for v in k))
+    rows = cursor.fetchall()
+
+    found = {(r[0], r[1]) for r in rows}
+    missing = sorted({d for d, m in keys if (d, m) not in found})
+    if compute_missing and missing:
+        cursor.execute("SELECT market, MAX(date) FROM market_breadth GROUP BY market")
+        synced = dict(cursor.fetchall())
+        for date in missing:
+            computed = _compute(cursor, "date = ?", (date,))
+            _upsert(cursor, [r for r in computed if synced.get(r[1]) and r[0] <= synced[r[1]]])
+            rows.extend(r for r in computed if (r[0], r[1]) in keys and (r[0], r[1]) not in found)
+
+    return {(r[0], r[1]): {
+        "date": r[0], "market": r[1], "sample_size": r[2], "advancers": r[3], "decliners": r[4],
+        "median_change": r[5], "anchors": json.loads(r[6] or "{}"),
+    } for r in rows}
+
+
+def format_market_mood(breadth: Optional[dict]) -> str:
+    """把一行市场宽度格式化为一句市场情绪描述"""
+    if not breadth:
+        return "市场数据正在同步中。"
+
+    proxy_msg = "，".join(f"{ANCHOR_NAMES.get(sym, sym)} {'涨' if chg > 0 else '跌'} {abs(chg):.2f}%"
+                         for sym, chg in breadth["anchors"].items())
+    if breadth["sample_size"] < MIN_SAMPLE:
+        return proxy_msg or "市场数据正在同步中。"
+
+    scope = "全市场" if breadth["sample_size"] > 1000 else "核心观察池"
+    summary = f"({scope}涨{breadth['advancers']}/跌{breadth['decliners']}，中位数{breadth['median_change']:+.2f}%)"
+    return f"{proxy_msg}，{summary}" if proxy_msg else f"{scope}情绪{summary}"
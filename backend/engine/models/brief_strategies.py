@@ -8,7 +8,11 @@ from typing import Dict, Any, Optional
 import json
 
 from logger import logger
-from engine.llm_client import LLMClient
+try:
+    # 与其他调用方共享同一个模块实例 (限流器 / 响应缓存是模块级单例)
+    from backend.engine.llm_client import LLMClient
+except ImportError:
+    from engine.llm_client import LLMClient
 from config import DEFAULTS
 try:
     from backend.engine.brief_prompts import BRIEF_ASSISTANT_SYSTEM_PROMPT, BRIEF_COLUMNIST_SYSTEM_PROMPT
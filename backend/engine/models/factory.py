@@ -1,10 +1,18 @@
 import json
-from typing import Dict, Any, Type
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple, Type
 from .base import BasePredictionModel
-from backend.database import get_connection
+from backend.config import MODEL_REGISTRY_CONFIG
+from backend.database import pooled_connection
 
 class ModelFactory:
     _registry: Dict[str, Type[BasePredictionModel]] = {}
+    # 进程级实例缓存: model_id -> (配置行, 适配器实例)
+    _instances: Dict[str, Tuple[Dict[str, Any], BasePredictionModel]] = {}
+    _active: List[str] = []
+    _checked_at: Optional[float] = None
+    _lock = threading.Lock()
     
     @classmethod
     def register(cls, provider_type: str, model_class: Type[BasePredictionModel]):
@@ -12,31 +20,33 @@ class ModelFactory:
         
     @classmethod
     def create_model(cls, model_id: str) -> BasePredictionModel:
+        """按数据库配置新建一个模型实例 (不经过缓存)"""
         # 1. Fetch config from DB
-        conn = get_connection()
-        cursor = conn.cursor()
-        try:
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
             cursor.execute("SELECT * FROM prediction_models WHERE model_id = ?", (model_id,))
             # Adapt to row format
             row = cursor.fetchone()
-        finally:
-            conn.close()
+            columns = [d[0] for d in cursor.description]
         
         if not row:
             raise ValueError(f"Model ID '{model_id}' not found in registry.")
             
+        return cls._build(model_id, cls._row_to_dict(columns, row))
+
+    @staticmethod
+    def _row_to_dict(columns, row) -> Dict[str, Any]:
         # Convert row to dict robustly
-        columns = [d[0] for d in cursor.description]
         if isinstance(row, (tuple, list)):
-            row_dict = dict(zip(columns, row))
+            return dict(zip(columns, row))
         elif hasattr(row, 'keys'):
             # Works for sqlite3.Row / mapping
-            row_dict = dict(row)
+            return dict(row)
         else:
             # Fallback for libsql Row object which might be indexable
             # Try to zip with columns assuming order matches
             try:
-                row_dict = dict(zip(columns, row))
+                return dict(zip(columns, row))
             except:
                 # Last resort if it has attributes matching columns (unlikely given previous error)
                 # Or maybe it has .as_dict() ?
@@ -49,7 +59,10 @@ class ModelFactory:
                         # Try get item
                         try: row_dict[col] = row[columns.index(col)]
                         except: pass
+                return row_dict
 
+    @classmethod
+    def _build(cls, model_id: str, row_dict: Dict[str, Any]) -> BasePredictionModel:
         provider = row_dict.get('provider')
         config_json = row_dict.get('config_json') or '{}'
         capabilities_json = row_dict.get('capabilities_json') or '{}'
@@ -68,29 +81,51 @@ class ModelFactory:
         return model_class(model_id, config)
 
     @classmethod
-    def get_active_models(cls):
-        conn = get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("SELECT model_id FROM prediction_models WHERE is_active = 1 ORDER BY priority DESC")
-            rows = cursor.fetchall()
-        finally:
-            conn.close()
-        
-        models = []
-        for row in rows:
-            # Robustly access first column (model_id)
-            if isinstance(row, (tuple, list)):
-                mid = row[0]
-            elif hasattr(row, '__getitem__'):
-                mid = row[0]
-            else:
-                 # Try attribute if named row
-                 mid = getattr(row, 'model_id', None)
-                 
-            if mid:
+    def get_active_models(cls) -> List[BasePredictionModel]:
+        """
+        活动模型 (按 priority DESC)，返回进程内缓存的适配器实例 (连同其 LLMClient / HTTP 客户端保持预热)
+        每 check_interval 秒读取一次 prediction_models，只有配置行发生变化的模型才重建
+        """
+        with cls._lock:
+            interval = MODEL_REGISTRY_CONFIG.get("check_interval", 60)
+            if cls._checked_at is None or time.monotonic() - cls._checked_at >= interval:
+                cls._reload()
+            return [cls._instances[mid][1] for mid in cls._active]
+
+    @classmethod
+    def invalidate(cls):
+        """丢弃缓存的模型实例 (下次 get_active_models 时按最新配置重建)"""
+        with cls._lock:
+            cls._instances.clear()
+            cls._active = []
+            cls._checked_at = None
+
+    @classmethod
+    def _reload(cls):
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM prediction_models WHERE is_active = 1 ORDER BY priority DESC")
+            columns = [d[0] for d in cursor.description]
+            rows = [cls._row_to_dict(columns, row) for row in cursor.fetchall()]
+        cls._checked_at = time.monotonic()
+
+        active = []
+        for row_dict in rows:
+            mid = row_dict.get('model_id')
+            if not mid:
+                continue
+            cached = cls._instances.get(mid)
+            # 整行配置即版本: 任一字段变化都重建该模型，未变化的直接复用
+            if cached is None or cached[0] != row_dict:
                 try:
-                    models.append(cls.create_model(mid))
+                    cls._instances[mid] = (row_dict, cls._build(mid, row_dict))
                 except Exception as e:
+                    cls._instances.pop(mid, None)
                     print(f"⚠️ Failed to load model {mid}: {e}")
-        return models
+                    continue
+            active.append(mid)
+
+        # 已停用 / 删除的模型释放实例
+        for mid in set(cls._instances) - set(active):
+            del cls._instances[mid]
+        cls._active = active
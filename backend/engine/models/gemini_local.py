@@ -7,11 +7,14 @@ import json
 import os
 import time
 import asyncio
+import weakref
 from typing import Dict, Any, Tuple
 from .base import BasePredictionModel
 from backend.logger import logger
 from backend.engine.schema_normalizer import normalize_ai_response
 from backend.engine.llm_tracker import get_tracker, estimate_tokens
+from backend.engine.llm_client import get_llm_cache, llm_cache_key
+from backend.engine.rate_limiter import get_rate_limiter, limiter_key
 
 
 class GeminiLocalAdapter(BasePredictionModel):
@@ -32,20 +35,35 @@ class GeminiLocalAdapter(BasePredictionModel):
         self.model_name = config.get("model") or config.get("model_name", "gemini-3-flash")
         self.max_tokens = config.get("max_tokens", 4096)
         self.temperature = config.get("temperature", 0.7)
+        self.timeout = config.get("timeout", 60)
         
         # 初始化 Gemini SDK (指向本地代理)
         self._client = None
+        # SDK 的异步 HTTP 客户端绑定在首次使用它的事件循环上；
+        # 适配器由 ModelFactory 跨多次 asyncio.run 复用，所以每个事件循环各用一个 Client
+        self._loop_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
         if self.api_key:
             try:
-                from google import genai
-                # V2 SDK support custom endpoint via http_options
-                self._client = genai.Client(
-                    api_key=self.api_key,
-                    http_options={'base_url': self.base_url}
-                )
+                self._client = self._new_client()
                 logger.info(f"✅ GeminiLocalAdapter V2 初始化成功 -> {self.base_url}")
             except Exception as e:
                 logger.warning(f"⚠️ GeminiLocalAdapter V2 初始化失败: {e}")
+
+    def _new_client(self):
+        from google import genai
+        # V2 SDK support custom endpoint via http_options
+        return genai.Client(
+            api_key=self.api_key,
+            http_options={'base_url': self.base_url}
+        )
+
+    def _aio_client(self):
+        """当前事件循环专用的 SDK 异步客户端"""
+        loop = asyncio.get_running_loop()
+        client = self._loop_clients.get(loop)
+        if client is None:
+            client = self._loop_clients[loop] = self._new_client()
+        return client.aio
         
     async def predict(self, symbol: str, date: str, data: Dict[str, Any]) -> Dict[str, Any]:
         if not self.api_key or not self._client:
@@ -84,7 +102,7 @@ class GeminiLocalAdapter(BasePredictionModel):
 
             try:
                 # Call Gemini via SDK
-                content, meta = await self._chat_gemini_local(system_prompt, user_prompt)
+                content, meta = await self._chat_gemini_local(system_prompt, user_prompt, use_cache=attempt == 0)
             except Exception as e:
                 last_error = f"Client Error: {str(e)}"
                 logger.error(f"Gemini Local execution failed (attempt {attempt + 1}/{max_retries + 1}): {e}")
@@ -124,6 +142,8 @@ class GeminiLocalAdapter(BasePredictionModel):
             if not parsed:
                 last_error = "Failed to parse AI response"
                 logger.warning(f"Failed to parse JSON response for {self.model_id} (attempt {attempt + 1}/{max_retries + 1})")
+                # 无法解析的回复不留在响应缓存里
+                get_llm_cache().evict(self._cache_key(system_prompt, user_prompt))
                 
                 tracker.set_status("parse_failed", "JSON 解析失败")
                 tracker.end_trace()
@@ -160,10 +180,23 @@ class GeminiLocalAdapter(BasePredictionModel):
         # If loop finishes without success
         return self._error_result(f"Failed after {max_retries + 1} attempts. Last Error: {last_error}")
     
-    async def _chat_gemini_local(self, system_prompt: str, user_prompt: str) -> Tuple[str, Dict[str, Any]]:
+    def _cache_key(self, system_prompt: str, user_prompt: str) -> str:
+        return llm_cache_key("gemini_local", self.model_name, self.temperature, self.max_tokens,
+                             [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}])
+
+    async def _chat_gemini_local(self, system_prompt: str, user_prompt: str, use_cache: bool = True) -> Tuple[str, Dict[str, Any]]:
         """
-        通过 Gemini V2 SDK 调用本地代理
+        通过 Gemini V2 SDK 调用本地代理 (经过 LLM 响应缓存)
         """
+        cache = get_llm_cache()
+        key = None
+        if cache.enabled:
+            key = self._cache_key(system_prompt, user_prompt)
+            if use_cache:
+                hit = cache.lookup(key)
+                if hit:
+                    return hit
+
         meta = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0, "latency_ms": 0, "error": None}
         
         # 合并 system 和 user prompt (本地代理不支持 system_instruction)
@@ -186,17 +219,22 @@ class GeminiLocalAdapter(BasePredictionModel):
                 max_output_tokens=self.max_tokens
             )
             
-            # Run in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            
-            def _call():
-                return self._client.models.generate_content(
-                    model=self.model_name,
-                    contents=contents,
-                    config=config
-                )
-
-            response = await loop.run_in_executor(None, _call)
+            # SDK 原生异步接口 (不占用线程)，经过与 LLMClient 共享的自适应限流器
+            limiter = get_rate_limiter(limiter_key(self.base_url, "gemini_local"))
+            try:
+                async with limiter.slot():
+                    response = await asyncio.wait_for(
+                        self._aio_client().models.generate_content(
+                            model=self.model_name,
+                            contents=contents,
+                            config=config
+                        ),
+                        self.timeout
+                    )
+            except Exception as e:
+                limiter.record(ok=False, status_code=getattr(e, "code", None), error=str(e))
+                raise
+            limiter.record(ok=True)
             
             elapsed = time.time() - start_time
             meta["latency_ms"] = int(elapsed * 1000)
@@ -215,6 +253,8 @@ class GeminiLocalAdapter(BasePredictionModel):
                 meta["total_tokens"] = meta["input_tokens"] + meta["output_tokens"]
             
             logger.info(f"   🤖 GEMINI_LOCAL 响应成功 ({elapsed:.1f}s, {meta['total_tokens']} tokens)")
+            if key and content:
+                cache.store(key, content, meta)
             return content, meta
             
         except Exception as e:
@@ -78,17 +78,15 @@ class OpenAIAdapter(BasePredictionModel):
             if attempt > 0:
                 tracker._current_trace.retry_count = attempt
 
-            # Execute Chat via LLMClient in thread
+            # Execute Chat via LLMClient (async transport, shared connection pool)
             try:
-                loop = asyncio.get_event_loop()
-                content, meta = await loop.run_in_executor(
-                    None, 
-                    lambda: self.client.chat(
-                        messages, 
-                        model=self.model_name, 
-                        temperature=self.temperature, 
-                        max_tokens=self.max_tokens
-                    )
+                content, meta = await self.client.chat_async(
+                    messages, 
+                    model=self.model_name, 
+                    temperature=self.temperature, 
+                    max_tokens=self.max_tokens,
+                    # 重试时不读缓存，避免重放同一个无法解析的响应
+                    use_cache=attempt == 0
                 )
             except Exception as e:
                 error_str = str(e)
@@ -142,6 +140,9 @@ class OpenAIAdapter(BasePredictionModel):
             if not parsed:
                 last_error = "Failed to parse AI response"
                 logger.warning(f"Failed to parse JSON response for {self.model_id} (attempt {attempt + 1}/{max_retries + 1})")
+                # 无法解析的回复不留在响应缓存里
+                self.client.evict_cached(messages, model=self.model_name,
+                                         temperature=self.temperature, max_tokens=self.max_tokens)
                 
                 # Record Parse Failure Trace
                 tracker.set_status("parse_failed", "JSON 解析失败")
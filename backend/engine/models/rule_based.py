@@ -27,28 +27,28 @@ class RuleAdapter(BasePredictionModel):
             # Attempt to fetch extra context (Weekly/Monthly) locally since runner might not provide it
             # This makes RuleAdapter smarter than before
             from backend.database import get_connection
-            conn = get_connection()
-            cursor = conn.cursor()
-            
-            monthly_series = None
-            try:
-                cursor.execute("SELECT * FROM monthly_prices WHERE symbol = ? ORDER BY date DESC LIMIT 1", (symbol,))
-                m_row = cursor.fetchone()
-                if m_row:
-                    m_cols = [d[0] for d in cursor.description]
-                    monthly_series = pd.Series(dict(zip(m_cols, m_row)))
-            except: pass
-            
-            weekly_series = None
-            try:
-                cursor.execute("SELECT * FROM weekly_prices WHERE symbol = ? ORDER BY date DESC LIMIT 1", (symbol,))
-                w_row = cursor.fetchone()
-                if w_row:
-                    w_cols = [d[0] for d in cursor.description]
-                    weekly_series = pd.Series(dict(zip(w_cols, w_row)))
-            except: pass
-            
-            conn.close()
+            from backend.price_cache import get_price_cache
+            cache = get_price_cache()
+            m_row, w_row = cache.get_row(symbol, "monthly"), cache.get_row(symbol, "weekly")
+
+            def _latest(cursor, table):
+                try:
+                    cursor.execute(f"SELECT * FROM {table} WHERE symbol = ? ORDER BY date DESC LIMIT 1", (symbol,))
+                    row = cursor.fetchone()
+                    return dict(zip([d[0] for d in cursor.description], row)) if row else None
+                except: return None
+
+            if m_row is None or w_row is None:
+                conn = get_connection()
+                cursor = conn.cursor()
+                if m_row is None:
+                    m_row = _latest(cursor, "monthly_prices")
+                if w_row is None:
+                    w_row = _latest(cursor, "weekly_prices")
+                conn.close()
+
+            monthly_series = pd.Series(m_row) if m_row else None
+            weekly_series = pd.Series(w_row) if w_row else None
             
             # Call Quant Engine
             from backend.quant.engine import QuantEngine
@@ -85,7 +85,8 @@ class RuleAdapter(BasePredictionModel):
             logger.error(f"Rule Engine Error: {e}")
             return None
     
-    def _build_reasoning(self, signal: str, summary: str, analysis: str) -> str:
+    @staticmethod
+    def _build_reasoning(signal: str, summary: str, analysis: str) -> str:
         """Build a JSON-formatted reasoning string consistent with LLM output."""
         reasoning_data = {
             "signal": signal,
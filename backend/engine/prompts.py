@@ -1,101 +1,189 @@
 import json
 from typing import Dict, Any, List
-from database import get_connection, get_stock_profile
+from database import get_connection, execute_with_retry
+from price_cache import get_price_cache
+
+DAILY_HISTORY_COLUMNS = [
+    "date", "open", "high", "low", "close", "change_percent", "volume",
+    "ma5", "ma10", "ma20", "ma60",
+    "macd", "macd_signal", "macd_hist",
+    "rsi", "kdj_k", "kdj_d", "kdj_j",
+    "boll_upper", "boll_mid", "boll_lower"
+]
+PERIOD_HISTORY_COLUMNS = ["date", "open", "high", "low", "close", "change_percent", "volume", "ma20", "rsi", "macd_hist"]
+
+DAILY_HISTORY_LIMIT = 10
+PERIOD_HISTORY_LIMIT = 12
+AI_HISTORY_LIMIT = 5
+AI_HISTORY_COLUMNS = ["date", "signal", "confidence", "ai_reasoning", "validation_status", "actual_change", "model"]
+
+# 批量加载上下文时每组 SQL 覆盖的股票数 (每只股票 2 个参数)
+CONTEXT_BATCH_SYMBOLS = 200
+# 未指定日期时的截止日 (取各股票最新交易日)
+_LATEST_DATE = "9999-12-31"
+
 
 def fetch_full_analysis_context(symbol: str, as_of_date: str = None) -> Dict[str, Any]:
     """
     Fetch all raw data needed for a comprehensive stock analysis.
     This ensures strict parity between different models/run modes.
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # 1. Basic Meta
-    cursor.execute("SELECT name FROM stock_meta WHERE symbol = ?", (symbol,))
-    name_row = cursor.fetchone()
-    stock_name = name_row[0] if name_row else "未知股票"
-
-    # 1.1 Profile
-    profile_row = get_stock_profile(symbol)
-    profile = {}
-    if profile_row:
-        industry, main_bus, desc = profile_row
-        profile = {
-            "industry": industry or "未知",
-            "main_business": main_bus or "暂无",
-            "description": desc or "暂无简介"
-        }
-    
-    # 2. Latest/Target Day Price Action
-    if as_of_date:
-        cursor.execute("SELECT * FROM daily_prices WHERE symbol = ? AND date = ?", (symbol, as_of_date))
-    else:
-        cursor.execute("SELECT * FROM daily_prices WHERE symbol = ? ORDER BY date DESC LIMIT 1", (symbol,))
-    
-    columns = [description[0] for description in cursor.description]
-    row = cursor.fetchone()
-    if not row:
-        return {"error": f"未找到股票 {symbol} 的行情数据" + (f" (日期: {as_of_date})" if as_of_date else "")}
+    return fetch_analysis_contexts([symbol], as_of_date)[symbol]
 
-    latest_data = dict(zip(columns, row))
-    analysis_date = latest_data['date']
-    
-    # 3. History
-    # 3.1 Daily (10 days) - Include technical indicators for IndicatorStep & SynthesisStep
-    cursor.execute("""
-        SELECT date, open, high, low, close, change_percent, volume,
-               ma5, ma10, ma20, ma60,
-               macd, macd_signal, macd_hist,
-               rsi, kdj_k, kdj_d, kdj_j,
-               boll_upper, boll_mid, boll_lower
-        FROM daily_prices 
-        WHERE symbol = ? AND date <= ?
-        ORDER BY date DESC LIMIT 10
-    """, (symbol, analysis_date))
-    daily_history = [dict(zip([
-        "date", "open", "high", "low", "close", "change_percent", "volume",
-        "ma5", "ma10", "ma20", "ma60",
-        "macd", "macd_signal", "macd_hist",
-        "rsi", "kdj_k", "kdj_d", "kdj_j",
-        "boll_upper", "boll_mid", "boll_lower"
-    ], h)) for h in cursor.fetchall()]
-
-    # 3.2 Weekly (12 weeks)
-    cursor.execute("""
-        SELECT date, open, high, low, close, change_percent, volume, ma20, rsi, macd_hist
-        FROM weekly_prices 
-        WHERE symbol = ? AND date <= ?
-        ORDER BY date DESC LIMIT 12
-    """, (symbol, analysis_date))
-    weekly_history = [dict(zip(["date", "open", "high", "low", "close", "change_percent", "volume", "ma20", "rsi", "macd_hist"], w)) for w in cursor.fetchall()]
-    
-    # 3.3 Monthly (12 months)
-    cursor.execute("""
-        SELECT date, open, high, low, close, change_percent, volume, ma20, rsi, macd_hist
-        FROM monthly_prices 
-        WHERE symbol = ? AND date <= ?
-        ORDER BY date DESC LIMIT 12
-    """, (symbol, analysis_date))
-    monthly_history = [dict(zip(["date", "open", "high", "low", "close", "change_percent", "volume", "ma20", "rsi", "macd_hist"], m)) for m in cursor.fetchall()]
-
-    # 4 & 5. AI History & Accuracy
-    history_data = fetch_ai_history_for_model(symbol, analysis_date, cursor=cursor)
-    ai_history = history_data["ai_history"]
-    accuracy_stats = history_data["accuracy"]
 
+def fetch_analysis_contexts(symbols: List[str], as_of_date: str = None,
+                            model_history: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    批量构建多只股票的分析上下文 (as_of_date 为 None 时取各自最新交易日)
+    每只股票的结果与 fetch_full_analysis_context 的结构完全一致，缺行情时为 {"error": ...}
+    每 CONTEXT_BATCH_SYMBOLS 只股票固定 5 条窗口函数查询 (ROW_NUMBER() OVER (PARTITION BY symbol ...))，
+    本地行情缓存命中的部分不再查库
+
+    model_history: 同时加载每个模型自己的历史预测与准确率，放在 ctx["model_history"][model_id]
+    """
+    symbols = list(dict.fromkeys(symbols))
+    contexts = {}
+    for i in range(0, len(symbols), CONTEXT_BATCH_SYMBOLS):
+        chunk = symbols[i:i + CONTEXT_BATCH_SYMBOLS]
+        contexts.update(execute_with_retry(_load_contexts, 3, chunk, as_of_date, model_history))
+    return contexts
+
+
+def _latest_rows(cursor, table: str, cutoffs: Dict[str, str], limit: int, columns: List[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """每只股票 date <= cutoff 的最近 limit 行 (新 -> 旧，同 ORDER BY date DESC LIMIT)"""
+    if not cutoffs:
+        return {}
+    select = "p.*" if columns is None else ", ".join(f"p.{c}" for c in ["symbol"] + columns)
+    cursor.execute(f"""
+        WITH t(symbol, cutoff) AS (VALUES {", ".join(["(?, ?)"] * len(cutoffs))})
+        SELECT * FROM (
+            SELECT {select}, ROW_NUMBER() OVER (PARTITION BY p.symbol ORDER BY p.date DESC) AS rn
+            FROM {table} p JOIN t ON p.symbol = t.symbol AND p.date <= t.cutoff
+        ) WHERE rn <= ?
+        ORDER BY symbol, rn
+    """, (*[v for item in cutoffs.items() for v in item], limit))
+    names = [d[0] for d in cursor.description]
+    result: Dict[str, List[Dict[str, Any]]] = {}
+    for r in cursor.fetchall():
+        row = dict(zip(names, r))
+        del row["rn"]
+        result.setdefault(row["symbol"], []).append(row if columns is None else {c: row[c] for c in columns})
+    return result
+
+
+def _history_entry(rows: List[Dict[str, Any]], total: int, correct: int) -> Dict[str, Any]:
     return {
-        "symbol": symbol,
-        "name": stock_name,
-        "date": analysis_date,
-        "profile": profile,
-        "latest_data": latest_data,
-        "daily_prices": daily_history[::-1], 
-        "weekly_prices": weekly_history,
-        "monthly_prices": monthly_history,
-        "ai_history": ai_history,
-        "accuracy": accuracy_stats
+        "ai_history": rows,
+        "accuracy": {
+            "total": total,
+            "rate": (correct / total * 100) if total else 0
+        }
     }
 
+
+def _load_contexts(conn, symbols: List[str], as_of_date: str, model_history: bool) -> Dict[str, Dict[str, Any]]:
+    cursor = conn.cursor()
+    cache = get_price_cache()
+
+    # 1. Basic Meta & Profile
+    cursor.execute(f"""
+        SELECT symbol, name, industry, main_business, description
+        FROM stock_meta WHERE symbol IN ({", ".join(["?"] * len(symbols))})
+    """, tuple(symbols))
+    meta = {r[0]: r[1:] for r in cursor.fetchall()}
+
+    # 2. Latest/Target Day Price Action + 3. History (本地行情缓存优先，未命中的股票合并查库)
+    limits = {"daily": DAILY_HISTORY_LIMIT, "weekly": PERIOD_HISTORY_LIMIT, "monthly": PERIOD_HISTORY_LIMIT}
+    columns = {"daily": DAILY_HISTORY_COLUMNS, "weekly": PERIOD_HISTORY_COLUMNS, "monthly": PERIOD_HISTORY_COLUMNS}
+    latest: Dict[str, Dict[str, Any]] = {}
+    history: Dict[str, Dict[str, List[Dict[str, Any]]]] = {s: {} for s in symbols}
+    for symbol in symbols:
+        row = cache.get_row(symbol, "daily", as_of_date)
+        if row is None:
+            continue
+        latest[symbol] = row
+        for period in limits:
+            rows = cache.get_history(symbol, period, end_date=row["date"], limit=limits[period], columns=columns[period])
+            if rows is not None:
+                history[symbol][period] = rows
+
+    # 2 & 3.1 日线: 最新一行取全部列，历史取指标列
+    cutoffs = {s: latest[s]["date"] if s in latest else (as_of_date or _LATEST_DATE)
+               for s in symbols if "daily" not in history[s]}
+    for symbol, rows in _latest_rows(cursor, "daily_prices", cutoffs, DAILY_HISTORY_LIMIT).items():
+        if symbol not in latest:
+            if as_of_date and rows[0]["date"] != as_of_date:
+                continue
+            latest[symbol] = rows[0]
+        history[symbol]["daily"] = [{c: r[c] for c in DAILY_HISTORY_COLUMNS} for r in rows]
+
+    # 3.2 Weekly (12 weeks) / 3.3 Monthly (12 months)
+    for period in ("weekly", "monthly"):
+        cutoffs = {s: latest[s]["date"] for s in latest if period not in history[s]}
+        for symbol, rows in _latest_rows(cursor, f"{period}_prices", cutoffs, PERIOD_HISTORY_LIMIT, PERIOD_HISTORY_COLUMNS).items():
+            history[symbol][period] = rows
+
+    # 4 & 5. AI History & Accuracy: 主决策 (is_primary = 1) 与各模型各自的最近 5 条及累计准确率
+    primary: Dict[str, Dict[str, Any]] = {}
+    by_model: Dict[str, Dict[str, Dict[str, Any]]] = {s: {} for s in latest}
+    if latest:
+        cursor.execute(f"""
+            WITH t(symbol, cutoff) AS (VALUES {", ".join(["(?, ?)"] * len(latest))})
+            SELECT * FROM (
+                SELECT p.symbol, p.is_primary, {", ".join(f"p.{c}" for c in AI_HISTORY_COLUMNS[:-1])}, p.model_id,
+                       ROW_NUMBER() OVER (m ORDER BY p.date DESC) AS model_rn,
+                       COUNT(*) OVER m AS model_total,
+                       SUM(CASE WHEN p.validation_status = 'Correct' THEN 1 ELSE 0 END) OVER m AS model_correct,
+                       ROW_NUMBER() OVER (pr ORDER BY p.date DESC) AS primary_rn,
+                       COUNT(*) OVER pr AS primary_total,
+                       SUM(CASE WHEN p.validation_status = 'Correct' THEN 1 ELSE 0 END) OVER pr AS primary_correct
+                FROM ai_predictions_v2 p JOIN t ON p.symbol = t.symbol AND p.date < t.cutoff
+                WHERE p.validation_status != 'Pending'
+                WINDOW m AS (PARTITION BY p.symbol, p.model_id), pr AS (PARTITION BY p.symbol, p.is_primary)
+            )
+            WHERE (? AND model_rn <= ?) OR (is_primary = 1 AND primary_rn <= ?)
+            ORDER BY symbol, date DESC
+        """, (*[v for s in latest for v in (s, latest[s]["date"])], int(model_history), AI_HISTORY_LIMIT, AI_HISTORY_LIMIT))
+        for r in cursor.fetchall():
+            symbol, is_primary, item = r[0], r[1], dict(zip(AI_HISTORY_COLUMNS, r[2:9]))
+            model_rn, model_total, model_correct, primary_rn, primary_total, primary_correct = r[9:]
+            if is_primary == 1 and primary_rn <= AI_HISTORY_LIMIT:
+                primary.setdefault(symbol, _history_entry([], primary_total, primary_correct or 0))["ai_history"].append(item)
+            if model_history and model_rn <= AI_HISTORY_LIMIT:
+                by_model[symbol].setdefault(item["model"], _history_entry([], model_total, model_correct or 0))["ai_history"].append(item)
+
+    contexts = {}
+    for symbol in symbols:
+        if symbol not in latest:
+            contexts[symbol] = {"error": f"未找到股票 {symbol} 的行情数据" + (f" (日期: {as_of_date})" if as_of_date else "")}
+            continue
+
+        profile = {}
+        if symbol in meta:
+            _, industry, main_bus, desc = meta[symbol]
+            profile = {
+                "industry": industry or "未知",
+                "main_business": main_bus or "暂无",
+                "description": desc or "暂无简介"
+            }
+        history_data = primary.get(symbol) or _history_entry([], 0, 0)
+        ctx = {
+            "symbol": symbol,
+            "name": meta[symbol][0] if symbol in meta else "未知股票",
+            "date": latest[symbol]['date'],
+            "profile": profile,
+            "latest_data": latest[symbol],
+            "daily_prices": history[symbol].get("daily", [])[::-1],
+            "weekly_prices": history[symbol].get("weekly", []),
+            "monthly_prices": history[symbol].get("monthly", []),
+            "ai_history": history_data["ai_history"],
+            "accuracy": history_data["accuracy"]
+        }
+        if model_history:
+            ctx["model_history"] = by_model[symbol]
+        contexts[symbol] = ctx
+    return contexts
+
 def fetch_ai_history_for_model(symbol: str, analysis_date: str, model_id: str = None, cursor = None) -> Dict[str, Any]:
     """
     Fetch historical predictions for a specific model or the primary decisions.
@@ -0,0 +1,228 @@
+"""
+LLM 自适应限流器 (令牌桶 + AIMD)
+
+按上游服务 (base_url 主机) 共享一个限流器，也是该服务唯一的并发控制:
+  - 并发上限: 同时在途的请求数不超过 max_concurrency
+  - 令牌桶: rate 个/秒补充，最多累积 burst 个 (允许短时突发)；rate 为 None 时不限速率，只遵守 Retry-After
+  - AIMD: 每次成功 rate += increase_step (线性回升，直到 max_rate)；
+          遇到 429 时 rate *= decrease_factor (乘性下降，不低于 min_rate)，并遵守 Retry-After
+这样吞吐会收敛到服务端的真实配额，而不是一个写死的 QPS
+同步 (线程) 与异步调用方共用同一份状态
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+try:
+    from backend.config import LLM_RATE_LIMIT_CONFIG
+except ImportError:
+    from config import LLM_RATE_LIMIT_CONFIG
+try:
+    from backend.logger import logger
+except ImportError:
+    from logger import logger
+
+def limiter_key(base_url: Optional[str], fallback: str) -> str:
+    """限流维度: base_url 的主机名，没有 base_url 时用 fallback (通常是 provider 名)"""
+    if base_url:
+        return urlparse(base_url).netloc or base_url
+    return fallback
+
+
+def is_rate_limited(status_code: Optional[int] = None, error: str = None) -> bool:
+    if status_code == 429:
+        return True
+    text = str(error or "").lower()
+    return "429" in text or "rate limit" in text or "resource_exhausted" in text or "too many requests" in text
+
+
+class AdaptiveRateLimiter:
+    """单个上游服务的令牌桶 + 并发上限 + AIMD 速率调整 (线程安全)"""
+
+    def __init__(self, key: str, rate: Optional[float] = None, burst: float = None, max_concurrency: int = 4,
+                 min_rate: float = 0.2, max_rate: float = None, increase_step: float = 0.05,
+                 decrease_factor: float = 0.5):
+        self.key = key
+        self.min_rate = min_rate
+        if rate:
+            self.max_rate = max_rate or max(rate, min_rate)
+            self.rate = min(max(rate, min_rate), self.max_rate)
+            self.burst = max(1.0, burst if burst is not None else self.rate)
+        else:
+            # 未配置速率的服务不做令牌桶限速 (AIMD 也不生效)
+            self.max_rate = self.rate = None
+            self.burst = 1.0
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+
+        self._lock = threading.Lock()
+        self.max_concurrency = max(1, max_concurrency)
+        self._active = 0
+        # 等待并发名额的调用方 (FIFO): 异步为 (loop, future)，同步为 (None, threading.Event)
+        self._waiters = deque()
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self.stats = {"requests": 0, "rate_limited": 0, "waited_seconds": 0.0}
+
+    # ---------- 令牌 ----------
+
+    def _reserve(self) -> float:
+        """取一个令牌 (允许透支，按预约顺序排队)，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._blocked_until - now)
+            if self.rate is not None:
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                self._tokens -= 1
+                wait = max(wait, -self._tokens / self.rate)
+            self.stats["requests"] += 1
+            self.stats["waited_seconds"] += wait
+            return wait
+
+    # ---------- 并发名额 ----------
+    # 限流器被多个线程 / 事件循环共享，不能用绑定单个循环的 asyncio.Semaphore:
+    # 名额由 release() 直接移交给队首的等待者，异步等待者通过 call_soon_threadsafe 唤醒
+
+    def _try_take(self, waiter) -> bool:
+        """有空闲名额且无人排队时直接占用，否则把 waiter 排进队列 (调用方持有 self._lock)"""
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            return True
+        self._waiters.append(waiter)
+        return False
+
+    async def _acquire_slot(self):
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        waiter = (loop, fut)
+        with self._lock:
+            if self._try_take(waiter):
+                return
+        try:
+            await fut
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove(waiter)
+                    owned = False
+                except ValueError:
+                    # 已被移交: 名额归我们所有 (future 被取消的情况由 _grant 归还)
+                    owned = fut.done() and not fut.cancelled()
+            if owned:
+                self.release()
+            raise
+
+    def _grant(self, fut):
+        if fut.cancelled():
+            self.release()
+        else:
+            fut.set_result(None)
+
+    async def acquire(self):
+        await self._acquire_slot()
+        try:
+            wait = self._reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        except BaseException:
+            # 等待令牌时被取消 (如 wait_for 超时) 也要归还并发名额
+            self.release()
+            raise
+
+    def acquire_sync(self):
+        event = threading.Event()
+        with self._lock:
+            taken = self._try_take((None, event))
+        if not taken:
+            event.wait()
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                loop, waiter = self._waiters.popleft()
+                if loop is None:
+                    waiter.set()
+                    return
+                try:
+                    loop.call_soon_threadsafe(self._grant, waiter)
+                    return
+                except RuntimeError:
+                    continue   # 等待者所在的事件循环已关闭
+            self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield self
+        finally:
+            self.release()
+
+    @contextmanager
+    def slot_sync(self):
+        self.acquire_sync()
+        try:
+            yield self
+        finally:
+            self.release()
+
+    # ---------- AIMD 反馈 ----------
+
+    def on_success(self):
+        if self.rate is None:
+            return
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_rate_limited(self, retry_after: float = None):
+        with self._lock:
+            now = time.monotonic()
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            self.stats["rate_limited"] += 1
+            # 同一拥塞窗口内只降一次速，避免并发在途请求同时 429 时速率塌缩到下限
+            window = max(1.0 / self.rate, 1.0) if self.rate is not None else 1.0
+            if now - self._last_decrease < window:
+                return
+            self._last_decrease = now
+            if self.rate is not None:
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                self._tokens = min(self._tokens, 0.0)  # 清空突发额度
+            rate = self.rate
+        logger.warning(f"⚠️ [RateLimit] {self.key} 触发 429"
+                       + (f"，速率降至 {rate:.2f} req/s" if rate is not None else "")
+                       + (f"，暂停 {retry_after:.1f}s" if retry_after else ""))
+
+    def record(self, ok: bool, status_code: int = None, retry_after: float = None, error: str = None):
+        """根据一次调用的结果调整速率 (其他错误不影响速率)"""
+        if ok:
+            self.on_success()
+        elif is_rate_limited(status_code, error):
+            self.on_rate_limited(retry_after)
+
+
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(key: str) -> AdaptiveRateLimiter:
+    """获取 (或按配置创建) 某个上游服务的共享限流器"""
+    limiter = _limiters.get(key)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(key)
+            if limiter is None:
+                params = dict(LLM_RATE_LIMIT_CONFIG["default"])
+                params.update(LLM_RATE_LIMIT_CONFIG.get("overrides", {}).get(key, {}))
+                limiter = _limiters[key] = AdaptiveRateLimiter(key, **params)
+    return limiter
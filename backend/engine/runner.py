@@ -4,20 +4,23 @@ from typing import List, Dict, Any
 from datetime import datetime
 
 from backend.database import get_connection
+from backend.engine.done_keys import DoneKeySet
 from backend.engine.models.factory import ModelFactory
 from backend.trading_calendar import get_next_trading_day_str
 
 from backend.logger import logger
 
 class PredictionRunner:
-    def __init__(self, model_filter: str = None, force: bool = False):
+    def __init__(self, model_filter: str = None, force: bool = False, done_keys: DoneKeySet = None):
         """
         Args:
             model_filter: 指定要使用的模型 ID，如果为 None 则使用所有活动模型
             force: 是否强制重新运行已存在的预测
+            done_keys: 本次运行预加载的已有预测键 (symbol, date, model_id)；为 None 时逐条查库
         """
         self.model_filter = model_filter
         self.force = force
+        self.done_keys = done_keys
 
     async def run_analysis(self, symbol: str, date: str = None, data: Dict[str, Any] = None, force: bool = False):
         """
@@ -28,7 +31,7 @@ class PredictionRunner:
         logger.info(f"🏁 Starting Multi-Model Analysis for {symbol} on {date}")
         
         # 1. Get Active Models (Already sorted by priority DESC)
-        models = ModelFactory.get_active_models()
+        models = await asyncio.to_thread(ModelFactory.get_active_models)
         if not models:
             logger.warning("⚠️ No active models found!")
             return False
@@ -47,7 +50,7 @@ class PredictionRunner:
         if not data:
             try:
                 from backend.engine.prompts import fetch_full_analysis_context
-                data = fetch_full_analysis_context(symbol, date)
+                data = await asyncio.to_thread(fetch_full_analysis_context, symbol, date)
                 
                 if "error" in data:
                     logger.warning(f"⚠️ Data context fetch failed: {data['error']}")
@@ -66,6 +69,10 @@ class PredictionRunner:
         # 3. Parallel Execution (The Race)
         tasks = []
         from backend.engine.prompts import fetch_ai_history_for_model
+
+        # 批量预取的上下文 (fetch_analysis_contexts(..., model_history=True)) 已带各模型历史
+        data = dict(data)
+        model_history = data.pop("model_history", None)
         
         for model in models:
             # Model-specific data context: each model reviews its own history
@@ -74,7 +81,10 @@ class PredictionRunner:
             
             try:
                 # Overwrite the global primary history with model-specific historical data
-                history_data = fetch_ai_history_for_model(symbol, date, model_id=model.model_id)
+                if model_history is not None:
+                    history_data = model_history.get(model.model_id) or {"ai_history": [], "accuracy": {"total": 0, "rate": 0}}
+                else:
+                    history_data = await asyncio.to_thread(fetch_ai_history_for_model, symbol, date, model_id=model.model_id)
                 model_specific_data.update(history_data)
                 logger.info(f"📜 {model.model_id} history loaded: {len(model_specific_data['ai_history'])} records, {model_specific_data['accuracy']['rate']:.1f}% acc")
             except Exception as e:
@@ -84,7 +94,10 @@ class PredictionRunner:
             
         predictions = await asyncio.gather(*tasks)
         
-        # 4. Save Results & Determine Primary
+        # 4. Save Results & Determine Primary (同步数据库操作放到线程中，不阻塞其他股票)
+        return await asyncio.to_thread(self._save_predictions, symbol, date, predictions, models)
+
+    def _save_predictions(self, symbol: str, date: str, predictions: List[Dict[str, Any]], models):
         conn = get_connection()
         cursor = conn.cursor()
         
@@ -112,6 +125,7 @@ class PredictionRunner:
             existing_priority = -1
 
         saved_count = 0
+        saved_models = []
         primary_pred = None
         
         # Get priority map for ALL models from database (to handle filtered case)
@@ -160,6 +174,7 @@ class PredictionRunner:
                     pred.get('execution_time_ms', 0), is_primary
                 ))
                 saved_count += 1
+                saved_models.append(model_id)
             except Exception as e:
                 logger.error(f"Failed to save V2 result for {model_id}: {e}")
 
@@ -168,29 +183,42 @@ class PredictionRunner:
 
         conn.commit()
         conn.close()
+        if self.done_keys is not None:
+            for model_id in saved_models:
+                self.done_keys.add((symbol, date, model_id))
         logger.info(f"✅ Analysis completed for {symbol}. Saved {saved_count} results. Primary: {primary_pred['model_id'] if primary_pred else 'None'}")
         
         # Return the primary prediction result for use in notifications
         return primary_pred if primary_pred else True
 
+    async def has_prediction(self, symbol: str, date: str, model_id: str) -> bool:
+        """幂等性检查: 有预加载的键集合时只做内存查找"""
+        if self.done_keys is not None:
+            return (symbol, date, model_id) in self.done_keys
+        return await asyncio.to_thread(self._has_prediction, symbol, date, model_id)
+
+    @staticmethod
+    def _has_prediction(symbol: str, date: str, model_id: str) -> bool:
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT 1 FROM ai_predictions_v2 WHERE symbol = ? AND date = ? AND model_id = ? LIMIT 1",
+                (symbol, date, model_id)
+            )
+            return cursor.fetchone() is not None
+        finally:
+            conn.close()
+
     async def _safe_predict(self, model, symbol, date, data, force: bool = False):
         try:
             # 1. Idempotency check per model
             if not force:
-                conn = get_connection()
-                cursor = conn.cursor()
-                try:
-                    cursor.execute(
-                        "SELECT 1 FROM ai_predictions_v2 WHERE symbol = ? AND date = ? AND model_id = ? LIMIT 1",
-                        (symbol, date, model.model_id)
-                    )
-                    if cursor.fetchone():
-                        logger.debug(f"⏩ Model {model.model_id} already has prediction for {symbol} on {date}, bypassing.")
-                        return None
-                finally:
-                    conn.close()
-
-            # 2. Execute prediction
+                if await self.has_prediction(symbol, date, model.model_id):
+                    logger.debug(f"⏩ Model {model.model_id} already has prediction for {symbol} on {date}, bypassing.")
+                    return None
+
+            # 2. Execute prediction (每个上游服务的并发由共享的 LLM 限流器控制)
             result = await model.predict(symbol, date, data)
             if result is None:
                 return None
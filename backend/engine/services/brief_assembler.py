@@ -1,22 +1,100 @@
 import asyncio
 import os
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 
 try:
-    from backend.database import get_connection
+    from backend.config import BRIEF_GENERATION_CONFIG
+    from backend.database import get_connection, execute_with_retry
     from backend.logger import logger
-    from backend.notifications import send_push_notification
+    from backend.notifications import send_push_notification, flush_push_notifications
 except ImportError:
-    from database import get_connection
+    from config import BRIEF_GENERATION_CONFIG
+    from database import get_connection, execute_with_retry
     from logger import logger
     try:
-        from notifications import send_push_notification
+        from notifications import send_push_notification, flush_push_notifications
     except ImportError:
         # Fallback for notification if not found
         def send_push_notification(**kwargs):
             logger.warning("send_push_notification not found, notification skipped")
 
+        def flush_push_notifications(timeout=None):
+            return True
+
+# 单条多行 INSERT 的行数 (每行 4 个参数，低于 SQLite 999 变量上限)
+DAILY_BRIEF_INSERT_ROWS = 200
+# 单条 IN (...) 查询 / UPDATE 的 user_id 个数
+USER_CHUNK_SIZE = 500
+
+
+def _render_brief(date_str: str, watchlist_count: int, stock_reports: List[tuple], timestamp: str) -> Tuple[str, str]:
+    """
+    把 (symbol, stock_name, analysis_markdown, signal) 列表渲染成用户简报 Markdown 与推送文案
+    单用户与批量组装共用，保证两条路径输出一致
+    """
+    brief_sections = []
+    brief_sections.append(f"# 📊 每日简报 - {date_str}\n")
+    brief_sections.append(f"个人定制，基于您关注的 {watchlist_count} 只股票。\n\n---\n")
+
+    for symbol, name, analysis, signal in stock_reports:
+        stock_name = name or symbol
+        brief_sections.append(f"### {stock_name} ({symbol})")
+        brief_sections.append(f"{analysis}\n\n")
+
+    brief_sections.append("---\n")
+    brief_sections.append(f"*StockWise AI 生成于 {timestamp}*")
+
+    full_brief = "\n".join(brief_sections)
+
+    # Intelligent Hook Generation
+    bullish_stocks = []
+    bearish_stocks = []
+
+    for symbol, name, _, signal in stock_reports:
+        s_name = name or symbol
+        if signal and ('Long' in signal or 'Bullish' in signal):
+            bullish_stocks.append(s_name)
+        elif signal and ('Short' in signal or 'Bearish' in signal):
+            bearish_stocks.append(s_name)
+
+    if bullish_stocks:
+        top_stocks = "、".join(bullish_stocks[:2])
+        etc = "等" if len(bullish_stocks) > 2 else ""
+        push_hook = f"📈 {top_stocks}{etc}出现看涨信号，点击查看今日 AI 复盘。"
+    elif bearish_stocks:
+        top_stocks = "、".join(bearish_stocks[:2])
+        etc = "等" if len(bearish_stocks) > 2 else ""
+        push_hook = f"⚠️ {top_stocks}{etc}面临调整压力，点击查看风险提示。"
+    else:
+        push_hook = f"今日复盘：{watchlist_count} 只股票走势平稳，点击查看详情。"
+
+    return full_brief, push_hook
+
+
+def _render_notification(user_tier: str, push_hook: str) -> Tuple[str, str]:
+    """Render title/body of the daily brief push using the unified template engine."""
+    try:
+        from notification_templates import NotificationTemplates
+    except ImportError:
+        try:
+            from backend.notification_templates import NotificationTemplates
+        except ImportError:
+            # Basic mock for absolute safety during refactor
+            class NotificationTemplates:
+                @staticmethod
+                def render(ntype, tier, **kwargs):
+                    if tier == 'pro':
+                        return "⭐ Pro 深度复盘已就绪", f"{kwargs.get('push_hook')} | 首席主笔深度解读"
+                    return "📊 今日简报已生成", kwargs.get('push_hook')
+
+    return NotificationTemplates.render(
+        "daily_brief",
+        tier=user_tier,
+        push_hook=push_hook
+    )
+
+
 async def assemble_user_brief(user_id: str, date_str: str) -> Optional[str]:
     """
     Phase 2: Assemble personalized brief from `stock_briefs`.
@@ -26,17 +104,17 @@ async def assemble_user_brief(user_id: str, date_str: str) -> Optional[str]:
     conn = get_connection()
     try:
         cursor = conn.cursor()
-        
+
         # 0. Get user subscription tier
         cursor.execute("SELECT subscription_tier FROM users WHERE user_id = ?", (user_id,))
         tier_row = cursor.fetchone()
         user_tier = tier_row[0] if tier_row and tier_row[0] else 'free'
         logger.info(f"👤 User {user_id} tier: {user_tier}")
-        
+
         # 1. Get user watchlist
         cursor.execute("SELECT symbol FROM user_watchlist WHERE user_id = ?", (user_id,))
         watchlist = [r[0] for r in cursor.fetchall()]
-        
+
         if not watchlist:
             return None
 
@@ -47,9 +125,9 @@ async def assemble_user_brief(user_id: str, date_str: str) -> Optional[str]:
             FROM stock_briefs
             WHERE symbol IN ({placeholders}) AND date = ? AND tier = ?
         """, (*watchlist, date_str, user_tier))
-        
+
         stock_reports = cursor.fetchall()
-        
+
         # Fallback: If PRO user has no pro briefs, try free tier as backup
         if not stock_reports and user_tier == 'pro':
             logger.warning(f"⚠️ No PRO briefs for user {user_id}, falling back to FREE tier...")
@@ -59,48 +137,14 @@ async def assemble_user_brief(user_id: str, date_str: str) -> Optional[str]:
                 WHERE symbol IN ({placeholders}) AND date = ? AND tier = 'free'
             """, (*watchlist, date_str))
             stock_reports = cursor.fetchall()
-        
+
         if not stock_reports:
             logger.warning(f"⚠️ User {user_id} (tier={user_tier}) has watchlist but no stock briefs found for {date_str}. Did Phase 1 run?")
             return None
 
-        # 3. Assemble Markdown
-        brief_sections = []
-        brief_sections.append(f"# 📊 每日简报 - {date_str}\n")
-        brief_sections.append(f"个人定制，基于您关注的 {len(watchlist)} 只股票。\n\n---\n")
-        
-        for symbol, name, analysis, signal in stock_reports:
-            stock_name = name or symbol
-            brief_sections.append(f"### {stock_name} ({symbol})")
-            brief_sections.append(f"{analysis}\n\n")
-
-        timestamp = datetime.now().strftime("%H:%M")
-        brief_sections.append("---\n")
-        brief_sections.append(f"*StockWise AI 生成于 {timestamp}*")
-        
-        full_brief = "\n".join(brief_sections)
-        
-        # Intelligent Hook Generation
-        bullish_stocks = []
-        bearish_stocks = []
-        
-        for symbol, name, _, signal in stock_reports:
-             s_name = name or symbol
-             if signal and ('Long' in signal or 'Bullish' in signal):
-                 bullish_stocks.append(s_name)
-             elif signal and ('Short' in signal or 'Bearish' in signal):
-                 bearish_stocks.append(s_name)
-        
-        if bullish_stocks:
-            top_stocks = "、".join(bullish_stocks[:2])
-            etc = "等" if len(bullish_stocks) > 2 else ""
-            push_hook = f"📈 {top_stocks}{etc}出现看涨信号，点击查看今日 AI 复盘。"
-        elif bearish_stocks:
-            top_stocks = "、".join(bearish_stocks[:2])
-            etc = "等" if len(bearish_stocks) > 2 else ""
-            push_hook = f"⚠️ {top_stocks}{etc}面临调整压力，点击查看风险提示。"
-        else:
-            push_hook = f"今日复盘：{len(watchlist)} 只股票走势平稳，点击查看详情。"
+        # 3. Assemble Markdown + push hook
+        full_brief, push_hook = _render_brief(date_str, len(watchlist), stock_reports,
+                                              datetime.now().strftime("%H:%M"))
 
         # 4. Save User Brief
         cursor.execute("""
@@ -108,7 +152,7 @@ async def assemble_user_brief(user_id: str, date_str: str) -> Optional[str]:
             VALUES (?, ?, ?, ?)
         """, (user_id, date_str, full_brief, push_hook))
         conn.commit()
-        
+
         return full_brief
 
     except Exception as e:
@@ -117,6 +161,151 @@ async def assemble_user_brief(user_id: str, date_str: str) -> Optional[str]:
     finally:
         conn.close()
 
+
+def _load_phase2_inputs(conn, date_str: str, target_tier: str = None) -> Dict[str, Any]:
+    """一次性读取 Phase 2 需要的全部数据: 自选股+等级、当日 stock_briefs、推送订阅、已通知用户"""
+    cursor = conn.cursor()
+
+    # 1. 所有用户的自选股与订阅等级 (一条 JOIN，按用户聚合)
+    sql = """
+        SELECT w.user_id, w.symbol, u.subscription_tier
+        FROM user_watchlist w LEFT JOIN users u ON u.user_id = w.user_id
+    """
+    params: tuple = ()
+    if target_tier:
+        sql += " WHERE u.subscription_tier = ?"
+        params = (target_tier,)
+    cursor.execute(sql + " ORDER BY w.user_id, w.rowid", params)
+
+    users: Dict[str, Dict[str, Any]] = {}
+    for user_id, symbol, tier in cursor.fetchall():
+        user = users.setdefault(user_id, {"tier": tier or 'free', "watchlist": []})
+        user["watchlist"].append(symbol)
+
+    # 2. 当日全部个股简报，按 (symbol, tier) 索引
+    cursor.execute("""
+        SELECT symbol, tier, stock_name, analysis_markdown, signal
+        FROM stock_briefs WHERE date = ?
+    """, (date_str,))
+    briefs = {(symbol, tier): (symbol, name, analysis, signal)
+              for symbol, tier, name, analysis, signal in cursor.fetchall()}
+
+    # 3. 有推送订阅的用户 & 当日已经通知过的用户
+    cursor.execute("SELECT DISTINCT user_id FROM push_subscriptions")
+    subscribed = {r[0] for r in cursor.fetchall()}
+    cursor.execute("SELECT user_id FROM daily_briefs WHERE date = ? AND notified_at IS NOT NULL", (date_str,))
+    notified = {r[0] for r in cursor.fetchall()}
+
+    return {"users": users, "briefs": briefs, "subscribed": subscribed, "notified": notified}
+
+
+def _write_daily_briefs(conn, rows: List[tuple]) -> int:
+    """
+    多行 UPSERT daily_briefs: 覆盖 content / push_hook / created_at，保留 notified_at，
+    同一天重跑 Phase 2 不会重复推送
+    """
+    cursor = conn.cursor()
+    for i in range(0, len(rows), DAILY_BRIEF_INSERT_ROWS):
+        chunk = rows[i:i + DAILY_BRIEF_INSERT_ROWS]
+        cursor.execute(f"""
+            INSERT INTO daily_briefs (user_id, date, content, push_hook)
+            VALUES {", ".join(["(?, ?, ?, ?)"] * len(chunk))}
+            ON CONFLICT(user_id, date) DO UPDATE SET
+                content = excluded.content,
+                push_hook = excluded.push_hook,
+                created_at = excluded.created_at
+        """, tuple(v for row in chunk for v in row))
+    return len(rows)
+
+
+def _mark_notified(conn, date_str: str, user_ids: List[str]) -> int:
+    cursor = conn.cursor()
+    for i in range(0, len(user_ids), USER_CHUNK_SIZE):
+        chunk = user_ids[i:i + USER_CHUNK_SIZE]
+        cursor.execute(f"""
+            UPDATE daily_briefs SET notified_at = datetime('now', '+8 hours')
+            WHERE date = ? AND user_id IN ({", ".join("?" * len(chunk))})
+        """, (date_str, *chunk))
+    return len(user_ids)
+
+
+def _assemble_all(date_str: str, target_tier: str = None) -> Dict[str, Any]:
+    data = execute_with_retry(_load_phase2_inputs, 3, date_str, target_tier)
+    briefs = data["briefs"]
+    timestamp = datetime.now().strftime("%H:%M")
+
+    rows: List[tuple] = []
+    pending: List[Tuple[str, str, str]] = []
+    missing = 0
+    for user_id, user in data["users"].items():
+        user_tier, watchlist = user["tier"], user["watchlist"]
+        stock_reports = [briefs[(s, user_tier)] for s in watchlist if (s, user_tier) in briefs]
+        # Fallback: If PRO user has no pro briefs, try free tier as backup
+        if not stock_reports and user_tier == 'pro':
+            stock_reports = [briefs[(s, 'free')] for s in watchlist if (s, 'free') in briefs]
+        if not stock_reports:
+            missing += 1
+            continue
+
+        full_brief, push_hook = _render_brief(date_str, len(watchlist), stock_reports, timestamp)
+        rows.append((user_id, date_str, full_brief, push_hook))
+        if user_id in data["subscribed"] and user_id not in data["notified"]:
+            pending.append((user_id, user_tier, push_hook))
+
+    # 分事务写入，单个事务不超过 write_batch_rows * DAILY_BRIEF_INSERT_ROWS 行
+    txn_rows = max(1, BRIEF_GENERATION_CONFIG["write_batch_rows"]) * DAILY_BRIEF_INSERT_ROWS
+    for i in range(0, len(rows), txn_rows):
+        execute_with_retry(_write_daily_briefs, 3, rows[i:i + txn_rows])
+
+    return {"users": len(data["users"]), "assembled": len(rows), "missing": missing, "pending": pending}
+
+
+async def assemble_all_user_briefs(date_str: str, target_tier: str = None) -> Dict[str, Any]:
+    """
+    Phase 2 (bulk): 几条查询读出所有用户的自选股/等级/订阅与当日 stock_briefs，
+    在内存中渲染全部简报，再以多行批量写入 daily_briefs
+    返回统计信息，其中 pending 为待推送的 (user_id, tier, push_hook)
+    """
+    start = datetime.now()
+    result = await asyncio.to_thread(_assemble_all, date_str, target_tier)
+    elapsed = (datetime.now() - start).total_seconds()
+    logger.info(f"👥 [Phase 2] Assembled {result['assembled']}/{result['users']} user briefs in {elapsed:.2f}s "
+                f"({result['missing']} without stock briefs, {len(result['pending'])} to notify)")
+    if result["missing"]:
+        logger.warning(f"⚠️ [Phase 2] {result['missing']} users have watchlists but no stock briefs for {date_str}. Did Phase 1 run?")
+    return result
+
+
+async def notify_user_briefs(date_str: str, pending: List[Tuple[str, str, str]]) -> int:
+    """
+    Queue the brief-ready notification for every pending (user_id, tier, push_hook),
+    wait for the push dispatcher to drain, then mark them notified in chunked UPDATEs.
+    """
+    if not pending:
+        return 0
+
+    sent: List[str] = []
+    for user_id, user_tier, push_hook in pending:
+        try:
+            notify_title, notify_body = _render_notification(user_tier, push_hook or "点击查看今日 AI 复盘")
+            # 入队即返回: 相同文案的用户由 PushDispatcher 合并为批量请求
+            send_push_notification(
+                title=notify_title,
+                body=notify_body,
+                url="/dashboard?brief=true",
+                target_user_id=user_id,
+                tag="daily_brief"
+            )
+            sent.append(user_id)
+        except Exception as e:
+            logger.error(f"❌ [Notify] Failed to notify user {user_id}: {e}")
+
+    await asyncio.to_thread(flush_push_notifications)
+    await asyncio.to_thread(execute_with_retry, _mark_notified, 3, date_str, sent)
+    logger.info(f"✅ [Notify] {len(sent)}/{len(pending)} users notified for brief {date_str}")
+    return len(sent)
+
+
 async def notify_user_brief_ready(user_id: str, date_str: str):
     """
     Send push notification to user immediately after their brief is ready.
@@ -125,22 +314,22 @@ async def notify_user_brief_ready(user_id: str, date_str: str):
     conn = get_connection()
     try:
         cursor = conn.cursor()
-        
+
         # 1. Idempotency Check
         cursor.execute(
             "SELECT notified_at FROM daily_briefs WHERE user_id = ? AND date = ?",
             (user_id, date_str)
         )
         row = cursor.fetchone()
-        
+
         if not row:
             logger.warning(f"⚠️ [Notify] User {user_id} has no brief for {date_str}, skipping notification")
             return
-        
+
         if row[0]:  # notified_at is not NULL
             logger.debug(f"ℹ️ [Notify] User {user_id} already notified at {row[0]}, skipping")
             return
-        
+
         # 2. Subscription Check
         cursor.execute(
             "SELECT 1 FROM push_subscriptions WHERE user_id = ? LIMIT 1",
@@ -149,7 +338,7 @@ async def notify_user_brief_ready(user_id: str, date_str: str):
         if not cursor.fetchone():
             logger.info(f"ℹ️ [Notify] User {user_id} has no push subscription, skipping notification")
             return
-        
+
         # 3. Get user tier
         cursor.execute(
             "SELECT subscription_tier FROM users WHERE user_id = ?",
@@ -157,7 +346,7 @@ async def notify_user_brief_ready(user_id: str, date_str: str):
         )
         tier_row = cursor.fetchone()
         user_tier = tier_row[0] if tier_row and tier_row[0] else 'free'
-        
+
         # 4. Get push_hook
         cursor.execute(
             "SELECT push_hook FROM daily_briefs WHERE user_id = ? AND date = ?",
@@ -165,28 +354,10 @@ async def notify_user_brief_ready(user_id: str, date_str: str):
         )
         row = cursor.fetchone()
         push_hook = row[0] if row and row[0] else "点击查看今日 AI 复盘"
-        
+
         # 5. Render & Send notification using unified template engine
-        try:
-            from notification_templates import NotificationTemplates
-        except ImportError:
-            try:
-                from backend.notification_templates import NotificationTemplates
-            except ImportError:
-                # Basic mock for absolute safety during refactor
-                class NotificationTemplates:
-                    @staticmethod
-                    def render(ntype, tier, **kwargs):
-                        if tier == 'pro': 
-                            return "⭐ Pro 深度复盘已就绪", f"{kwargs.get('push_hook')} | 首席主笔深度解读"
-                        return "📊 今日简报已生成", kwargs.get('push_hook')
-
-        notify_title, notify_body = NotificationTemplates.render(
-            "daily_brief", 
-            tier=user_tier, 
-            push_hook=push_hook
-        )
-        
+        notify_title, notify_body = _render_notification(user_tier, push_hook)
+
         send_push_notification(
             title=notify_title,
             body=notify_body,
@@ -194,16 +365,16 @@ async def notify_user_brief_ready(user_id: str, date_str: str):
             target_user_id=user_id,
             tag="daily_brief"
         )
-        
+
         # 6. Mark as notified (UTC+8 workaround)
         cursor.execute(
             "UPDATE daily_briefs SET notified_at = datetime('now', '+8 hours') WHERE user_id = ? AND date = ?",
             (user_id, date_str)
         )
         conn.commit()
-        
+
         logger.info(f"✅ [Notify] User {user_id} notified for brief {date_str}")
-        
+
     except Exception as e:
         logger.error(f"❌ [Notify] Failed to notify user {user_id}: {e}")
     finally:
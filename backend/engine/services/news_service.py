@@ -1,9 +1,25 @@
+"""
+个股新闻服务 (EastMoney 搜索 + 本地 news_articles 存储)
+
+- news_articles: 按 (symbol, article_id) 去重保存与个股相关的文章
+- news_fetch_state: 每只股票的抓取水位 (上次抓取时间 / 已见最新文章时间)
+水位在新鲜度 TTL 内、或目标日期早于上次抓取日期时直接读库，不发网络请求；
+否则请求一次 EastMoney，只写入库里没有的新文章，再统一从库中读取并过滤
+"""
 import asyncio
+import hashlib
 import json
 import re
 import requests
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict
+
+try:
+    from backend.config import BEIJING_TZ, NEWS_CONFIG
+    from backend.database import execute_with_retry
+except ImportError:
+    from config import BEIJING_TZ, NEWS_CONFIG
+    from database import execute_with_retry
 
 try:
     from backend.logger import logger
@@ -14,131 +30,198 @@ except ImportError:
         import logging
         logger = logging.getLogger(__name__)
 
-async def fetch_news_for_stock(symbol: str, stock_name: str, target_date: str = None) -> str:
-    """Fetch news using EastMoney API (Free & Real-time for CN/HK) and filter by date if provided."""
-    
-    def _fetch_sync():
-        url = "http://search-api-web.eastmoney.com/search/jsonp"
-        params = {
-            "cb": "jQuery_callback",
-            "param": json.dumps({
-                "uid": "",
-                "keyword": symbol, # Search by symbol primarily
-                "type": ["cmsArticle"],
-                "client": "web",
-                "clientType": "web", 
-                "clientVersion": "curr",
-                "param": {
-                    "cmsArticle": {
-                        "searchScope": "default",
-                        "sort": "default",
-                        "pageIndex": 1,
-                        "pageSize": 50, # Fetch more to filter later
-                        "preTag": "",
-                        "postTag": ""
-                    }
+# 以目标日期为准，允许的新闻回溯天数 (覆盖整个周末)
+NEWS_WINDOW_DAYS = 5
+# 每只股票最多输出的新闻条数
+NEWS_LIMIT = 5
+_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _fetch_sync(symbol: str) -> Optional[str]:
+    """单次请求 EastMoney 搜索接口，返回 JSONP 文本 (HTTP 错误抛出异常)"""
+    url = "http://search-api-web.eastmoney.com/search/jsonp"
+    params = {
+        "cb": "jQuery_callback",
+        "param": json.dumps({
+            "uid": "",
+            "keyword": symbol, # Search by symbol primarily
+            "type": ["cmsArticle"],
+            "client": "web",
+            "clientType": "web",
+            "clientVersion": "curr",
+            "param": {
+                "cmsArticle": {
+                    "searchScope": "default",
+                    "sort": "default",
+                    "pageIndex": 1,
+                    "pageSize": NEWS_CONFIG["page_size"], # Fetch more to filter later
+                    "preTag": "",
+                    "postTag": ""
                 }
-            })
-        }
-        
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-            "Referer": f"https://so.eastmoney.com/news/s?keyword={symbol}"
-        }
-
-        max_retries = 3
-        retry_delay = 2
-        
-        for attempt in range(max_retries):
-            try:
-                resp = requests.get(url, params=params, headers=headers, timeout=10)
-                resp.raise_for_status()  # Raise on HTTP errors (4xx, 5xx)
-                return resp.text
-            except requests.exceptions.RequestException as e:
-                if attempt < max_retries - 1:
-                    wait_time = retry_delay * (2 ** attempt)
-                    logger.warning(f"⚠️ [EastMoney] Attempt {attempt + 1}/{max_retries} failed for {symbol}: {e}. Retrying in {wait_time}s...")
-                    import time as time_module
-                    time_module.sleep(wait_time)
-                else:
-                    logger.error(f"❌ [EastMoney] All {max_retries} attempts failed for {symbol}: {e}")
-                    return None
-        return None
-
-    # Execute request in thread pool to avoid blocking
-    resp_text = await asyncio.to_thread(_fetch_sync)
-    
-    if not resp_text:
-        return "News retrieval failed."
-
-    # Parse JSONP
+            }
+        })
+    }
+
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+        "Referer": f"https://so.eastmoney.com/news/s?keyword={symbol}"
+    }
+
+    resp = requests.get(url, params=params, headers=headers, timeout=10)
+    resp.raise_for_status()  # Raise on HTTP errors (4xx, 5xx)
+    return resp.text
+
+
+async def _fetch_remote(symbol: str) -> Optional[str]:
+    """带指数退避的重试 (等待用 asyncio.sleep，不占用线程)，全部失败返回 None"""
+    max_retries = 3
+    retry_delay = 2
+
+    for attempt in range(max_retries):
+        try:
+            # Execute request in thread pool to avoid blocking
+            return await asyncio.to_thread(_fetch_sync, symbol)
+        except requests.exceptions.RequestException as e:
+            if attempt < max_retries - 1:
+                wait_time = retry_delay * (2 ** attempt)
+                logger.warning(f"⚠️ [EastMoney] Attempt {attempt + 1}/{max_retries} failed for {symbol}: {e}. Retrying in {wait_time}s...")
+                await asyncio.sleep(wait_time)
+            else:
+                logger.error(f"❌ [EastMoney] All {max_retries} attempts failed for {symbol}: {e}")
+    return None
+
+
+def parse_articles(resp_text: str, symbol: str, stock_name: str = None) -> List[Dict[str, str]]:
+    """解析 JSONP 响应，只保留标题中包含代码或名称的文章"""
     match = re.search(r'^[^(]*\((.*)\);?$', resp_text.strip(), re.DOTALL)
     if not match:
-        return "No significant news found."
+        return []
+
+    data = json.loads(match.group(1))
+    # Ensure 'result' and 'cmsArticle' exist, handle None or missing keys gracefully
+    result = data.get("result") or {}
+    articles = result.get("cmsArticle") or []
+
+    # Filter: Symbol OR Name in title
+    # EastMoney search by 'keyword' (symbol) might return irrelevant results if we don't filter
+    filter_terms = [symbol]
+    if stock_name:
+        filter_terms.append(stock_name)
+
+    parsed = []
+    for a in articles:
+        title = a.get("title") or ""
+        if not any(term.lower() in title.lower() for term in filter_terms):
+            continue
+        published_at = a.get("date") or ""
+        article_id = a.get("code") or a.get("url") or hashlib.sha1(f"{title}|{published_at}".encode()).hexdigest()
+        parsed.append({
+            "article_id": str(article_id),
+            "title": title.replace("<em>", "").replace("</em>", ""),
+            "content": (a.get("content") or "")[:300],
+            "published_at": published_at,
+            "media": a.get("mediaName") or "EastMoney",
+            "url": a.get("url"),
+        })
+    return parsed
+
 
+def _load_state(conn, symbol: str):
+    cursor = conn.cursor()
+    cursor.execute("SELECT last_fetched_at, last_seen_at FROM news_fetch_state WHERE symbol = ?", (symbol,))
+    return cursor.fetchone()
+
+
+def _save_articles(conn, symbol: str, articles: List[Dict[str, str]], fetched_at: str) -> int:
+    """写入新文章 (已存在的 article_id 跳过) 并推进水位，返回新增条数"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM news_articles WHERE symbol = ?", (symbol,))
+    before = cursor.fetchone()[0]
+    cursor.executemany("""
+        INSERT OR IGNORE INTO news_articles (symbol, article_id, title, content, published_at, media, url, fetched_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [(symbol, a["article_id"], a["title"], a["content"], a["published_at"], a["media"], a["url"], fetched_at)
+          for a in articles])
+
+    # 超过保留期的文章清理掉
+    cutoff = (datetime.strptime(fetched_at, _TIME_FORMAT) - timedelta(days=NEWS_CONFIG["retention_days"])).strftime("%Y-%m-%d")
+    cursor.execute("DELETE FROM news_articles WHERE symbol = ? AND published_at < ?", (symbol, cutoff))
+
+    cursor.execute("SELECT COUNT(*), MAX(published_at) FROM news_articles WHERE symbol = ?", (symbol,))
+    after, last_seen = cursor.fetchone()
+    cursor.execute("""
+        INSERT OR REPLACE INTO news_fetch_state (symbol, last_fetched_at, last_seen_at)
+        VALUES (?, ?, ?)
+    """, (symbol, fetched_at, last_seen))
+    return max(0, after - before)
+
+
+def _load_articles(conn, symbol: str, target_date: str = None) -> List[tuple]:
+    cursor = conn.cursor()
+    if target_date:
+        start = (datetime.strptime(target_date, "%Y-%m-%d") - timedelta(days=NEWS_WINDOW_DAYS)).strftime("%Y-%m-%d")
+        # Allow today and past 5 days (covers full weekends)
+        cursor.execute("""
+            SELECT title, content, published_at, media FROM news_articles
+            WHERE symbol = ? AND published_at >= ? AND substr(published_at, 1, 10) <= ?
+            ORDER BY published_at DESC LIMIT ?
+        """, (symbol, start, target_date, NEWS_LIMIT))
+    else:
+        cursor.execute("""
+            SELECT title, content, published_at, media FROM news_articles
+            WHERE symbol = ? ORDER BY published_at DESC LIMIT ?
+        """, (symbol, NEWS_LIMIT))
+    return cursor.fetchall()
+
+
+def _is_fresh(state, target_date: str, now: datetime) -> bool:
+    """水位是否足以覆盖本次请求: TTL 内抓取过，或上次抓取已经晚于目标日期 (历史日期的新闻不会再变)"""
+    if not state or not state[0]:
+        return False
+    last_fetched = datetime.strptime(state[0], _TIME_FORMAT).replace(tzinfo=BEIJING_TZ)
+    if (now - last_fetched).total_seconds() < NEWS_CONFIG["ttl_seconds"]:
+        return True
+    return bool(target_date) and state[0][:10] > target_date
+
+
+async def fetch_news_for_stock(symbol: str, stock_name: str, target_date: str = None, force_refresh: bool = False) -> str:
+    """Fetch news for a stock (local store first, EastMoney only when the watermark is stale) and filter by date."""
+    now = datetime.now(BEIJING_TZ)
     try:
-        data = json.loads(match.group(1))
-        # Ensure 'result' and 'cmsArticle' exist, handle None or missing keys gracefully
-        result = data.get("result") or {}
-        if not result:
-             return "No significant news found."
-             
-        articles = result.get("cmsArticle", [])
-        
-        # Filter: Symbol OR Name in title
-        # EastMoney search by 'keyword' (symbol) might return irrelevant results if we don't filter
-        filter_terms = [symbol]
-        if stock_name:
-            filter_terms.append(stock_name)
-            
-        focused_articles = [
-            a for a in articles
-            if any(term.lower() in a.get("title", "").lower() for term in filter_terms)
-        ]
-        
-        if not focused_articles:
-             return "No significant news found directly related to this stock."
-
-        context = []
-        try:
-            target_dt = datetime.strptime(target_date, "%Y-%m-%d") if target_date else None
-        except Exception:
-            target_dt = None
-
-        for a in focused_articles:
-            # Date filter: Allow news within past 3 days of target_date
-            a_date = a.get('date', '')
-            
-            if target_dt and a_date:
-                try:
-                    # News date format is usually 'YYYY-MM-DD HH:MM:SS'
-                    news_dt = datetime.strptime(a_date[:10], "%Y-%m-%d")
-                    days_diff = (target_dt - news_dt).days
-                    
-                    if days_diff < 0 or days_diff > 5: # Allow today and past 5 days (covers full weekends)
-                        continue
-                except Exception:
-                    # If date parsing fails, fallback to strict match or ignore if unknown
-                    if not a_date.startswith(target_date):
-                        continue
-            elif target_date and not a_date.startswith(target_date):
-                continue
-                
-            title = a.get('title', '').replace("<em>", "").replace("</em>", "")
-            content = a.get('content', '')[:300] 
-            date = a_date
-            media = a.get('mediaName', 'EastMoney')
-            
-            context.append(f"- **{title}** ({date}): {content} (Source: {media})")
-            
-            if len(context) >= 5: # Limit to 5 strictly valid news
-                break
-            
-        if not context:
-            return "No recent news found (Date mismatch or no significant updates today)."
-            
-        return "\n".join(context)
+        state = await asyncio.to_thread(execute_with_retry, _load_state, 3, symbol)
+    except Exception as e:
+        logger.warning(f"⚠️ [News] Store unavailable for {symbol}: {e}")
+        state = None
 
+    fetch_failed = False
+    if force_refresh or not _is_fresh(state, target_date, now):
+        resp_text = await _fetch_remote(symbol)
+        if not resp_text:
+            fetch_failed = True
+        else:
+            try:
+                articles = parse_articles(resp_text, symbol, stock_name)
+            except Exception as e:
+                logger.error(f"⚠️ [EastMoney] Parse failed for {symbol}: {e}")
+                return f"News parsing failed: {e}"
+            try:
+                added = await asyncio.to_thread(execute_with_retry, _save_articles, 3, symbol, articles,
+                                                now.strftime(_TIME_FORMAT))
+                logger.debug(f"📰 [News] {symbol}: {added} new / {len(articles)} related articles")
+            except Exception as e:
+                logger.warning(f"⚠️ [News] Failed to store articles for {symbol}: {e}")
+    else:
+        logger.debug(f"📰 [News] {symbol}: store is current, skip fetch")
+
+    try:
+        rows = await asyncio.to_thread(execute_with_retry, _load_articles, 3, symbol, target_date)
     except Exception as e:
-        logger.error(f"⚠️ [EastMoney] Parse failed for {symbol}: {e}")
-        return f"News parsing failed: {e}"
+        logger.error(f"⚠️ [News] Read failed for {symbol}: {e}")
+        rows = []
+
+    if not rows:
+        if fetch_failed:
+            return "News retrieval failed."
+        return "No recent news found (Date mismatch or no significant updates today)."
+
+    return "\n".join(f"- **{title}** ({date}): {content} (Source: {media})" for title, content, date, media in rows)
@@ -1,6 +1,6 @@
 import json
 from datetime import datetime
-from backend.database import get_connection
+from backend.database import pooled_connection
 from backend.logger import logger
 from backend.engine.task_registry import AGENTS
 
@@ -49,79 +49,78 @@ class TaskLogger:
     def _log(self, status: str, display_name: str = None, task_type: str = None, dimensions: dict = None, 
              message: str = None, metadata: dict = None, start: bool = False, end: bool = False):
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
+            with pooled_connection() as conn:
+                cursor = conn.cursor()
             
-            now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
-            # Check if entry exists for this task/date/agent
-            # Note: We technically allow multiple runs of same task_name if repeated, 
-            # but for 'daily plan' logic usually we update the latest one.
-            cursor.execute(
-                """SELECT id, status FROM task_logs 
-                   WHERE task_name = ? AND date = ? AND agent_id = ? 
-                   ORDER BY id DESC LIMIT 1""",
-                (self.task_name, self.date, self.agent_id)
-            )
-            row = cursor.fetchone()
+                # Check if entry exists for this task/date/agent
+                # Note: We technically allow multiple runs of same task_name if repeated, 
+                # but for 'daily plan' logic usually we update the latest one.
+                cursor.execute(
+                    """SELECT id, status FROM task_logs 
+                       WHERE task_name = ? AND date = ? AND agent_id = ? 
+                       ORDER BY id DESC LIMIT 1""",
+                    (self.task_name, self.date, self.agent_id)
+                )
+                row = cursor.fetchone()
             
-            meta_json = json.dumps(metadata) if metadata else None
-            dim_json = json.dumps(dimensions) if dimensions else None
+                meta_json = json.dumps(metadata) if metadata else None
+                dim_json = json.dumps(dimensions) if dimensions else None
             
-            if row and (row[1] == 'pending' or row[1] == 'running'):
-                # Update existing active entry
-                log_id = row[0]
-                update_fields = ["status = ?", "updated_at = datetime('now', '+8 hours')"]
-                params = [status]
+                if row and (row[1] == 'pending' or row[1] == 'running'):
+                    # Update existing active entry
+                    log_id = row[0]
+                    update_fields = ["status = ?", "updated_at = datetime('now', '+8 hours')"]
+                    params = [status]
                 
-                if message:
-                    update_fields.append("message = ?")
-                    params.append(message)
+                    if message:
+                        update_fields.append("message = ?")
+                        params.append(message)
                 
-                if start:
-                    update_fields.append("start_time = ?")
-                    params.append(now_str)
-                    # If starting, we might want to update display_name/type/dims if provided
-                    if display_name:
-                        update_fields.append("display_name = ?")
-                        params.append(display_name)
-                    if task_type:
-                        update_fields.append("task_type = ?")
-                        params.append(task_type)
-                    if dim_json:
-                        update_fields.append("dimensions = ?")
-                        params.append(dim_json)
+                    if start:
+                        update_fields.append("start_time = ?")
+                        params.append(now_str)
+                        # If starting, we might want to update display_name/type/dims if provided
+                        if display_name:
+                            update_fields.append("display_name = ?")
+                            params.append(display_name)
+                        if task_type:
+                            update_fields.append("task_type = ?")
+                            params.append(task_type)
+                        if dim_json:
+                            update_fields.append("dimensions = ?")
+                            params.append(dim_json)
                 
-                if end:
-                    update_fields.append("end_time = ?")
-                    params.append(now_str)
+                    if end:
+                        update_fields.append("end_time = ?")
+                        params.append(now_str)
                     
-                if meta_json:
-                    update_fields.append("metadata = ?")
-                    params.append(meta_json)
+                    if meta_json:
+                        update_fields.append("metadata = ?")
+                        params.append(meta_json)
                 
-                params.append(log_id)
+                    params.append(log_id)
                 
-                sql = f"UPDATE task_logs SET {', '.join(update_fields)} WHERE id = ?"
-                cursor.execute(sql, params)
-            else:
-                if start or not row:
-                    cursor.execute("""
-                        INSERT INTO task_logs 
-                        (agent_id, task_name, display_name, task_type, date, 
-                         status, triggered_by, start_time, end_time, 
-                         dimensions, message, metadata)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        self.agent_id, self.task_name, display_name or self.task_name, task_type or 'unknown', self.date,
-                        status, self.triggered_by, 
-                        now_str if start else None, 
-                        now_str if end else None, 
-                        dim_json, message, meta_json
-                    ))
+                    sql = f"UPDATE task_logs SET {', '.join(update_fields)} WHERE id = ?"
+                    cursor.execute(sql, params)
+                else:
+                    if start or not row:
+                        cursor.execute("""
+                            INSERT INTO task_logs 
+                            (agent_id, task_name, display_name, task_type, date, 
+                             status, triggered_by, start_time, end_time, 
+                             dimensions, message, metadata)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        """, (
+                            self.agent_id, self.task_name, display_name or self.task_name, task_type or 'unknown', self.date,
+                            status, self.triggered_by, 
+                            now_str if start else None, 
+                            now_str if end else None, 
+                            dim_json, message, meta_json
+                        ))
             
-            conn.commit()
-            conn.close()
+                conn.commit()
             logger.info(f"[{self.agent_id}] {status.upper()} {self.task_name}: {message or ''}")
             
         except Exception as e:
@@ -1,5 +1,6 @@
+import numpy as np
 import pandas as pd
-from backend.database import get_connection
+from backend.database import get_connection, execute_with_retry
 from backend.logger import logger
 
 # Industry Standard: Noise Threshold (1%)
@@ -13,60 +14,89 @@ def validate_previous_prediction(symbol: str, today_data: pd.Series):
     execute_with_retry(_validate_logic, 3, symbol, today_data)
 
 
+# 每条多行 UPDATE 的预测数 (5 个参数/行)
+VALIDATE_CHUNK_ROWS = 500
+
+
 def verify_all_pending():
     """
     Batch verify all pending predictions against their SPECIFIC target date price data.
     This ensures that old pending predictions are validated against the correct historical day,
     not just the latest available price.
+
+    Set-based: 一次 JOIN 取出所有 target_date 已同步的待验证预测，向量化计算结果，
+    再用分块的多行 UPDATE ... FROM (VALUES ...) 写回 (target_date 未同步的保持 Pending)
     """
-    from database import get_connection
-    conn = get_connection()
     try:
-        cursor = conn.cursor()
-        
         # --- 1. Validate Multi-Model Table (ai_predictions_v2) ---
-        # We use target_date to match exactly with daily_prices
         logger.info("🔍 Verifying pending V2 predictions...")
-        
-        pending_v2 = cursor.execute("""
-            SELECT symbol, date, target_date, model_id, signal
-            FROM ai_predictions_v2 
-            WHERE validation_status='Pending'
-        """).fetchall()
-
-        validated_count_v2 = 0
-        
-        for row in pending_v2:
-            symbol, p_date, target_date, model_id, signal = row
-            
-            # Find price data specifically for the target_date
-            price_row = cursor.execute("""
-                SELECT change_percent FROM daily_prices 
-                WHERE symbol = ? AND date = ?
-            """, (symbol, target_date)).fetchone()
-            
-            if price_row:
-                actual_change = price_row[0]
-                status = _calculate_status(signal, actual_change)
-                
-                cursor.execute("""
-                    UPDATE ai_predictions_v2
-                    SET validation_status = ?, actual_change = ?, updated_at = datetime('now', '+8 hours')
-                    WHERE symbol = ? AND date = ? AND model_id = ?
-                """, (status, actual_change, symbol, p_date, model_id))
-                
-                validated_count_v2 += 1
-                logger.info(f"   ✅ Validated V2 {symbol} ({p_date} -> {target_date}): {signal} vs {actual_change}% = {status}")
-            
-            # If no price data found for target_date yet, we skip (it remains Pending)
-
-        conn.commit()
-        logger.info(f"✨ Validation Complete: {validated_count_v2} V2 predictions.")
+        validated_count_v2, summary = execute_with_retry(_verify_pending_v2, 3)
+        detail = ", ".join(f"{k}: {v}" for k, v in summary.items())
+        logger.info(f"✨ Validation Complete: {validated_count_v2} V2 predictions." + (f" ({detail})" if detail else ""))
         
     except Exception as e:
         logger.error(f"❌ Batch verification failed: {e}")
-    finally:
-        conn.close()
+
+
+def _verify_pending_v2(conn):
+    return verify_pending_range(conn)
+
+
+def verify_pending_range(conn, start_date: str = None, end_date: str = None, model_id: str = None):
+    """
+    验证 target_date 已同步的待验证预测，返回 (条数, {model_id: {status: 条数}})
+    可选按预测日期区间 / 模型限定范围 (批量回填写入后只验证刚写入的区间)
+    """
+    cursor = conn.cursor()
+    where, params = "", []
+    if start_date and end_date:
+        where += " AND p.date BETWEEN ? AND ?"
+        params += [start_date, end_date]
+    if model_id:
+        where += " AND p.model_id = ?"
+        params.append(model_id)
+    # We use target_date to match exactly with daily_prices
+    rows = cursor.execute(f"""
+        SELECT p.symbol, p.date, p.model_id, p.signal, d.change_percent
+        FROM ai_predictions_v2 p
+        JOIN daily_prices d ON d.symbol = p.symbol AND d.date = p.target_date
+        WHERE p.validation_status = 'Pending' AND d.change_percent IS NOT NULL{where}
+    """, params).fetchall()
+    if not rows:
+        return 0, {}
+
+    df = pd.DataFrame(rows, columns=["symbol", "date", "model_id", "signal", "actual_change"])
+    df["status"] = calculate_status_vectorized(df["signal"].to_numpy(), df["actual_change"].to_numpy(dtype=float))
+
+    values = list(zip(df["symbol"], df["date"], df["model_id"], df["status"], df["actual_change"].astype(float)))
+    for i in range(0, len(values), VALIDATE_CHUNK_ROWS):
+        chunk = values[i:i + VALIDATE_CHUNK_ROWS]
+        cursor.execute(f"""
+            WITH v(symbol, date, model_id, status, actual_change) AS (
+                VALUES {", ".join(["(?, ?, ?, ?, ?)"] * len(chunk))}
+            )
+            UPDATE ai_predictions_v2
+            SET validation_status = v.status, actual_change = v.actual_change,
+                updated_at = datetime('now', '+8 hours')
+            FROM v
+            WHERE ai_predictions_v2.symbol = v.symbol AND ai_predictions_v2.date = v.date
+              AND ai_predictions_v2.model_id = v.model_id AND ai_predictions_v2.validation_status = 'Pending'
+        """, tuple(x for row in chunk for x in row))
+
+    for r in df.itertuples(index=False):
+        logger.debug(f"   ✅ Validated V2 {r.symbol} ({r.date}): {r.signal} vs {r.actual_change}% = {r.status}")
+    return len(df), df.groupby(["model_id", "status"]).size().unstack(fill_value=0).to_dict("index")
+
+
+def calculate_status_vectorized(signals: np.ndarray, actual_changes: np.ndarray) -> np.ndarray:
+    """_calculate_status 的向量化版本 (规则必须保持一致)"""
+    correct = np.select(
+        [signals == 'Long', signals == 'Short', signals == 'Side'],
+        # Side: 在噪音区间内或下跌 (规避了下跌) 都算正确，即 actual_change <= NOISE_THRESHOLD
+        [actual_changes > 0, actual_changes < 0, actual_changes <= NOISE_THRESHOLD],
+        default=False
+    )
+    return np.where(correct, 'Correct', 'Incorrect')
 
 def _validate_logic(conn, symbol: str, today_data: dict):
     """
@@ -32,20 +32,24 @@ def fetch_stock_data(symbol: str, period: str = "daily", start_date: str = None)
     def _fetch_hk():
         return ak.stock_hk_hist(symbol=symbol, period=period, start_date=start_date, end_date=datetime.now().strftime("%Y%m%d"), adjust="qfq")
 
+    # 带交易所前缀的代码 (sh000001) 只可能是指数，直接走新浪指数接口
+    is_index = symbol[:2].lower() in ("sh", "sz")
+
     @retry_request(max_retries=3, delay=2.0)
     def _fetch_cn():
-        # 1. 尝试个股接口 (Stock)
-        try:
-            df = ak.stock_zh_a_hist(symbol=symbol, period=period, start_date=start_date, end_date=datetime.now().strftime("%Y%m%d"), adjust="qfq")
-            if not df.empty: return df
-        except: pass
-        
-        # 2. 尝试 ETF 接口 (Fund)
-        # 51xxxx, 15xxxx 等
-        try:
-            df = ak.fund_etf_hist_em(symbol=symbol, period=period, start_date=start_date, end_date=datetime.now().strftime("%Y%m%d"), adjust="qfq")
-            if not df.empty: return df
-        except: pass
+        if not is_index:
+            # 1. 尝试个股接口 (Stock)
+            try:
+                df = ak.stock_zh_a_hist(symbol=symbol, period=period, start_date=start_date, end_date=datetime.now().strftime("%Y%m%d"), adjust="qfq")
+                if not df.empty: return df
+            except: pass
+            
+            # 2. 尝试 ETF 接口 (Fund)
+            # 51xxxx, 15xxxx 等
+            try:
+                df = ak.fund_etf_hist_em(symbol=symbol, period=period, start_date=start_date, end_date=datetime.now().strftime("%Y%m%d"), adjust="qfq")
+                if not df.empty: return df
+            except: pass
 
         # 3. 尝试指数接口 (Index)
         # e.g. sh000001
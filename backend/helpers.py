@@ -10,19 +10,35 @@ from logger import logger
 
 
 def get_last_date(symbol: str, table: str = "daily_prices") -> str:
-    """获取数据库中某支股票的最后日期"""
-    def _logic(conn, sym, tbl):
+    """获取数据库中某支股票的最后日期 (读 latest_prices 快照的一行)"""
+    def _logic(conn, sym, prd):
         cur = conn.cursor()
-        cur.execute(f"SELECT MAX(date) FROM {tbl} WHERE symbol = ?", (sym,))
+        cur.execute("SELECT date FROM latest_prices WHERE symbol = ? AND period = ?", (sym, prd))
         return cur.fetchone()
 
     try:
-        row = execute_with_retry(_logic, 3, symbol, table)
+        row = execute_with_retry(_logic, 3, symbol, table[:-len("_prices")])
         return row[0] if row and row[0] else None
     except Exception:
         return None
 
 
+def get_indicator_state(symbol: str, period: str = "daily"):
+    """读取某支股票某周期的增量指标状态 (IndicatorState)，不存在或损坏时返回 None"""
+    from quant.incremental import IndicatorState
+
+    def _logic(conn, sym, prd):
+        cur = conn.cursor()
+        cur.execute("SELECT state FROM indicator_state WHERE symbol = ? AND period = ?", (sym, prd))
+        return cur.fetchone()
+
+    try:
+        row = execute_with_retry(_logic, 3, symbol, period)
+        return IndicatorState.from_json(row[0]) if row and row[0] else None
+    except Exception:
+        return None
+
+
 def check_stock_analysis_mode(symbol: str) -> str:
     """检查股票分析模式：如果有 Pro/Premium 用户关注，则使用 AI，否则使用 Rules"""
     try:
@@ -13,6 +13,11 @@ from logger import logger
 from notifications import send_push_notification
 from notification_templates import NotificationTemplates
 
+# 多行 INSERT 每条语句的行数 (notification_logs 每行 7 个参数，低于 SQLite 999 变量上限)
+INSERT_CHUNK_ROWS = 100
+# 预加载用户资料时单条 IN (...) 的 user_id 个数
+USER_CHUNK_SIZE = 500
+
 
 class NotificationManager:
     """
@@ -32,6 +37,8 @@ class NotificationManager:
         self.signal_cache: Dict[str, Dict[str, dict]] = {}  # user_id -> {symbol -> state_dict}
         self.pending_state_updates: List[dict] = []  # List of state updates to flush to DB
         self.user_tier_cache: Dict[str, str] = {}  # user_id -> tier
+        self.user_settings_cache: Dict[str, dict] = {}  # user_id -> parsed notification_settings
+        self.pending_logs: List[tuple] = []  # notification_logs rows to flush to DB
         
         # Internal stats
         self.stats = {
@@ -45,6 +52,42 @@ class NotificationManager:
         """Helper to get a connection if one wasn't provided."""
         return self.conn if self.conn else get_connection()
 
+    def load_user_profiles(self, user_ids: List[str]):
+        """
+        Pre-load tiers and parsed notification settings for users not cached yet.
+        One query per USER_CHUNK_SIZE users instead of two lookups per message.
+        """
+        missing = [uid for uid in dict.fromkeys(user_ids) if uid not in self.user_tier_cache]
+        if not missing:
+            return
+
+        conn = self._get_conn()
+        try:
+            cursor = conn.cursor()
+            for i in range(0, len(missing), USER_CHUNK_SIZE):
+                chunk = missing[i:i + USER_CHUNK_SIZE]
+                cursor.execute(f"""
+                    SELECT user_id, subscription_tier, notification_settings
+                    FROM users WHERE user_id IN ({",".join(["?"] * len(chunk))})
+                """, tuple(chunk))
+                for uid, tier, settings_json in cursor.fetchall():
+                    self.user_tier_cache[uid] = tier or "free"
+                    try:
+                        self.user_settings_cache[uid] = json.loads(settings_json) if settings_json else {}
+                    except (TypeError, ValueError) as e:
+                        logger.debug(f"⚠️ Failed to parse notification settings for {uid}: {e}")
+                        self.user_settings_cache[uid] = {}
+        except Exception as e:
+            logger.error(f"❌ [NotificationManager] Failed to load user profiles: {e}")
+        finally:
+            if not self.conn:
+                conn.close()
+
+        # Unknown users (or a failed load): default tier, all notifications enabled
+        for uid in missing:
+            self.user_tier_cache.setdefault(uid, "free")
+            self.user_settings_cache.setdefault(uid, {})
+
     def load_signal_states(self, user_ids: List[str], symbols: List[str]):
         """
         Pre-load signal states from DB into memory for efficient comparison.
@@ -53,6 +96,7 @@ class NotificationManager:
         if not user_ids or not symbols:
             return
 
+        self.load_user_profiles(user_ids)
         conn = self._get_conn()
         try:
             cursor = conn.cursor()
@@ -151,11 +195,14 @@ class NotificationManager:
         Main exit point:
         1. Aggregates queued notifications per user.
         2. Sends them via Push API (with analytics tracking).
-        3. Persists state changes to signal_states.
-        4. Logs to notification_logs.
+        3. Persists state changes to signal_states and logs to notification_logs
+           (chunked multi-row statements in a single transaction).
         """
         total_sent = 0
         
+        # Tiers & preferences for every queued user in one pass
+        self.load_user_profiles([uid for uid, events in self.queued_notifications.items() if events])
+        
         # 1 & 2: Process Queued Notifications
         for user_id, events in self.queued_notifications.items():
             if not events:
@@ -170,34 +217,22 @@ class NotificationManager:
                     total_sent += 1
                     self.stats["notifications_sent"] += 1
         
-        # 3: Flush State Updates
-        if self.pending_state_updates:
-            self._persist_signal_states()
+        # 3 & 4: Flush State Updates + Notification Logs
+        if self.pending_state_updates or self.pending_logs:
+            self._persist_pending_writes()
             
         # Clear queues
         self.queued_notifications.clear()
         self.pending_state_updates.clear()
+        self.pending_logs.clear()
         
         return total_sent
 
     def _get_user_tier(self, user_id: str) -> str:
-        """Fetch or return cached user tier."""
-        if user_id in self.user_tier_cache:
-            return self.user_tier_cache[user_id]
-        
-        conn = self._get_conn()
-        try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT subscription_tier FROM users WHERE user_id = ?", (user_id,))
-            row = cursor.fetchone()
-            tier = row[0] if row and row[0] else "free"
-            self.user_tier_cache[user_id] = tier
-            return tier
-        except Exception:
-            return "free"
-        finally:
-            if not self.conn:
-                conn.close()
+        """Return cached user tier (loading it if the user was not preloaded)."""
+        if user_id not in self.user_tier_cache:
+            self.load_user_profiles([user_id])
+        return self.user_tier_cache.get(user_id, "free")
 
     def _aggregate_notifications(self, user_id: str, events: List[dict], user_tier: str = "free") -> Optional[dict]:
         """
@@ -283,17 +318,14 @@ class NotificationManager:
         Check if user has enabled this notification type.
         Returns True if allowed to send, False to skip.
         """
-        conn = self._get_conn()
+        if user_id not in self.user_settings_cache:
+            self.load_user_profiles([user_id])
+        settings = self.user_settings_cache.get(user_id)
+        
+        if not settings:
+            return True  # Default: all enabled if no settings
+        
         try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT notification_settings FROM users WHERE user_id = ?", (user_id,))
-            row = cursor.fetchone()
-            
-            if not row or not row[0]:
-                return True  # Default: all enabled if no settings
-            
-            settings = json.loads(row[0])
-            
             # Global switch check
             if not settings.get("enabled", True):
                 return False
@@ -305,9 +337,6 @@ class NotificationManager:
         except Exception as e:
             logger.debug(f"⚠️ Failed to check user preference: {e}")
             return True  # Fail-open: send if we can't check
-        finally:
-            if not self.conn:
-                conn.close()
 
     def _send_notification(self, user_id: str, payload: dict) -> bool:
         """Helper to send push and log it."""
@@ -349,47 +378,45 @@ class NotificationManager:
             return False
 
     def _log_to_db(self, log_id: str, user_id: str, payload: dict):
-        """Persist notification record for analytics."""
-        conn = self._get_conn()
-        try:
-            cursor = conn.cursor()
-            cursor.execute("""
+        """Buffer notification record for analytics (written in bulk at flush())."""
+        self.pending_logs.append((
+            log_id, user_id, payload["type"],
+            json.dumps(payload.get("related_symbols", [])),
+            payload["title"], payload["body"], payload["url"]
+        ))
+
+    def _write_pending(self, conn):
+        """Chunked multi-row INSERTs for buffered logs and the latest state per (user, symbol)."""
+        cursor = conn.cursor()
+        for i in range(0, len(self.pending_logs), INSERT_CHUNK_ROWS):
+            chunk = self.pending_logs[i:i + INSERT_CHUNK_ROWS]
+            cursor.execute(f"""
                 INSERT INTO notification_logs (id, user_id, type, related_symbols, title, body, url)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                log_id, user_id, payload["type"], 
-                json.dumps(payload.get("related_symbols", [])), 
-                payload["title"], payload["body"], payload["url"]
-            ))
-            if not self.conn:
-                conn.commit()
-        except Exception as e:
-            logger.error(f"❌ Failed to log notification to DB: {e}")
-        finally:
-            if not self.conn:
-                conn.close()
+                VALUES {", ".join(["(?, ?, ?, ?, ?, ?, ?)"] * len(chunk))}
+            """, tuple(v for row in chunk for v in row))
 
-    def _persist_signal_states(self):
-        """Bulk update signal states to avoid O(N) queries."""
-        conn = self._get_conn()
+        now = datetime.now().isoformat()
+        states = list({
+            (u["user_id"], u["symbol"]): (u["user_id"], u["symbol"], u["signal"], u["confidence"], now)
+            for u in self.pending_state_updates
+        }.values())
+        for i in range(0, len(states), INSERT_CHUNK_ROWS):
+            chunk = states[i:i + INSERT_CHUNK_ROWS]
+            cursor.execute(f"""
+                INSERT OR REPLACE INTO signal_states (user_id, symbol, last_signal, last_confidence, last_notified_at)
+                VALUES {", ".join(["(?, ?, ?, ?, ?)"] * len(chunk))}
+            """, tuple(v for row in chunk for v in row))
+        return len(states)
+
+    def _persist_pending_writes(self):
+        """Write buffered notification logs and signal states in a single transaction."""
         try:
-            cursor = conn.cursor()
-            now = datetime.now().isoformat()
-            
-            for update in self.pending_state_updates:
-                cursor.execute("""
-                    INSERT OR REPLACE INTO signal_states (user_id, symbol, last_signal, last_confidence, last_notified_at)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (
-                    update["user_id"], update["symbol"], 
-                    update["signal"], update["confidence"], now
-                ))
-            
-            if not self.conn:
-                conn.commit()
-            logger.info(f"💾 [NotificationManager] Persisted {len(self.pending_state_updates)} signal state changes")
+            if self.conn:
+                # Caller owns the connection (and the commit)
+                state_count = self._write_pending(self.conn)
+            else:
+                state_count = execute_with_retry(self._write_pending, 3)
+            logger.info(f"💾 [NotificationManager] Persisted {len(self.pending_logs)} notification logs, "
+                        f"{state_count} signal state changes")
         except Exception as e:
-            logger.error(f"❌ Failed to persist signal states: {e}")
-        finally:
-            if not self.conn:
-                conn.close()
+            logger.error(f"❌ Failed to persist notification logs / signal states: {e}")
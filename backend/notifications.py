@@ -1,18 +1,12 @@
 import os
-import requests
-import json
-import time
 from logger import logger
+from push_dispatcher import get_push_dispatcher
 
 def send_push_notification(title, body, url=None, related_symbol=None, broadcast=False, tag=None, target_user_id=None):
     """
-    调用 Internal API 发送 Web Push 通知
+    投递 Web Push 通知 (调用 Internal API)
+    消息进入 PushDispatcher 队列后立即返回，由后台连接池批量并发发送，失败的消息进入 push_queue 重试
     """
-    # 在 GitHub Actions 中，NEXT_PUBLIC_SITE_URL 或类似变量应指向生产环境
-    # 如果没有设置，默认为 localhost (开发用)
-    base_url = os.getenv("NEXT_PUBLIC_SITE_URL") or "http://localhost:3000"
-    api_url = f"{base_url}/api/internal/notify"
-    
     secret = os.getenv("INTERNAL_API_SECRET")
     
     if not secret:
@@ -28,23 +22,18 @@ def send_push_notification(title, body, url=None, related_symbol=None, broadcast
         "tag": tag,
         "target_user_id": target_user_id
     }
+    get_push_dispatcher().submit(payload)
 
-    try:
-        response = requests.post(
-            api_url,
-            json=payload,
-            headers={
-                "Authorization": f"Bearer {secret}",
-                "Content-Type": "application/json"
-            },
-            timeout=10
-        )
-        if response.status_code == 200:
-            logger.info(f"✅ 推送发送成功: {title} (Target: {target_user_id or 'Broadcast'})")
-        else:
-            logger.warning(f"⚠️ 推送发送失败 [{response.status_code}]: {response.text}")
-    except Exception as e:
-        logger.error(f"❌ 推送请求异常: {e}")
+def flush_push_notifications(timeout=None):
+    """等待已投递的推送全部发送完毕 (或进入重试队列)"""
+    return get_push_dispatcher().flush(timeout)
+
+def retry_failed_pushes():
+    """立即重发 push_queue 中到期的失败推送，并等待发送完成"""
+    count = get_push_dispatcher().retry_now()
+    flush_push_notifications()
+    logger.info(f"🔁 Retried {count} queued push notifications")
+    return count
 
 def send_personalized_daily_report(date_str):
     """
@@ -94,11 +83,11 @@ def send_personalized_daily_report(date_str):
                     tag="daily_brief"
                 )
                 success_count += 1
-                time.sleep(0.2) # Rate limit protection
                 
             except Exception as e:
                 logger.error(f"❌ Failed to push to {user_id}: {e}")
-                
+        
+        flush_push_notifications()
         logger.info(f"✅ Batch push completed. Sent: {success_count}/{len(targets)}")
         
     except Exception as e:
@@ -111,10 +100,12 @@ if __name__ == "__main__":
     from datetime import datetime
     
     parser = argparse.ArgumentParser()
-    parser.add_argument("--action", choices=["push_daily"], required=True)
+    parser.add_argument("--action", choices=["push_daily", "retry_push"], required=True)
     parser.add_argument("--date", help="Date YYYY-MM-DD")
     args = parser.parse_args()
     
     if args.action == "push_daily":
         target_date = args.date or datetime.now().strftime("%Y-%m-%d")
         send_personalized_daily_report(target_date) 
+    elif args.action == "retry_push":
+        retry_failed_pushes()
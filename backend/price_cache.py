@@ -0,0 +1,382 @@
+"""
+StockWise 本地列式行情缓存 (Arrow IPC)
+
+daily/weekly/monthly_prices 的本地只读副本，每只股票每个周期一个文件
+(data/price_cache/daily_CN/600519.arrow ...)，文件按 date 排序并内存映射读取。
+- Turso 仍是唯一数据源: 缓存只在数据库事务提交后更新，读不到、覆盖不足或已过期时调用方回退到 SQL
+- 新鲜度校验: 每个进程每个周期只读一次 latest_prices (symbol -> 最新日期)，
+  缓存最后一根 K 线的日期与之不一致的股票视为过期 (例如其他机器同步过数据库)
+- PriceBatchWriter.flush() 只重写本批涉及的股票文件; run_full_sync 结束时 refresh() 补齐未缓存或过期的股票
+- 每只股票只保留最近 keep_bars 根 K 线; 历史不足 keep_bars 的股票标记为 complete (缓存即全部历史)
+- 未安装 pyarrow 或 PRICE_CACHE_ENABLED=false 时整体禁用，所有读取返回 None
+"""
+import os
+import time
+import threading
+from bisect import bisect_right
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:
+    pa = None
+
+try:
+    from backend.config import PRICE_CACHE_CONFIG
+except ImportError:
+    from config import PRICE_CACHE_CONFIG
+try:
+    from backend.logger import logger
+except ImportError:
+    from logger import logger
+
+PERIODS = ("daily", "weekly", "monthly")
+
+# 缓存的列 (不含 ai_summary)
+CACHE_COLUMNS = [
+    "symbol", "date", "open", "high", "low", "close", "volume", "change_percent",
+    "ma5", "ma10", "ma20", "ma60", "macd", "macd_signal", "macd_hist",
+    "boll_upper", "boll_mid", "boll_lower", "rsi", "kdj_k", "kdj_d", "kdj_j",
+]
+
+# 读取时最多每隔多少秒检查一次文件是否被其他进程替换
+STAT_INTERVAL = 1.0
+# 补齐缓存时每条 SQL 的股票数
+REFRESH_CHUNK = 200
+
+
+def market_of(symbol: str) -> str:
+    """与 trading_calendar.get_market_from_symbol 相同的规则 (5 位为港股)"""
+    return "HK" if len(symbol) == 5 else "CN"
+
+
+class _View:
+    """某一时刻股票文件的不可变快照 (读取方一次性取用，避免重载时读到不一致的表和日期)"""
+
+    def __init__(self, table=None, complete: bool = False):
+        self.table = table
+        self.complete = complete
+        self._dates: Optional[list] = None
+
+    @property
+    def dates(self) -> list:
+        if self._dates is None:
+            self._dates = self.table.column("date").to_pylist() if self.table is not None else []
+        return self._dates
+
+    @property
+    def last_date(self) -> Optional[str]:
+        dates = self.dates
+        return dates[-1] if dates else None
+
+
+class _Segment:
+    """一只股票某个周期的缓存文件"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.mtime = None
+        self.checked_at = 0.0
+        self.view = _View()
+
+    def load(self):
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            self.view, self.mtime = _View(), None
+            return
+        mtime = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if mtime == self.mtime:
+            return
+        if os.name == "nt":
+            # Windows 下内存映射的文件无法被 os.replace 替换，改为读入内存
+            with pa.OSFile(str(self.path), "rb") as source:
+                table = ipc.open_file(source).read_all()
+        else:
+            # 关闭文件句柄后映射仍然有效，缓存数千只股票也不会占用文件描述符
+            with pa.memory_map(str(self.path), "r") as source:
+                table = ipc.open_file(source).read_all()
+        meta = table.schema.metadata or {}
+        self.view, self.mtime = _View(table, meta.get(b"complete") == b"1"), mtime
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now - self.checked_at >= STAT_INTERVAL:
+            self.checked_at = now
+            self.load()
+
+
+class PriceCache:
+    """行情缓存入口 (线程安全；读取无锁，写入/重载串行)"""
+
+    def __init__(self, root: str = None, keep_bars: Dict[str, int] = None, enabled: bool = None):
+        self.root = Path(root or PRICE_CACHE_CONFIG["dir"])
+        self.keep_bars = keep_bars or PRICE_CACHE_CONFIG["keep_bars"]
+        enabled = PRICE_CACHE_CONFIG["enabled"] if enabled is None else enabled
+        self.enabled = bool(enabled) and pa is not None
+        self._lock = threading.Lock()
+        self._segments: Dict[Tuple[str, str], _Segment] = {}
+        # period -> {symbol: 最新日期}，本进程内的新鲜度基准
+        self._latest: Dict[str, Dict[str, str]] = {}
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "writes": 0}
+
+    def _path(self, period: str, symbol: str) -> Path:
+        return self.root / f"{period}_{market_of(symbol)}" / f"{symbol}.arrow"
+
+    # ---------- 新鲜度 ----------
+
+    def _load_latest(self, period: str) -> Dict[str, str]:
+        try:
+            from backend.database import execute_with_retry
+        except ImportError:
+            from database import execute_with_retry
+
+        def _logic(conn):
+            cur = conn.cursor()
+            cur.execute("SELECT symbol, date FROM latest_prices WHERE period = ?", (period,))
+            return cur.fetchall()
+
+        try:
+            return {symbol: date for symbol, date in execute_with_retry(_logic, 3)}
+        except Exception as e:
+            # 没有基准时所有读取都回退到数据库
+            logger.warning(f"⚠️ 无法读取 latest_prices 校验行情缓存 ({period})，本次运行不使用缓存: {e}")
+            return {}
+
+    def _latest_dates(self, period: str) -> Dict[str, str]:
+        """本进程第一次用到某个周期时读取 latest_prices，之后只随本进程的写入更新"""
+        latest = self._latest.get(period)
+        if latest is None:
+            with self._lock:
+                latest = self._latest.get(period)
+                if latest is None:
+                    latest = self._latest[period] = self._load_latest(period)
+        return latest
+
+    def prepare(self, periods: Iterable[str]):
+        """
+        写数据库之前调用: 先固定新鲜度基准
+        (提交后才读 latest_prices 会把本批涉及的、原本最新的缓存误判为过期)
+        """
+        if self.enabled:
+            for period in periods:
+                self._latest_dates(period)
+
+    def _is_fresh(self, period: str, symbol: str, view: _View) -> bool:
+        return view.last_date == self._latest_dates(period).get(symbol)
+
+    # ---------- 读取 ----------
+
+    def _segment(self, period: str, symbol: str) -> _Segment:
+        key = (period, symbol)
+        seg = self._segments.get(key)
+        if seg is None:
+            with self._lock:
+                seg = self._segments.get(key)
+                if seg is None:
+                    seg = _Segment(self._path(period, symbol))
+                    seg.load()
+                    seg.checked_at = time.monotonic()
+                    self._segments[key] = seg
+        else:
+            seg.maybe_reload()
+        return seg
+
+    def get_history(self, symbol: str, period: str = "daily", end_date: str = None,
+                    limit: int = None, columns: Sequence[str] = None) -> Optional[List[dict]]:
+        """
+        读取 date <= end_date 的最近 limit 根 K 线 (新 -> 旧，同 ORDER BY date DESC LIMIT)
+        缓存未命中、覆盖不足或已过期时返回 None，由调用方回退到数据库
+        """
+        if not self.enabled:
+            return None
+        try:
+            view = self._segment(period, symbol).view
+            if view.table is None:
+                self.stats["misses"] += 1
+                return None
+            if not self._is_fresh(period, symbol, view):
+                self.stats["stale"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            dates = view.dates
+            end = bisect_right(dates, end_date) if end_date else len(dates)
+            available = end if limit is None else min(end, limit)
+            # 缓存只保留最近 keep_bars 根: 不足 limit 时只有在缓存即全部历史时才可信
+            if (limit is None or available < limit) and not view.complete:
+                self.stats["misses"] += 1
+                return None
+
+            window = view.table.slice(end - available, available)
+            if columns:
+                window = window.select(list(columns))
+            rows = window.to_pylist()
+            rows.reverse()
+            self.stats["hits"] += 1
+            return rows
+        except Exception as e:
+            logger.debug(f"price cache read failed ({symbol} {period}): {e}")
+            self.stats["misses"] += 1
+            return None
+
+    def get_row(self, symbol: str, period: str = "daily", date: str = None) -> Optional[dict]:
+        """读取指定日期 (None 为最新) 的一行；没有该日期或未命中时返回 None"""
+        rows = self.get_history(symbol, period, end_date=date, limit=1)
+        if not rows or (date and rows[0]["date"] != date):
+            return None
+        return rows[0]
+
+    # ---------- 写入 ----------
+
+    def _write(self, period: str, symbol: str, df, complete: bool):
+        """按 date 排序、截断到 keep_bars 后原子替换该股票的文件 (调用方持有 self._lock)"""
+        keep = self.keep_bars.get(period, 300)
+        df = df[CACHE_COLUMNS].astype({c: float for c in CACHE_COLUMNS[2:]})
+        df = df.sort_values("date").tail(keep).reset_index(drop=True)
+        if df.empty:
+            self._invalidate(period, symbol)
+            return
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({"complete": "1" if complete and len(df) < keep else "0"})
+
+        path = self._path(period, symbol)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".tmp{os.getpid()}")
+        with pa.OSFile(str(tmp), "wb") as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, path)
+        self.stats["writes"] += 1
+
+        seg = self._segments.get((period, symbol))
+        if seg is not None:
+            seg.load()
+        # 写入的都是已提交的数据库内容，本进程的基准随之前进
+        latest = self._latest.get(period)
+        if latest is not None:
+            latest[symbol] = df["date"].iloc[-1]
+
+    def _loaded_segment(self, period: str, symbol: str) -> _Segment:
+        """写入前取股票文件并同步到磁盘上的最新版本 (调用方持有 self._lock)"""
+        seg = self._segments.get((period, symbol))
+        if seg is None:
+            seg = self._segments[(period, symbol)] = _Segment(self._path(period, symbol))
+        seg.load()
+        return seg
+
+    def _invalidate(self, period: str, symbol: str, error: Exception = None):
+        """删除股票文件，宁可回退到数据库也不能读到旧数据"""
+        if error is not None:
+            logger.warning(f"⚠️ 行情缓存 {period} {symbol} 更新失败，已失效: {error}")
+        try:
+            self._path(period, symbol).unlink()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"❌ 无法删除失效的行情缓存 {period} {symbol}: {e}")
+            self.enabled = False
+        seg = self._segments.get((period, symbol))
+        if seg is not None:
+            seg.view, seg.mtime = _View(), None
+
+    def apply_rows(self, table_name: str, columns: Sequence[str], rows: List[tuple],
+                   cleanups: List[Tuple[str, str]] = None):
+        """
+        数据库事务提交后调用: 把写入的行追加到对应股票的缓存文件 (只重写涉及的股票)
+        cleanups 为 (symbol, start_date) 列表，对应周/月线当前周期的 DELETE
+        未缓存的股票忽略、已过期的股票删除 (都由 refresh() 从数据库完整加载)
+        """
+        if not self.enabled or not rows:
+            return
+        import pandas as pd
+
+        period = table_name.replace("_prices", "")
+        sym_idx = list(columns).index("symbol")
+        by_symbol: Dict[str, List[tuple]] = {}
+        for r in rows:
+            by_symbol.setdefault(r[sym_idx], []).append(r)
+        starts = dict(cleanups or [])
+        latest = self._latest_dates(period)
+
+        with self._lock:
+            for symbol, symbol_rows in by_symbol.items():
+                view = self._loaded_segment(period, symbol).view
+                if view.table is None:
+                    continue
+                if view.last_date != latest.get(symbol):
+                    # 缓存落后于数据库时直接追加会留下缺口
+                    self._invalidate(period, symbol)
+                    continue
+                try:
+                    old = view.table.to_pandas()
+                    if symbol in starts:
+                        old = old[old["date"] < starts[symbol]]
+                    new = pd.DataFrame(symbol_rows, columns=list(columns))[CACHE_COLUMNS]
+                    merged = pd.concat([old, new], ignore_index=True).drop_duplicates("date", keep="last")
+                    self._write(period, symbol, merged, view.complete)
+                except Exception as e:
+                    self._invalidate(period, symbol, e)
+
+    def refresh(self, symbols: Sequence[str], periods: Sequence[str] = PERIODS):
+        """从数据库补齐尚未缓存或已过期的股票 (每只股票最近 keep_bars 根)"""
+        if not self.enabled or not symbols:
+            return
+        import pandas as pd
+        try:
+            from backend.database import execute_with_retry
+        except ImportError:
+            from database import execute_with_retry
+
+        for period in periods:
+            keep = self.keep_bars.get(period, 300)
+            latest = self._latest_dates(period)
+            with self._lock:
+                missing = []
+                for s in dict.fromkeys(symbols):
+                    view = self._loaded_segment(period, s).view
+                    if view.table is None or view.last_date != latest.get(s):
+                        missing.append(s)
+                if not missing:
+                    continue
+
+                def _load(conn, chunk):
+                    cur = conn.cursor()
+                    cols = ", ".join(CACHE_COLUMNS)
+                    cur.execute(f"""
+                        SELECT {cols} FROM (
+                            SELECT {cols}, ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY date DESC) AS rn
+                            FROM {period}_prices
+                            WHERE symbol IN ({", ".join("?" * len(chunk))})
+                        ) WHERE rn <= ?
+                    """, (*chunk, keep))
+                    return cur.fetchall()
+
+                try:
+                    loaded = []
+                    for i in range(0, len(missing), REFRESH_CHUNK):
+                        loaded.extend(execute_with_retry(_load, 3, missing[i:i + REFRESH_CHUNK]))
+                except Exception as e:
+                    logger.warning(f"⚠️ 行情缓存 {period} 补齐失败: {e}")
+                    continue
+                if not loaded:
+                    continue
+
+                new = pd.DataFrame(loaded, columns=CACHE_COLUMNS)
+                groups = new.groupby("symbol", sort=False)
+                for symbol, df in groups:
+                    try:
+                        self._write(period, symbol, df, len(df) < keep)
+                    except Exception as e:
+                        self._invalidate(period, symbol, e)
+                logger.info(f"🗂️ 行情缓存 {period}: 载入 {groups.ngroups} 只股票 ({len(loaded)} 行)")
+
+
+_cache = PriceCache()
+
+
+def get_price_cache() -> PriceCache:
+    return _cache
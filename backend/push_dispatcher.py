@@ -0,0 +1,284 @@
+"""
+Web Push 异步投递器 (PushDispatcher)
+
+- send_push_notification 只把消息放进队列就返回，分析 / 简报循环不再等待 HTTP
+- 后台线程运行独立事件循环，用共享的 httpx.AsyncClient (keep-alive 连接池) 并发发送，并发数受限
+- 攒批: linger_ms 内到达、模板相同 (title/body/url/tag) 的定向消息合并为一次
+  target_user_ids 请求 (/api/internal/notify 批量接口)
+- 失败重试: 网络错误 / 429 / 5xx 的消息写入 push_queue，按指数退避由后台循环重新投递；
+  超过 max_attempts 或其他 4xx 标记为 failed 留档
+- push_queue 的读写在事件循环线程内同步执行，进程退出时的 flush 也能把失败消息落库
+"""
+import asyncio
+import atexit
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    from backend.config import PUSH_DISPATCH_CONFIG
+    from backend.database import execute_with_retry
+    from backend.logger import logger
+except ImportError:
+    from config import PUSH_DISPATCH_CONFIG
+    from database import execute_with_retry
+    from logger import logger
+
+# 被认领的重试消息在该秒数内不会被再次认领 (进程中途退出时到期后自动重新投递)
+CLAIM_LEASE_SECONDS = 300
+# 每轮最多认领的重试消息数
+CLAIM_BATCH = 500
+# 退出时等待队列发送完成的最长秒数
+EXIT_FLUSH_TIMEOUT = 30
+
+
+def notify_api_url() -> str:
+    # 在 GitHub Actions 中，NEXT_PUBLIC_SITE_URL 或类似变量应指向生产环境
+    # 如果没有设置，默认为 localhost (开发用)
+    base_url = os.getenv("NEXT_PUBLIC_SITE_URL") or "http://localhost:3000"
+    return f"{base_url}/api/internal/notify"
+
+
+def _coalesce_key(payload: Dict[str, Any]) -> Optional[tuple]:
+    """只有定向单个用户的消息可以合并；按股票 / 广播的消息原样发送"""
+    if not payload.get("target_user_id") or payload.get("related_symbol") or payload.get("broadcast"):
+        return None
+    return (payload.get("title"), payload.get("body"), payload.get("url"), payload.get("tag"))
+
+
+def build_requests(messages: List[dict], bulk: bool = True, max_targets: int = 100) -> List[Tuple[dict, List[dict]]]:
+    """
+    把一批消息合并成请求: [(请求体, 该请求覆盖的消息列表)]
+    每条消息为 {"payload": ..., "queue_id": ..., "attempts": ...}
+    """
+    groups: Dict[tuple, List[dict]] = {}
+    out: List[Tuple[dict, List[dict]]] = []
+    for msg in messages:
+        key = _coalesce_key(msg["payload"]) if bulk else None
+        if key is None:
+            out.append((msg["payload"], [msg]))
+        else:
+            groups.setdefault(key, []).append(msg)
+
+    for (title, body, url, tag), msgs in groups.items():
+        if len(msgs) == 1:
+            out.append((msgs[0]["payload"], msgs))
+            continue
+        for i in range(0, len(msgs), max_targets):
+            chunk = msgs[i:i + max_targets]
+            targets = list(dict.fromkeys(m["payload"]["target_user_id"] for m in chunk))
+            out.append(({"title": title, "body": body, "url": url, "tag": tag, "target_user_ids": targets}, chunk))
+    return out
+
+
+def _claim_due(conn, now: float, limit: int) -> List[tuple]:
+    """认领到期的重试消息，并把它们的 next_attempt_at 推后一个租期"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, payload, attempts FROM push_queue
+        WHERE status = 'pending' AND next_attempt_at <= ?
+        ORDER BY next_attempt_at LIMIT ?
+    """, (now, limit))
+    rows = cursor.fetchall()
+    if rows:
+        cursor.execute(f"""
+            UPDATE push_queue SET next_attempt_at = ?
+            WHERE id IN ({", ".join("?" * len(rows))})
+        """, (now + CLAIM_LEASE_SECONDS, *(r[0] for r in rows)))
+    return rows
+
+
+def _record_results(conn, delivered: List[dict], failed: List[Tuple[dict, str, bool]], now: float,
+                    max_attempts: int, retry_base: float) -> int:
+    """发送成功的重试消息出队；失败的消息入队 / 推迟 / 标记为 failed，返回进入重试的条数"""
+    cursor = conn.cursor()
+    done_ids = [m["queue_id"] for m in delivered if m.get("queue_id")]
+    if done_ids:
+        cursor.execute(f"DELETE FROM push_queue WHERE id IN ({', '.join('?' * len(done_ids))})", done_ids)
+
+    scheduled = 0
+    for msg, error, retryable in failed:
+        attempts = msg.get("attempts", 0) + 1
+        if retryable and attempts < max_attempts:
+            status, next_at = "pending", now + retry_base * (2 ** (attempts - 1))
+            scheduled += 1
+        else:
+            status, next_at = "failed", None
+        if msg.get("queue_id"):
+            cursor.execute("""
+                UPDATE push_queue SET attempts = ?, status = ?, next_attempt_at = ?, last_error = ?,
+                    updated_at = datetime('now', '+8 hours')
+                WHERE id = ?
+            """, (attempts, status, next_at, error, msg["queue_id"]))
+        else:
+            cursor.execute("""
+                INSERT INTO push_queue (payload, attempts, status, next_attempt_at, last_error, updated_at)
+                VALUES (?, ?, ?, ?, ?, datetime('now', '+8 hours'))
+            """, (json.dumps(msg["payload"], ensure_ascii=False), attempts, status, next_at, error))
+    return scheduled
+
+
+class PushDispatcher:
+    """进程内单例的异步推送队列 (线程安全: 任何线程 / 事件循环都可以 submit)"""
+
+    def __init__(self, config: Dict[str, Any] = None):
+        self.config = dict(PUSH_DISPATCH_CONFIG, **(config or {}))
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._client = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._start_lock = threading.Lock()
+        self._idle = threading.Condition()
+        self._pending = 0
+        self.stats = {"submitted": 0, "requests": 0, "delivered": 0, "retry_scheduled": 0, "failed": 0}
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="push-dispatcher", daemon=True).start()
+            asyncio.run_coroutine_threadsafe(self._setup(), loop).result()
+            self._loop = loop
+            asyncio.run_coroutine_threadsafe(self._consume(), loop)
+            asyncio.run_coroutine_threadsafe(self._retry_loop(), loop)
+            atexit.register(self.flush, EXIT_FLUSH_TIMEOUT)
+
+    async def _setup(self):
+        self._queue = asyncio.Queue()
+        self._semaphore = asyncio.Semaphore(max(1, self.config["concurrency"]))
+        if httpx is not None:
+            concurrency = max(1, self.config["concurrency"])
+            self._client = httpx.AsyncClient(
+                timeout=self.config["timeout"],
+                limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            )
+
+    def submit(self, payload: Dict[str, Any]):
+        """入队后立即返回"""
+        self.start()
+        with self._idle:
+            self._pending += 1
+            self.stats["submitted"] += 1
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, {"payload": payload, "queue_id": None, "attempts": 0})
+
+    def flush(self, timeout: float = None) -> bool:
+        """阻塞直到已提交的消息全部处理完 (发送成功或进入重试队列)，超时返回 False"""
+        if self._loop is None:
+            return True
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def _done(self, n: int):
+        with self._idle:
+            self._pending -= n
+            if self._pending <= 0:
+                self._idle.notify_all()
+
+    # ---------- 事件循环内 ----------
+
+    async def _consume(self):
+        while True:
+            batch = [await self._queue.get()]
+            if self.config["linger_ms"] > 0:
+                await asyncio.sleep(self.config["linger_ms"] / 1000)
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            for body, msgs in build_requests(batch, self.config["bulk_endpoint"], self.config["batch_max_targets"]):
+                asyncio.ensure_future(self._deliver(body, msgs))
+
+    async def _deliver(self, body: dict, msgs: List[dict]):
+        try:
+            async with self._semaphore:
+                ok, error, retryable = await self._post(body)
+            self.stats["requests"] += 1
+            if ok:
+                self.stats["delivered"] += len(msgs)
+                if any(m.get("queue_id") for m in msgs):
+                    await self._record(msgs, [])
+                logger.info(f"✅ 推送发送成功: {body.get('title')} (Target: "
+                            f"{body.get('target_user_id') or len(body.get('target_user_ids') or []) or 'Broadcast'})")
+            else:
+                logger.warning(f"⚠️ 推送发送失败: {error}")
+                await self._record([], [(m, error, retryable) for m in msgs])
+        except Exception as e:
+            logger.error(f"❌ 推送请求异常: {e}")
+        finally:
+            self._done(len(msgs))
+
+    async def _post(self, body: dict) -> Tuple[bool, Optional[str], bool]:
+        """返回 (是否成功, 错误信息, 是否值得重试)"""
+        headers = {
+            "Authorization": f"Bearer {os.getenv('INTERNAL_API_SECRET')}",
+            "Content-Type": "application/json"
+        }
+        try:
+            if self._client is not None:
+                response = await self._client.post(notify_api_url(), json=body, headers=headers)
+            else:
+                response = await asyncio.to_thread(requests.post, notify_api_url(), json=body, headers=headers,
+                                                   timeout=self.config["timeout"])
+        except Exception as e:
+            return False, f"{type(e).__name__}: {e}", True
+        if response.status_code == 200:
+            return True, None, False
+        error = f"[{response.status_code}] {response.text[:200]}"
+        return False, error, response.status_code == 429 or response.status_code >= 500
+
+    async def _record(self, delivered: List[dict], failed: List[Tuple[dict, str, bool]]):
+        # 在事件循环线程内同步写库: 退出时 (atexit flush) 默认线程池已经关闭，asyncio.to_thread 会直接抛错
+        try:
+            scheduled = execute_with_retry(_record_results, 3, delivered, failed, time.time(),
+                                           self.config["max_attempts"], self.config["retry_base_seconds"])
+        except Exception as e:
+            logger.error(f"❌ 推送重试队列写入失败: {e}")
+            return
+        self.stats["retry_scheduled"] += scheduled
+        self.stats["failed"] += len(failed) - scheduled
+
+    async def _retry_loop(self):
+        while True:
+            try:
+                await self.retry_due()
+            except Exception as e:
+                logger.debug(f"ℹ️ 推送重试队列暂不可用: {e}")
+            await asyncio.sleep(self.config["retry_interval_seconds"])
+
+    def retry_now(self) -> int:
+        """立即重新投递 push_queue 中到期的消息 (同步调用)，返回条数"""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self.retry_due(), self._loop).result()
+
+    async def retry_due(self) -> int:
+        """把 push_queue 中到期的消息重新放回发送队列"""
+        rows = execute_with_retry(_claim_due, 3, time.time(), CLAIM_BATCH)
+        if rows:
+            with self._idle:
+                self._pending += len(rows)
+            for queue_id, payload, attempts in rows:
+                self._queue.put_nowait({"payload": json.loads(payload), "queue_id": queue_id, "attempts": attempts})
+            logger.info(f"🔁 重新投递 {len(rows)} 条失败推送")
+        return len(rows)
+
+
+_dispatcher: Optional[PushDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_push_dispatcher() -> PushDispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = PushDispatcher()
+    return _dispatcher
@@ -1,3 +1,3 @@
 # Expose key components
 from .engine import QuantEngine
-from .types import QuantSignal, AnalysisResult
+from .types import QuantSignal, AnalysisResult, BacktestResult
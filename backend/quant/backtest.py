@@ -0,0 +1,147 @@
+"""
+向量化回测引擎
+一次性在整张 (symbol × date) 表上评估策略，而不是逐行调用 strategy.analyze():
+  1. 日线按 symbol 做 as-of join 对齐当时已知的最新周线 / 月线 (date <= 当日，无未来数据)
+  2. strategy.analyze_frame() 向量化产出信号、置信度
+  3. 次一交易日的 change_percent 作为 actual_change，按 validator 的规则判定 Correct / Incorrect
+"""
+import argparse
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .strategies.base import BaseStrategy
+from .strategies.trend import TrendStrategy
+from .types import BacktestResult
+
+try:
+    from backend.database import execute_with_retry
+    from backend.engine.validator import calculate_status_vectorized
+except ImportError:
+    from database import execute_with_retry
+    from engine.validator import calculate_status_vectorized
+
+DAILY_COLUMNS = ["symbol", "date", "close", "change_percent", "ma5", "ma20", "rsi", "macd_hist"]
+PERIOD_COLUMNS = ["symbol", "date", "close", "ma20"]
+
+
+def load_prices(symbols: List[str] = None, start_date: str = None,
+                end_date: str = None) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """一次读出回测所需的日线 / 周线 / 月线列 (每个周期一条查询)"""
+    def _query(conn, table: str, columns: List[str]) -> pd.DataFrame:
+        where, params = [], []
+        if symbols:
+            where.append(f"symbol IN ({', '.join(['?'] * len(symbols))})")
+            params.extend(symbols)
+        # 周/月线不设起点: 区间第一天也要能对齐到之前的周期
+        if start_date and table == "daily_prices":
+            where.append("date >= ?")
+            params.append(start_date)
+        if end_date:
+            where.append("date <= ?")
+            params.append(end_date)
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT {", ".join(columns)} FROM {table}
+            {"WHERE " + " AND ".join(where) if where else ""}
+        """, tuple(params))
+        return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+    return tuple(execute_with_retry(_query, 3, table, columns) for table, columns in (
+        ("daily_prices", DAILY_COLUMNS), ("weekly_prices", PERIOD_COLUMNS), ("monthly_prices", PERIOD_COLUMNS)
+    ))
+
+
+def align_periods(daily: pd.DataFrame, weekly: Optional[pd.DataFrame] = None,
+                  monthly: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    按 symbol 排序日线并 as-of 对齐周线 / 月线 (取 date <= 当日的最近一根)，
+    追加 weekly_close / weekly_ma20 / monthly_close / monthly_ma20 与次日涨跌 actual_change
+    """
+    frame = daily.copy()
+    frame["_ts"] = pd.to_datetime(frame["date"], format="%Y-%m-%d")
+    frame = frame.sort_values("_ts", kind="stable").reset_index(drop=True)
+
+    for name, period in (("weekly", weekly), ("monthly", monthly)):
+        cols = [f"{name}_close", f"{name}_ma20"]
+        if period is None or period.empty:
+            frame[cols] = np.nan
+            continue
+        right = period[["symbol", "date", "close", "ma20"]].rename(columns={"close": cols[0], "ma20": cols[1]})
+        right["_ts"] = pd.to_datetime(right.pop("date"), format="%Y-%m-%d")
+        frame = pd.merge_asof(frame, right.sort_values("_ts", kind="stable"), on="_ts", by="symbol",
+                              direction="backward")
+
+    frame = frame.sort_values(["symbol", "_ts"], kind="stable").reset_index(drop=True).drop(columns="_ts")
+    # 预测的验证日是下一个有行情的交易日 (同 target_date = 下一交易日)
+    frame["actual_change"] = frame.groupby("symbol", sort=False)["change_percent"].shift(-1)
+    return frame
+
+
+class BacktestEngine:
+    """在整段历史上一次性评估一个策略"""
+
+    def __init__(self, strategy: BaseStrategy = None, strategy_name: str = "trend"):
+        self.strategy = strategy or TrendStrategy()
+        self.strategy_name = strategy_name
+
+    def run(self, daily: pd.DataFrame, weekly: Optional[pd.DataFrame] = None,
+            monthly: Optional[pd.DataFrame] = None) -> BacktestResult:
+        frame = align_periods(daily, weekly, monthly)
+        signals = pd.concat([frame, self.strategy.analyze_frame(frame)], axis=1)
+
+        # 最后一天没有次日行情: 保持 Pending
+        actual = signals["actual_change"].to_numpy(dtype=float)
+        status = calculate_status_vectorized(signals["action"].to_numpy(), actual)
+        signals["validation_status"] = np.where(np.isnan(actual), "Pending", status)
+
+        return BacktestResult(
+            strategy_name=self.strategy_name,
+            signals=signals,
+            by_symbol=self._hit_rates(signals, "symbol"),
+            summary=self._summary(signals),
+        )
+
+    def run_from_db(self, symbols: List[str] = None, start_date: str = None, end_date: str = None) -> BacktestResult:
+        return self.run(*load_prices(symbols, start_date, end_date))
+
+    @staticmethod
+    def _hit_rates(signals: pd.DataFrame, by: str) -> pd.DataFrame:
+        validated = signals[signals["validation_status"] != "Pending"]
+        grouped = validated.assign(correct=validated["validation_status"] == "Correct").groupby(by)
+        stats = grouped.agg(total=("correct", "size"), correct=("correct", "sum"),
+                            avg_confidence=("confidence", "mean"))
+        stats["hit_rate"] = stats["correct"] / stats["total"] * 100
+        return stats
+
+    @classmethod
+    def _summary(cls, signals: pd.DataFrame) -> dict:
+        validated = signals[signals["validation_status"] != "Pending"]
+        total = len(validated)
+        correct = int((validated["validation_status"] == "Correct").sum())
+        return {
+            "symbols": int(signals["symbol"].nunique()),
+            "rows": len(signals),
+            "total": total,
+            "correct": correct,
+            "hit_rate": (correct / total * 100) if total else 0,
+            "by_signal": cls._hit_rates(signals, "action").to_dict("index"),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vectorized strategy backtest over daily_prices")
+    parser.add_argument("--symbols", nargs="*", help="股票代码 (默认全部)")
+    parser.add_argument("--start", help="起始日期 YYYY-MM-DD")
+    parser.add_argument("--end", help="结束日期 YYYY-MM-DD")
+    args = parser.parse_args()
+
+    started = time.time()
+    result = BacktestEngine().run_from_db(args.symbols, args.start, args.end)
+    s = result.summary
+    print(f"📊 {result.strategy_name}: {s['symbols']} 只股票, {s['rows']} 行, "
+          f"命中率 {s['hit_rate']:.1f}% ({s['correct']}/{s['total']}), 耗时 {time.time() - started:.1f}s")
+    for action, stats in s["by_signal"].items():
+        print(f"   {action:<5} {stats['hit_rate']:.1f}% ({int(stats['correct'])}/{int(stats['total'])})")
@@ -0,0 +1,185 @@
+"""
+增量指标计算
+保存把序列向后延长一根 K 线所需的最小状态，逐根更新，与 pandas_ta_classic 的全量结果一致:
+  - MA5/10/20/60: 滚动窗口和
+  - MACD(12,26,9): 以 SMA 为种子的 EMA 状态 (同 ta.ema(sma=True, adjust=False))
+  - BOLL(20,2): 20 根收盘窗口，总体标准差 (ddof=0)
+  - RSI(14): 以 SMA 为种子的 Wilder 平滑 (同 ta.rma)
+  - KDJ(9,3,3): 9 根最高/最低价 deque + K/D 的 3 根 SMA 窗口
+"""
+import json
+import math
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+NAN = float("nan")
+
+MA_LENGTHS = (5, 10, 20, 60)
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+BOLL_LENGTH, BOLL_STD = 20, 2
+RSI_LENGTH = 14
+KDJ_K, KDJ_D, KDJ_SMOOTH = 9, 3, 3
+
+# 滚动和每累计这么多根后从窗口重新求和，避免浮点误差累积
+RESYNC_EVERY = 500
+
+INDICATOR_COLUMNS = [
+    "ma5", "ma10", "ma20", "ma60", "macd", "macd_signal", "macd_hist",
+    "boll_upper", "boll_mid", "boll_lower", "rsi", "kdj_k", "kdj_d", "kdj_j",
+]
+
+
+def _ema_step(state: dict, value: float, length: int, alpha: float = None) -> float:
+    """SMA 种子 EMA: 前 length 个值取均值作为首个输出，之后 y = y' + α(x - y')
+    alpha 默认 2/(length+1)；Wilder 平滑 (RSI) 传 1/length
+    """
+    if state["count"] < length:
+        state["count"] += 1
+        state["seed"] += value
+        if state["count"] < length:
+            return NAN
+        state["value"] = state["seed"] / length
+        return state["value"]
+    alpha = alpha or 2.0 / (length + 1)
+    state["value"] = (1 - alpha) * state["value"] + alpha * value
+    return state["value"]
+
+
+def _new_ema() -> dict:
+    return {"count": 0, "seed": 0.0, "value": NAN}
+
+
+@dataclass
+class IndicatorState:
+    """指标状态 (可 JSON 序列化，按 symbol + period 持久化)"""
+    as_of: Optional[str] = None           # 最后一根已纳入状态的 K 线日期
+    last_close: Optional[float] = None    # 该 K 线收盘价 (用于检测前复权重算)
+    bars: int = 0
+    closes: List[float] = field(default_factory=list)       # 最近 60 根收盘
+    ma_sums: Dict[str, float] = field(default_factory=lambda: {str(n): 0.0 for n in MA_LENGTHS})
+    ema_fast: dict = field(default_factory=_new_ema)
+    ema_slow: dict = field(default_factory=_new_ema)
+    ema_signal: dict = field(default_factory=_new_ema)
+    rsi_gain: dict = field(default_factory=_new_ema)
+    rsi_loss: dict = field(default_factory=_new_ema)
+    highs: List[float] = field(default_factory=list)        # 最近 9 根最高价
+    lows: List[float] = field(default_factory=list)         # 最近 9 根最低价
+    raw_k: List[float] = field(default_factory=list)        # 最近 3 个未平滑 %K
+    smooth_k: List[float] = field(default_factory=list)     # 最近 3 个 K
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, raw: str) -> "IndicatorState":
+        return cls(**json.loads(raw))
+
+
+class IncrementalIndicators:
+    """逐根 K 线更新指标；update() 返回该 K 线的指标字典 (未预热的指标为 NaN)"""
+
+    def __init__(self, state: IndicatorState = None):
+        self.state = state or IndicatorState()
+        s = self.state
+        self._closes = deque(s.closes, maxlen=max(MA_LENGTHS))
+        self._highs = deque(s.highs, maxlen=KDJ_K)
+        self._lows = deque(s.lows, maxlen=KDJ_K)
+        self._raw_k = deque(s.raw_k, maxlen=KDJ_SMOOTH)
+        self._smooth_k = deque(s.smooth_k, maxlen=KDJ_D)
+
+    def snapshot(self) -> IndicatorState:
+        """导出当前状态的独立副本"""
+        s = self.state
+        s.closes, s.highs, s.lows = list(self._closes), list(self._highs), list(self._lows)
+        s.raw_k, s.smooth_k = list(self._raw_k), list(self._smooth_k)
+        return IndicatorState.from_json(s.to_json())
+
+    def update(self, date: str, high: float, low: float, close: float) -> Dict[str, float]:
+        s = self.state
+        out: Dict[str, float] = {}
+        prev_close = self._closes[-1] if self._closes else None
+
+        # --- MA (滚动和) ---
+        closes = self._closes
+        for n in MA_LENGTHS:
+            key = str(n)
+            s.ma_sums[key] += close
+            if len(closes) >= n:
+                s.ma_sums[key] -= closes[-n]
+        closes.append(close)
+        s.bars += 1
+        if s.bars % RESYNC_EVERY == 0:
+            window = list(closes)
+            for n in MA_LENGTHS:
+                s.ma_sums[str(n)] = math.fsum(window[-n:])
+        for n in MA_LENGTHS:
+            out[f"ma{n}"] = s.ma_sums[str(n)] / n if s.bars >= n else NAN
+
+        # --- MACD ---
+        fast = _ema_step(s.ema_fast, close, MACD_FAST)
+        slow = _ema_step(s.ema_slow, close, MACD_SLOW)
+        macd = fast - slow if not (math.isnan(fast) or math.isnan(slow)) else NAN
+        signal = _ema_step(s.ema_signal, macd, MACD_SIGNAL) if not math.isnan(macd) else NAN
+        out["macd"], out["macd_signal"] = macd, signal
+        out["macd_hist"] = macd - signal if not math.isnan(signal) else NAN
+
+        # --- BOLL (总体标准差) ---
+        if s.bars >= BOLL_LENGTH:
+            mid = out["ma20"]
+            window = list(closes)[-BOLL_LENGTH:]
+            std = math.sqrt(sum((c - mid) ** 2 for c in window) / BOLL_LENGTH)
+            out["boll_mid"], out["boll_upper"], out["boll_lower"] = mid, mid + BOLL_STD * std, mid - BOLL_STD * std
+        else:
+            out["boll_mid"] = out["boll_upper"] = out["boll_lower"] = NAN
+
+        # --- RSI (Wilder 平滑的平均涨幅/跌幅) ---
+        out["rsi"] = NAN
+        if prev_close is not None:
+            diff = close - prev_close
+            gain = _ema_step(s.rsi_gain, max(diff, 0.0), RSI_LENGTH, alpha=1.0 / RSI_LENGTH)
+            loss = abs(_ema_step(s.rsi_loss, min(diff, 0.0), RSI_LENGTH, alpha=1.0 / RSI_LENGTH))
+            if not math.isnan(gain) and gain + loss:
+                out["rsi"] = 100 * gain / (gain + loss)
+
+        # --- KDJ (stoch 9/3/3) ---
+        self._highs.append(high)
+        self._lows.append(low)
+        k = d = NAN
+        if len(self._highs) == KDJ_K:
+            hh, ll = max(self._highs), min(self._lows)
+            # 与 pandas_ta 的 non_zero_range 一致: 区间为 0 时 %K 取 0
+            self._raw_k.append(100 * (close - ll) / (hh - ll) if hh != ll else 0.0)
+            if len(self._raw_k) == KDJ_SMOOTH:
+                k = sum(self._raw_k) / KDJ_SMOOTH
+                self._smooth_k.append(k)
+                if len(self._smooth_k) == KDJ_D:
+                    d = sum(self._smooth_k) / KDJ_D
+        out["kdj_k"], out["kdj_d"] = k, d
+        out["kdj_j"] = 3 * k - 2 * d if not math.isnan(d) else NAN
+
+        s.as_of, s.last_close = date, close
+        return out
+
+
+def replay(df, state: IndicatorState = None):
+    """
+    在状态基础上依次更新 df 中的每一根 K 线 (df 需按日期升序，含 date/high/low/close)
+    返回 (带指标列的 df 副本, 倒数第二根 K 线之后的状态快照)
+
+    最后一根 K 线可能是盘中/未完结的周期，会在下次同步时被覆盖，因此状态只推进到它之前
+    """
+    engine = IncrementalIndicators(state)
+    records = []
+    committed = engine.snapshot()
+    n = len(df)
+    for i, (date, high, low, close) in enumerate(zip(df["date"], df["high"], df["low"], df["close"])):
+        if i == n - 1:
+            committed = engine.snapshot()
+        records.append(engine.update(date, float(high), float(low), float(close)))
+
+    out = df.copy()
+    for col in INDICATOR_COLUMNS:
+        out[col] = [r[col] for r in records]
+    out = out.fillna(0).infer_objects(copy=False)
+    return out, committed
@@ -1,11 +1,35 @@
+from typing import Dict
+
+import numpy as np
 import pandas as pd
-import pandas_ta_classic as ta
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    import pandas_ta_classic as ta
+except ImportError:
+    ta = None
+
+try:
+    from backend.config import INDICATOR_CONFIG
+except ImportError:
+    from config import INDICATOR_CONFIG
+
+from .incremental import INDICATOR_COLUMNS
 
 # 解决 Pandas 2.2+ 的 FutureWarnings
 pd.set_option('future.no_silent_downcasting', True)
 
 def calculate_indicators(df: pd.DataFrame) -> pd.DataFrame:
-    """计算技术指标"""
+    """计算技术指标 (内核由 INDICATOR_CONFIG["kernel"] 选择: pandas_ta / numpy)"""
+    if df.empty:
+        return df
+    if INDICATOR_CONFIG.get("kernel") == "numpy" or ta is None:
+        return calculate_indicators_numpy(df)
+    return calculate_indicators_pandas_ta(df)
+
+
+def calculate_indicators_pandas_ta(df: pd.DataFrame) -> pd.DataFrame:
+    """pandas_ta_classic 内核 (逐只股票，多次 pandas 计算)"""
     if df.empty:
         return df
 
@@ -22,9 +46,11 @@ def calculate_indicators(df: pd.DataFrame) -> pd.DataFrame:
     # MACD
     macd = ta.macd(df["close"], fast=12, slow=26, signal=9)
     if macd is not None:
-        df["macd"] = macd.iloc[:, 0]
-        df["macd_signal"] = macd.iloc[:, 1]
-        df["macd_hist"] = macd.iloc[:, 2]
+        # pandas_ta 的列顺序是 MACD / MACDh / MACDs，按列名前缀取值
+        cols = {c.split("_")[0]: c for c in macd.columns}
+        df["macd"] = macd[cols["MACD"]]
+        df["macd_signal"] = macd[cols["MACDs"]]
+        df["macd_hist"] = macd[cols["MACDh"]]
     else:
         df["macd"] = 0
         df["macd_signal"] = 0
@@ -60,3 +86,109 @@ def calculate_indicators(df: pd.DataFrame) -> pd.DataFrame:
     # 填充缺失值并类型转换
     df = df.fillna(0).infer_objects(copy=False)
     return df
+
+
+# ---------- 纯 NumPy 内核 ----------
+# 输入为 (symbols × bars) 矩阵，每行左侧可用 NaN 填充 (历史较短的股票)，
+# 预热期、SMA 种子 EMA、Wilder 平滑和 stoch 的零区间处理均与 pandas_ta_classic 一致
+
+def _rolling(x: np.ndarray, n: int, reducer) -> np.ndarray:
+    """沿 bars 轴的滚动窗口统计；窗口内含 NaN (含左侧填充) 时结果为 NaN"""
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] >= n:
+        out[:, n - 1:] = reducer(sliding_window_view(x, n, axis=1), axis=2)
+    return out
+
+
+def _seeded_ema(x: np.ndarray, n: int, alpha: float) -> np.ndarray:
+    """SMA 种子的指数平滑: 每行首个有效值起的前 n 个值取均值作种子，之后 y = (1-α)y' + αx"""
+    symbols, bars = x.shape
+    valid = ~np.isnan(x)
+    seed_at = np.where(valid.any(axis=1), valid.argmax(axis=1), bars) + n - 1
+    seed = _rolling(x, n, np.mean)
+
+    out = np.full(x.shape, np.nan)
+    prev = np.full(symbols, np.nan)
+    for t in range(bars):
+        prev = np.where(t == seed_at, seed[:, t], np.where(t > seed_at, (1 - alpha) * prev + alpha * x[:, t], np.nan))
+        out[:, t] = prev
+    return out
+
+
+def compute_indicator_arrays(close, high, low) -> Dict[str, np.ndarray]:
+    """一次向量化计算全部指标列，返回 {列名: (symbols × bars) 数组}，未预热处为 NaN"""
+    close = np.atleast_2d(np.asarray(close, dtype=float))
+    high = np.atleast_2d(np.asarray(high, dtype=float))
+    low = np.atleast_2d(np.asarray(low, dtype=float))
+    out: Dict[str, np.ndarray] = {}
+
+    # SMA
+    for n in (5, 10, 20, 60):
+        out[f"ma{n}"] = _rolling(close, n, np.mean)
+
+    # MACD (12, 26, 9)
+    macd = _seeded_ema(close, 12, 2 / 13) - _seeded_ema(close, 26, 2 / 27)
+    signal = _seeded_ema(macd, 9, 2 / 10)
+    out["macd"], out["macd_signal"], out["macd_hist"] = macd, signal, macd - signal
+
+    # BBANDS (20, 2)，总体标准差
+    std = _rolling(close, 20, np.std)
+    out["boll_mid"] = out["ma20"]
+    out["boll_upper"] = out["ma20"] + 2 * std
+    out["boll_lower"] = out["ma20"] - 2 * std
+
+    # RSI (14)，Wilder 平滑
+    diff = np.diff(close, axis=1, prepend=np.nan)
+    gain = _seeded_ema(np.maximum(diff, 0), 14, 1 / 14)
+    loss = np.abs(_seeded_ema(np.minimum(diff, 0), 14, 1 / 14))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out["rsi"] = 100 * gain / (gain + loss)
+
+        # KDJ (stoch 9/3/3)，零区间按 pandas_ta 的 non_zero_range 用 epsilon 代替
+        lowest = _rolling(low, 9, np.min)
+        span = _rolling(high, 9, np.max) - lowest
+        raw_k = 100 * (close - lowest) / np.where(span == 0, np.finfo(float).eps, span)
+    k = _rolling(raw_k, 3, np.mean)
+    d = _rolling(k, 3, np.mean)
+    out["kdj_k"], out["kdj_d"], out["kdj_j"] = k, d, 3 * k - 2 * d
+    return out
+
+
+def _attach(df: pd.DataFrame, arrays: Dict[str, np.ndarray], row: int, offset: int) -> pd.DataFrame:
+    """把一行指标结果拼回 DataFrame (一次 concat，避免逐列插入)，并按 fillna(0) 语义补零"""
+    indicators = pd.DataFrame({col: arrays[col][row, offset:] for col in INDICATOR_COLUMNS}, index=df.index)
+    base = df.drop(columns=[c for c in INDICATOR_COLUMNS if c in df.columns])
+    if base.isna().values.any():
+        base = base.fillna(0).infer_objects(copy=False)
+    return pd.concat([base, indicators], axis=1)
+
+
+def _finalize(arrays: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """未预热的 NaN 统一置 0 (对应 pandas 内核末尾的 fillna(0))"""
+    return {col: np.nan_to_num(arr, nan=0.0, posinf=0.0, neginf=0.0) for col, arr in arrays.items()}
+
+
+def calculate_indicators_numpy(df: pd.DataFrame) -> pd.DataFrame:
+    """NumPy 内核的单只股票入口，输出列与 calculate_indicators_pandas_ta 相同"""
+    if df.empty:
+        return df
+    arrays = compute_indicator_arrays(df["close"].to_numpy(dtype=float),
+                                      df["high"].to_numpy(dtype=float),
+                                      df["low"].to_numpy(dtype=float))
+    return _attach(df, _finalize(arrays), 0, 0)
+
+
+def calculate_indicators_batch(frames: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    """多只股票一次计算: 按最后一根 K 线右对齐打包为 (symbols × bars) 矩阵，较短的行左侧填 NaN"""
+    frames = {sym: df for sym, df in frames.items() if not df.empty}
+    if not frames:
+        return {}
+
+    bars = max(len(df) for df in frames.values())
+    packed = {col: np.full((len(frames), bars), np.nan) for col in ("close", "high", "low")}
+    for i, df in enumerate(frames.values()):
+        for col, matrix in packed.items():
+            matrix[i, bars - len(df):] = df[col].to_numpy(dtype=float)
+
+    arrays = _finalize(compute_indicator_arrays(packed["close"], packed["high"], packed["low"]))
+    return {sym: _attach(df, arrays, i, bars - len(df)) for i, (sym, df) in enumerate(frames.items())}
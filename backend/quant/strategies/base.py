@@ -17,3 +17,30 @@ class BaseStrategy(ABC):
                 - 'monthly_row': Optional[pd.Series] (Latest monthly data)
         """
         pass
+
+    def analyze_frame(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        向量化版本: 一次评估多行 (symbol × date)，供回测引擎使用
+
+        Args:
+            frame: 每行一个 (symbol, date)，日线列 + as-of 对齐的 weekly_close / weekly_ma20 / monthly_close / monthly_ma20
+        Returns:
+            与 frame 同索引的 DataFrame: action, confidence, reason, risk_level
+
+        默认逐行调用 analyze() (未对齐到周线 / 月线的行传 None)，任何策略都能回测；子类可覆盖为真正的向量化实现
+        """
+        def _period_row(row: pd.Series, name: str) -> Optional[pd.Series]:
+            close = row.get(f"{name}_close")
+            if close is None or pd.isna(close):
+                return None
+            return pd.Series({"close": close, "ma20": row.get(f"{name}_ma20")})
+
+        signals = []
+        for _, row in frame.iterrows():
+            sig = self.analyze(row.get("symbol", ""), {
+                "daily_row": row,
+                "weekly_row": _period_row(row, "weekly"),
+                "monthly_row": _period_row(row, "monthly"),
+            })
+            signals.append((sig.action, sig.confidence, sig.reason, sig.risk_level))
+        return pd.DataFrame(signals, columns=["action", "confidence", "reason", "risk_level"], index=frame.index)
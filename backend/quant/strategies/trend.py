@@ -1,4 +1,5 @@
 from typing import Dict, Any
+import numpy as np
 import pandas as pd
 from .base import BaseStrategy
 from ..types import QuantSignal
@@ -89,3 +90,44 @@ class TrendStrategy(BaseStrategy):
             reason=reason,
             risk_level="High" if resonance_count < 2 else "Low"
         )
+
+    def analyze_frame(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        analyze() 的向量化版本，规则逐条对应 (NaN 参与比较时结果为 False，与单行 Series 一致)
+        没有对齐到周线/月线的行按 Bull 处理 (同 weekly_row / monthly_row 为 None)
+        """
+        close = frame['close'].to_numpy(dtype=float)
+        ma20 = frame['ma20'].to_numpy(dtype=float)
+        rsi = frame['rsi'].to_numpy(dtype=float)
+
+        # --- Multi-timeframe Trend ---
+        monthly_bear = frame['monthly_close'].to_numpy(dtype=float) <= frame['monthly_ma20'].to_numpy(dtype=float)
+        weekly_bear = frame['weekly_close'].to_numpy(dtype=float) <= frame['weekly_ma20'].to_numpy(dtype=float)
+
+        # --- Base Signal Logic ---
+        support_price = np.where(ma20 > 0, ma20, close * 0.95)
+        short = close < support_price * 0.98
+        choppy = (rsi >= 45) & (rsi <= 55)
+        long = ~short & (close > ma20) & ~choppy
+        action = np.select([short, long], ['Short', 'Long'], 'Side')
+
+        # --- Resonance & Confidence ---
+        resonance = np.select(
+            [long, short],
+            [(~monthly_bear).astype(int) + (~weekly_bear).astype(int), monthly_bear.astype(int) + weekly_bear.astype(int)],
+            0
+        )
+        confidence = np.where(action == 'Side', 0.50, np.choose(resonance, [0.65, 0.75, 0.88]))
+        reason = np.select(
+            [short, choppy, long],
+            ["Price broken below support level", "RSI in choppy zone (45-55)", "Price standing above MA20"],
+            "No clear trend signal"
+        )
+
+        return pd.DataFrame({
+            'action': action,
+            'confidence': confidence,
+            'resonance': resonance,
+            'reason': reason,
+            'risk_level': np.where(resonance < 2, "High", "Low"),
+        }, index=frame.index)
@@ -2,6 +2,8 @@ from dataclasses import dataclass, field
 from typing import Dict, Any, Optional, List
 from typing import Literal
 
+import pandas as pd
+
 @dataclass
 class QuantSignal:
     """标准化的量化信号对象"""
@@ -22,3 +24,14 @@ class AnalysisResult:
     signal: QuantSignal
     indicators_snapshot: Dict[str, float]
     strategy_name: str
+
+@dataclass
+class BacktestResult:
+    """向量化回测结果"""
+    strategy_name: str
+    # 每个 (symbol, date) 一行: action, confidence, reason, risk_level, actual_change, validation_status
+    signals: pd.DataFrame
+    # 每只股票的命中率统计
+    by_symbol: pd.DataFrame
+    # 整体 / 各信号的命中率
+    summary: Dict[str, Any]
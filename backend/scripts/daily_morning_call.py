@@ -17,6 +17,7 @@ sys.path.insert(0, os.path.dirname(backend_path))
 from database import get_connection
 from logger import logger
 from notification_service import NotificationManager
+from notifications import flush_push_notifications
 from config import BEIJING_TZ
 
 try:
@@ -25,6 +26,34 @@ except ImportError:
     from engine.task_logger import get_task_logger
 
 
+BUY_SIGNALS = ('Buy', 'Strong Buy', 'Long')
+
+
+def load_watchlist_predictions(cursor, date_str):
+    """
+    One set-based query for every user's watchlist and the primary predictions targeting date_str.
+    Returns {user_id: (watchlist, [(symbol, signal, name), ...])}; users without predictions
+    are included with an empty list.
+    """
+    cursor.execute("""
+        SELECT w.user_id, w.symbol, p.signal, m.name
+        FROM user_watchlist w
+        LEFT JOIN ai_predictions_v2 p
+            ON p.symbol = w.symbol AND p.target_date = ? AND p.is_primary = 1
+        LEFT JOIN stock_meta m ON m.symbol = p.symbol
+        ORDER BY w.user_id
+    """, (date_str,))
+
+    grouped = {}
+    for user_id, symbol, signal, name in cursor.fetchall():
+        watchlist, predictions = grouped.setdefault(user_id, ({}, []))
+        watchlist[symbol] = None
+        # 与 stock_meta 内连接一致: 没有元数据的预测不计入
+        if signal is not None and name is not None:
+            predictions.append((symbol, signal, name))
+    return {uid: (list(wl), preds) for uid, (wl, preds) in grouped.items()}
+
+
 def generate_morning_calls(dry_run=False, target_date=None):
     """
     Generate and send personalized morning calls for all active users.
@@ -52,42 +81,22 @@ def generate_morning_calls(dry_run=False, target_date=None):
     # Extract just a snippet for the body
     sentiment_snippet = market_sentiment[:100] + "..." if len(market_sentiment) > 100 else market_sentiment
 
-    # 2. Get Users with Watchlists
-    cursor.execute("""
-        SELECT DISTINCT user_id FROM user_watchlist
-    """)
-    users = [row[0] for row in cursor.fetchall()]
+    # 2. Every user's watchlist + today's primary predictions in a single join
+    per_user = load_watchlist_predictions(cursor, today_str)
     
     sent_count = 0
-    for user_id in users:
-        # Fetch user's watchlist symbols
-        cursor.execute("SELECT symbol FROM user_watchlist WHERE user_id = ?", (user_id,))
-        watchlist = [row[0] for row in cursor.fetchall()]
-        
-        if not watchlist:
-            continue
-            
-        # Fetch today's AI plans for these stocks (with names)
-        placeholders = ",".join(["?"] * len(watchlist))
-        cursor.execute(f"""
-            SELECT p.symbol, p.signal, p.confidence, p.ai_reasoning, m.name
-            FROM ai_predictions_v2 p
-            JOIN stock_meta m ON p.symbol = m.symbol
-            WHERE p.symbol IN ({placeholders}) AND p.target_date = ? AND p.is_primary = 1
-        """, (*watchlist, today_str))
-        predictions = cursor.fetchall()
-        
+    for user_id, (watchlist, predictions) in per_user.items():
         if not predictions:
             logger.debug(f"⏩ Skip user {user_id}: No predictions for watchlist today.")
             continue
             
         # Compose personalized message placeholders
-        buy_signals = [f"{p[4]}" for p in predictions if p[1] in ('Buy', 'Strong Buy', 'Long')]
+        buy_signals = [name for _, signal, name in predictions if signal in BUY_SIGNALS]
         
         # Decide which template type to use
         notif_type = "morning_call" if buy_signals else "morning_call_neutral"
         
-        # Queue for NotificationManager to handle (it will fetch tier and render during flush)
+        # Queue for NotificationManager to handle (it preloads tiers/settings and renders during flush)
         nm.queue_notification(user_id, notif_type, {
             "stock_names": ", ".join(buy_signals[:3]),
             "sentiment_snippet": sentiment_snippet,
@@ -98,6 +107,7 @@ def generate_morning_calls(dry_run=False, target_date=None):
         
     # Flush all
     total_delivered = nm.flush()
+    flush_push_notifications()
     logger.info(f"✅ Morning Call Task Finished. Queued: {sent_count}, Delivered: {total_delivered}")
     t_logger.success(f"Delivered briefing to {total_delivered} users.")
     conn.close()
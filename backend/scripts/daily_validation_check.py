@@ -17,6 +17,7 @@ sys.path.insert(0, os.path.dirname(backend_path))
 from database import get_connection
 from logger import logger
 from notification_service import NotificationManager
+from notifications import flush_push_notifications
 from notification_templates import NotificationTemplates
 from engine.validator import verify_all_pending
 
@@ -113,6 +114,7 @@ def run_validation_notifications(dry_run=False):
         })
 
     total_sent = nm.flush()
+    flush_push_notifications()
     logger.info(f"✅ Validation Notification Task Finished. Delivered: {total_sent}")
     conn.close()
 
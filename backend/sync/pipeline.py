@@ -0,0 +1,209 @@
+"""
+分阶段行情同步流水线
+抓取 (网络) -> 指标计算 (CPU) -> 批量写入 (DB)，阶段之间用有界队列连接，
+各阶段按自己的并发度运行，不再在单个线程里串行处理一只股票的全部周期
+"""
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import SYNC_CONFIG
+from logger import logger
+from sync.writer import PriceBatchWriter
+
+PERIODS = ("daily", "weekly", "monthly")
+
+# 队列结束标记
+_STOP = object()
+
+
+# fetchers.fetch_stock_data 各分支实际请求的主机 (akshare 接口)
+HOST_CN = "push2his.eastmoney.com"       # stock_zh_a_hist / fund_etf_hist_em
+HOST_HK = "33.push2his.eastmoney.com"    # stock_hk_hist
+HOST_INDEX = "finance.sina.com.cn"       # stock_zh_index_daily (sh000001 等带交易所前缀的指数)
+
+
+def host_for_symbol(symbol: str) -> str:
+    """行情请求落到的上游主机 (限流的维度)，与 fetchers.fetch_stock_data 的分支一致"""
+    if symbol[:2].lower() in ("sh", "sz"):
+        return HOST_INDEX
+    if len(symbol) == 5:
+        return HOST_HK
+    return HOST_CN
+
+
+class HostRateLimiter:
+    """按主机的最小请求间隔限流 (线程安全，替代原来硬编码的 time.sleep(0.5))"""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot: Dict[str, float] = {}
+
+    def acquire(self, host: str):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+
+
+class PriceSyncPipeline:
+    """
+    三阶段流水线:
+      1. fetch: fetch_workers 个线程，按主机限流拉取原始行情
+      2. compute: cpu_workers 个线程，清洗 + 计算指标 + 生成入库行
+      3. write: 单个线程，把多只股票的行合并交给 PriceBatchWriter
+
+    fetch_fn(symbol, period) -> payload (None 表示无需处理)
+    compute_fn(symbol, period, payload) -> (rows, state) (rows 为空表示无需写入；state 为增量指标状态，可为 None)
+    """
+
+    def __init__(self, fetch_fn: Callable, compute_fn: Callable, writer: PriceBatchWriter = None,
+                 fetch_workers: int = None, cpu_workers: int = None, queue_size: int = None,
+                 rate_per_host: float = None):
+        self.fetch_fn = fetch_fn
+        self.compute_fn = compute_fn
+        self.writer = writer or PriceBatchWriter()
+        # 只有包含该 (symbol, period) 的批次提交后才登记成功
+        self.writer.on_commit = self._committed
+        self.fetch_workers = fetch_workers or SYNC_CONFIG.get("fetch_workers", 4)
+        self.cpu_workers = cpu_workers or SYNC_CONFIG.get("cpu_workers", 2)
+        self.queue_size = queue_size or SYNC_CONFIG.get("queue_size", 32)
+        if rate_per_host is None:
+            rate_per_host = SYNC_CONFIG.get("fetch_rate_per_host", 2.0)
+        self.limiter = HostRateLimiter(rate_per_host)
+
+        self._lock = threading.Lock()
+        self._remaining: Dict[str, int] = {}
+        self._errors: Dict[str, str] = {}
+        self._completed = 0
+        self._total = 0
+
+    # ---------- 结果登记 ----------
+
+    def _finish(self, symbol: str, period: str, error: Optional[Exception] = None):
+        """登记一个 (symbol, period) 任务结束; 只有日线失败才算该股票失败 (周/月线失败不影响核心指标)"""
+        with self._lock:
+            if error is not None:
+                if period == "daily":
+                    self._errors[symbol] = str(error)
+                    logger.error(f"❌ {symbol} 同步失败: {error}")
+                else:
+                    logger.warning(f"⚠️ {symbol} {period} 同步失败: {error}")
+            self._remaining[symbol] -= 1
+            if self._remaining[symbol] == 0:
+                self._completed += 1
+                if self._completed % 10 == 0:
+                    logger.info(f"   ⏩ 进度: {self._completed}/{self._total} ...")
+
+    def _committed(self, keys: List[Tuple[str, str]]):
+        for symbol, period in keys:
+            if symbol in self._remaining:
+                self._finish(symbol, period)
+
+    # ---------- 各阶段 ----------
+
+    def _fetch_stage(self, jobs: "queue.Queue", fetched: "queue.Queue"):
+        while True:
+            job = jobs.get()
+            if job is _STOP:
+                return
+            symbol, period = job
+            try:
+                self.limiter.acquire(host_for_symbol(symbol))
+                payload = self.fetch_fn(symbol, period)
+            except Exception as e:
+                self._finish(symbol, period, e)
+                continue
+            if payload is None:
+                self._finish(symbol, period)
+                continue
+            fetched.put((symbol, period, payload))
+
+    def _compute_stage(self, fetched: "queue.Queue", to_write: "queue.Queue"):
+        while True:
+            item = fetched.get()
+            if item is _STOP:
+                return
+            symbol, period, payload = item
+            try:
+                rows, state = self.compute_fn(symbol, period, payload)
+            except Exception as e:
+                self._finish(symbol, period, e)
+                continue
+            if not rows:
+                self._finish(symbol, period)
+                continue
+            to_write.put((symbol, period, rows, state))
+
+    def _write_stage(self, to_write: "queue.Queue"):
+        while True:
+            item = to_write.get()
+            if item is _STOP:
+                return
+            symbol, period, rows, state = item
+            try:
+                self.writer.add(symbol, period, rows, state=state)
+            except Exception as e:
+                # flush 失败时整批数据留在 writer 中，由后续 / 最终 flush 重试；继续消费，避免上游阻塞
+                logger.warning(f"⚠️ 批量写入失败，稍后重试 ({len(self.writer.pending_keys)} 个待写任务): {e}")
+
+    # ---------- 入口 ----------
+
+    def run(self, symbols: List[str], periods: Tuple[str, ...] = PERIODS) -> Tuple[int, List[str]]:
+        """同步所有股票的指定周期，返回 (成功股票数, 错误列表)"""
+        symbols = list(dict.fromkeys(symbols))
+        self._remaining = {s: len(periods) for s in symbols}
+        self._errors, self._completed, self._total = {}, 0, len(symbols)
+
+        # 任务队列一次性装满 (仅是 (symbol, period) 元组)；后续阶段的队列有界，产生背压
+        jobs: "queue.Queue" = queue.Queue()
+        fetched: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        to_write: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+
+        # 先排完所有日线再排周/月线，保证核心数据最先落库
+        for period in periods:
+            for symbol in symbols:
+                jobs.put((symbol, period))
+
+        fetchers = [threading.Thread(target=self._fetch_stage, args=(jobs, fetched), name=f"sync-fetch-{i}", daemon=True)
+                    for i in range(self.fetch_workers)]
+        computers = [threading.Thread(target=self._compute_stage, args=(fetched, to_write), name=f"sync-cpu-{i}", daemon=True)
+                     for i in range(self.cpu_workers)]
+        writer_thread = threading.Thread(target=self._write_stage, args=(to_write,), name="sync-writer", daemon=True)
+
+        logger.info(f"🚀 启动流水线同步 (fetch={self.fetch_workers}, cpu={self.cpu_workers}, "
+                    f"queue={self.queue_size}, {len(symbols)} 只股票 × {len(periods)} 周期)")
+        for t in fetchers + computers + [writer_thread]:
+            t.start()
+
+        # 逐级关闭: 上一阶段全部退出后再给下一阶段发结束标记
+        for _ in fetchers:
+            jobs.put(_STOP)
+        for t in fetchers:
+            t.join()
+        for _ in computers:
+            fetched.put(_STOP)
+        for t in computers:
+            t.join()
+        to_write.put(_STOP)
+        writer_thread.join()
+
+        try:
+            self.writer.flush()
+        except Exception as e:
+            logger.error(f"❌ 批量写入失败: {e}")
+            # 最终 flush 仍失败: 批次中所有未提交的任务都记为失败
+            for symbol, period in self.writer.pending_keys:
+                if symbol in self._remaining:
+                    self._finish(symbol, period, e)
+
+        errors = [f"{s}: {msg}" for s, msg in self._errors.items()]
+        success_count = len(symbols) - len(self._errors)
+        return success_count, errors
@@ -4,7 +4,6 @@
 """
 import time
 from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import pandas as pd
 
@@ -12,21 +11,56 @@ from database import get_connection, get_stock_pool
 from config import SYNC_CONFIG
 from fetchers import fetch_stock_data
 from utils import send_wecom_notification, format_volume
-from notifications import send_push_notification
+from notifications import send_push_notification, flush_push_notifications
 from engine.indicators import calculate_indicators
+from quant.incremental import replay
+from sync.writer import PriceBatchWriter, build_price_rows
+from sync.pipeline import PriceSyncPipeline
+from price_cache import get_price_cache
 # from engine.validator import validate_previous_prediction  <-- Decoupled
-from helpers import get_last_date, check_trading_day_skip
+from helpers import get_last_date, get_indicator_state, check_trading_day_skip
 from logger import logger
 
 
-def process_stock_period(symbol: str, period: str = "daily", is_realtime: bool = False):
-    """增量处理特定周期的股票数据"""
+# akshare 中文列名 -> 入库列名
+COLUMN_MAP = {
+    "日期": "date", "开盘": "open", "收盘": "close", 
+    "最高": "high", "最低": "low", "成交量": "volume", "涨跌幅": "change_percent"
+}
+
+
+def _fetch_normalized(symbol: str, period: str, start_date: str):
+    """拉取行情并统一列名/日期格式，无数据时返回 None"""
+    df = fetch_stock_data(symbol, period=period, start_date=start_date)
+    if df.empty: return None
+    df = df.rename(columns=COLUMN_MAP)
+    df["date"] = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d")
+    return df
+
+
+def _state_matches(df: pd.DataFrame, state) -> bool:
+    """状态日期那根 K 线的收盘价未变 (前复权价在除权后会整体重算，此时状态失效)"""
+    row = df[df["date"] == state.as_of]
+    if row.empty or state.last_close is None:
+        return False
+    close = float(row["close"].iloc[-1])
+    return abs(close - state.last_close) <= 1e-6 * max(1.0, abs(state.last_close))
+
+
+def fetch_period_frame(symbol: str, period: str = "daily"):
+    """流水线抓取阶段: 拉取原始行情并统一列名
+
+    有增量指标状态时只从状态日期起拉取，否则按回溯窗口拉取
+    返回 (df, last_date_str, state)，无数据时返回 None
+    """
+    state = get_indicator_state(symbol, period) if SYNC_CONFIG.get("incremental_indicators") else None
+    if state is not None:
+        df = _fetch_normalized(symbol, period, state.as_of.replace("-", ""))
+        if df is not None and _state_matches(df, state):
+            return df, state.as_of, state
+        logger.info(f"♻️ {symbol} {period}: 指标状态与行情不一致 (可能已除权)，回退全量重算")
+
     table_name = f"{period}_prices"
-    if is_realtime:
-        logger.info(f"⏱️ [实时重算] 正在更新盘中指标: {symbol}")
-    else:
-        logger.info(f"🔍 检查 {period} 状态: {symbol}")
-    
     last_date_str = get_last_date(symbol, table_name)
     
     # 动态确定回溯天数，确保指标计算有足够上下文
@@ -43,33 +77,40 @@ def process_stock_period(symbol: str, period: str = "daily", is_realtime: bool =
     else:
         fetch_start_str = (datetime.now() - timedelta(days=buffer_days)).strftime("%Y%m%d")
 
-    # 1. 抓取
-    df = fetch_stock_data(symbol, period=period, start_date=fetch_start_str)
-    if df.empty: return
-    
-    # 2. 清洗
-    df = df.rename(columns={
-        "日期": "date", "开盘": "open", "收盘": "close", 
-        "最高": "high", "最低": "low", "成交量": "volume", "涨跌幅": "change_percent"
-    })
-    df["date"] = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d")
+    df = _fetch_normalized(symbol, period, fetch_start_str)
+    if df is None: return None
+    return df, last_date_str, None
+
+
+def prepare_period_frame(symbol: str, period: str, payload):
+    """流水线计算阶段: 校验并计算指标
+
+    返回 (带指标的 df, 待保存的指标状态)，无需写入时返回 None
+    增量模式下 df 只包含状态日期之后的新增/变化 K 线
+    """
+    df, last_date_str, state = payload
     
-    # 3. 验证昨日预测 (Validation Decoupled -> Run via --verify)
+    # 1. 验证昨日预测 (Validation Decoupled -> Run via --verify)
     # if period == "daily" and not df.empty and not is_realtime:
     #    validate_previous_prediction(symbol, df.iloc[-1])
 
-    # 4. 判断是否需要更新
-    if last_date_str and df["date"].max() < last_date_str:
+    # 2. 判断是否需要更新
+    if state is not None:
+        df = df[df["date"] > state.as_of]
+        if df.empty:
+            logger.info(f"✨ 数据已是最新 ({state.as_of})。")
+            return None
+    elif last_date_str and df["date"].max() < last_date_str:
         logger.info(f"✨ 数据已是最新 ({last_date_str})。")
-        return
+        return None
 
-    # 5. 数据校验 (Data Validation)
+    # 3. 数据校验 (Data Validation)
     original_count = len(df)
     
-    # 5.1 基本价格校验: close > 0
+    # 3.1 基本价格校验: close > 0
     df = df[df["close"] > 0]
     
-    # 5.2 成交量校验: volume >= 0
+    # 3.2 成交量校验: volume >= 0
     df = df[df["volume"] >= 0]
     
     # 注: 不校验涨跌幅范围，因为新股首日和港股可能大幅波动
@@ -80,66 +121,59 @@ def process_stock_period(symbol: str, period: str = "daily", is_realtime: bool =
     
     if df.empty:
         logger.warning(f"⚠️ {symbol}: 校验后无有效数据")
-        return
+        return None
+
+    # 4. 计算指标
+    if state is not None:
+        # 增量: 从状态继续推进，只计算新增 K 线；状态未前进时无需重写
+        df, new_state = replay(df, state)
+        return df, (new_state if new_state.as_of != state.as_of else None)
 
-    # 6. 计算指标
     df = calculate_indicators(df)
+    new_state = None
+    if SYNC_CONFIG.get("incremental_indicators"):
+        # 全量重算后用同一窗口建立状态，下次同步即可走增量
+        _, new_state = replay(df[["date", "high", "low", "close"]])
+    return df, new_state
+
+
+def compute_period_rows(symbol: str, period: str, payload):
+    """流水线计算阶段入口: 返回 (待写入的行, 指标状态)"""
+    prepared = prepare_period_frame(symbol, period, payload)
+    if prepared is None:
+        return [], None
+    df, state = prepared
+    return build_price_rows(symbol, df), state
+
+
+def process_stock_period(symbol: str, period: str = "daily", is_realtime: bool = False, writer: PriceBatchWriter = None):
+    """增量处理特定周期的股票数据 (单只股票串行执行抓取/计算/写入三个阶段)
+
+    writer: 可选的共享 PriceBatchWriter，为 None 时立即写入
+    """
+    if is_realtime:
+        logger.info(f"⏱️ [实时重算] 正在更新盘中指标: {symbol}")
+    else:
+        logger.info(f"🔍 检查 {period} 状态: {symbol}")
+
+    payload = fetch_period_frame(symbol, period)
+    if payload is None: return
+
+    prepared = prepare_period_frame(symbol, period, payload)
+    if prepared is None: return
+    df, state = prepared
     
-    # 7. 入库
-    # 定义舍入函数
-    def r2(x): return round(float(x), 2) if x else 0
-    def r3(x): return round(float(x), 3) if x else 0
-    def r1(x): return round(float(x), 1) if x else 0
-    
-    records = []
-    for _, row in df.iterrows():
-        records.append((
-            symbol, row["date"], r2(row["open"]), r2(row["high"]), r2(row["low"]), r2(row["close"]),
-            int(row["volume"]), r2(row["change_percent"]),
-            r2(row["ma5"]), r2(row["ma10"]), r2(row["ma20"]), r2(row["ma60"]),
-            r3(row["macd"]), r3(row["macd_signal"]), r3(row["macd_hist"]),
-            r2(row["boll_upper"]), r2(row["boll_mid"]), r2(row["boll_lower"]),
-            r1(row["rsi"]), r1(row["kdj_k"]), r1(row["kdj_d"]), r1(row["kdj_j"]), None
-        )) # type: ignore
-
-    from database import execute_with_retry
-
-    # 6.1 对于周/月线：删除当前周期的旧记录（防止每日同步产生重复）
-    # akshare 每天返回的"当前周/月"日期会变化，需要清理再插入
-    if period in ("weekly", "monthly") and records:
-        latest_date = records[-1][1]  # 最新记录的日期
-        latest_dt = pd.to_datetime(latest_date)
-        
-        def _cleanup_current_period(conn, _table, _symbol, _latest_dt, _period):
-            cur = conn.cursor()
-            if _period == "weekly":
-                # 删除同一周的所有记录 (ISO 周)
-                week_start = _latest_dt - pd.Timedelta(days=_latest_dt.weekday())
-                cur.execute(f"DELETE FROM {_table} WHERE symbol = ? AND date >= ?", 
-                           (_symbol, week_start.strftime('%Y-%m-%d')))
-                logger.debug(f"🧹 清理 {_symbol} 本周旧记录 (从 {week_start.strftime('%Y-%m-%d')} 起)")
-            elif _period == "monthly":
-                # 删除同月的所有记录
-                month_start = _latest_dt.strftime('%Y-%m-01')
-                cur.execute(f"DELETE FROM {_table} WHERE symbol = ? AND date >= ?", 
-                           (_symbol, month_start))
-                logger.debug(f"🧹 清理 {_symbol} 本月旧记录 (从 {month_start} 起)")
-        
-        execute_with_retry(_cleanup_current_period, 3, table_name, symbol, latest_dt, period)
-
-    def _save_prices(conn, _table, _records):
-        cur = conn.cursor()
-        cur.executemany(f"""
-            INSERT OR REPLACE INTO {_table} 
-            (symbol, date, open, high, low, close, volume, change_percent,
-             ma5, ma10, ma20, ma60, macd, macd_signal, macd_hist,
-             boll_upper, boll_mid, boll_lower, rsi, kdj_k, kdj_d, kdj_j, ai_summary)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, _records)
-
-    execute_with_retry(_save_prices, 3, table_name, records)
+    # 5. 入库 (整列舍入 + 多行 INSERT；周/月线的当前周期清理与指标状态在同一事务内完成)
+    # 传入共享 writer 时只累积，由调用方统一 flush，实现多股票合并事务
+    rows = build_price_rows(symbol, df)
+    if writer is not None:
+        writer.add(symbol, period, rows, state=state)
+    else:
+        local_writer = PriceBatchWriter()
+        local_writer.add(symbol, period, rows, state=state)
+        local_writer.flush()
     
-    # 7. 实时更新推送 (仅在盘中实时模式下触发)
+    # 6. 实时更新推送 (仅在盘中实时模式下触发)
     if is_realtime:
         last_row = df.iloc[-1]
         change = float(last_row['change_percent'])
@@ -153,6 +187,7 @@ def process_stock_period(symbol: str, period: str = "daily", is_realtime: bool =
             return r[0] if r else sym
 
         try:
+            from database import execute_with_retry
             stock_name = execute_with_retry(_get_name, 2, symbol)
         except:
             stock_name = symbol
@@ -216,15 +251,10 @@ def run_full_sync(market_filter: str = None):
         return
 
     start_time = time.time()
-    success_count = 0
-    errors = []
-    
-    # 使用线程池并发同步
-    workers = SYNC_CONFIG["daily_workers"]
 
     # [NEW] Force Inject Market Anchors (Ensure indices are fetched)
     # This solves the "Where does the market data come from?" problem.
-    from engine.context_service import MARKET_ANCHORS
+    from engine.market_breadth import MARKET_ANCHORS, MARKETS, update_market_breadth
     
     # Merge and deduplicate
     current_set = set(target_stocks)
@@ -239,43 +269,22 @@ def run_full_sync(market_filter: str = None):
             target_stocks.append(anchor)
             logger.info(f"⚓ Auto-injecting Market Anchor: {anchor}")
 
-    logger.info(f"🚀 启动并发同步 (Workers={workers})...")
-    
-    def sync_single_stock(stock):
-        """单个股票的全量同步任务"""
-        try:
-            # 日线是必须的
-            process_stock_period(stock, period="daily")
-            time.sleep(0.5) # Slight delay to avoid DB connection burst
-            
-            # 周月线偶尔失败不影响核心体验
-            try: 
-                process_stock_period(stock, period="weekly")
-                time.sleep(0.5)
-            except: pass 
-            try: process_stock_period(stock, period="monthly")
-            except: pass
-            return True
-        except Exception as e:
-            raise e
-
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        future_to_stock = {executor.submit(sync_single_stock, stock): stock for stock in target_stocks}
-        
-        for i, future in enumerate(as_completed(future_to_stock)):
-            stock = future_to_stock[future]
-            try:
-                future.result()
-                success_count += 1
-            except Exception as e:
-                error_msg = str(e)
-                errors.append(f"{stock}: {error_msg}")
-                logger.error(f"❌ {stock} 同步失败: {error_msg}")
-            
-            # 进度条效果
-            if (i + 1) % 10 == 0:
-                logger.info(f"   ⏩ 进度: {i + 1}/{len(target_stocks)} ...")
+    # 分阶段流水线: 抓取 / 指标计算 / 批量写入 各自并发，阶段间有界队列背压
+    pipeline = PriceSyncPipeline(fetch_period_frame, compute_period_rows)
+    success_count, errors = pipeline.run(target_stocks)
+
+    # 补齐本地行情缓存中尚未收录的股票 (已收录的由 writer 在 flush 时增量合并)
+    get_price_cache().refresh(target_stocks)
+
+    # 最后阶段: 增量汇总市场宽度 (market_breadth)，供简报/分析直接读取
+    try:
+        update_market_breadth([market_filter] if market_filter else MARKETS)
+    except Exception as e:
+        logger.warning(f"⚠️ 市场宽度更新失败: {e}")
     
+    # 等待价格推送发送完毕 (失败的进入 push_queue)，不依赖进程退出时的 atexit
+    flush_push_notifications(timeout=60)
+
     duration = time.time() - start_time
     market_label = f" ({market_filter})" if market_filter else ""
     report = f"### 📊 StockWise: Daily Sync{market_label}\n"
@@ -0,0 +1,192 @@
+"""
+价格批量写入模块
+按列向量化舍入，并把多只股票的行情合并为多行 INSERT 语句，在一个事务内落库
+"""
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from database import execute_with_retry, refresh_latest_prices, PRICE_COLUMNS
+from price_cache import get_price_cache
+from config import SYNC_CONFIG
+from logger import logger
+
+
+# 各列保留的小数位 (与旧版 r1/r2/r3 保持一致)
+ROUNDING = {
+    2: ["open", "high", "low", "close", "change_percent", "ma5", "ma10", "ma20", "ma60",
+        "boll_upper", "boll_mid", "boll_lower"],
+    3: ["macd", "macd_signal", "macd_hist"],
+    1: ["rsi", "kdj_k", "kdj_d", "kdj_j"],
+}
+
+# 每条 INSERT 的行数: 23 列 × 400 行 = 9200 个参数，低于 SQLite/libSQL 的 32766 上限
+INSERT_CHUNK_ROWS = 400
+# 每条 DELETE 合并的 (symbol, date) 条件数
+DELETE_CHUNK_SIZE = 200
+
+
+def build_price_rows(symbol: str, df: pd.DataFrame) -> List[tuple]:
+    """将带指标的 DataFrame 转换为入库行 (整列舍入，无逐行 Python 循环)"""
+    if df.empty:
+        return []
+
+    n = len(df)
+    columns = {
+        "symbol": [symbol] * n,
+        "date": df["date"].tolist(),
+        "volume": np.nan_to_num(df["volume"].to_numpy(dtype=float)).astype(np.int64).tolist(),
+        "ai_summary": [None] * n,
+    }
+    for decimals, cols in ROUNDING.items():
+        values = df[cols].to_numpy(dtype=float)
+        values = np.round(np.nan_to_num(values, nan=0.0), decimals)
+        for idx, col in enumerate(cols):
+            columns[col] = values[:, idx].tolist()
+
+    return list(zip(*(columns[c] for c in PRICE_COLUMNS)))
+
+
+def current_period_start(period: str, latest_date: str) -> str:
+    """周/月线的当前周期起点 (akshare 返回的"本周/本月"日期每天变化，需要先清理)"""
+    latest_dt = datetime.strptime(latest_date, "%Y-%m-%d")
+    if period == "weekly":
+        # ISO 周起点 (周一)
+        return (latest_dt - timedelta(days=latest_dt.weekday())).strftime("%Y-%m-%d")
+    return latest_dt.strftime("%Y-%m-01")
+
+
+class PriceBatchWriter:
+    """
+    跨股票的价格批量写入器 (线程安全)
+    add() 只在内存中累积，flush() 把所有待写行在一个事务内写入:
+      1. 合并的 DELETE 清理周/月线的当前周期
+      2. 分块的多行 INSERT OR REPLACE
+      3. 刷新涉及股票的 latest_prices 快照
+    提交成功后用本批包含的 (symbol, period) 列表回调 on_commit (调用方据此登记成功)
+    """
+
+    def __init__(self, flush_rows: int = None, on_commit: Optional[Callable[[List[Tuple[str, str]]], None]] = None):
+        self.flush_rows = flush_rows or SYNC_CONFIG.get("write_batch_rows", 5000)
+        self.on_commit = on_commit
+        self._lock = threading.Lock()
+        self._rows: Dict[str, List[tuple]] = {}
+        self._cleanups: Dict[str, List[Tuple[str, str]]] = {}
+        self._states: Dict[Tuple[str, str], object] = {}
+        self._keys: Dict[Tuple[str, str], None] = {}
+        self._pending = 0
+        # 自动 flush 的行数阈值 (失败后推迟到再积累 flush_rows 行，避免每次 add 都重试)
+        self._flush_at = self.flush_rows
+        self.stats = {"rows": 0, "flushes": 0, "statements": 0}
+
+    def add(self, symbol: str, period: str, rows: List[tuple], state=None):
+        """加入一只股票某个周期的入库行 (build_price_rows 的输出，达到阈值时自动 flush)
+
+        state: 可选的 IndicatorState，与行情行在同一事务内写入 indicator_state
+        """
+        if not rows:
+            return
+
+        table = f"{period}_prices"
+        with self._lock:
+            self._rows.setdefault(table, []).extend(rows)
+            if period in ("weekly", "monthly"):
+                self._cleanups.setdefault(table, []).append((symbol, current_period_start(period, rows[-1][1])))
+            if state is not None:
+                self._states[(symbol, period)] = state
+            self._keys[(symbol, period)] = None
+            self._pending += len(rows)
+            should_flush = self._pending >= self._flush_at
+
+        if should_flush:
+            self.flush()
+
+    @property
+    def pending_keys(self) -> List[Tuple[str, str]]:
+        """尚未提交的 (symbol, period)"""
+        with self._lock:
+            return list(self._keys)
+
+    def _restore(self, rows: Dict[str, List[tuple]], cleanups: Dict[str, List[Tuple[str, str]]],
+                 states: Dict[Tuple[str, str], object], keys: Dict[Tuple[str, str], None]):
+        """把写入失败的批次合并回缓冲区 (排在期间新加入的数据之前，新的指标状态优先)"""
+        with self._lock:
+            for table, table_rows in rows.items():
+                self._rows[table] = table_rows + self._rows.get(table, [])
+            for table, conds in cleanups.items():
+                self._cleanups[table] = conds + self._cleanups.get(table, [])
+            self._states = {**states, **self._states}
+            self._keys = {**keys, **self._keys}
+            self._pending += sum(len(r) for r in rows.values())
+            self._flush_at = self._pending + self.flush_rows
+
+    def flush(self) -> int:
+        """在单个事务内写入所有待写数据，返回写入行数"""
+        with self._lock:
+            rows, cleanups, states, keys = self._rows, self._cleanups, self._states, self._keys
+            self._rows, self._cleanups, self._states, self._keys, self._pending = {}, {}, {}, {}, 0
+
+        total = sum(len(r) for r in rows.values())
+        if not total:
+            return 0
+
+        def _write(conn):
+            cur = conn.cursor()
+            statements = 0
+            for table, conds in cleanups.items():
+                for i in range(0, len(conds), DELETE_CHUNK_SIZE):
+                    chunk = conds[i:i + DELETE_CHUNK_SIZE]
+                    where = " OR ".join(["(symbol = ? AND date >= ?)"] * len(chunk))
+                    cur.execute(f"DELETE FROM {table} WHERE {where}", tuple(v for c in chunk for v in c))
+                    statements += 1
+
+            row_placeholder = "(" + ", ".join(["?"] * len(PRICE_COLUMNS)) + ")"
+            for table, table_rows in rows.items():
+                for i in range(0, len(table_rows), INSERT_CHUNK_ROWS):
+                    chunk = table_rows[i:i + INSERT_CHUNK_ROWS]
+                    cur.execute(f"""
+                        INSERT OR REPLACE INTO {table} ({", ".join(PRICE_COLUMNS)})
+                        VALUES {", ".join([row_placeholder] * len(chunk))}
+                    """, tuple(v for r in chunk for v in r))
+                    statements += 1
+
+            # 同一事务内刷新这些股票的最新 K 线快照 (latest_prices)
+            for table, table_rows in rows.items():
+                refresh_latest_prices(cur, table[:-len("_prices")], {r[0] for r in table_rows})
+                statements += 1
+
+            if states:
+                cur.executemany("""
+                    INSERT OR REPLACE INTO indicator_state (symbol, period, as_of, state, updated_at)
+                    VALUES (?, ?, ?, ?, datetime('now', '+8 hours'))
+                """, [(sym, prd, st.as_of, st.to_json()) for (sym, prd), st in states.items()])
+                statements += 1
+            return statements
+
+        # 提交前固定本地行情缓存的新鲜度基准
+        cache = get_price_cache()
+        cache.prepare(table[:-len("_prices")] for table in rows)
+
+        try:
+            statements = execute_with_retry(_write, 3)
+        except Exception:
+            # 事务失败: 把这批数据放回缓冲区，后续的 flush 会再次写入
+            self._restore(rows, cleanups, states, keys)
+            raise
+
+        # 事务提交后再更新本地行情缓存 (缓存永远不会领先于数据库)
+        for table, table_rows in rows.items():
+            cache.apply_rows(table, PRICE_COLUMNS, table_rows, cleanups.get(table))
+
+        with self._lock:
+            self._flush_at = self.flush_rows
+            self.stats["rows"] += total
+            self.stats["flushes"] += 1
+            self.stats["statements"] += statements
+        logger.info(f"💾 批量写入 {total} 行行情 ({len(rows)} 张表, {statements} 条语句)")
+        if self.on_commit:
+            self.on_commit(list(keys))
+        return total
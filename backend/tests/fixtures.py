@@ -0,0 +1,49 @@
+"""
+Shared test helpers: OHLC bars for indicator parity tests, price table rows, in-memory database.
+"""
+import sqlite3
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+
+def make_bars(n, seed=0):
+    """n 根随机游走日线 (可复现)"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    return pd.DataFrame({
+        "date": pd.date_range("2020-01-01", periods=n).strftime("%Y-%m-%d"),
+        "open": close,
+        "high": close * (1 + rng.uniform(0, 0.02, n)),
+        "low": close * (1 - rng.uniform(0, 0.02, n)),
+        "close": close,
+        "volume": 1000.0,
+        "change_percent": 0.0,
+    })
+
+
+def price_row(symbol, date, close):
+    """一行 *_prices 记录 (按 PRICE_COLUMNS 顺序): 数值列都取 close"""
+    from sync.writer import PRICE_COLUMNS
+
+    values = {c: float(close) for c in PRICE_COLUMNS}
+    values.update({"symbol": symbol, "date": date, "volume": 1000, "ai_summary": None})
+    return tuple(values[c] for c in PRICE_COLUMNS)
+
+
+def memory_db(testcase, schema=""):
+    """内存 SQLite 连接 (可跨线程使用)，执行建表脚本，测试结束时关闭"""
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.executescript(schema)
+    testcase.addCleanup(conn.close)
+    return conn
+
+
+def use_memory_db(testcase, conn, *modules):
+    """把各模块的 execute_with_retry 指向 conn (不重试，直接执行)"""
+    for module in modules:
+        patcher = patch.object(module, "execute_with_retry",
+                               side_effect=lambda func, retries, *args: func(conn, *args))
+        patcher.start()
+        testcase.addCleanup(patcher.stop)
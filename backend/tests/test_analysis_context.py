@@ -0,0 +1,92 @@
+"""
+Unit tests for the batched analysis-context loader in engine/prompts.py.
+"""
+import sys
+import os
+import unittest
+from unittest.mock import patch
+
+# Add backend dir AND project root to path to support both legacy and new imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from engine import prompts
+from price_cache import PriceCache
+from sync.writer import PRICE_COLUMNS
+from fixtures import price_row, memory_db, use_memory_db
+
+SYMBOLS = ["600519", "000001", "00700"]
+
+
+class TestFetchAnalysisContexts(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = memory_db(self)
+        for table in ("daily_prices", "weekly_prices", "monthly_prices"):
+            self.conn.execute(f"CREATE TABLE {table} ({', '.join(PRICE_COLUMNS)}, PRIMARY KEY (symbol, date))")
+        self.conn.executescript("""
+            CREATE TABLE stock_meta (symbol TEXT PRIMARY KEY, name TEXT, industry TEXT, main_business TEXT, description TEXT);
+            CREATE TABLE ai_predictions_v2 (
+                symbol TEXT, date TEXT, model_id TEXT, signal TEXT, confidence REAL, ai_reasoning TEXT,
+                validation_status TEXT DEFAULT 'Pending', actual_change REAL, is_primary INTEGER DEFAULT 0,
+                PRIMARY KEY (symbol, date, model_id)
+            );
+        """)
+        self.conn.execute("INSERT INTO stock_meta VALUES ('600519', '贵州茅台', '白酒', NULL, NULL)")
+        for symbol, days in (("600519", 15), ("000001", 3)):
+            for day in range(1, days + 1):
+                date = f"2024-01-{day:02d}"
+                for table in ("daily_prices", "weekly_prices", "monthly_prices"):
+                    self.conn.execute(f"INSERT INTO {table} VALUES ({', '.join('?' * len(PRICE_COLUMNS))})",
+                                      price_row(symbol, date, day))
+                for model, status in (("m1", "Correct"), ("m2", "Incorrect")):
+                    self.conn.execute("""
+                        INSERT INTO ai_predictions_v2 (symbol, date, model_id, signal, confidence, validation_status, is_primary)
+                        VALUES (?, ?, ?, 'Long', 0.6, ?, ?)
+                    """, (symbol, date, model, status, int(model == "m1")))
+
+        self.statements = []
+        self.conn.set_trace_callback(self.statements.append)
+        use_memory_db(self, self.conn, prompts)
+        patcher = patch.object(prompts, "get_price_cache", return_value=PriceCache(enabled=False))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_context_shape(self):
+        ctx = prompts.fetch_analysis_contexts(SYMBOLS, "2024-01-12")["600519"]
+        self.assertEqual(ctx["name"], "贵州茅台")
+        self.assertEqual(ctx["profile"], {"industry": "白酒", "main_business": "暂无", "description": "暂无简介"})
+        self.assertEqual(ctx["latest_data"]["date"], "2024-01-12")
+        self.assertEqual(len(ctx["latest_data"]), len(PRICE_COLUMNS))
+        self.assertEqual([r["date"] for r in ctx["daily_prices"]][-2:], ["2024-01-11", "2024-01-12"])
+        self.assertEqual(len(ctx["daily_prices"]), 10)
+        self.assertEqual(ctx["weekly_prices"][0]["date"], "2024-01-12")
+        self.assertEqual(len(ctx["monthly_prices"]), 12)
+        self.assertEqual([h["date"] for h in ctx["ai_history"]],
+                         ["2024-01-11", "2024-01-10", "2024-01-09", "2024-01-08", "2024-01-07"])
+        self.assertEqual(ctx["accuracy"], {"total": 11, "rate": 100.0})
+        self.assertNotIn("model_history", ctx)
+
+    def test_missing_data_is_an_error(self):
+        contexts = prompts.fetch_analysis_contexts(SYMBOLS, "2024-01-12")
+        self.assertIn("error", contexts["000001"])
+        self.assertIn("error", contexts["00700"])
+        self.assertEqual(prompts.fetch_analysis_contexts(["000001"])["000001"]["date"], "2024-01-03")
+
+    def test_model_history(self):
+        ctx = prompts.fetch_analysis_contexts(SYMBOLS, model_history=True)["000001"]
+        self.assertEqual(ctx["model_history"]["m2"]["accuracy"], {"total": 2, "rate": 0.0})
+        self.assertEqual([h["model"] for h in ctx["model_history"]["m2"]["ai_history"]], ["m2", "m2"])
+        self.assertEqual(ctx["model_history"]["m1"], prompts.fetch_ai_history_for_model(
+            "000001", "2024-01-03", model_id="m1", cursor=self.conn.cursor()))
+
+    def test_query_count_is_fixed(self):
+        prompts.fetch_analysis_contexts(["600519"], model_history=True)
+        single = len(self.statements)
+        self.statements.clear()
+        prompts.fetch_analysis_contexts(SYMBOLS * 2, model_history=True)
+        self.assertEqual(len(self.statements), single)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Unit tests for the vectorized backtest engine (quant/backtest.py).
+"""
+import sys
+import os
+import unittest
+
+import numpy as np
+import pandas as pd
+
+# Add backend dir AND project root to path to support both legacy and new imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.engine.validator import _calculate_status
+from backend.quant.backtest import BacktestEngine, align_periods
+from backend.quant.strategies.base import BaseStrategy
+from backend.quant.strategies.trend import TrendStrategy
+
+
+def _frame(n=2000, seed=7):
+    rng = np.random.default_rng(seed)
+    close = rng.uniform(5, 15, n)
+    frame = pd.DataFrame({
+        "close": close,
+        "ma20": np.where(rng.random(n) < 0.1, 0.0, close * rng.uniform(0.9, 1.1, n)),
+        "rsi": rng.uniform(20, 80, n),
+        "macd_hist": rng.normal(0, 1, n),
+        "weekly_close": rng.uniform(5, 15, n),
+        "weekly_ma20": rng.uniform(5, 15, n),
+        "monthly_close": rng.uniform(5, 15, n),
+        "monthly_ma20": rng.uniform(5, 15, n),
+    })
+    frame.loc[rng.random(n) < 0.1, ["weekly_close", "weekly_ma20"]] = np.nan     # 没有对齐到周线
+    frame.loc[rng.random(n) < 0.05, "rsi"] = np.nan
+    return frame
+
+
+class TestTrendStrategyFrame(unittest.TestCase):
+
+    def test_matches_row_by_row(self):
+        frame = _frame()
+        vectorized = TrendStrategy().analyze_frame(frame)
+        strategy = TrendStrategy()
+        for i, row in frame.iterrows():
+            weekly = None if np.isnan(row["weekly_close"]) else pd.Series({"close": row["weekly_close"], "ma20": row["weekly_ma20"]})
+            monthly = pd.Series({"close": row["monthly_close"], "ma20": row["monthly_ma20"]})
+            sig = strategy.analyze("X", {"daily_row": row, "weekly_row": weekly, "monthly_row": monthly})
+            got = vectorized.loc[i]
+            self.assertEqual((got["action"], got["reason"], got["risk_level"]), (sig.action, sig.reason, sig.risk_level), i)
+            self.assertAlmostEqual(got["confidence"], sig.confidence)
+
+    def test_base_fallback_matches_vectorized(self):
+        frame = _frame(300)
+        vectorized = TrendStrategy().analyze_frame(frame)
+        fallback = BaseStrategy.analyze_frame(TrendStrategy(), frame)
+
+        cols = ["action", "reason", "risk_level"]
+        pd.testing.assert_frame_equal(fallback[cols], vectorized[cols])
+        np.testing.assert_allclose(fallback["confidence"].to_numpy(dtype=float), vectorized["confidence"].to_numpy(dtype=float))
+
+
+class TestBacktestEngine(unittest.TestCase):
+
+    def setUp(self):
+        dates = pd.bdate_range("2024-01-01", periods=30).strftime("%Y-%m-%d")
+        rng = np.random.default_rng(3)
+        self.daily = pd.concat([pd.DataFrame({
+            "symbol": symbol, "date": dates, "close": rng.uniform(9, 11, len(dates)),
+            "change_percent": rng.normal(0, 2, len(dates)), "ma20": 10.0,
+            "rsi": rng.uniform(20, 80, len(dates)), "macd_hist": 0.0,
+        }) for symbol in ("600519", "000001")], ignore_index=True).sample(frac=1, random_state=1)
+        self.weekly = pd.DataFrame({"symbol": "600519", "date": ["2024-01-05", "2024-01-12"],
+                                    "close": [9.0, 11.0], "ma20": [10.0, 10.0]})
+
+    def test_weekly_is_aligned_as_of(self):
+        frame = align_periods(self.daily, self.weekly).set_index(["symbol", "date"])
+        self.assertTrue(np.isnan(frame.loc[("600519", "2024-01-04"), "weekly_close"]))
+        self.assertEqual(frame.loc[("600519", "2024-01-05"), "weekly_close"], 9.0)
+        self.assertEqual(frame.loc[("600519", "2024-01-11"), "weekly_close"], 9.0)
+        self.assertEqual(frame.loc[("600519", "2024-02-09"), "weekly_close"], 11.0)
+        self.assertTrue(frame.loc["000001", "weekly_close"].isna().all())
+
+    def test_statuses_use_next_day_change(self):
+        result = BacktestEngine().run(self.daily, self.weekly)
+        signals = result.signals
+        for symbol, group in signals.groupby("symbol"):
+            self.assertEqual(list(group["date"]), sorted(group["date"]))
+            self.assertEqual(group["validation_status"].iloc[-1], "Pending")
+            for (_, row), next_change in zip(group.iloc[:-1].iterrows(), group["change_percent"].iloc[1:]):
+                self.assertEqual(row["validation_status"], _calculate_status(row["action"], next_change))
+
+        validated = signals[signals["validation_status"] != "Pending"]
+        self.assertEqual(len(validated), 58)
+        self.assertEqual(result.summary["total"], 58)
+        self.assertAlmostEqual(result.summary["hit_rate"],
+                               (validated["validation_status"] == "Correct").mean() * 100)
+        self.assertEqual(int(result.by_symbol["total"].sum()), 58)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+Unit tests for the bulk Phase 2 assembler (engine/services/brief_assembler.py).
+"""
+import sys
+import os
+import asyncio
+import unittest
+from unittest.mock import patch
+
+# Add backend dir AND project root to path to support both legacy and new imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.engine.services import brief_assembler
+from fixtures import memory_db, use_memory_db
+
+DATE = "2024-01-05"
+
+
+class TestBulkBriefAssembler(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = memory_db(self, """
+            CREATE TABLE users (user_id TEXT PRIMARY KEY, subscription_tier TEXT);
+            CREATE TABLE user_watchlist (user_id TEXT, symbol TEXT, PRIMARY KEY (user_id, symbol));
+            CREATE TABLE push_subscriptions (id TEXT PRIMARY KEY, user_id TEXT);
+            CREATE TABLE stock_briefs (
+                symbol TEXT, date TEXT, tier TEXT, stock_name TEXT, analysis_markdown TEXT, signal TEXT,
+                PRIMARY KEY (symbol, date, tier)
+            );
+            CREATE TABLE daily_briefs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, date TEXT NOT NULL,
+                content TEXT NOT NULL, push_hook TEXT, created_at TIMESTAMP DEFAULT (datetime('now', '+8 hours')),
+                notified_at TIMESTAMP, UNIQUE(user_id, date)
+            );
+            INSERT INTO users VALUES ('u-free', 'free'), ('u-pro', 'pro'), ('u-done', NULL);
+            INSERT INTO user_watchlist VALUES
+                ('u-free', '600519'), ('u-free', '000001'), ('u-pro', '600519'),
+                ('u-done', '000001'), ('u-empty', '300750');
+            INSERT INTO push_subscriptions VALUES ('s1', 'u-free'), ('s2', 'u-pro'), ('s3', 'u-done');
+            INSERT INTO stock_briefs VALUES
+                ('600519', '2024-01-05', 'free', '贵州茅台', 'free 600519', 'Long'),
+                ('000001', '2024-01-05', 'free', '平安银行', 'free 000001', 'Short'),
+                ('000001', '2024-01-05', 'pro', '平安银行', 'pro 000001', 'Long');
+            INSERT INTO daily_briefs (user_id, date, content, notified_at) VALUES
+                ('u-done', '2024-01-05', 'old', '2024-01-05 08:00:00');
+        """)
+
+        self.sent = []
+        use_memory_db(self, self.conn, brief_assembler)
+        patcher = patch.object(brief_assembler, "send_push_notification",
+                               side_effect=lambda **kw: self.sent.append(kw["target_user_id"]))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _briefs(self):
+        return {r[0]: r[1:] for r in self.conn.execute(
+            "SELECT user_id, content, push_hook, notified_at FROM daily_briefs WHERE date = ?", (DATE,))}
+
+    def test_assembles_all_users_in_one_pass(self):
+        result = asyncio.run(brief_assembler.assemble_all_user_briefs(DATE))
+        briefs = self._briefs()
+
+        self.assertEqual((result["users"], result["assembled"], result["missing"]), (4, 3, 1))
+        self.assertNotIn("u-empty", briefs)
+
+        content, hook, _ = briefs["u-free"]
+        self.assertIn("基于您关注的 2 只股票", content)
+        self.assertIn("### 贵州茅台 (600519)\nfree 600519", content)
+        self.assertIn("### 平安银行 (000001)\nfree 000001", content)
+        self.assertTrue(hook.startswith("📈 贵州茅台"))
+
+        # PRO 用户没有 pro 简报时回退到 free
+        self.assertIn("free 600519", briefs["u-pro"][0])
+
+        # 已通知的用户: 内容被覆盖，notified_at 保留，不再进入待推送列表
+        self.assertEqual(briefs["u-done"][0].count("free 000001"), 1)
+        self.assertEqual(briefs["u-done"][2], "2024-01-05 08:00:00")
+        self.assertEqual(sorted(u for u, _, _ in result["pending"]), ["u-free", "u-pro"])
+
+    def test_tier_filter_and_notify(self):
+        result = asyncio.run(brief_assembler.assemble_all_user_briefs(DATE, target_tier="pro"))
+        self.assertEqual(result["assembled"], 1)
+
+        notified = asyncio.run(brief_assembler.notify_user_briefs(DATE, result["pending"]))
+        self.assertEqual((notified, self.sent), (1, ["u-pro"]))
+        self.assertIsNotNone(self._briefs()["u-pro"][2])
+
+    def test_matches_single_user_render(self):
+        reports = [("600519", None, "a", "Bearish"), ("000001", "平安银行", "b", None)]
+        content, hook = brief_assembler._render_brief(DATE, 2, reports, "09:30")
+        self.assertIn("### 600519 (600519)", content)
+        self.assertTrue(content.endswith("*StockWise AI 生成于 09:30*"))
+        self.assertEqual(hook, "⚠️ 600519面临调整压力，点击查看风险提示。")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+Unit tests for the concurrent Phase 1 brief pipeline (engine/brief_generator.py).
+"""
+import sys
+import os
+import asyncio
+import unittest
+from unittest.mock import patch, MagicMock
+
+# Add backend dir AND project root to path to support both legacy and new imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.engine import brief_generator, done_keys
+from fixtures import memory_db, use_memory_db
+
+DATE = "2024-01-05"
+SYMBOLS = [f"60000{i}" for i in range(6)]
+
+
+class _FakeContextService:
+    cache = MagicMock(stats={"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}, hit_rate=0.0)
+
+    async def get_batch_predictions_and_reflection(self, symbols, date_str):
+        return {s: {"signal": "Long", "confidence": 0.7} for s in symbols}
+
+    async def get_batch_technical_facts(self, symbols):
+        return {s: {"close": 10.0, "change": 1.0} for s in symbols}
+
+    async def get_comprehensive_context(self, symbol, date_str, stock_name=None):
+        await asyncio.sleep(0.01)
+        return {"meta": {"symbol": symbol}}
+
+
+class TestBriefPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = memory_db(self, """
+            CREATE TABLE users (user_id TEXT PRIMARY KEY, subscription_tier TEXT);
+            CREATE TABLE user_watchlist (user_id TEXT, symbol TEXT);
+            CREATE TABLE stock_meta (symbol TEXT PRIMARY KEY, name TEXT);
+            CREATE TABLE stock_briefs (
+                symbol TEXT, date TEXT, tier TEXT, stock_name TEXT, analysis_markdown TEXT,
+                raw_news TEXT, signal TEXT, confidence REAL, PRIMARY KEY (symbol, date, tier)
+            );
+            INSERT INTO users VALUES ('u-free', 'free'), ('u-pro', 'pro');
+        """)
+        self.conn.executemany("INSERT INTO user_watchlist VALUES (?, ?)",
+                              [("u-free", s) for s in SYMBOLS] + [("u-pro", SYMBOLS[0])])
+        self.conn.execute("INSERT INTO stock_briefs VALUES (?, ?, 'free', '', 'old', '', 'Side', 0.5)", (SYMBOLS[1], DATE))
+
+        self.active, self.peak, self.calls = 0, 0, []
+        use_memory_db(self, self.conn, brief_generator, done_keys)
+        no_close = MagicMock(cursor=self.conn.cursor, commit=self.conn.commit)
+        for patcher in (patch.object(brief_generator, "get_connection", return_value=no_close),
+                        patch.object(brief_generator, "ContextService", _FakeContextService),
+                        patch.object(brief_generator, "fetch_news_for_stock", side_effect=self._news),
+                        patch.object(brief_generator, "analyze_stock_context", side_effect=self._analyze),
+                        patch.dict(brief_generator.BRIEF_GENERATION_CONFIG, {"symbol_concurrency": 3, "write_batch_rows": 2})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def _news(self, symbol, stock_name, date_str):
+        return f"news {symbol}"
+
+    async def _analyze(self, symbol, stock_name, news, tech_data, date_str, tier, facts=None):
+        self.calls.append((symbol, tier))
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.02)
+        self.active -= 1
+        return f"{tier} brief {symbol}"
+
+    def test_generates_missing_tiers_concurrently(self):
+        asyncio.run(brief_generator.generate_stock_briefs_batch(DATE))
+
+        rows = self.conn.execute("SELECT symbol, tier, analysis_markdown FROM stock_briefs").fetchall()
+        self.assertEqual(len(rows), len(SYMBOLS) + 1)                      # 每只 free + 一只 pro
+        self.assertIn((SYMBOLS[1], "free", "old"), rows)                    # 已存在的不重复生成
+        self.assertIn((SYMBOLS[0], "pro", f"pro brief {SYMBOLS[0]}"), rows)
+        self.assertEqual(len(self.calls), len(SYMBOLS))
+        self.assertGreater(self.peak, 1)
+        self.assertLessEqual(self.peak, 4)                                   # 3 只股票 (其中一只两个档位)
+
+    def test_done_keys_failure_falls_back_to_row_checks(self):
+        with patch.object(brief_generator.DoneKeySet, "load_briefs", side_effect=RuntimeError("database is locked")):
+            asyncio.run(brief_generator.generate_stock_briefs_batch(DATE))
+
+        rows = self.conn.execute("SELECT symbol, tier, analysis_markdown FROM stock_briefs").fetchall()
+        self.assertEqual(len(rows), len(SYMBOLS) + 1)
+        self.assertIn((SYMBOLS[1], "free", "old"), rows)
+        self.assertNotIn((SYMBOLS[1], "free"), self.calls)
+
+    def test_failed_flush_keeps_rows(self):
+        def flaky(func, retries, rows):
+            if any(r[0] == "bad" for r in rows):
+                raise RuntimeError("constraint failed")
+            return func(self.conn, rows)
+
+        writer = brief_generator._BriefWriter(done_keys=None)
+        row = lambda sym: (sym, DATE, "free", sym, "brief", "", "Long", 0.7)
+        with patch.object(brief_generator, "execute_with_retry", side_effect=flaky):
+            writer.add(row("bad"))
+            writer.add(row("600100"))
+            asyncio.run(writer.flush())
+            # 中途失败: 行保留在缓冲区，推迟到再积累一批时重试
+            self.assertEqual((writer.saved, len(writer._rows), writer.should_flush()), (0, 2, False))
+
+            writer.add(row("600101"))
+            asyncio.run(writer.flush(final=True))
+
+        # 最后一次 flush 逐条写入，只丢掉坏的那一条
+        saved = {r[0] for r in self.conn.execute("SELECT symbol FROM stock_briefs WHERE tier = 'free' AND analysis_markdown = 'brief'")}
+        self.assertEqual((writer.saved, saved), (2, {"600100", "600101"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
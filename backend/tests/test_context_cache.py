@@ -0,0 +1,79 @@
+"""
+Unit tests for the ContextService fact cache (engine/context_service.py).
+"""
+import sys
+import os
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+
+# Add backend dir AND project root to path to support both legacy and new imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from engine import context_service
+from engine.context_service import FactCache
+
+TODAY = "2999-01-01"
+PAST = "2000-01-01"
+
+
+class TestFactCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = FactCache(max_entries=2, ttl_seconds=60, history_ttl_seconds=3600)
+        self.calls = []
+
+    def _loader(self, value):
+        self.calls.append(value)
+        return value
+
+    def _get(self, key, date_str=TODAY, loader=None):
+        return asyncio.run(self.cache.get_or_load(key, date_str, loader or self._loader, key))
+
+    def test_hits_and_lru_eviction(self):
+        self._get("a")
+        self._get("b")
+        self._get("a")                   # a 变为最近使用
+        self._get("c")                   # 淘汰 b
+        self._get("b")
+        self.assertEqual(self.calls, ["a", "b", "c", "b"])
+        self.assertEqual(self.cache.stats, {"hits": 1, "misses": 4, "coalesced": 0, "evictions": 2})
+        self.assertAlmostEqual(self.cache.hit_rate, 0.2)
+
+    def test_ttl_depends_on_date(self):
+        self.assertEqual(self.cache.ttl_for(TODAY), 60)
+        self.assertEqual(self.cache.ttl_for(PAST), 3600)
+        self._get("today")
+        self._get("past", PAST)
+        now = time.monotonic()
+        with patch.object(context_service.time, "monotonic", return_value=now + 120):
+            self._get("today")
+            self._get("past", PAST)
+        self.assertEqual(self.calls, ["today", "past", "today"])
+
+    def test_concurrent_requests_share_one_load(self):
+        def slow(key):
+            time.sleep(0.05)
+            return self._loader(key)
+
+        async def main():
+            return await asyncio.gather(*(self.cache.get_or_load("k", TODAY, slow, "k") for _ in range(5)))
+
+        self.assertEqual(asyncio.run(main()), ["k"] * 5)
+        self.assertEqual(self.calls, ["k"])
+        self.assertEqual(self.cache.stats["coalesced"], 4)
+
+    def test_failures_are_not_cached(self):
+        def broken(key):
+            raise RuntimeError("db down")
+
+        with self.assertRaises(RuntimeError):
+            self._get("k", loader=broken)
+        self.assertEqual(self._get("k"), "k")
+        self.assertEqual(self.calls, ["k"])
+
+
+if __name__ == "__main__":
+    unittest.main()
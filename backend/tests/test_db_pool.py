@@ -0,0 +1,95 @@
+"""
+Unit tests for the per-thread connection pool in database.py.
+"""
+import sys
+import os
+import sqlite3
+import threading
+import unittest
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import ConnectionPool
+
+
+def _memory_conn():
+    return sqlite3.connect(":memory:", check_same_thread=False)
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Verify reuse, bounding and health-check eviction of pooled connections."""
+
+    def setUp(self):
+        patcher = patch.object(database, "get_connection", side_effect=_memory_conn)
+        self.mock_connect = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reuses_connection_in_same_thread(self):
+        pool = ConnectionPool(max_size=2)
+        conn = pool.acquire()
+        pool.release(conn)
+        self.assertIs(pool.acquire(), conn)
+        self.assertEqual(self.mock_connect.call_count, 1)
+        self.assertEqual(pool.stats["reused"], 1)
+
+    def test_pool_is_bounded(self):
+        pool = ConnectionPool(max_size=1)
+        a, b = pool.acquire(), pool.acquire()
+        pool.release(a)
+        pool.release(b)
+        self.assertEqual(len(pool._idle()), 1)
+
+    def test_broken_connection_is_discarded(self):
+        pool = ConnectionPool(max_size=2)
+        conn = pool.acquire()
+        pool.release(conn, broken=True)
+        self.assertEqual(pool.stats["discarded"], 1)
+        self.assertIsNot(pool.acquire(), conn)
+
+    def test_idle_connection_expires(self):
+        pool = ConnectionPool(max_size=2, max_idle_seconds=0)
+        conn = pool.acquire()
+        pool.release(conn)
+        self.assertIsNot(pool.acquire(), conn)
+
+    def test_threads_do_not_share_connections(self):
+        pool = ConnectionPool(max_size=2)
+        conn = pool.acquire()
+        pool.release(conn)
+
+        seen = []
+        t = threading.Thread(target=lambda: seen.append(pool.acquire()))
+        t.start()
+        t.join()
+        self.assertIsNot(seen[0], conn)
+
+    def test_stateless_mode_always_creates(self):
+        pool = ConnectionPool(max_size=2, stateless=True)
+        conn = pool.acquire()
+        pool.release(conn)
+        pool.acquire()
+        self.assertEqual(self.mock_connect.call_count, 2)
+
+    def test_stream_error_drops_connection(self):
+        pool = ConnectionPool(max_size=2)
+        with patch.object(database, "_pool", pool):
+            with self.assertRaises(RuntimeError):
+                with database.pooled_connection():
+                    raise RuntimeError("Hrana: stream not found")
+        self.assertEqual(pool.stats["discarded"], 1)
+        self.assertEqual(len(pool._idle()), 0)
+
+    def test_interrupted_block_drops_connection(self):
+        pool = ConnectionPool(max_size=2)
+        with patch.object(database, "_pool", pool):
+            with self.assertRaises(KeyboardInterrupt):
+                with database.pooled_connection():
+                    raise KeyboardInterrupt
+        self.assertEqual((pool.stats["discarded"], pool._entries(), len(pool._idle())), (1, {}, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
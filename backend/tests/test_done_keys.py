@@ -0,0 +1,52 @@
+"""
+Unit tests for the run-scoped idempotency key set (engine/done_keys.py).
+"""
+import sys
+import os
+import asyncio
+import unittest
+from unittest.mock import patch
+
+# Add backend dir AND project root to path to support both legacy and new imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.engine import done_keys
+from backend.engine.done_keys import DoneKeySet
+from backend.engine.runner import PredictionRunner
+from fixtures import memory_db, use_memory_db
+
+
+class TestDoneKeySet(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = memory_db(self, """
+            CREATE TABLE ai_predictions_v2 (symbol TEXT, date TEXT, model_id TEXT);
+            CREATE TABLE stock_briefs (symbol TEXT, date TEXT, tier TEXT);
+            INSERT INTO ai_predictions_v2 VALUES ('600519', '2024-01-02', 'm1'), ('600519', '2024-01-03', 'm1'),
+                                                 ('000001', '2024-01-05', 'm2');
+            INSERT INTO stock_briefs VALUES ('600519', '2024-01-03', 'pro'), ('600519', '2024-01-02', 'free');
+        """)
+        use_memory_db(self, self.conn, done_keys)
+
+    def test_loads_only_the_date_range(self):
+        keys = DoneKeySet.load_predictions("2024-01-03", "2024-01-05")
+        self.assertEqual(len(keys), 2)
+        self.assertIn(("600519", "2024-01-03", "m1"), keys)
+        self.assertNotIn(("600519", "2024-01-02", "m1"), keys)
+
+        briefs = DoneKeySet.load_briefs("2024-01-03")
+        self.assertIn(("600519", "2024-01-03", "pro"), briefs)
+        self.assertNotIn(("600519", "2024-01-03", "free"), briefs)
+
+    def test_runner_checks_the_set_without_database(self):
+        runner = PredictionRunner(done_keys=DoneKeySet([("600519", "2024-01-03", "m1")]))
+        with patch.object(PredictionRunner, "_has_prediction", side_effect=AssertionError("no per-row query")):
+            self.assertTrue(asyncio.run(runner.has_prediction("600519", "2024-01-03", "m1")))
+            self.assertFalse(asyncio.run(runner.has_prediction("600519", "2024-01-03", "m2")))
+        runner.done_keys.add(("600519", "2024-01-03", "m2"))
+        self.assertTrue(asyncio.run(runner.has_prediction("600519", "2024-01-03", "m2")))
+
+
+if __name__ == "__main__":
+    unittest.main()
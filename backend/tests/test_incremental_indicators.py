@@ -0,0 +1,74 @@
+"""
+Parity tests: incremental indicator engine vs full pandas_ta_classic recompute.
+"""
+import sys
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+
+import numpy as np
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from quant.indicators import calculate_indicators
+from quant.incremental import replay, IndicatorState, INDICATOR_COLUMNS
+from fixtures import make_bars, memory_db
+
+
+class TestIncrementalParity(unittest.TestCase):
+
+    def assertColumnsClose(self, expected, actual):
+        for col in INDICATOR_COLUMNS:
+            np.testing.assert_allclose(
+                actual[col].to_numpy(dtype=float), expected[col].to_numpy(dtype=float),
+                rtol=1e-9, atol=1e-8, err_msg=col,
+            )
+
+    def test_full_replay_matches_pandas_ta(self):
+        # 覆盖各指标的预热边界 (MACD signal 需 34 根, MA60 需 60 根)
+        for n in (5, 15, 30, 40, 120, 700):
+            df = make_bars(n, seed=n)
+            expected = calculate_indicators(df.copy())
+            actual, _ = replay(df)
+            self.assertColumnsClose(expected, actual)
+
+    def test_resume_from_saved_state(self):
+        df = make_bars(300)
+        expected = calculate_indicators(df.copy())
+
+        # 第一次同步到第 200 根，状态停在倒数第二根 (最后一根视为未完结)
+        _, state = replay(df.iloc[:200])
+        self.assertEqual(state.as_of, df["date"].iloc[198])
+
+        # 状态经 JSON 持久化后继续推进，只输出状态之后的 K 线
+        state = IndicatorState.from_json(state.to_json())
+        tail, _ = replay(df.iloc[199:], state)
+        self.assertColumnsClose(expected.iloc[199:], tail)
+
+    def test_flat_range_kdj(self):
+        df = make_bars(30)
+        df.loc[:, ["high", "low", "close"]] = 10.0
+        expected = calculate_indicators(df.copy())
+        actual, _ = replay(df)
+        self.assertColumnsClose(expected, actual)
+
+
+class TestMacdMigration(unittest.TestCase):
+
+    def test_swapped_rows_fixed_once(self):
+        conn = memory_db(self, f"CREATE TABLE daily_prices ({', '.join(database.PRICE_COLUMNS)}, PRIMARY KEY (symbol, date))")
+        conn.execute("INSERT INTO daily_prices (symbol, date, macd, macd_signal, macd_hist) "
+                     "VALUES ('600519', '2024-01-02', 1.0, 0.25, 0.75)")
+        no_close = MagicMock(cursor=conn.cursor, commit=conn.commit)
+        with patch.object(database, "get_connection", return_value=no_close):
+            # 旧内核写入的行: signal / hist 互换，indicator_state 建表时交换一次; 再次 init_db 不再交换
+            database.init_db()
+            database.init_db()
+        row = conn.execute("SELECT macd_signal, macd_hist FROM daily_prices").fetchone()
+        self.assertEqual(row, (0.75, 0.25))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+Unit tests for the latest_prices snapshot maintained by sync/writer.py.
+"""
+import sys
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import helpers
+from sync import writer
+from sync.writer import PriceBatchWriter, PRICE_COLUMNS
+from fixtures import price_row, memory_db, use_memory_db
+
+
+class TestLatestPrices(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = memory_db(self)
+        for period in database.PRICE_PERIODS:
+            self.conn.execute(f"CREATE TABLE {period}_prices ({', '.join(PRICE_COLUMNS)}, PRIMARY KEY (symbol, date))")
+        self.conn.execute(f"""
+            CREATE TABLE latest_prices (period TEXT, {', '.join(PRICE_COLUMNS)}, updated_at TEXT,
+                                        PRIMARY KEY (symbol, period))
+        """)
+        self.conn.executemany(f"INSERT INTO daily_prices VALUES ({', '.join('?' * len(PRICE_COLUMNS))})",
+                              [price_row("600519", "2024-01-02", 1), price_row("600519", "2024-01-03", 2)])
+        database.refresh_latest_prices(self.conn.cursor(), "daily")
+
+        use_memory_db(self, self.conn, writer, database, helpers)
+        patcher = patch.object(writer, "get_price_cache", return_value=MagicMock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_seeded_from_price_table(self):
+        self.assertEqual(helpers.get_last_date("600519"), "2024-01-03")
+        self.assertIsNone(helpers.get_last_date("600519", "weekly_prices"))
+        self.assertEqual(database.get_latest_prices(["600519", "000001"], columns=["date", "close"]),
+                         {"600519": {"symbol": "600519", "date": "2024-01-03", "close": 2.0}})
+
+    def test_writer_upserts_in_same_flush(self):
+        batch = PriceBatchWriter(flush_rows=100)
+        batch.add("600519", "daily", [price_row("600519", "2024-01-04", 3)])
+        batch.add("000001", "weekly", [price_row("000001", "2024-01-05", 7)])
+        batch.flush()
+        latest = database.get_latest_prices(["600519"], columns=["date", "close"])
+        self.assertEqual(latest["600519"]["close"], 3.0)
+        self.assertEqual(helpers.get_last_date("000001", "weekly_prices"), "2024-01-05")
+
+        # 周线当前周期被清理后重写: 快照跟随新的最后一根
+        batch.add("000001", "weekly", [price_row("000001", "2024-01-04", 8)])
+        batch.flush()
+        self.assertEqual(database.get_latest_prices(["000001"], "weekly")["000001"]["close"], 8.0)
+
+    def test_failed_flush_keeps_rows_for_retry(self):
+        batch = PriceBatchWriter(flush_rows=100)
+        batch.add("600519", "daily", [price_row("600519", "2024-01-04", 3)])
+        with patch.object(writer, "execute_with_retry", side_effect=RuntimeError("database is locked")):
+            with self.assertRaises(RuntimeError):
+                batch.flush()
+        batch.add("000001", "daily", [price_row("000001", "2024-01-04", 5)])
+
+        self.assertEqual(batch.flush(), 2)
+        latest = database.get_latest_prices(["600519", "000001"], columns=["close"])
+        self.assertEqual({s: r["close"] for s, r in latest.items()}, {"600519": 3.0, "000001": 5.0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+"""
+Unit tests for the content-addressed LLM response cache in engine/llm_client.py.
+"""
+import sys
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+
+# Add backend dir AND project root to path to support both legacy and new imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.engine import llm_client
+from backend.engine.llm_client import (
+    LLMClient, LLMResponseCache, MemoryCacheBackend, SQLiteCacheBackend, llm_cache_key
+)
+
+MESSAGES = [{"role": "system", "content": "sys"}, {"role": "user", "content": "600519 2024-01-05"}]
+
+
+def _response(content="{\"signal\": \"Long\"}"):
+    resp = MagicMock(status_code=200, text="")
+    resp.json.return_value = {
+        "choices": [{"message": {"content": content}}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120},
+    }
+    return resp
+
+
+class TestCacheBackends(unittest.TestCase):
+
+    def test_key_depends_on_every_field(self):
+        base = llm_cache_key("deepseek", "deepseek-chat", 0.7, 4096, MESSAGES)
+        self.assertEqual(base, llm_cache_key("deepseek", "deepseek-chat", 0.7, 4096, [dict(m) for m in MESSAGES]))
+        self.assertNotEqual(base, llm_cache_key("deepseek", "deepseek-chat", 0.5, 4096, MESSAGES))
+        self.assertNotEqual(base, llm_cache_key("hunyuan", "deepseek-chat", 0.7, 4096, MESSAGES))
+
+    def test_memory_lru_eviction(self):
+        backend = MemoryCacheBackend(max_entries=2)
+        backend.set("a", "A", {})
+        backend.set("b", "B", {})
+        backend.get("a")                      # a 变为最近使用
+        self.assertEqual(backend.set("c", "C", {}), 1)
+        self.assertIsNone(backend.get("b"))
+        self.assertEqual(backend.get("a")[0], "A")
+
+    def test_sqlite_ttl_and_size_cap(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            backend = SQLiteCacheBackend(os.path.join(tmp, "cache.db"), ttl_seconds=60, max_entries=3)
+            backend.PRUNE_EVERY = 1
+            for i in range(5):
+                backend.set(f"k{i}", f"v{i}", {"total_tokens": i})
+            self.assertIsNone(backend.get("k0"))
+            self.assertEqual(backend.get("k4"), ("v4", {"total_tokens": 4}))
+
+            with patch.object(llm_client.time, "time", return_value=llm_client.time.time() + 120):
+                self.assertIsNone(backend.get("k4"))
+
+    def test_sqlite_hits_do_not_write(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            backend = SQLiteCacheBackend(os.path.join(tmp, "cache.db"), max_entries=3)
+            backend.PRUNE_EVERY = 1
+            for key in ("k0", "k1", "k2"):
+                backend.set(key, key, {})
+            changes = backend._conn.total_changes
+            self.assertEqual(backend.get("k0"), ("k0", {}))
+            self.assertEqual(backend._conn.total_changes, changes)
+
+            # 访问时间随下一次写入落盘，LRU 淘汰的是最久未访问的 k1
+            backend.set("k3", "k3", {})
+            self.assertIsNone(backend.get("k1"))
+            self.assertEqual(backend.get("k0"), ("k0", {}))
+
+
+class TestClientCaching(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = LLMResponseCache(backend=MemoryCacheBackend(), enabled=True)
+        patcher = patch.object(llm_client, "_llm_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = LLMClient(provider="custom", base_url="http://llm.test/v1", api_key="k", model="m")
+
+    def test_second_call_is_served_from_cache(self):
+        with patch.object(llm_client.requests, "post", return_value=_response()) as post:
+            first, meta1 = self.client.chat(MESSAGES)
+            second, meta2 = self.client.chat(MESSAGES)
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(meta1["total_tokens"], 120)
+        self.assertTrue(meta2["cached"])
+        self.assertEqual(meta2["total_tokens"], 0)
+        self.assertEqual(self.cache.stats["hits"], 1)
+        self.assertEqual(self.cache.stats["saved_tokens"], 120)
+
+    def test_bypass_read_still_refreshes_entry(self):
+        with patch.object(llm_client.requests, "post", side_effect=[_response("bad"), _response("good")]) as post:
+            self.client.chat(MESSAGES)
+            self.client.chat(MESSAGES, use_cache=False)
+            content, _ = self.client.chat(MESSAGES)
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(content, "good")
+
+    def test_failures_are_not_cached(self):
+        failed = MagicMock(status_code=429, text="rate limited")
+        with patch.object(llm_client.requests, "post", side_effect=[failed, _response()]) as post:
+            self.assertIsNone(self.client.chat(MESSAGES)[0])
+            self.assertIsNotNone(self.client.chat(MESSAGES)[0])
+        self.assertEqual(post.call_count, 2)
+
+    def test_unparseable_reply_is_evicted(self):
+        with patch.object(llm_client, "get_tracker"), \
+                patch.object(llm_client, "normalize_ai_response", side_effect=lambda r: r), \
+                patch.object(llm_client.requests, "post", side_effect=[_response("not json"), _response()]) as post:
+            self.assertIsNone(self.client.generate_stock_prediction("sys", "600519 2024-01-05", retries=0))
+            # 坏回复没有留在缓存里: 下次运行重新请求，解析成功的回复才会被复用
+            self.assertEqual(self.client.generate_stock_prediction("sys", "600519 2024-01-05", retries=0)["signal"], "Long")
+            self.client.generate_stock_prediction("sys", "600519 2024-01-05", retries=0)
+        self.assertEqual(post.call_count, 2)
+
+    def test_disabled_cache_is_bypassed(self):
+        self.cache.enabled = False
+        with patch.object(llm_client.requests, "post", return_value=_response()) as post:
+            self.client.chat(MESSAGES)
+            self.client.chat(MESSAGES)
+        self.assertEqual(post.call_count, 2)
+
+
+@unittest.skipIf(llm_client.httpx is None, "httpx not installed")
+class TestLoopHttpClients(unittest.TestCase):
+
+    def test_clients_are_closed_when_the_loop_finishes(self):
+        async def use_client():
+            return llm_client.get_async_http_client("http://llm.test/v1")
+
+        clients = [llm_client.run_with_http_clients(use_client()) for _ in range(3)]
+        # 每次 asyncio.run 一个新的连接池，结束时全部关闭
+        self.assertEqual(len({id(c) for c in clients}), 3)
+        self.assertTrue(all(c.is_closed for c in clients))
+
+
+if __name__ == "__main__":
+    unittest.main()
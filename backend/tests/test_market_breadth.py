@@ -0,0 +1,74 @@
+"""
+Unit tests for the materialized market breadth table (engine/market_breadth.py).
+"""
+import sys
+import os
+import unittest
+
+# Add backend dir AND project root to path to support both legacy and new imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from engine import market_breadth
+from engine.market_breadth import update_market_breadth, load_market_breadth, format_market_mood
+from fixtures import memory_db, use_memory_db
+
+
+class TestMarketBreadth(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = memory_db(self, """
+            CREATE TABLE daily_prices (symbol TEXT, date TEXT, change_percent REAL, PRIMARY KEY (symbol, date));
+            CREATE TABLE market_breadth (
+                date TEXT NOT NULL, market TEXT NOT NULL,
+                sample_size INTEGER, advancers INTEGER, decliners INTEGER, median_change REAL,
+                anchors TEXT, updated_at TIMESTAMP, PRIMARY KEY (date, market)
+            );
+        """)
+        rows = [("sh000001", "2099-01-02", 0.5), ("00700", "2099-01-02", -1.0), ("02800", "2099-01-02", -0.3)]
+        rows += [(f"60000{i}", "2099-01-02", c) for i, c in enumerate([2.0, 1.0, 0.0, -1.0, 3.0, None])]
+        self.conn.executemany("INSERT INTO daily_prices VALUES (?, ?, ?)", rows)
+        use_memory_db(self, self.conn, market_breadth)
+
+    def _load(self, *keys, **kwargs):
+        return load_market_breadth(self.conn.cursor(), keys, **kwargs)
+
+    def test_aggregates_per_market(self):
+        self.assertEqual(update_market_breadth(), 2)
+        rows = self._load(("2099-01-02", "CN"), ("2099-01-02", "HK"))
+
+        cn = rows[("2099-01-02", "CN")]
+        self.assertEqual((cn["sample_size"], cn["advancers"], cn["decliners"], cn["median_change"]), (5, 3, 1, 1.0))
+        self.assertEqual(cn["anchors"], {"sh000001": 0.5})
+        self.assertEqual(format_market_mood(cn), "上证指数 涨 0.50%，(核心观察池涨3/跌1，中位数+1.00%)")
+        # 样本不足时只展示锚点
+        self.assertEqual(format_market_mood(rows[("2099-01-02", "HK")]), "恒生指数(ETF) 跌 0.30%")
+
+    def test_latest_date_is_recomputed(self):
+        update_market_breadth(["CN"])
+        self.conn.execute("INSERT INTO daily_prices VALUES ('600010', '2099-01-02', 5.0)")
+        update_market_breadth(["CN"])
+        self.assertEqual(self._load(("2099-01-02", "CN"))[("2099-01-02", "CN")]["advancers"], 4)
+
+    def _stored(self):
+        return sorted(r[0] for r in self.conn.execute("SELECT date FROM market_breadth WHERE market = 'CN'"))
+
+    def test_missing_dates_are_computed_on_demand(self):
+        self.assertEqual(self._load(("2099-01-02", "CN")), {})
+        # 首次同步之前: 只计算不写入，首次同步仍从 BACKFILL_DAYS 回溯
+        row = self._load(("2099-01-02", "CN"), compute_missing=True)[("2099-01-02", "CN")]
+        self.assertEqual(row["sample_size"], 5)
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM market_breadth").fetchone()[0], 0)
+        self.assertEqual(format_market_mood(None), "市场数据正在同步中。")
+
+        update_market_breadth(["CN"])
+        self.conn.executemany("INSERT INTO daily_prices VALUES (?, ?, ?)",
+                              [("600000", "2099-01-01", 1.0), ("600000", "2099-01-03", 1.0)])
+        rows = self._load(("2099-01-01", "CN"), ("2099-01-03", "CN"), compute_missing=True)
+        # 早于最近汇总日期的缺口写入; 更新的日期 (可能尚未同步完) 只计算
+        self.assertEqual(set(rows), {("2099-01-01", "CN"), ("2099-01-03", "CN")})
+        self.assertEqual(self._stored(), ["2099-01-01", "2099-01-02"])
+
+
+if __name__ == "__main__":
+    unittest.main()
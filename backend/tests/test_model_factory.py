@@ -0,0 +1,98 @@
+"""
+Unit tests for the process-wide model cache in engine/models/factory.py.
+"""
+import sys
+import os
+import sqlite3
+import unittest
+from contextlib import contextmanager
+from unittest.mock import patch
+
+# Add backend dir AND project root to path to support both legacy and new imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.engine.models import factory
+from backend.engine.models.base import BasePredictionModel
+from backend.engine.models.factory import ModelFactory
+
+
+class DummyModel(BasePredictionModel):
+    instances = 0
+
+    def __init__(self, model_id, config):
+        super().__init__(model_id, config)
+        DummyModel.instances += 1
+
+    async def predict(self, symbol, date, data):
+        return None
+
+
+class TestModelRegistryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("""
+            CREATE TABLE prediction_models (
+                model_id TEXT PRIMARY KEY, display_name TEXT NOT NULL, provider TEXT NOT NULL,
+                is_active BOOLEAN DEFAULT 1, priority INTEGER DEFAULT 0, config_json TEXT, capabilities_json TEXT
+            )
+        """)
+        self.conn.executemany("INSERT INTO prediction_models VALUES (?, ?, 'dummy', 1, ?, ?, NULL)", [
+            ("m1", "M1", 10, '{"temperature": 0.7}'),
+            ("m2", "M2", 20, '{}'),
+        ])
+        self.addCleanup(self.conn.close)
+        self.queries = 0
+
+        @contextmanager
+        def _pooled():
+            self.queries += 1
+            yield self.conn
+
+        ModelFactory.register("dummy", DummyModel)
+        ModelFactory.invalidate()
+        DummyModel.instances = 0
+        for patcher in (patch.object(factory, "pooled_connection", _pooled),
+                        patch.dict(factory.MODEL_REGISTRY_CONFIG, {"check_interval": 3600})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(ModelFactory.invalidate)
+
+    def _recheck(self):
+        ModelFactory._checked_at = None   # 模拟检查间隔已过
+
+    def test_instances_are_reused(self):
+        first = ModelFactory.get_active_models()
+        for _ in range(50):
+            models = ModelFactory.get_active_models()
+        self.assertEqual([m.model_id for m in models], ["m2", "m1"])
+        self.assertTrue(all(a is b for a, b in zip(first, models)))
+        self.assertEqual(DummyModel.instances, 2)
+        self.assertEqual(self.queries, 1)
+
+    def test_changed_config_rebuilds_only_that_model(self):
+        m2, m1 = ModelFactory.get_active_models()
+        self.conn.execute("UPDATE prediction_models SET config_json = '{\"temperature\": 0.2}' WHERE model_id = 'm1'")
+        self.assertIs(ModelFactory.get_active_models()[1], m1)   # 检查间隔内不查库
+        self._recheck()
+        new_m2, new_m1 = ModelFactory.get_active_models()
+        self.assertIs(new_m2, m2)
+        self.assertIsNot(new_m1, m1)
+        self.assertEqual(new_m1.config["temperature"], 0.2)
+
+    def test_deactivated_and_priority_changes(self):
+        ModelFactory.get_active_models()
+        self.conn.execute("UPDATE prediction_models SET is_active = 0 WHERE model_id = 'm2'")
+        self.conn.execute("INSERT INTO prediction_models VALUES ('m3', 'M3', 'dummy', 1, 5, NULL, NULL)")
+        self._recheck()
+        self.assertEqual([m.model_id for m in ModelFactory.get_active_models()], ["m1", "m3"])
+
+    def test_broken_model_is_skipped(self):
+        self.conn.execute("INSERT INTO prediction_models VALUES ('bad', 'Bad', 'unknown', 1, 30, NULL, NULL)")
+        self._recheck()
+        self.assertEqual([m.model_id for m in ModelFactory.get_active_models()], ["m2", "m1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
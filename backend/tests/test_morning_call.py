@@ -0,0 +1,70 @@
+"""
+Unit tests for the set-based morning call generator (scripts/daily_morning_call.py).
+"""
+import sys
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+
+# Add backend dir, scripts dir AND project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import daily_morning_call
+from notification_service import NotificationManager
+from fixtures import memory_db
+
+DATE = "2024-01-05"
+
+
+class TestMorningCall(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = memory_db(self, """
+            CREATE TABLE users (user_id TEXT PRIMARY KEY, subscription_tier TEXT, notification_settings TEXT);
+            CREATE TABLE user_watchlist (user_id TEXT, symbol TEXT, PRIMARY KEY (user_id, symbol));
+            CREATE TABLE stock_meta (symbol TEXT PRIMARY KEY, name TEXT);
+            CREATE TABLE stock_briefs (symbol TEXT, date TEXT, analysis_markdown TEXT, created_at TEXT);
+            CREATE TABLE ai_predictions_v2 (symbol TEXT, date TEXT, model_id TEXT, target_date TEXT,
+                                            signal TEXT, is_primary INTEGER);
+            CREATE TABLE notification_logs (id TEXT PRIMARY KEY, user_id TEXT, type TEXT, related_symbols TEXT,
+                                            title TEXT, body TEXT, url TEXT);
+            CREATE TABLE signal_states (user_id TEXT, symbol TEXT, last_signal TEXT, last_confidence REAL,
+                                        last_notified_at TEXT, PRIMARY KEY (user_id, symbol));
+            INSERT INTO users VALUES ('u-bull', 'pro', NULL), ('u-side', 'free', NULL), ('u-none', 'free', NULL);
+            INSERT INTO user_watchlist VALUES
+                ('u-bull', '600519'), ('u-bull', '000001'), ('u-bull', '000002'),
+                ('u-side', '000001'), ('u-none', '300750');
+            INSERT INTO stock_meta VALUES ('600519', '贵州茅台'), ('000001', '平安银行');
+            INSERT INTO ai_predictions_v2 VALUES
+                ('600519', '2024-01-04', 'm1', '2024-01-05', 'Long', 1),
+                ('600519', '2024-01-04', 'm2', '2024-01-05', 'Short', 0),
+                ('000001', '2024-01-04', 'm1', '2024-01-05', 'Side', 1),
+                ('000002', '2024-01-04', 'm1', '2024-01-05', 'Long', 1),
+                ('300750', '2024-01-03', 'm1', '2024-01-04', 'Long', 1);
+        """)
+
+    def test_single_join_groups_by_user(self):
+        grouped = daily_morning_call.load_watchlist_predictions(self.conn.cursor(), DATE)
+
+        self.assertEqual(sorted(grouped["u-bull"][0]), ["000001", "000002", "600519"])
+        # 非主决策、没有 stock_meta 的预测不计入
+        self.assertEqual(sorted(grouped["u-bull"][1]), [("000001", "Side", "平安银行"), ("600519", "Long", "贵州茅台")])
+        self.assertEqual(grouped["u-side"][1], [("000001", "Side", "平安银行")])
+        self.assertEqual(grouped["u-none"], (["300750"], []))
+
+    def test_generate_queues_all_users_at_once(self):
+        no_close = MagicMock(cursor=self.conn.cursor, commit=self.conn.commit)
+        with patch.object(daily_morning_call, "get_connection", return_value=no_close), \
+                patch.object(daily_morning_call, "get_task_logger"), \
+                patch.object(daily_morning_call, "NotificationManager",
+                             side_effect=lambda dry_run: NotificationManager(conn=self.conn, dry_run=True)):
+            daily_morning_call.generate_morning_calls(dry_run=True, target_date=DATE)
+
+        logs = dict(self.conn.execute("SELECT user_id, type FROM notification_logs"))
+        self.assertEqual(logs, {"u-bull": "morning_call", "u-side": "morning_call_neutral"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+Unit tests for the local news store in engine/services/news_service.py.
+"""
+import sys
+import os
+import asyncio
+import json
+import unittest
+from unittest.mock import patch
+
+# Add backend dir AND project root to path to support both legacy and new imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.engine.services import news_service
+from fixtures import memory_db, use_memory_db
+
+
+def _jsonp(*articles):
+    return "jQuery_callback(" + json.dumps({"result": {"cmsArticle": list(articles)}}) + ");"
+
+
+def _article(code, title, date):
+    return {"code": code, "title": title, "date": date, "content": f"content {code}", "mediaName": "EM"}
+
+
+class TestNewsStore(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = memory_db(self, """
+            CREATE TABLE news_articles (
+                symbol TEXT, article_id TEXT, title TEXT, content TEXT, published_at TEXT,
+                media TEXT, url TEXT, fetched_at TIMESTAMP, PRIMARY KEY (symbol, article_id)
+            );
+            CREATE TABLE news_fetch_state (symbol TEXT PRIMARY KEY, last_fetched_at TIMESTAMP, last_seen_at TEXT);
+        """)
+        use_memory_db(self, self.conn, news_service)
+        self.responses = []
+        patcher = patch.object(news_service, "_fetch_sync", side_effect=lambda symbol: self.responses.pop(0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _fetch(self, date_str, **kwargs):
+        return asyncio.run(news_service.fetch_news_for_stock("600519", "贵州茅台", date_str, **kwargs))
+
+    def test_rerun_is_served_from_store(self):
+        self.responses.append(_jsonp(_article("a1", "贵州茅台发布公告", "2099-01-02 09:00:00"),
+                                     _article("x", "无关新闻", "2099-01-02 10:00:00")))
+        first = self._fetch("2099-01-02")
+        second = self._fetch("2099-01-02")   # 水位新鲜: 不再请求网络 (responses 已空)
+        self.assertEqual(first, second)
+        self.assertIn("贵州茅台发布公告", first)
+        self.assertNotIn("无关新闻", first)
+
+    def test_refresh_only_adds_new_articles(self):
+        self.responses.append(_jsonp(_article("a1", "600519 旧闻", "2099-01-01 09:00:00")))
+        self._fetch("2099-01-02")
+        self.responses.append(_jsonp(_article("a1", "600519 旧闻", "2099-01-01 09:00:00"),
+                                     _article("a2", "600519 新闻", "2099-01-02 09:00:00")))
+        news = self._fetch("2099-01-02", force_refresh=True)
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM news_articles").fetchone()[0], 2)
+        self.assertLess(news.index("新闻"), news.index("旧闻"))
+        self.assertEqual(self.conn.execute("SELECT last_seen_at FROM news_fetch_state").fetchone()[0],
+                         "2099-01-02 09:00:00")
+
+    def test_historical_date_uses_store_and_window(self):
+        self.conn.execute("INSERT INTO news_fetch_state VALUES ('600519', '2099-01-20 08:00:00', NULL)")
+        self.conn.execute("""
+            INSERT INTO news_articles VALUES ('600519', 'old', '600519 太早', '', '2098-12-01 09:00:00', 'EM', NULL, NULL),
+                                             ('600519', 'in', '600519 窗口内', '', '2099-01-08 09:00:00', 'EM', NULL, NULL)
+        """)
+        news = self._fetch("2099-01-10")
+        self.assertIn("窗口内", news)
+        self.assertNotIn("太早", news)
+
+    def test_network_failure_without_store(self):
+        with patch.object(news_service, "_fetch_remote", return_value=None):
+            self.assertEqual(self._fetch("2099-01-02"), "News retrieval failed.")
+
+
+if __name__ == "__main__":
+    unittest.main()
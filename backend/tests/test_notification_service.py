@@ -97,6 +97,7 @@ class TestNotificationService(unittest.TestCase):
         }
         
         self.manager._log_to_db("test_id", "user1", payload)
+        self.manager._persist_pending_writes()
         
         # Check cursor execution
         cursor = self.mock_conn.cursor()
@@ -112,12 +113,32 @@ class TestNotificationService(unittest.TestCase):
             {"user_id": "u2", "symbol": "S2", "signal": "Short", "confidence": 0.7}
         ]
         
-        self.manager._persist_signal_states()
+        self.manager._persist_pending_writes()
         
+        # One multi-row statement for both updates
         cursor = self.mock_conn.cursor()
-        self.assertEqual(cursor.execute.call_count, 2)
+        self.assertEqual(cursor.execute.call_count, 1)
         args, _ = cursor.execute.call_args
         self.assertIn("INSERT OR REPLACE INTO signal_states", args[0])
+        self.assertEqual(args[1][:3], ("u1", "S1", "Long"))
+        self.assertEqual(len(args[1]), 10)
+
+    def test_preloaded_preferences(self):
+        """Tiers and settings are loaded once and reused for every message."""
+        cursor = self.mock_conn.cursor()
+        cursor.fetchall.return_value = [
+            ("u1", "pro", json.dumps({"types": {"signal_flip": {"enabled": False}}})),
+            ("u2", None, None),
+        ]
+        self.manager.load_user_profiles(["u1", "u2", "u3"])
+        cursor.execute.reset_mock()
+
+        self.assertEqual(self.manager._get_user_tier("u1"), "pro")
+        self.assertEqual(self.manager._get_user_tier("u3"), "free")
+        self.assertFalse(self.manager._check_user_preference("u1", "signal_flip"))
+        self.assertTrue(self.manager._check_user_preference("u1", "morning_call"))
+        self.assertTrue(self.manager._check_user_preference("u2", "signal_flip"))
+        cursor.execute.assert_not_called()
 
     def test_flush_workflow(self):
         """Verify end-to-end flush logic."""
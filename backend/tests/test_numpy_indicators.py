@@ -0,0 +1,51 @@
+"""
+Parity tests: pure-NumPy indicator kernel vs the pandas_ta_classic kernel.
+"""
+import sys
+import os
+import unittest
+
+import numpy as np
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quant.indicators import (
+    ta, calculate_indicators_pandas_ta, calculate_indicators_numpy, calculate_indicators_batch,
+)
+from quant.incremental import INDICATOR_COLUMNS
+from fixtures import make_bars
+
+
+@unittest.skipUnless(ta is not None, "pandas_ta_classic not installed")
+class TestNumpyKernelParity(unittest.TestCase):
+
+    def assertFramesClose(self, expected, actual):
+        for col in INDICATOR_COLUMNS:
+            np.testing.assert_allclose(
+                actual[col].to_numpy(dtype=float), expected[col].to_numpy(dtype=float),
+                rtol=1e-9, atol=1e-8, err_msg=col,
+            )
+
+    def test_single_symbol_matches_pandas_ta(self):
+        for n in (5, 15, 30, 40, 120, 700):
+            df = make_bars(n, seed=n)
+            self.assertFramesClose(calculate_indicators_pandas_ta(df.copy()), calculate_indicators_numpy(df.copy()))
+
+    def test_flat_range_kdj(self):
+        df = make_bars(30)
+        df.loc[:, ["high", "low", "close"]] = 10.0
+        self.assertFramesClose(calculate_indicators_pandas_ta(df.copy()), calculate_indicators_numpy(df.copy()))
+
+    def test_batch_with_ragged_lengths(self):
+        frames = {f"S{n}": make_bars(n, seed=n) for n in (10, 35, 80, 200)}
+        results = calculate_indicators_batch(frames)
+
+        self.assertEqual(list(results), list(frames))
+        for sym, df in frames.items():
+            self.assertEqual(len(results[sym]), len(df))
+            self.assertFramesClose(calculate_indicators_pandas_ta(df.copy()), results[sym])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""
+Unit tests for the local Arrow price cache (price_cache.py).
+"""
+import sys
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from price_cache import PriceCache, CACHE_COLUMNS, pa
+from sync.writer import PRICE_COLUMNS
+from fixtures import price_row, memory_db, use_memory_db
+
+
+def _dates(n, start=1):
+    return [f"2024-01-{d:02d}" for d in range(start, start + n)]
+
+
+@unittest.skipIf(pa is None, "pyarrow not installed")
+class TestPriceCache(unittest.TestCase):
+    """Verify hydration, coverage checks and incremental merges of the cache."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = PriceCache(root=tmp.name, keep_bars={"daily": 5, "weekly": 5, "monthly": 5}, enabled=True)
+
+        self.conn = memory_db(self)
+        self.conn.execute(f"CREATE TABLE daily_prices ({', '.join(PRICE_COLUMNS)}, PRIMARY KEY (symbol, date))")
+        self.conn.execute(f"CREATE TABLE latest_prices (period, {', '.join(PRICE_COLUMNS)}, updated_at, "
+                          f"PRIMARY KEY (symbol, period))")
+        self._insert([price_row("600519", d, i) for i, d in enumerate(_dates(8))]
+                     + [price_row("000001", d, i) for i, d in enumerate(_dates(3))])
+
+        patcher = patch.dict(sys.modules, {"backend.database": database})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        use_memory_db(self, self.conn, database)
+
+    def _insert(self, rows):
+        """模拟 PriceBatchWriter: 写行情并在同一事务内刷新 latest_prices"""
+        self.conn.executemany(f"INSERT OR REPLACE INTO daily_prices VALUES ({', '.join('?' * len(PRICE_COLUMNS))})",
+                              rows)
+        database.refresh_latest_prices(self.conn.cursor(), "daily", {r[0] for r in rows})
+
+    def _new_reader(self):
+        return PriceCache(root=str(self.cache.root), keep_bars=self.cache.keep_bars, enabled=True)
+
+    def _refresh(self):
+        self.cache.refresh(["600519", "000001"], periods=("daily",))
+
+    def test_miss_before_refresh(self):
+        self.assertIsNone(self.cache.get_history("600519", "daily", limit=3))
+
+    def test_history_matches_sql_order(self):
+        self._refresh()
+        rows = self.cache.get_history("600519", "daily", end_date="2024-01-07", limit=3, columns=["date", "close"])
+        self.assertEqual(rows, [{"date": "2024-01-07", "close": 6.0},
+                                {"date": "2024-01-06", "close": 5.0},
+                                {"date": "2024-01-05", "close": 4.0}])
+
+    def test_truncated_history_falls_back(self):
+        self._refresh()
+        # 只缓存了最近 5 根: 请求更早的窗口必须回退到数据库
+        self.assertIsNone(self.cache.get_history("600519", "daily", end_date="2024-01-05", limit=3))
+        self.assertIsNone(self.cache.get_history("600519", "daily", limit=10))
+
+    def test_complete_symbol_serves_short_history(self):
+        self._refresh()
+        rows = self.cache.get_history("000001", "daily", limit=10)
+        self.assertEqual([r["date"] for r in rows], ["2024-01-03", "2024-01-02", "2024-01-01"])
+
+    def test_get_row(self):
+        self._refresh()
+        self.assertEqual(self.cache.get_row("600519", "daily")["date"], "2024-01-08")
+        self.assertEqual(self.cache.get_row("600519", "daily", "2024-01-06")["close"], 5.0)
+        self.assertIsNone(self.cache.get_row("600519", "daily", "2024-01-09"))
+
+    def test_apply_rows_merges_cached_symbols_only(self):
+        self._refresh()
+        self.cache.apply_rows("daily_prices", PRICE_COLUMNS,
+                              [price_row("600519", "2024-01-08", 99), price_row("600519", "2024-01-09", 100),
+                               price_row("600000", "2024-01-09", 1)])
+        rows = self.cache.get_history("600519", "daily", limit=2, columns=["date", "close"])
+        self.assertEqual(rows, [{"date": "2024-01-09", "close": 100.0}, {"date": "2024-01-08", "close": 99.0}])
+        self.assertIsNone(self.cache.get_row("600000", "daily"))
+
+    def test_cleanup_drops_current_period(self):
+        self._refresh()
+        self.cache.apply_rows("daily_prices", PRICE_COLUMNS, [price_row("600519", "2024-01-07", 50)],
+                              cleanups=[("600519", "2024-01-07")])
+        self.assertEqual(self.cache.get_row("600519", "daily")["date"], "2024-01-07")
+
+    def test_apply_rows_rewrites_only_touched_symbols(self):
+        self._refresh()
+        untouched = (self.cache.root / "daily_CN" / "000001.arrow").stat().st_mtime_ns
+        self.cache.apply_rows("daily_prices", PRICE_COLUMNS, [price_row("600519", "2024-01-09", 9)])
+        self.assertEqual((self.cache.root / "daily_CN" / "000001.arrow").stat().st_mtime_ns, untouched)
+        self.assertEqual(self.cache.stats["writes"], 3)
+
+    def test_other_instance_sees_update(self):
+        self._refresh()
+        reader = self._new_reader()
+        self.assertEqual(reader.get_row("600519", "daily")["date"], "2024-01-08")
+        self._insert([price_row("600519", "2024-01-09", 9)])
+        self.cache.apply_rows("daily_prices", PRICE_COLUMNS, [price_row("600519", "2024-01-09", 9)])
+        # 已在运行的读取方仍以启动时的 latest_prices 为基准: 更新后的文件视为过期，回退到数据库
+        reader._segments[("daily", "600519")].checked_at = 0
+        self.assertIsNone(reader.get_row("600519", "daily"))
+        # 下一次运行读到新的基准
+        self.assertEqual(self._new_reader().get_row("600519", "daily")["date"], "2024-01-09")
+
+    def test_stale_cache_falls_back_and_is_reloaded(self):
+        self._refresh()
+        # 其他机器同步了数据库，本地缓存没有更新
+        self._insert([price_row("600519", "2024-01-09", 9), price_row("600519", "2024-01-10", 10)])
+        reader = self._new_reader()
+        self.assertIsNone(reader.get_row("600519", "daily"))
+        self.assertEqual(reader.get_row("000001", "daily")["date"], "2024-01-03")
+
+        # 过期的股票不再追加 (会留下缺口)，由 refresh 从数据库重新加载
+        reader.apply_rows("daily_prices", PRICE_COLUMNS, [price_row("600519", "2024-01-10", 10)])
+        self.assertFalse((reader.root / "daily_CN" / "600519.arrow").exists())
+        reader.refresh(["600519", "000001"], periods=("daily",))
+        rows = reader.get_history("600519", "daily", limit=3, columns=["date"])
+        self.assertEqual([r["date"] for r in rows], ["2024-01-10", "2024-01-09", "2024-01-08"])
+
+    def test_columns_are_cache_columns(self):
+        self._refresh()
+        self.assertEqual(list(self.cache.get_row("600519", "daily")), CACHE_COLUMNS)
+
+
+if __name__ == "__main__":
+    unittest.main()
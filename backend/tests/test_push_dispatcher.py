@@ -0,0 +1,112 @@
+"""
+Unit tests for the async push dispatcher (push_dispatcher.py).
+"""
+import sys
+import os
+import time
+import unittest
+from unittest.mock import patch
+
+# Add backend dir AND project root to path to support both legacy and new imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import push_dispatcher
+from push_dispatcher import PushDispatcher, build_requests
+from fixtures import memory_db, use_memory_db
+
+
+def _msg(target=None, symbol=None, body="b"):
+    return {"payload": {"title": "t", "body": body, "url": "/d", "tag": "daily_brief",
+                        "target_user_id": target, "related_symbol": symbol, "broadcast": False},
+            "queue_id": None, "attempts": 0}
+
+
+class TestBuildRequests(unittest.TestCase):
+
+    def test_same_template_targets_are_coalesced(self):
+        msgs = [_msg("u1"), _msg("u2"), _msg("u1"), _msg("u3", body="other"), _msg(symbol="600519")]
+        reqs = build_requests(msgs, bulk=True, max_targets=100)
+        bodies = [body for body, _ in reqs]
+
+        self.assertEqual(len(reqs), 3)
+        bulk = next(b for b in bodies if "target_user_ids" in b)
+        self.assertEqual(bulk["target_user_ids"], ["u1", "u2"])
+        self.assertEqual(len(next(m for b, m in reqs if b is bulk)), 3)
+        self.assertIn(msgs[3]["payload"], bodies)
+        self.assertIn(msgs[4]["payload"], bodies)
+
+    def test_max_targets_and_bulk_disabled(self):
+        msgs = [_msg(f"u{i}") for i in range(5)]
+        self.assertEqual([len(m) for _, m in build_requests(msgs, max_targets=2)], [2, 2, 1])
+        self.assertEqual(len(build_requests(msgs, bulk=False)), 5)
+
+
+class TestPushDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = memory_db(self, """
+            CREATE TABLE push_queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, attempts INTEGER DEFAULT 0,
+                status TEXT DEFAULT 'pending', next_attempt_at REAL, last_error TEXT,
+                created_at TIMESTAMP, updated_at TIMESTAMP
+            )
+        """)
+        use_memory_db(self, self.conn, push_dispatcher)
+
+        self.sent, self.result = [], (True, None, False)
+        self.dispatcher = PushDispatcher({"linger_ms": 20, "retry_interval_seconds": 3600, "max_attempts": 2})
+
+        async def fake_post(body):
+            self.sent.append(body)
+            return self.result
+
+        self.dispatcher._post = fake_post
+
+    def _queue(self):
+        return self.conn.execute("SELECT attempts, status, next_attempt_at IS NOT NULL FROM push_queue").fetchall()
+
+    def test_submit_is_batched_and_flushed(self):
+        for uid in ("u1", "u2", "u3"):
+            self.dispatcher.submit(_msg(uid)["payload"])
+        self.assertTrue(self.dispatcher.flush(timeout=5))
+
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(self.sent[0]["target_user_ids"], ["u1", "u2", "u3"])
+        self.assertEqual(self.dispatcher.stats["delivered"], 3)
+        self.assertEqual(self._queue(), [])
+
+    def test_failed_sends_are_retried_from_queue(self):
+        self.result = (False, "[503] busy", True)
+        self.dispatcher.submit(_msg("u1")["payload"])
+        self.assertTrue(self.dispatcher.flush(timeout=5))
+        self.assertEqual(self._queue(), [(1, "pending", 1)])
+
+        # 未到期不重投; 到期后重投成功则出队
+        self.assertEqual(self.dispatcher.retry_now(), 0)
+        self.conn.execute("UPDATE push_queue SET next_attempt_at = ?", (time.time() - 1,))
+        self.result = (True, None, False)
+        self.assertEqual(self.dispatcher.retry_now(), 1)
+        self.assertTrue(self.dispatcher.flush(timeout=5))
+        self.assertEqual(self._queue(), [])
+        self.assertEqual(len(self.sent), 2)
+
+    def test_permanent_failure_is_kept_as_failed(self):
+        self.result = (False, "[400] bad", False)
+        self.dispatcher.submit(_msg("u1")["payload"])
+        self.assertTrue(self.dispatcher.flush(timeout=5))
+        self.assertEqual(self._queue(), [(1, "failed", 0)])
+        self.assertEqual(self.dispatcher.stats["failed"], 1)
+
+    def test_failures_persist_without_thread_pool(self):
+        # 退出时 (atexit) 默认线程池已关闭: 失败的消息仍然要写进 push_queue
+        self.result = (False, "[503] busy", True)
+        with patch.object(push_dispatcher.asyncio, "to_thread",
+                          side_effect=RuntimeError("cannot schedule new futures after interpreter shutdown")):
+            self.dispatcher.submit(_msg("u1")["payload"])
+            self.assertTrue(self.dispatcher.flush(timeout=5))
+        self.assertEqual(self._queue(), [(1, "pending", 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
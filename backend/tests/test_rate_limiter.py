@@ -0,0 +1,129 @@
+"""
+Unit tests for the adaptive token-bucket limiter in engine/rate_limiter.py.
+"""
+import sys
+import os
+import asyncio
+import time
+import unittest
+
+# Add backend dir AND project root to path to support both legacy and new imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.engine.rate_limiter import AdaptiveRateLimiter, is_rate_limited, limiter_key
+
+
+class TestAdaptiveRateLimiter(unittest.TestCase):
+
+    def test_burst_then_steady_rate(self):
+        limiter = AdaptiveRateLimiter("t", rate=20, burst=3, max_rate=20)
+        start = time.monotonic()
+        for _ in range(3):
+            limiter.acquire_sync()
+            limiter.release()
+        self.assertLess(time.monotonic() - start, 0.03)   # 突发额度内不等待
+        for _ in range(4):
+            limiter.acquire_sync()
+            limiter.release()
+        self.assertGreaterEqual(time.monotonic() - start, 4 / 20 - 0.02)
+
+    def test_additive_increase_is_capped(self):
+        limiter = AdaptiveRateLimiter("t", rate=1, max_rate=1.2, increase_step=0.1)
+        for _ in range(5):
+            limiter.record(ok=True)
+        self.assertAlmostEqual(limiter.rate, 1.2)
+
+    def test_multiplicative_decrease_once_per_window(self):
+        limiter = AdaptiveRateLimiter("t", rate=8, max_rate=8, min_rate=1)
+        for _ in range(5):   # 并发在途请求同时收到 429
+            limiter.record(ok=False, status_code=429)
+        self.assertEqual(limiter.rate, 4)
+        self.assertEqual(limiter.stats["rate_limited"], 5)
+
+    def test_retry_after_blocks_new_requests(self):
+        limiter = AdaptiveRateLimiter("t", rate=100, burst=10, max_rate=100)
+        limiter.on_rate_limited(retry_after=0.15)
+        start = time.monotonic()
+        limiter.acquire_sync()
+        limiter.release()
+        self.assertGreaterEqual(time.monotonic() - start, 0.14)
+
+    def test_other_errors_do_not_change_rate(self):
+        limiter = AdaptiveRateLimiter("t", rate=5, max_rate=5)
+        limiter.record(ok=False, status_code=500, error="HTTP 500: boom")
+        self.assertEqual(limiter.rate, 5)
+        self.assertTrue(is_rate_limited(None, "HTTP 429: Too Many Requests"))
+        self.assertTrue(is_rate_limited(None, "429 RESOURCE_EXHAUSTED"))
+
+    def test_concurrency_cap(self):
+        limiter = AdaptiveRateLimiter("t", rate=1000, burst=1000, max_rate=1000, max_concurrency=2)
+        state = {"active": 0, "peak": 0}
+
+        async def call():
+            async with limiter.slot():
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+                await asyncio.sleep(0.02)
+                state["active"] -= 1
+
+        async def main():
+            await asyncio.gather(*(call() for _ in range(6)))
+
+        asyncio.run(main())
+        self.assertEqual(state["peak"], 2)
+
+    def test_cancelled_acquire_returns_slot(self):
+        limiter = AdaptiveRateLimiter("t", rate=1, burst=1, max_rate=1, max_concurrency=1)
+
+        async def main():
+            await limiter.acquire()       # 用掉唯一的令牌并占住名额
+            queued = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0.01)
+            queued.cancel()               # 排队等名额时取消
+            limiter.release()
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(limiter.acquire(), 0.05)   # 拿到名额后等令牌时超时
+            await asyncio.sleep(0)
+
+        asyncio.run(main())
+        self.assertEqual((limiter._active, len(limiter._waiters)), (0, 0))
+
+    def test_slot_is_handed_over_across_threads(self):
+        limiter = AdaptiveRateLimiter("t", rate=1000, burst=1000, max_rate=1000, max_concurrency=1)
+        limiter.acquire_sync()
+
+        async def main():
+            waiter = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0.01)
+            self.assertFalse(waiter.done())
+            await asyncio.to_thread(limiter.release)
+            await asyncio.wait_for(waiter, 1)
+
+        asyncio.run(main())
+        self.assertEqual(limiter._active, 1)
+
+    def test_unconfigured_rate_is_unlimited(self):
+        limiter = AdaptiveRateLimiter("t")
+        start = time.monotonic()
+        for _ in range(50):
+            limiter.acquire_sync()
+            limiter.release()
+        self.assertLess(time.monotonic() - start, 0.05)
+
+        # 不限速率时 429 只暂停 Retry-After，不会开始限速
+        limiter.record(ok=False, status_code=429, retry_after=0.1)
+        limiter.record(ok=True)
+        self.assertIsNone(limiter.rate)
+        start = time.monotonic()
+        limiter.acquire_sync()
+        limiter.release()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_limiter_key(self):
+        self.assertEqual(limiter_key("https://api.deepseek.com/v1", "deepseek"), "api.deepseek.com")
+        self.assertEqual(limiter_key(None, "gemini"), "gemini")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+Unit tests for the rule-engine bulk backfill path (analysis/backfill.py).
+"""
+import sys
+import os
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+# Add backend dir AND project root to path to support both legacy and new imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from analysis import backfill
+from engine import done_keys
+from quant import backtest
+import trading_calendar
+from fixtures import memory_db, use_memory_db
+
+
+def _daily(symbol, date, close, ma5=10.0, rsi=60.0, ma20=9.0):
+    return {"symbol": symbol, "date": date, "close": close, "change_percent": 1.0,
+            "ma5": ma5, "ma20": ma20, "rsi": rsi, "macd_hist": 0.1}
+
+
+class TestRuleEngineBulkBackfill(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = memory_db(self, """
+            CREATE TABLE prediction_models (model_id TEXT PRIMARY KEY, priority INTEGER);
+            CREATE TABLE ai_predictions_v2 (
+                symbol TEXT, date TEXT, model_id TEXT, target_date TEXT, signal TEXT, confidence REAL,
+                support_price REAL, pressure_price REAL, ai_reasoning TEXT,
+                token_usage_input INTEGER, token_usage_output INTEGER, execution_time_ms INTEGER,
+                is_primary INTEGER DEFAULT 0, validation_status TEXT DEFAULT 'Pending',
+                created_at TEXT, updated_at TEXT,
+                actual_change REAL, PRIMARY KEY (symbol, date, model_id)
+            );
+            CREATE TABLE daily_prices (symbol TEXT, date TEXT, change_percent REAL);
+            INSERT INTO prediction_models VALUES ('rule-engine', 50), ('llm-low', 10), ('llm-high', 100);
+            INSERT INTO ai_predictions_v2 (symbol, date, model_id, signal, is_primary) VALUES
+                ('600519', '2024-01-03', 'llm-low', 'Side', 1),
+                ('000001', '2024-01-03', 'llm-high', 'Long', 1),
+                ('600519', '2024-01-04', 'rule-engine', 'Side', 1);
+        """)
+
+        daily = pd.DataFrame([
+            _daily("600519", "2024-01-03", 11.0), _daily("600519", "2024-01-04", 12.0),
+            _daily("000001", "2024-01-03", 11.0, ma20=None), _daily("000001", "2024-01-04", 12.0, rsi=None),
+        ])
+        weekly = monthly = pd.DataFrame([
+            {"symbol": s, "date": "2023-12-29", "close": 10.0, "ma20": 9.0} for s in ("600519", "000001")
+        ])
+        use_memory_db(self, self.conn, backfill, done_keys)
+        for patcher in (patch.object(backtest, "load_prices", return_value=(daily, weekly, monthly)),
+                        patch.object(trading_calendar, "get_next_trading_day_str",
+                                     side_effect=lambda d, market=None: d[:-2] + f"{int(d[-2:]) + 1:02d}")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _rows(self):
+        return {(r[0], r[1], r[2]): r[3:] for r in self.conn.execute(
+            "SELECT symbol, date, model_id, is_primary, target_date, validation_status FROM ai_predictions_v2")}
+
+    def _prices(self, symbol, date):
+        return self.conn.execute("SELECT support_price, pressure_price FROM ai_predictions_v2 "
+                                 "WHERE symbol = ? AND date = ? AND model_id = 'rule-engine'", (symbol, date)).fetchone()
+
+    def test_primary_follows_model_priority(self):
+        written = backfill._rule_engine_bulk_backfill(["600519", "000001"], ["2024-01-03", "2024-01-04"])
+        rows = self._rows()
+
+        # 已存在的 rule-engine 行被跳过; rsi 缺失的行不写入
+        self.assertEqual(written, {"600519": 1, "000001": 1})
+        self.assertNotIn(("000001", "2024-01-04", "rule-engine"), rows)
+        self.assertEqual(rows[("600519", "2024-01-04", "rule-engine")][1], None)
+
+        # 优先级高于 llm-low: 取代其主决策; 低于 llm-high: 不成为主决策
+        self.assertEqual(rows[("600519", "2024-01-03", "rule-engine")], (1, "2024-01-04", "Pending"))
+        self.assertEqual(rows[("600519", "2024-01-03", "llm-low")][0], 0)
+        self.assertEqual(rows[("000001", "2024-01-03", "rule-engine")][0], 0)
+        self.assertEqual(rows[("000001", "2024-01-03", "llm-high")][0], 1)
+
+        # 支撑 / 压力位与 RuleAdapter 一致: MA20 缺失时为 0
+        self.assertEqual(self._prices("000001", "2024-01-03"), (0.0, 0.0))
+        self.assertAlmostEqual(self._prices("600519", "2024-01-03")[1], 9.9)
+
+    def test_written_range_is_validated(self):
+        self.conn.execute("INSERT INTO daily_prices VALUES ('600519', '2024-01-04', 2.5), ('000001', '2024-01-04', NULL)")
+        backfill._rule_engine_bulk_backfill(["600519", "000001"], ["2024-01-03"])
+        rows = self._rows()
+
+        # target_date 已同步的写入即验证; 未同步的保持 Pending; 其他模型的预测不受影响
+        self.assertIn(rows[("600519", "2024-01-03", "rule-engine")][2], ("Correct", "Incorrect"))
+        self.assertEqual(rows[("000001", "2024-01-03", "rule-engine")][2], "Pending")
+        self.assertEqual(rows[("600519", "2024-01-03", "llm-low")][2], "Pending")
+
+    def test_force_rewrites_and_keeps_own_primary(self):
+        written = backfill._rule_engine_bulk_backfill(["600519"], ["2024-01-04"], force=True,
+                                                      pairs={("600519", "2024-01-04")})
+        self.assertEqual(written, {"600519": 1})
+        self.assertEqual(self._rows()[("600519", "2024-01-04", "rule-engine")], (1, "2024-01-05", "Pending"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+Unit tests for the staged price sync pipeline (sync/pipeline.py).
+"""
+import sys
+import os
+import threading
+import time
+import unittest
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sync.pipeline import PriceSyncPipeline, HostRateLimiter, host_for_symbol
+
+
+class FakeWriter:
+    """Collects rows instead of writing to the database."""
+
+    def __init__(self, fail=False):
+        self.rows = []
+        self.flushed = 0
+        self.writer_threads = set()
+        self.pending_keys = []
+        self.on_commit = None
+        self.fail = fail
+
+    def add(self, symbol, period, rows, state=None):
+        self.writer_threads.add(threading.current_thread().name)
+        self.rows.extend((symbol, period, r) for r in rows)
+        self.pending_keys.append((symbol, period))
+
+    def flush(self):
+        self.flushed += 1
+        if self.fail:
+            raise RuntimeError("database is locked")
+        keys, self.pending_keys = self.pending_keys, []
+        self.on_commit(keys)
+
+
+class TestPriceSyncPipeline(unittest.TestCase):
+
+    def _pipeline(self, fetch_fn, compute_fn, writer):
+        return PriceSyncPipeline(fetch_fn, compute_fn, writer=writer,
+                                 fetch_workers=3, cpu_workers=2, queue_size=2, rate_per_host=0)
+
+    def test_all_periods_reach_single_writer(self):
+        writer = FakeWriter()
+        pipeline = self._pipeline(lambda s, p: (s, p), lambda s, p, payload: ([payload], None), writer)
+        success, errors = pipeline.run(["600519", "00700", "000001"])
+
+        self.assertEqual(success, 3)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(writer.rows), 9)
+        self.assertEqual(writer.writer_threads, {"sync-writer"})
+        self.assertEqual(writer.flushed, 1)
+
+    def test_only_daily_failure_counts_as_error(self):
+        def fetch(symbol, period):
+            if symbol == "BAD" and period == "daily":
+                raise RuntimeError("timeout")
+            if period == "monthly":
+                raise RuntimeError("monthly unavailable")
+            return symbol
+
+        writer = FakeWriter()
+        success, errors = self._pipeline(fetch, lambda s, p, payload: ([payload], None), writer).run(["OK", "BAD"])
+
+        self.assertEqual(success, 1)
+        self.assertEqual(errors, ["BAD: timeout"])
+
+    def test_failed_flush_fails_every_pending_symbol(self):
+        writer = FakeWriter(fail=True)
+        success, errors = self._pipeline(lambda s, p: (s, p), lambda s, p, payload: ([payload], None),
+                                         writer).run(["600519", "000001"])
+        self.assertEqual(success, 0)
+        self.assertEqual(sorted(e.split(":")[0] for e in errors), ["000001", "600519"])
+
+    def test_empty_payload_skips_write(self):
+        writer = FakeWriter()
+        success, errors = self._pipeline(lambda s, p: None, lambda s, p, payload: ([1], None), writer).run(["600519"])
+        self.assertEqual((success, errors), (1, []))
+        self.assertEqual(writer.rows, [])
+
+
+class TestHostRateLimiter(unittest.TestCase):
+
+    def test_spaces_requests_per_host(self):
+        limiter = HostRateLimiter(rate_per_second=20)
+
+        start = time.monotonic()
+        for host in ("a", "b", "c"):
+            limiter.acquire(host)
+        self.assertLess(time.monotonic() - start, 0.04)
+
+        start = time.monotonic()
+        for _ in range(3):
+            limiter.acquire("d")
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_host_follows_fetch_path(self):
+        self.assertEqual(host_for_symbol("600519"), "push2his.eastmoney.com")
+        self.assertEqual(host_for_symbol("510300"), "push2his.eastmoney.com")
+        self.assertEqual(host_for_symbol("02800"), "33.push2his.eastmoney.com")
+        self.assertEqual(host_for_symbol("sh000001"), "finance.sina.com.cn")
+
+
+if __name__ == "__main__":
+    unittest.main()
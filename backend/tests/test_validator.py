@@ -0,0 +1,74 @@
+"""
+Unit tests for the set-based pending validation in engine/validator.py.
+"""
+import sys
+import os
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+# Add backend dir AND project root to path to support both legacy and new imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.engine import validator
+from fixtures import memory_db, use_memory_db
+
+
+class TestVerifyAllPending(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = memory_db(self, """
+            CREATE TABLE daily_prices (symbol TEXT, date TEXT, change_percent REAL, PRIMARY KEY (symbol, date));
+            CREATE TABLE ai_predictions_v2 (
+                symbol TEXT, date TEXT, model_id TEXT, target_date TEXT, signal TEXT,
+                validation_status TEXT DEFAULT 'Pending', actual_change REAL, updated_at TEXT,
+                PRIMARY KEY (symbol, date, model_id)
+            );
+        """)
+        self.conn.executemany("INSERT INTO daily_prices VALUES (?, ?, ?)", [
+            ("600519", "2024-01-03", 2.5), ("600519", "2024-01-04", -0.6), ("000001", "2024-01-03", 1.4),
+        ])
+        self.conn.executemany(
+            "INSERT INTO ai_predictions_v2 (symbol, date, model_id, target_date, signal) VALUES (?, ?, ?, ?, ?)", [
+                ("600519", "2024-01-02", "m1", "2024-01-03", "Long"),
+                ("600519", "2024-01-02", "m2", "2024-01-03", "Side"),
+                ("600519", "2024-01-03", "m1", "2024-01-04", "Short"),
+                ("000001", "2024-01-02", "m1", "2024-01-03", "Side"),
+                ("000001", "2024-01-03", "m1", "2024-01-04", "Long"),   # 目标日尚未同步
+            ])
+        use_memory_db(self, self.conn, validator)
+
+    def _statuses(self):
+        rows = self.conn.execute("""
+            SELECT symbol, date, model_id, validation_status, actual_change FROM ai_predictions_v2
+        """).fetchall()
+        return {r[:3]: r[3:] for r in rows}
+
+    def test_bulk_update_matches_targets(self):
+        with patch.object(validator, "VALIDATE_CHUNK_ROWS", 2):
+            validator.verify_all_pending()
+        self.assertEqual(self._statuses(), {
+            ("600519", "2024-01-02", "m1"): ("Correct", 2.5),
+            ("600519", "2024-01-02", "m2"): ("Incorrect", 2.5),
+            ("600519", "2024-01-03", "m1"): ("Correct", -0.6),
+            ("000001", "2024-01-02", "m1"): ("Incorrect", 1.4),
+            ("000001", "2024-01-03", "m1"): ("Pending", None),
+        })
+
+    def test_validated_rows_are_not_touched_again(self):
+        validator.verify_all_pending()
+        self.conn.execute("UPDATE daily_prices SET change_percent = -5 WHERE symbol = '600519'")
+        validator.verify_all_pending()
+        self.assertEqual(self._statuses()[("600519", "2024-01-02", "m1")], ("Correct", 2.5))
+
+    def test_vectorized_status_matches_scalar(self):
+        signals = np.array(["Long", "Short", "Side", "Hold"] * 5, dtype=object)
+        changes = np.repeat([-2.0, -0.5, 0.0, 1.0, 1.5], 4)
+        expected = [validator._calculate_status(s, c) for s, c in zip(signals, changes)]
+        self.assertEqual(validator.calculate_status_vectorized(signals, changes).tolist(), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,7 +6,7 @@ from functools import wraps
 from datetime import datetime
 from pypinyin import pinyin, Style
 from config import BEIJING_TZ, WECOM_ROBOT_KEY
-from database import get_connection
+from database import pooled_connection
 from logger import logger
 
 def retry_request(max_retries=5, delay=2.0, backoff=2.0):
@@ -44,11 +44,10 @@ def retry_request(max_retries=5, delay=2.0, backoff=2.0):
 def get_market(symbol: str) -> str:
     """获取股票所属市场 (CN/HK)"""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT market FROM stock_meta WHERE symbol = ?", (symbol,))
-        row = cursor.fetchone()
-        conn.close()
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT market FROM stock_meta WHERE symbol = ?", (symbol,))
+            row = cursor.fetchone()
         if row:
             return row[0]
     except:
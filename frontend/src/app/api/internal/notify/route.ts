@@ -29,7 +29,7 @@ export async function POST(request: Request) {
 
     try {
         const body = await request.json();
-        const { target_user_id, related_symbol, title, body: msgBody, url, tag } = body;
+        const { target_user_id, target_user_ids, related_symbol, title, body: msgBody, url, tag } = body;
 
         if (!title || !msgBody) {
             return NextResponse.json({ error: 'Missing title or body' }, { status: 400 });
@@ -41,7 +41,18 @@ export async function POST(request: Request) {
         let subscriptions: any[] = [];
 
         // 2. 查找目标订阅者
-        if (target_user_id) {
+        if (Array.isArray(target_user_ids) && target_user_ids.length > 0) {
+            // 批量: 同一模板发给多个用户 (后端 PushDispatcher 合并的请求)
+            const sql = `SELECT * FROM push_subscriptions WHERE user_id IN (${target_user_ids.map(() => '?').join(',')})`;
+            if (strategy === 'cloud') {
+                const res = await (client as Client).execute({ sql, args: target_user_ids });
+                subscriptions = res.rows;
+            } else {
+                const db = client as Database.Database;
+                subscriptions = db.prepare(sql).all(...target_user_ids);
+                db.close();
+            }
+        } else if (target_user_id) {
             // 直接查找指定用户
             const sql = 'SELECT * FROM push_subscriptions WHERE user_id = ?';
             if (strategy === 'cloud') {
@@ -83,7 +94,7 @@ export async function POST(request: Request) {
             }
         } else {
             // 必须指定目标
-            return NextResponse.json({ error: 'Must specify target_user_id, related_symbol, or broadcast: true' }, { status: 400 });
+            return NextResponse.json({ error: 'Must specify target_user_id, target_user_ids, related_symbol, or broadcast: true' }, { status: 400 });
         }
 
         console.log(`Found ${subscriptions.length} subscriptions for push.`);